@@ -0,0 +1,176 @@
+import logging
+from typing import Dict, List, Any, Tuple
+import numpy as np
+from local_store import SERIES_KEY_FIELDS, series_id, series_key, to_epoch_ms, from_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = 'anomaly-state'
+ANOMALIES_COLLECTION = 'anomalies'
+
+# Per-series detector state, 48 bytes a series; shards stay well under 1 MiB
+STATE_DTYPE = np.dtype([
+    ('sid', 'S20'),
+    ('mean', '<f8'),
+    ('var', '<f8'),
+    ('count', '<u4'),
+    ('last_ts', '<i8')
+])
+STATE_SHARDS = 16
+
+# EWMA smoothing per reference step (the 5 minute alignment period); gaps decay more
+ALPHA = 0.1
+REFERENCE_STEP_MS = 300_000
+
+# Points needed before a series is scored, and the |z| at which a point is flagged
+WARMUP_POINTS = 12
+THRESHOLD = 5.0
+
+# Variance floor relative to the mean, so flat series do not flag every wiggle
+MIN_RELATIVE_STD = 0.01
+
+def shard_of(sid: str) -> int:
+    return int(sid[:2], 16) % STATE_SHARDS
+
+class AnomalyDetector:
+    """Streaming EWMA anomaly detector over metric series.
+
+    Each series keeps an exponentially weighted mean and variance, a point
+    count and the last timestamp seen, packed into fixed-width records and
+    stored per project in sharded binary state documents. A collection run
+    loads the state once, skips points already seen (collection windows
+    overlap), scores each new point against the state before it, and folds
+    it in: O(1) per point, no history reads.
+
+    Points are applied in rounds, the k-th new point of every series at once,
+    so scoring and updates are numpy operations across all series in a run.
+    """
+
+    def __init__(self, storage, project_id: str, alpha: float = ALPHA,
+                 threshold: float = THRESHOLD, warmup: int = WARMUP_POINTS):
+        self.storage = storage
+        self.project_id = project_id
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+
+    def _shard_name(self, shard: int) -> str:
+        return f"{self.project_id}_{shard:02x}"
+
+    def _load_state(self) -> np.ndarray:
+        names = [self._shard_name(shard) for shard in range(STATE_SHARDS)]
+        blobs = self.storage.get_binary(STATE_COLLECTION, names)
+        parts = [np.frombuffer(blobs[name], dtype=STATE_DTYPE) for name in names if name in blobs]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=STATE_DTYPE)
+
+    def _save_state(self, state: np.ndarray) -> None:
+        shards = np.array([shard_of(sid.decode('ascii')) for sid in state['sid']], dtype=np.int64)
+        self.storage.set_binary(STATE_COLLECTION, {
+            self._shard_name(shard): state[shards == shard].tobytes()
+            for shard in range(STATE_SHARDS)
+        })
+
+    def _gather(self, points: List[Dict[str, Any]], rows: Dict[str, int], keys: Dict[int, Dict]) -> Tuple:
+        """Flatten points into (row, timestamp ms, value) arrays; unseen series get new rows"""
+        row_list, ts_list, value_list = [], [], []
+        row_cache = {}
+        for point in points:
+            if point.get('value') is None:
+                continue
+            # Points of one series repeat the same labels; hash each series once
+            cache_key = tuple(
+                tuple(sorted(value.items())) if isinstance(value, dict) else value
+                for value in (point.get(field) for field in SERIES_KEY_FIELDS)
+            )
+            row = row_cache.get(cache_key)
+            if row is None:
+                key = series_key(point)
+                sid = series_id(key)
+                row = rows.get(sid)
+                if row is None:
+                    row = rows[sid] = len(rows)
+                keys[row] = key
+                row_cache[cache_key] = row
+            row_list.append(row)
+            ts_list.append(to_epoch_ms(point['timestamp']))
+            value_list.append(float(point['value']))
+        return (np.array(row_list, dtype=np.int64), np.array(ts_list, dtype=np.int64),
+                np.array(value_list, dtype=np.float64))
+
+    def process(self, points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score and absorb one run's points; returns the anomalies found"""
+        state = self._load_state()
+        rows = {sid.decode('ascii'): i for i, sid in enumerate(state['sid'])}
+        keys: Dict[int, Dict] = {}
+        known = len(rows)
+
+        point_rows, timestamps, values = self._gather(points, rows, keys)
+        if len(rows) > known:
+            added = np.zeros(len(rows) - known, dtype=STATE_DTYPE)
+            added['sid'] = [sid.encode('ascii') for sid in list(rows)[known:]]
+            state = np.concatenate([state, added])
+
+        # Only points newer than what each series has absorbed
+        fresh = timestamps > state['last_ts'][point_rows]
+        point_rows, timestamps, values = point_rows[fresh], timestamps[fresh], values[fresh]
+
+        # Rank each point within its series by time; round k applies every series' k-th point
+        order = np.lexsort((timestamps, point_rows))
+        point_rows, timestamps, values = point_rows[order], timestamps[order], values[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(point_rows)) + 1] if len(point_rows) else np.zeros(0, dtype=np.int64)
+        ranks = np.arange(len(point_rows)) - np.repeat(starts, np.diff(np.r_[starts, len(point_rows)]))
+
+        mean, var, count, last_ts = state['mean'], state['var'], state['count'], state['last_ts']
+        flagged = []
+        for rank in range(int(ranks.max()) + 1 if len(ranks) else 0):
+            sel = ranks == rank
+            r, ts, x = point_rows[sel], timestamps[sel], values[sel]
+
+            m, v, n = mean[r], var[r], count[r]
+            std = np.maximum(np.sqrt(v), np.abs(m) * MIN_RELATIVE_STD)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.where(std > 0, (x - m) / std, 0.0)
+            scored = n >= self.warmup
+            hits = scored & (np.abs(z) >= self.threshold)
+            if hits.any():
+                flagged.append((r[hits], ts[hits], x[hits], m[hits], std[hits], z[hits]))
+
+            # Gaps longer than the reference step forget the old baseline faster
+            steps = np.where(n > 0, np.maximum((ts - last_ts[r]) / REFERENCE_STEP_MS, 1.0), 1.0)
+            a = np.where(n > 0, 1.0 - (1.0 - self.alpha) ** steps, 1.0)
+            # Warmed-up series absorb outliers clipped to the threshold, so one spike
+            # does not inflate the baseline
+            clipped = np.where(scored, m + np.clip(z, -self.threshold, self.threshold) * std, x)
+            delta = clipped - m
+            mean[r] = m + a * delta
+            var[r] = (1.0 - a) * (v + a * delta * delta)
+            count[r] = n + 1
+            last_ts[r] = ts
+
+        self._save_state(state)
+
+        anomalies = []
+        for r, ts, x, m, std, z in flagged:
+            for row, t, value, expected, spread, score in zip(r, ts, x, m, std, z):
+                key = keys.get(row, {})
+                anomalies.append(dict(
+                    key,
+                    series_id=state['sid'][row].decode('ascii'),
+                    timestamp=from_epoch_ms(int(t)).isoformat(),
+                    value=float(value),
+                    expected=float(expected),
+                    std=float(spread),
+                    score=round(float(score), 3),
+                    direction='spike' if score > 0 else 'drop'
+                ))
+
+        logger.info(f"Anomaly detection for {self.project_id}: {len(timestamps)} new points, "
+                    f"{len(state)} series, {len(anomalies)} anomalies")
+        return anomalies
+
+def detect_anomalies(storage, project_id: str, points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run the detector over a collection run and store the anomalies it finds"""
+    anomalies = AnomalyDetector(storage, project_id).process(points)
+    if anomalies:
+        storage.add_documents(ANOMALIES_COLLECTION, anomalies)
+    return anomalies
@@ -0,0 +1,160 @@
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional
+from changelog import VOLATILE_FIELDS
+from snapshots import content_hash
+
+logger = logging.getLogger(__name__)
+
+CADENCE_COLLECTION = 'collection-cadence'
+
+# Inventory sections polled per slice, with the field a resource's region comes
+# from; None marks global sections, which form a single slice
+SLICED_SECTIONS = {
+    'networks': None,
+    'firewall_rules': None,
+    'subnetworks': 'region',
+    'routers': 'region',
+    'nat_gateways': 'region',
+    'instance_interfaces': 'zone'
+}
+GLOBAL = 'global'
+
+# Scheduler period of the inventory collector; no slice is polled more often
+DEFAULT_TICK_MINUTES = 15
+# Every slice is polled at least this often, whatever its history
+DEFAULT_MAX_STALENESS_MINUTES = 360
+
+# Change history fades with this half-life, so a slice that turns busy is noticed within days
+CHANGE_HALF_LIFE_SECONDS = 3 * 86400
+# Slices without history behave as if they changed once in PRIOR_SECONDS
+PRIOR_CHANGES = 1.0
+PRIOR_SECONDS = 6 * 3600
+# Poll when a change is this likely to have happened since the last poll
+TARGET_CHANGES_PER_POLL = 0.5
+
+def slice_key(section: str, region: str = GLOBAL) -> str:
+    return f"{section}/{region}"
+
+def slice_keys(regions: List[str]) -> List[str]:
+    """Every slice of a project with the given regions"""
+    return [
+        slice_key(section, region)
+        for section, field in SLICED_SECTIONS.items()
+        for region in ([GLOBAL] if field is None else regions)
+    ]
+
+def resource_region(section: str, resource: Dict[str, Any]) -> str:
+    field = SLICED_SECTIONS[section]
+    if field is None:
+        return GLOBAL
+    value = resource.get(field, '')
+    # Zones are <region>-<letter>
+    return value.rpartition('-')[0] if field == 'zone' else value
+
+def slice_fingerprint(resources: Iterable[Dict[str, Any]]) -> str:
+    """Order-independent hash of a slice's configuration, measurements left out"""
+    return content_hash(sorted(
+        content_hash({k: v for k, v in resource.items() if k not in VOLATILE_FIELDS}) for resource in resources
+    ))
+
+class CollectionCadence:
+    """Per-project polling schedule of inventory slices (resource type x region).
+
+    Each slice keeps a decayed count of the polls that found it changed and
+    the time those polls covered; their ratio is the slice's change rate,
+    and the poll interval is the time in which TARGET_CHANGES_PER_POLL
+    changes are expected, between the scheduler tick and the maximum
+    staleness. Change is detected by comparing each poll's fingerprint with
+    the previous one, so no earlier inventory has to be read.
+    """
+
+    def __init__(self, storage, project_id: str, tick_minutes: Optional[int] = None,
+                 max_staleness_minutes: Optional[int] = None):
+        self.storage = storage
+        self.project_id = project_id
+        self.tick = 60 * (tick_minutes or int(os.environ.get('COLLECTION_TICK_MINUTES', DEFAULT_TICK_MINUTES)))
+        self.max_staleness = 60 * (max_staleness_minutes or int(
+            os.environ.get('MAX_STALENESS_MINUTES', DEFAULT_MAX_STALENESS_MINUTES)))
+        document = storage.get_documents(CADENCE_COLLECTION, [project_id]).get(project_id) or {}
+        self.slices: Dict[str, Dict[str, Any]] = document.get('slices', {})
+
+    def interval(self, key: str) -> float:
+        """Seconds between polls of a slice, from its change history"""
+        state = self.slices.get(key, {})
+        rate = (state.get('changes', 0.0) + PRIOR_CHANGES) / (state.get('seconds', 0.0) + PRIOR_SECONDS)
+        # Polling at the last tick before max_staleness keeps every slice within it
+        return min(max(TARGET_CHANGES_PER_POLL / rate, self.tick), self.max_staleness - self.tick)
+
+    def is_due(self, key: str, now: datetime) -> bool:
+        state = self.slices.get(key)
+        if state is None:
+            return True
+        age = (now - datetime.fromisoformat(state['last_polled'])).total_seconds()
+        # Runs land on ticks; poll at the one closest to the interval
+        return age >= self.interval(key) - self.tick / 2
+
+    def due(self, keys: Iterable[str], now: datetime, force: bool = False) -> List[str]:
+        return [key for key in keys if force or self.is_due(key, now)]
+
+    def record_poll(self, key: str, resources: List[Dict[str, Any]], now: datetime) -> bool:
+        """Update a slice's history with a fresh poll; returns whether it changed"""
+        fingerprint = slice_fingerprint(resources)
+        state = self.slices.get(key)
+        if state is None:
+            self.slices[key] = {'last_polled': now.isoformat(), 'fingerprint': fingerprint,
+                                'changes': 0.0, 'seconds': 0.0, 'polls': 1}
+            return False
+
+        elapsed = max((now - datetime.fromisoformat(state['last_polled'])).total_seconds(), 0.0)
+        changed = fingerprint != state['fingerprint']
+        decay = 0.5 ** (elapsed / CHANGE_HALF_LIFE_SECONDS)
+        state['changes'] = state['changes'] * decay + (1.0 if changed else 0.0)
+        state['seconds'] = state['seconds'] * decay + elapsed
+        state['fingerprint'] = fingerprint
+        state['last_polled'] = now.isoformat()
+        state['polls'] = state.get('polls', 0) + 1
+        return changed
+
+    def last_polled(self, keys: Iterable[str]) -> Dict[str, str]:
+        return {key: self.slices[key]['last_polled'] for key in keys if key in self.slices}
+
+    def save(self, now: datetime) -> None:
+        for key, state in self.slices.items():
+            state['interval_seconds'] = round(self.interval(key))
+        self.storage.set_document(CADENCE_COLLECTION, self.project_id, {
+            'project_id': self.project_id,
+            'timestamp': now.isoformat(),
+            'slices': self.slices
+        })
+
+def slice_resources(section: str, resources: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Resources of a section grouped by slice key"""
+    slices: Dict[str, List[Dict[str, Any]]] = {}
+    for resource in resources:
+        slices.setdefault(slice_key(section, resource_region(section, resource)), []).append(resource)
+    return slices
+
+def merge_sections(fresh: Dict[str, List[Dict[str, Any]]], polled: List[str], previous,
+                   regions: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Whole sections from freshly polled slices plus the previous snapshot's other slices.
+
+    fresh holds only resources of polled slices. Resources of regions that
+    are not polled are carried over from the previous snapshot, which is
+    read only for sections with such regions.
+    """
+    polled = set(polled)
+    merged = {}
+    for section, resources in fresh.items():
+        keys = [slice_key(section)] if SLICED_SECTIONS[section] is None else \
+            [slice_key(section, region) for region in regions]
+        carried = [key for key in keys if key not in polled]
+        if carried and previous is not None and section in previous.section_names:
+            carried = set(carried)
+            resources = resources + [
+                resource for resource in previous.section(section)
+                if slice_key(section, resource_region(section, resource)) in carried
+            ]
+        merged[section] = resources
+    return merged
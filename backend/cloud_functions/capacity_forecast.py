@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+import functions_framework
+import numpy as np
+from storage import get_storage
+from snapshots import load_snapshot
+from local_store import to_epoch_ms, from_epoch_ms
+from cost_engine import EGRESS_METRIC, flatten_points, region_of
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORECASTS_COLLECTION = 'capacity-forecasts'
+PORT_USAGE_METRIC = 'compute.googleapis.com/nat/port_usage'
+ALLOCATED_PORTS_METRIC = 'compute.googleapis.com/nat/allocated_ports'
+
+# Hourly peaks over this history are fitted; forecasts run this far ahead
+HISTORY = timedelta(days=14)
+HORIZON_HOURS = 30 * 24
+HOUR_MS = 3_600_000
+
+# Daily seasonality as a short Fourier series; a little ridge keeps series
+# with under two days of history solvable
+DAILY_HARMONICS = 3
+RIDGE = 1e-3
+MIN_OBSERVED_HOURS = 24
+
+# The upper band (forecast + UNCERTAINTY_SIGMAS residual deviations) crossing
+# the limit within WARNING_HOURS puts a resource in the run's at-risk list
+UNCERTAINTY_SIGMAS = 2.0
+WARNING_HOURS = 7 * 24
+
+# Cloud NAT defaults when a gateway sets no port limits
+DEFAULT_MIN_PORTS_PER_VM = 64
+
+# Default per-VM egress caps: 2 Gbps per vCPU up to 32 Gbps (16 Gbps for E2);
+# shared-core machine types get 1 Gbps
+EGRESS_GBPS_PER_VCPU = 2
+EGRESS_MAX_GBPS = {'e2': 16}
+EGRESS_DEFAULT_MAX_GBPS = 32
+SHARED_CORE_GBPS = 1
+SHARED_CORE_TYPES = {'e2-micro', 'e2-small', 'e2-medium', 'f1-micro', 'g1-small'}
+
+def port_limit(gateway: Dict[str, Any]) -> int:
+    """Ports one VM can get: max_ports_per_vm with dynamic allocation, min_ports_per_vm otherwise"""
+    return int(gateway.get('max_ports_per_vm') or gateway.get('min_ports_per_vm') or DEFAULT_MIN_PORTS_PER_VM)
+
+def egress_limit(machine_type: str) -> Optional[float]:
+    """Default egress bandwidth cap of a machine type in bytes/s, None when unknown"""
+    parts = machine_type.split('-')
+    if 'custom' in parts and parts.index('custom') + 1 < len(parts):
+        vcpus = parts[parts.index('custom') + 1]
+    else:
+        vcpus = parts[-1] if len(parts) >= 3 else ''
+    if machine_type in SHARED_CORE_TYPES:
+        gbps = SHARED_CORE_GBPS
+    elif vcpus.isdigit():
+        gbps = min(int(vcpus) * EGRESS_GBPS_PER_VCPU, EGRESS_MAX_GBPS.get(parts[0], EGRESS_DEFAULT_MAX_GBPS))
+    else:
+        return None
+    return gbps * 1e9 / 8
+
+def design_matrix(hours: np.ndarray) -> np.ndarray:
+    """Columns: intercept, trend in days, then cos/sin pairs of the daily cycle"""
+    columns = [np.ones(len(hours)), hours / 24.0]
+    for k in range(1, DAILY_HARMONICS + 1):
+        angle = 2 * np.pi * k * hours / 24.0
+        columns.extend([np.cos(angle), np.sin(angle)])
+    return np.stack(columns, axis=1)
+
+def hourly_peaks(series_ranges: List, start_ms: int, n_hours: int) -> np.ndarray:
+    """[series, hour] maximum of each hour's points, NaN where an hour has none"""
+    peaks = np.full((len(series_ranges), n_hours), np.nan)
+    series_ids, timestamps, values = flatten_points(series_ranges, start_ms, start_ms + n_hours * HOUR_MS)
+    if not len(values):
+        return peaks
+
+    # Points come sorted by series and time, so cells are non-decreasing
+    cells = series_ids * n_hours + (timestamps - start_ms) // HOUR_MS
+    starts = np.r_[0, np.nonzero(np.diff(cells))[0] + 1]
+    peaks.reshape(-1)[cells[starts]] = np.maximum.reduceat(values, starts)
+    return peaks
+
+def fit_batch(peaks: np.ndarray, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Weighted least squares of every series on the shared design at once.
+
+    Missing hours get zero weight, so each series solves its own normal
+    equations (X' W X + ridge) b = X' W y; all of them are built with two
+    einsums and solved in one batched call. Returns (coefficients, residual
+    RMSE, observed hours) per series.
+    """
+    observed = ~np.isnan(peaks)
+    weights = observed.astype(np.float64)
+    y = np.where(observed, peaks, 0.0)
+
+    normal = np.einsum('st,tp,tq->spq', weights, X, X)
+    penalty = np.full(X.shape[1], RIDGE)
+    penalty[0] = 0.0
+    normal += np.diag(penalty) * np.maximum(weights.sum(axis=1), 1.0)[:, None, None]
+    rhs = np.einsum('st,tp->sp', weights * y, X)
+    coefficients = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0]
+
+    residuals = (y - coefficients @ X.T) * weights
+    count = weights.sum(axis=1)
+    rmse = np.sqrt((residuals ** 2).sum(axis=1) / np.maximum(count, 1.0))
+    return coefficients, rmse, count
+
+def first_crossing(forecast: np.ndarray, limits: np.ndarray) -> np.ndarray:
+    """Index of the first forecast hour at or above each series' limit, -1 when none"""
+    crossed = forecast >= limits[:, None]
+    return np.where(crossed.any(axis=1), crossed.argmax(axis=1), -1)
+
+class CapacityForecaster:
+    """Trend plus daily seasonality forecasts for NAT ports and VM egress.
+
+    Every series of a kind is reduced to hourly peaks on one shared grid, so
+    a single design matrix serves all of them: fitting, the 30 day forecast
+    and the search for the first hour at the limit are batched numpy
+    operations across every gateway and instance in a run.
+    """
+
+    def __init__(self, nat_gateways: Optional[List[Dict[str, Any]]] = None,
+                 interfaces: Optional[List[Dict[str, Any]]] = None):
+        self.gateways = {(g.get('region', ''), g.get('name', '')): g for g in nat_gateways or []}
+        self.instances: Dict[str, Dict[str, Any]] = {}
+        for interface in interfaces or []:
+            self.instances.setdefault(str(interface.get('instance_id', '')), interface)
+
+    def nat_target(self, series) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Gateway of a NAT series and the per-VM port limit it is measured against"""
+        resource_labels = series.key.get('resource_labels') or {}
+        metric_labels = series.key.get('metric_labels') or {}
+        name = resource_labels.get('gateway_name') or metric_labels.get('nat_gateway_name', '')
+        region = resource_labels.get('region') or region_of(resource_labels.get('zone', ''))
+        gateway = self.gateways.get((region, name))
+        if gateway is None:
+            return None
+        target = {'gateway': name, 'router': gateway.get('router_name', ''), 'region': region}
+        if resource_labels.get('instance_id'):
+            target['instance_id'] = str(resource_labels['instance_id'])
+        return target, float(port_limit(gateway))
+
+    def egress_target(self, series) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Instance of a sent_bytes_count series and its egress cap in bytes/s"""
+        labels = series.key.get('resource_labels') or {}
+        instance = self.instances.get(str(labels.get('instance_id', '')))
+        if instance is None:
+            return None
+        limit = egress_limit(instance.get('machine_type', ''))
+        if limit is None:
+            return None
+        return {
+            'instance': instance.get('instance', ''),
+            'instance_id': str(labels['instance_id']),
+            'zone': labels.get('zone') or instance.get('zone', ''),
+            'machine_type': instance['machine_type']
+        }, limit
+
+    def forecast(self, kind: str, series_ranges: List, targets, start_ms: int, end_ms: int) -> List[Dict[str, Any]]:
+        """One forecast row per series with a known limit and enough history"""
+        placed = [(series, targets(series)) for series in series_ranges]
+        placed = [(series, target) for series, target in placed if target]
+        if not placed:
+            return []
+
+        n_hours = (end_ms - start_ms) // HOUR_MS
+        peaks = hourly_peaks([series for series, _ in placed], start_ms, n_hours)
+        X = design_matrix(np.arange(n_hours, dtype=np.float64))
+        coefficients, rmse, observed = fit_batch(peaks, X)
+
+        horizon = design_matrix(np.arange(n_hours, n_hours + HORIZON_HOURS, dtype=np.float64))
+        forecast = np.maximum(coefficients @ horizon.T, 0.0)
+        limits = np.array([limit for _, (_, limit) in placed])
+        expected = first_crossing(forecast, limits)
+        earliest = first_crossing(forecast + UNCERTAINTY_SIGMAS * rmse[:, None], limits)
+
+        # Latest observed hourly peak per series
+        last_hour = np.where(~np.isnan(peaks), np.arange(n_hours), -1).max(axis=1)
+        current = peaks[np.arange(len(placed)), np.maximum(last_hour, 0)]
+        seasonal = coefficients[:, 2:] @ X[:24, 2:].T
+
+        rows = []
+        for i in np.nonzero(observed >= MIN_OBSERVED_HOURS)[0]:
+            series, (target, limit) = placed[i]
+            rows.append(dict(
+                target,
+                kind=kind,
+                series_id=series.series_id,
+                limit=limit,
+                current_peak=round(float(current[i]), 3),
+                utilization_percent=round(float(current[i]) / limit * 100, 2),
+                trend_per_day=round(float(coefficients[i, 1]), 3),
+                daily_amplitude=round(float(seasonal[i].max() - seasonal[i].min()), 3),
+                forecast_peak=round(float(forecast[i].max()), 3),
+                hours_to_exhaustion=int(expected[i]) if expected[i] >= 0 else None,
+                exhausts_at=from_epoch_ms(end_ms + int(expected[i]) * HOUR_MS).isoformat()
+                            if expected[i] >= 0 else None,
+                earliest_hours_to_exhaustion=int(earliest[i]) if earliest[i] >= 0 else None,
+                fit_rmse=round(float(rmse[i]), 3),
+                observed_hours=int(observed[i])
+            ))
+
+        logger.info(f"Forecast {len(rows)} of {len(placed)} {kind} series over {n_hours} hours")
+        return rows
+
+def forecast_capacity_for_project(storage, project_id: str, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Forecast NAT port and egress headroom from stored history and replace the stored forecasts.
+
+    Documents are keyed by project, kind and series, so each run overwrites
+    the previous forecast; series that stop reporting age out by retention.
+    """
+    now = now or datetime.now(timezone.utc)
+    end_ms = to_epoch_ms(now) // HOUR_MS * HOUR_MS
+    start_ms = end_ms - int(HISTORY.total_seconds() * 1000)
+
+    snapshot = load_snapshot(storage, project_id)
+    sections = snapshot.section_names if snapshot else []
+    forecaster = CapacityForecaster(
+        snapshot.section('nat_gateways') if 'nat_gateways' in sections else [],
+        snapshot.section('instance_interfaces') if 'instance_interfaces' in sections else []
+    )
+    if snapshot is None:
+        logger.warning(f"No inventory for {project_id}; limits are unknown and nothing is forecast")
+
+    rows = []
+    for kind, metric_type, targets in (
+        ('nat_port_usage', PORT_USAGE_METRIC, forecaster.nat_target),
+        ('nat_allocated_ports', ALLOCATED_PORTS_METRIC, forecaster.nat_target),
+        ('instance_egress', EGRESS_METRIC, forecaster.egress_target)
+    ):
+        series = storage.read_series(project_id, metric_type, start_ms, end_ms)
+        rows.extend(forecaster.forecast(kind, series, targets, start_ms, end_ms))
+
+    timestamp = now.isoformat()
+    storage.set_documents(FORECASTS_COLLECTION, {
+        f"{project_id}_{row['kind']}_{row['series_id']}": dict(row, project_id=project_id, timestamp=timestamp)
+        for row in rows
+    })
+    return rows
+
+def at_risk(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows whose upper band reaches the limit within WARNING_HOURS, soonest first"""
+    risky = [
+        row for row in rows
+        if row['earliest_hours_to_exhaustion'] is not None and row['earliest_hours_to_exhaustion'] <= WARNING_HOURS
+    ]
+    return sorted(risky, key=lambda row: row['earliest_hours_to_exhaustion'])
+
+@functions_framework.http
+def forecast_capacity(request):
+    """HTTP Cloud Function entry point for NAT port and bandwidth forecasting"""
+    try:
+        project_id = os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
+        if not project_id:
+            return {'error': 'Project ID not found'}, 400
+
+        rows = forecast_capacity_for_project(get_storage(), project_id)
+        risky = at_risk(rows)
+        for row in risky:
+            logger.warning(f"{row['kind']} may reach its limit of {row['limit']:g} within "
+                           f"{row['earliest_hours_to_exhaustion']}h: "
+                           f"{row.get('gateway') or row.get('instance')} ({row['series_id']})")
+
+        response = {
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'series_forecast': len(rows),
+            'forecasts_by_kind': {
+                kind: sum(1 for row in rows if row['kind'] == kind)
+                for kind in sorted({row['kind'] for row in rows})
+            },
+            'at_risk': [
+                {key: row.get(key) for key in (
+                    'kind', 'gateway', 'instance', 'instance_id', 'limit', 'current_peak',
+                    'hours_to_exhaustion', 'earliest_hours_to_exhaustion'
+                ) if row.get(key) is not None}
+                for row in risky
+            ]
+        }
+
+        logger.info(f"Capacity forecasting completed: {response['series_forecast']} series, "
+                    f"{len(risky)} at risk")
+        return response, 200
+
+    except ValueError as e:
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Capacity forecasting failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+# For local testing
+if __name__ == '__main__':
+    os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'your-project-id')
+
+    class MockRequest:
+        def __init__(self):
+            self.args = {}
+
+    result = forecast_capacity(MockRequest())
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,143 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+from keys import document_id
+from snapshots import BLOB_COLLECTION, InventorySnapshot, content_hash, load_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+CHANGES_COLLECTION = 'inventory-changes'
+CHECKPOINT_COLLECTION = 'inventory-checkpoints'
+
+# A full checkpoint at most this often; as-of queries replay at most this much history
+CHECKPOINT_INTERVAL = timedelta(hours=24)
+
+# Inventory sections tracked by the change log, with the fields identifying a resource
+RESOURCE_KEYS = {
+    'networks': ('name',),
+    'subnetworks': ('region', 'name'),
+    'firewall_rules': ('name',),
+    'routers': ('region', 'name'),
+    'nat_gateways': ('region', 'router_name', 'name'),
+    'instance_interfaces': ('zone', 'instance', 'internal_ip')
+}
+
+# Measurements rather than configuration: they ride along with other changes
+# but do not produce events on their own
+VOLATILE_FIELDS = {'available_ips'}
+
+def resource_key(resource: Dict[str, Any], key_fields) -> str:
+    return '/'.join(str(resource.get(field, '')) for field in key_fields)
+
+def diff_fields(old: Dict[str, Any], new: Dict[str, Any], prefix: str = '') -> List[Dict[str, Any]]:
+    """Field-level differences; nested dicts recurse into dotted paths, lists compare whole"""
+    changes = []
+    for field in sorted(set(old) | set(new)):
+        path = f"{prefix}{field}"
+        if field not in new:
+            changes.append({'field': path, 'op': 'unset', 'old': old[field], 'new': None})
+        elif field not in old:
+            changes.append({'field': path, 'op': 'set', 'old': None, 'new': new[field]})
+        elif old[field] != new[field]:
+            if isinstance(old[field], dict) and isinstance(new[field], dict):
+                changes.extend(diff_fields(old[field], new[field], f"{path}."))
+            else:
+                changes.append({'field': path, 'op': 'set', 'old': old[field], 'new': new[field]})
+    return changes
+
+def section_changes(storage, previous: InventorySnapshot, section: str,
+                    resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """created/modified/deleted events for one section against the previous snapshot.
+
+    Resources whose content hash is in the previous snapshot are unchanged and
+    never read; only blobs of resources that disappeared are fetched, so a
+    quiet estate costs the chunk reads alone.
+    """
+    key_fields = RESOURCE_KEYS[section]
+    old_hashes = set(previous.resource_hashes(section))
+    new_by_hash = {content_hash(resource): resource for resource in resources}
+
+    gone = [h for h in old_hashes if h not in new_by_hash]
+    old_resources = {
+        resource_key(blob['data'], key_fields): blob['data']
+        for blob in storage.get_documents(BLOB_COLLECTION, gone).values()
+    }
+    new_resources = {
+        resource_key(resource, key_fields): resource
+        for h, resource in new_by_hash.items() if h not in old_hashes
+    }
+
+    events = []
+    for key in sorted(set(old_resources) | set(new_resources)):
+        before, after = old_resources.get(key), new_resources.get(key)
+        event = {'section': section, 'resource_key': key, 'resource_name': (after or before).get('name', '')}
+        if before is None:
+            events.append(dict(event, event='created', resource=after))
+        elif after is None:
+            events.append(dict(event, event='deleted', resource=before))
+        else:
+            changes = diff_fields(before, after)
+            if any(change['field'].split('.')[0] not in VOLATILE_FIELDS for change in changes):
+                events.append(dict(event, event='modified', changes=changes))
+    return events
+
+def write_checkpoint(storage, data: Dict[str, Any], inventory_id: str) -> str:
+    """Full state of the tracked sections, stored like an inventory snapshot.
+
+    The manifest names the key fields of each section, so readers rebuild
+    resource identities without knowing RESOURCE_KEYS.
+    """
+    checkpoint = {
+        'project_id': data['project_id'],
+        'timestamp': data['timestamp'],
+        'inventory_id': inventory_id,
+        'key_fields': {section: list(fields) for section, fields in RESOURCE_KEYS.items()}
+    }
+    for section in RESOURCE_KEYS:
+        if section in data:
+            checkpoint[section] = data[section]
+
+    doc_id = document_id(data['project_id'], datetime.fromisoformat(data['timestamp']))
+    write_snapshot(storage, doc_id, checkpoint, collection=CHECKPOINT_COLLECTION)
+    return doc_id
+
+def record_changes(storage, previous: Optional[InventorySnapshot], data: Dict[str, Any],
+                   inventory_id: str) -> Dict[str, Any]:
+    """Log changes since the previous snapshot and checkpoint when one is due.
+
+    Call after the new snapshot is written and before the resources are
+    annotated for the per-type collections. The first run for a project only
+    writes a checkpoint, which is the baseline later events apply to.
+    """
+    project_id = data['project_id']
+    when = datetime.fromisoformat(data['timestamp'])
+
+    events = []
+    if previous is not None:
+        for section in RESOURCE_KEYS:
+            # A section the previous snapshot lacks starts at the next checkpoint
+            if section in data and section in previous.section_names:
+                events.extend(section_changes(storage, previous, section, data[section]))
+
+    documents = {}
+    for event in events:
+        event.update(project_id=project_id, timestamp=data['timestamp'], inventory_id=inventory_id)
+        documents[document_id(project_id, when)] = event
+    if documents:
+        storage.set_documents(CHANGES_COLLECTION, documents)
+
+    checkpoint = load_snapshot(storage, project_id, collection=CHECKPOINT_COLLECTION)
+    checkpoint_id = None
+    if checkpoint is None or \
+            when - datetime.fromisoformat(checkpoint.manifest['timestamp']) >= CHECKPOINT_INTERVAL or \
+            set(checkpoint.manifest.get('key_fields', {})) != set(RESOURCE_KEYS):
+        checkpoint_id = write_checkpoint(storage, data, inventory_id)
+
+    stats = {
+        'created': sum(1 for e in events if e['event'] == 'created'),
+        'modified': sum(1 for e in events if e['event'] == 'modified'),
+        'deleted': sum(1 for e in events if e['event'] == 'deleted'),
+        'checkpoint': checkpoint_id
+    }
+    logger.info(f"Recorded inventory changes for {project_id}: {stats}")
+    return stats
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional
+import functions_framework
+import numpy as np
+from storage import get_storage
+from snapshots import load_snapshot
+from local_store import to_epoch_ms
+from flow_logs import DESTINATION_CLASSES, load_destination_bytes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COSTS_COLLECTION = 'costs'
+EGRESS_METRIC = 'compute.googleapis.com/instance/network/sent_bytes_count'
+
+# sent_bytes_count is collected as ALIGN_RATE over 5 minute windows: bytes/s per point
+ALIGNMENT_SECONDS = 300
+
+INTERNET = DESTINATION_CLASSES.index('internet')
+INTER_ZONE = DESTINATION_CLASSES.index('inter_zone')
+
+PRICING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'egress_pricing.json')
+
+DAY_MS = 86_400_000
+
+def load_pricing(path: Optional[str] = None) -> Dict[str, Any]:
+    """Pricing table from EGRESS_PRICING_FILE or the bundled list prices"""
+    with open(path or os.environ.get('EGRESS_PRICING_FILE') or PRICING_FILE) as f:
+        return json.load(f)
+
+def region_of(zone: str) -> str:
+    return zone.rsplit('-', 1)[0] if zone.count('-') >= 2 else zone
+
+def unit_price(pricing: Dict[str, Any], destination_class: str, region: str) -> float:
+    """Price per pricing unit; the longest region prefix in the class table wins"""
+    table = pricing['classes'].get(destination_class, {})
+    matches = [prefix for prefix in table if prefix != 'default' and region.startswith(prefix)]
+    return float(table[max(matches, key=len)] if matches else table.get('default', 0.0))
+
+def flatten_points(series_ranges: List, start_ms: int, end_ms: int):
+    """(series index, timestamp, value) arrays of the points in [start_ms, end_ms).
+
+    Points repeated across collection runs, or stored by both the VPC and GCE
+    collectors, are dropped with one lexsort; the result is ordered by series
+    and timestamp. Series indexes are positions in series_ranges.
+    """
+    point_series, point_ts, point_values = [], [], []
+    for index, series in enumerate(series_ranges):
+        for timestamps, values in series.chunks:
+            timestamps = np.asarray(timestamps, dtype=np.int64)
+            point_series.append(np.full(len(timestamps), index, dtype=np.int64))
+            point_ts.append(timestamps)
+            point_values.append(np.asarray(values, dtype=np.float64))
+
+    if not point_ts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    series_ids = np.concatenate(point_series)
+    timestamps = np.concatenate(point_ts)
+    values = np.concatenate(point_values)
+    in_range = (timestamps >= start_ms) & (timestamps < end_ms) & np.isfinite(values)
+    series_ids, timestamps, values = series_ids[in_range], timestamps[in_range], values[in_range]
+
+    # One point per series and timestamp, whichever run stored it
+    order = np.lexsort((timestamps, series_ids))
+    series_ids, timestamps, values = series_ids[order], timestamps[order], values[order]
+    first = np.r_[True, (np.diff(series_ids) != 0) | (np.diff(timestamps) != 0)]
+    return series_ids[first], timestamps[first], values[first]
+
+class EgressCostEngine:
+    """Egress cost per resource, zone, region and destination class.
+
+    All points of a day are flattened into deduplicated (series, timestamp,
+    rate) arrays (flatten_points); per-series bytes come from a single
+    bincount. Each series carries a row of destination shares, and
+    bytes times shares times a per-region price matrix gives cost per series
+    and class; a final bincount per class rolls series up to resources.
+
+    Load-balanced traffic is internet egress. Other traffic is split by the
+    instance's bytes per destination class in the day's flow logs
+    (destination_bytes, {(instance name, zone): bytes per class}). Instances
+    without flow records take the project's overall split, and without any
+    flow data, traffic from instances with an external IP counts as internet
+    and the rest as inter-zone; rows costed that way are flagged
+    destination_class_estimated.
+    """
+
+    def __init__(self, pricing: Dict[str, Any], interfaces: Optional[List[Dict[str, Any]]] = None,
+                 destination_bytes: Optional[Dict[tuple, List[int]]] = None):
+        self.pricing = pricing
+        self.unit_bytes = float(pricing.get('unit_bytes', 1 << 30))
+        self.instances: Dict[str, Dict[str, Any]] = {}
+        for interface in interfaces or []:
+            instance = self.instances.setdefault(str(interface.get('instance_id', '')), {
+                'name': interface.get('instance', ''), 'zone': interface.get('zone', ''), 'external_ip': False
+            })
+            instance['external_ip'] = instance['external_ip'] or bool(interface.get('external_ip'))
+
+        self.observed: Dict[tuple, np.ndarray] = {}
+        project_bytes = np.zeros(len(DESTINATION_CLASSES))
+        for key, sent in (destination_bytes or {}).items():
+            sent = np.asarray(sent, dtype=np.float64)
+            if sent.sum() > 0:
+                self.observed[key] = sent / sent.sum()
+                project_bytes += sent
+        self.project_shares = project_bytes / project_bytes.sum() if project_bytes.sum() > 0 else None
+
+    def _shares(self, resource_id: str, metric_labels: Dict[str, str], zone: str) -> tuple:
+        """(shares per destination class, whether they are estimated)"""
+        shares = np.zeros(len(DESTINATION_CLASSES))
+        if str(metric_labels.get('loadbalanced', '')).lower() == 'true':
+            shares[INTERNET] = 1.0
+            return shares, False
+
+        instance = self.instances.get(resource_id, {})
+        observed = self.observed.get((instance.get('name') or resource_id, instance.get('zone') or zone))
+        if observed is not None:
+            return observed, False
+        if self.project_shares is not None:
+            return self.project_shares, True
+        shares[INTERNET if instance.get('external_ip') else INTER_ZONE] = 1.0
+        return shares, True
+
+    def compute(self, series_ranges: List, start_ms: int, end_ms: int) -> List[Dict[str, Any]]:
+        """Cost rows per (resource, destination class) for points in [start_ms, end_ms)"""
+        resources: Dict[str, int] = {}
+        resource_info = []
+        series_resource, share_rows, price_rows, estimated = [], [], [], []
+
+        for series in series_ranges:
+            labels = series.key.get('resource_labels') or {}
+            resource_id = str(labels.get('instance_id', ''))
+            zone = labels.get('zone', '')
+            row = resources.get(resource_id)
+            if row is None:
+                row = resources[resource_id] = len(resource_info)
+                region = region_of(zone)
+                resource_info.append({
+                    'resource_id': resource_id,
+                    'resource': self.instances.get(resource_id, {}).get('name') or resource_id,
+                    'zone': zone,
+                    'region': region
+                })
+                price_rows.append([unit_price(self.pricing, c, region) for c in DESTINATION_CLASSES])
+                estimated.append(False)
+
+            series_resource.append(row)
+            shares, guessed = self._shares(resource_id, series.key.get('metric_labels') or {}, zone)
+            share_rows.append(shares)
+            estimated[row] = estimated[row] or guessed
+
+        series_ids, _, rates = flatten_points(series_ranges, start_ms, end_ms)
+        if not len(rates):
+            return []
+
+        n_series = len(series_resource)
+        series_bytes = np.bincount(series_ids, weights=np.maximum(rates, 0.0) * ALIGNMENT_SECONDS,
+                                   minlength=n_series)
+
+        to_resource = np.array(series_resource, dtype=np.int64)
+        class_bytes = series_bytes[:, None] * np.array(share_rows)
+        class_cost = class_bytes * np.array(price_rows)[to_resource] / self.unit_bytes
+
+        n_resources = len(resource_info)
+        resource_bytes = np.stack([
+            np.bincount(to_resource, weights=class_bytes[:, c], minlength=n_resources)
+            for c in range(len(DESTINATION_CLASSES))
+        ], axis=1)
+        resource_cost = np.stack([
+            np.bincount(to_resource, weights=class_cost[:, c], minlength=n_resources)
+            for c in range(len(DESTINATION_CLASSES))
+        ], axis=1)
+
+        rows = []
+        for r, c in zip(*np.nonzero(resource_bytes)):
+            rows.append(dict(
+                resource_info[r],
+                destination_class=DESTINATION_CLASSES[c],
+                destination_class_estimated=estimated[r],
+                bytes=int(round(resource_bytes[r, c])),
+                cost_usd=round(float(resource_cost[r, c]), 6)
+            ))
+
+        logger.info(f"Costed {len(rates)} egress points over {n_series} series: "
+                    f"{len(rows)} resource/class rows")
+        return rows
+
+def cost_totals(rows: List[Dict[str, Any]], field: str) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for row in rows:
+        totals[row[field]] = totals.get(row[field], 0.0) + row['cost_usd']
+    return {key: round(value, 4) for key, value in sorted(totals.items())}
+
+def compute_daily_costs(storage, project_id: str, day: datetime) -> List[Dict[str, Any]]:
+    """Cost one UTC day of egress, split by that day's flow logs, and store it in the costs collection.
+
+    Documents are keyed by day, resource and class, so a rerun for the same
+    day replaces its rows instead of adding to them.
+    """
+    start = day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+    start_ms = to_epoch_ms(start)
+
+    snapshot = load_snapshot(storage, project_id)
+    interfaces = []
+    if snapshot is not None and 'instance_interfaces' in snapshot.section_names:
+        interfaces = snapshot.section('instance_interfaces')
+    else:
+        logger.warning(f"No instance inventory for {project_id}; costing without external IP data")
+
+    destination_bytes = load_destination_bytes(storage, project_id, f"{start:%Y-%m-%d}")
+    if not destination_bytes:
+        logger.warning(f"No flow log destinations for {project_id} on {start:%Y-%m-%d}; "
+                       f"estimating destination classes")
+    engine = EgressCostEngine(load_pricing(), interfaces, destination_bytes)
+    series = storage.read_series(project_id, EGRESS_METRIC, start_ms, start_ms + DAY_MS)
+    rows = engine.compute(series, start_ms, start_ms + DAY_MS)
+
+    computed_at = datetime.now(timezone.utc).isoformat()
+    documents = {}
+    for row in rows:
+        row.update(date=start, project_id=project_id, computed_at=computed_at)
+        documents[f"{start:%Y%m%d}_{project_id}_{row['resource_id']}_{row['destination_class']}"] = row
+    storage.set_documents(COSTS_COLLECTION, documents)
+    return rows
+
+@functions_framework.http
+def compute_egress_costs(request):
+    """HTTP Cloud Function entry point for daily egress costing"""
+    try:
+        project_id = os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
+        if not project_id:
+            return {'error': 'Project ID not found'}, 400
+
+        # Default to yesterday, the last complete UTC day
+        if request.args.get('date'):
+            day = datetime.strptime(request.args.get('date'), '%Y-%m-%d')
+        else:
+            day = datetime.now(timezone.utc) - timedelta(days=1)
+
+        rows = compute_daily_costs(get_storage(), project_id, day)
+
+        response = {
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'date': day.strftime('%Y-%m-%d'),
+            'rows_written': len(rows),
+            'total_cost_usd': round(sum(row['cost_usd'] for row in rows), 4),
+            'cost_by_region': cost_totals(rows, 'region'),
+            'cost_by_zone': cost_totals(rows, 'zone'),
+            'cost_by_destination_class': cost_totals(rows, 'destination_class')
+        }
+
+        logger.info(f"Egress costing completed: {response}")
+        return response, 200
+
+    except ValueError as e:
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Egress costing failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+# For local testing
+if __name__ == '__main__':
+    os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'your-project-id')
+
+    class MockRequest:
+        def __init__(self):
+            self.args = {}
+
+    result = compute_egress_costs(MockRequest())
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,686 @@
+import base64
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Callable, Optional, Tuple
+import functions_framework
+from google.cloud import monitoring_v3
+from storage import get_storage
+from keys import document_id
+from snapshots import content_hash, load_snapshot
+from cadence import CollectionCadence, SLICED_SECTIONS, merge_sections, slice_key, slice_keys
+from network_collector import NetworkDataCollector, store_network_data
+from metrics_collector import METRIC_CATEGORIES, NetworkMetricsCollector
+from flow_logs import store_flow_report
+from anomalies import detect_anomalies
+from local_store import to_epoch_ms
+from tracing import collector_run
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Coordinator/worker collection: the coordinator splits a run into tasks (one
+# inventory slice, one metric type over one time chunk, or one project's flow
+# logs), records the run and publishes the tasks; workers execute them from
+# the queue. Once every task has an outcome, one finalize task per project is
+# published on the same queue, and the worker completing the last of those
+# closes the run. Collection capacity grows with worker instances instead of
+# being bound by one invocation's timeout.
+
+RUNS_COLLECTION = 'fanout-runs'
+TASKS_COLLECTION = 'fanout-tasks'
+RESULTS_COLLECTION = 'fanout-results'
+
+TASK_KINDS = ('inventory', 'metrics', 'flow_logs')
+# Published per project once a run's collection tasks are recorded
+FINALIZE_KIND = 'finalize'
+
+# Resources per result document, as for snapshot chunks
+RESULT_CHUNK_SIZE = 1000
+
+# Metric windows are split into chunks of this length, aligned to the 5 minute alignment period
+DEFAULT_METRIC_CHUNK_MINUTES = 60
+ALIGNMENT_PERIOD_SECONDS = 300
+
+DEFAULT_TASK_TOPIC = 'collection-tasks'
+# Threads of the in-process queue, standing in for worker instances
+DEFAULT_LOCAL_WORKERS = 8
+
+# Failed tasks listed in the run record
+MAX_REPORTED_FAILURES = 50
+
+# A finalize task's claim lapses after this, longer than a worker's 540 s timeout,
+# so a redelivery can take over from a worker that died holding it
+FINALIZE_LEASE_SECONDS = 600
+MAX_CLAIM_TAKEOVERS = 5
+
+# The coordinator sweeps runs still running this long after they started;
+# tasks without an outcome past the deadline are taken as lost
+STALE_RUN_MINUTES = 15
+TASK_DEADLINE_MINUTES = 60
+MAX_SWEPT_RUNS = 20
+
+def make_task(run_id: str, timestamp: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Task message: a spec and its run, under an ID derived from both"""
+    return dict(spec, run_id=run_id, task_id=f"{run_id}_{content_hash(spec)[:16]}", timestamp=timestamp)
+
+def ordering_key(task: Dict[str, Any]) -> str:
+    """Chunks of one metric type are delivered in time order, as series and anomaly state only move forward"""
+    if task['kind'] == 'metrics':
+        return f"{task['project_id']}/{task['metric_type']}"
+    return ''
+
+def metric_aligners() -> Dict[str, str]:
+    """Each collected metric type once, with its aligner"""
+    aligners = {}
+    for metric_types, aligner in METRIC_CATEGORIES.values():
+        for metric_type in metric_types:
+            aligners.setdefault(metric_type, aligner)
+    return aligners
+
+def metric_chunks(start: datetime, end: datetime, chunk_minutes: int) -> List[Tuple[datetime, datetime]]:
+    """Consecutive (start, end) chunks covering a window, boundaries on alignment periods"""
+    step = max(chunk_minutes * 60 // ALIGNMENT_PERIOD_SECONDS, 1) * ALIGNMENT_PERIOD_SECONDS
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        boundary = (int(chunk_start.timestamp()) // step + 1) * step
+        chunk_end = min(datetime.fromtimestamp(boundary, timezone.utc), end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+class PubSubQueue:
+    """Publishes tasks to a Pub/Sub topic; a push subscription delivers them to the workers"""
+
+    def __init__(self, project_id: str, topic: str):
+        from google.cloud import pubsub_v1
+        self.publisher = pubsub_v1.PublisherClient(
+            publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=True)
+        )
+        self.topic_path = self.publisher.topic_path(project_id, topic)
+
+    def publish(self, tasks: List[Dict[str, Any]]) -> int:
+        futures = [
+            self.publisher.publish(self.topic_path, json.dumps(task).encode('utf-8'), ordering_key=ordering_key(task))
+            for task in tasks
+        ]
+        for future in futures:
+            future.result()
+        return len(futures)
+
+    def join(self) -> None:
+        """Workers run elsewhere; nothing to wait for"""
+
+class InProcessQueue:
+    """Stand-in for Pub/Sub that delivers tasks to a handler on a thread pool.
+
+    Tasks sharing an ordering key are delivered one at a time in publish
+    order, all others concurrently. With deliveries > 1 every task is
+    delivered that many times, as Pub/Sub may do.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], workers: int = DEFAULT_LOCAL_WORKERS,
+                 deliveries: int = 1):
+        self.handler = handler
+        self.deliveries = deliveries
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+
+    def publish(self, tasks: List[Dict[str, Any]]) -> int:
+        ordered: Dict[str, List] = {}
+        unordered = []
+        for task in tasks:
+            key = ordering_key(task)
+            for _ in range(self.deliveries):
+                if key:
+                    ordered.setdefault(key, []).append(task)
+                else:
+                    unordered.append([task])
+        for messages in list(ordered.values()) + unordered:
+            self.futures.append(self.executor.submit(self._deliver, messages))
+        return len(tasks)
+
+    def _deliver(self, messages: List[Dict[str, Any]]) -> None:
+        for message in messages:
+            # Every delivery decodes its own copy of the message
+            self.handler(json.loads(json.dumps(message)))
+
+    def join(self) -> None:
+        """Wait for every delivery, including tasks published by handlers; raises the first handler error"""
+        while self.futures:
+            futures, self.futures = self.futures, []
+            for future in futures:
+                future.result()
+
+def get_queue(project_id: str):
+    """Task queue selected by TASK_QUEUE ('pubsub' or 'inprocess').
+
+    Pub/Sub publishes to TASK_TOPIC; the in-process queue runs the tasks in
+    this process on LOCAL_WORKERS threads.
+    """
+    backend = os.environ.get('TASK_QUEUE', 'pubsub').lower()
+    if backend == 'pubsub':
+        return PubSubQueue(project_id, os.environ.get('TASK_TOPIC', DEFAULT_TASK_TOPIC))
+    if backend == 'inprocess':
+        # Finalize tasks go back onto the queue that delivered the last collection task
+        queue = InProcessQueue(lambda task: execute_task(task, queue),
+                               int(os.environ.get('LOCAL_WORKERS', DEFAULT_LOCAL_WORKERS)))
+        return queue
+    raise ValueError(f"Unknown TASK_QUEUE: {backend}")
+
+def plan_project(storage, project_id: str, kinds: List[str], now: datetime, force: bool = False,
+                 duration_minutes: int = 60, chunk_minutes: int = DEFAULT_METRIC_CHUNK_MINUTES) -> Tuple[Dict, List]:
+    """(plan, task specs) of one project.
+
+    Inventory tasks cover the slices the cadence finds due, all of them
+    before the project's first snapshot; metric tasks cover every metric
+    type over every chunk of the window.
+    """
+    plan, specs = {}, []
+    if 'inventory' in kinds:
+        regions = NetworkDataCollector(project_id)._get_regions()
+        region_names = [region.name for region in regions]
+        zones = {region.name: [zone.split('/')[-1] for zone in region.zones] for region in regions}
+        keys = slice_keys(region_names)
+        if load_snapshot(storage, project_id) is None:
+            due = keys
+        else:
+            due = CollectionCadence(storage, project_id).due(keys, now, force)
+        for key in due:
+            section, region = key.split('/')
+            spec = {'kind': 'inventory', 'project_id': project_id, 'section': section, 'region': region}
+            if section == 'instance_interfaces':
+                spec['zones'] = zones[region]
+            specs.append(spec)
+        plan['inventory'] = {'regions': region_names, 'slices': len(keys), 'due_slices': len(due)}
+
+    if 'metrics' in kinds or 'flow_logs' in kinds:
+        start = now - timedelta(minutes=duration_minutes)
+        window = {'start': start.isoformat(), 'end': now.isoformat(), 'duration_minutes': duration_minutes}
+        if 'metrics' in kinds:
+            for metric_type, aligner in metric_aligners().items():
+                for chunk_start, chunk_end in metric_chunks(start, now, chunk_minutes):
+                    specs.append({'kind': 'metrics', 'project_id': project_id, 'metric_type': metric_type,
+                                  'aligner': aligner, 'start': chunk_start.isoformat(), 'end': chunk_end.isoformat()})
+            plan['metrics'] = window
+        if 'flow_logs' in kinds:
+            # Flow log matching aggregates over the whole window, so it is one task
+            specs.append({'kind': 'flow_logs', 'project_id': project_id, 'start': window['start'], 'end': window['end']})
+            plan['flow_logs'] = window
+    return plan, specs
+
+def start_run(storage, queue, project_ids: List[str], kinds: List[str], force: bool = False,
+              duration_minutes: int = 60, chunk_minutes: int = DEFAULT_METRIC_CHUNK_MINUTES) -> Dict[str, Any]:
+    """Plan a run, record it and publish its tasks; returns the run record"""
+    now = datetime.now(timezone.utc)
+    timestamp = now.isoformat()
+    run_id = document_id(project_ids[0], now)
+
+    plans, task_ids, tasks = {}, {}, []
+    for project_id in project_ids:
+        plan, specs = plan_project(storage, project_id, kinds, now, force, duration_minutes, chunk_minutes)
+        plans[project_id] = plan
+        project_tasks = [make_task(run_id, timestamp, spec) for spec in specs]
+        task_ids[project_id] = [task['task_id'] for task in project_tasks]
+        tasks.extend(project_tasks)
+
+    run = {
+        'run_id': run_id,
+        'timestamp': timestamp,
+        'project_ids': project_ids,
+        'kinds': kinds,
+        'status': 'running',
+        'plan': plans,
+        'task_ids': task_ids,
+        'tasks_total': len(tasks),
+        'tasks_by_kind': {kind: sum(1 for task in tasks if task['kind'] == kind) for kind in kinds},
+        'tasks_done': 0,
+        'tasks_failed': 0,
+        'projects_finalized': 0
+    }
+    # Workers count completions against the record, so it is written first
+    storage.set_document(RUNS_COLLECTION, run_id, run)
+    try:
+        if tasks:
+            queue.publish(tasks)
+        else:
+            begin_finalization(storage, queue, run)
+    except Exception as e:
+        logger.error(f"Publishing tasks of run {run_id} failed: {str(e)}")
+        storage.set_document(RUNS_COLLECTION, run_id, dict(run, status='failed', error=str(e)))
+        raise
+    logger.info(f"Run {run_id}: published {len(tasks)} tasks for {len(project_ids)} projects")
+    return run
+
+def _result_ids(outcome: Dict[str, Any]) -> List[str]:
+    return [f"{outcome['task_id']}_{i:04d}" for i in range(outcome.get('result_chunks', 0))]
+
+def _run_inventory_task(storage, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Poll one slice into result documents keyed by the task, so a rerun overwrites them"""
+    collector = NetworkDataCollector(task['project_id'])
+    resources = collector.collect_slice(task['section'], task['region'], task.get('zones'))
+    chunks = {}
+    for i in range(0, len(resources), RESULT_CHUNK_SIZE):
+        chunks[f"{task['task_id']}_{i // RESULT_CHUNK_SIZE:04d}"] = {
+            'run_id': task['run_id'],
+            'task_id': task['task_id'],
+            'timestamp': task['timestamp'],
+            'resources': resources[i:i + RESULT_CHUNK_SIZE]
+        }
+    storage.set_documents(RESULTS_COLLECTION, chunks)
+    return {'items': len(resources), 'result_chunks': len(chunks)}
+
+def _run_metrics_task(storage, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Query one metric type over one chunk and write the points under series and timestamp keys"""
+    collector = NetworkMetricsCollector(task['project_id'])
+    points = collector._query_time_series(
+        metric_type=task['metric_type'],
+        start_time=datetime.fromisoformat(task['start']),
+        end_time=datetime.fromisoformat(task['end']),
+        aggregation_alignment_period=ALIGNMENT_PERIOD_SECONDS,
+        aggregation_per_series_aligner=getattr(monitoring_v3.Aggregation.Aligner, task['aligner']),
+        raise_errors=True
+    )
+    for point in points:
+        point['collection_timestamp'] = task['timestamp']
+        point['project_id'] = task['project_id']
+    storage.write_metrics(points, idempotent=True)
+    return {'items': len(points)}
+
+def _run_flow_logs_task(storage, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Match the window's flow logs against the rules; the report is stored once, at finalization"""
+    collector = NetworkMetricsCollector(task['project_id'])
+    points = collector._get_firewall_metrics(datetime.fromisoformat(task['start']), datetime.fromisoformat(task['end']))
+    if collector.flow_report is None:
+        raise RuntimeError('Flow log ingestion failed')
+    for point in points:
+        point['collection_timestamp'] = task['timestamp']
+        point['project_id'] = task['project_id']
+    storage.write_metrics(points, idempotent=True)
+    storage.set_document(RESULTS_COLLECTION, f"{task['task_id']}_0000", {
+        'run_id': task['run_id'],
+        'task_id': task['task_id'],
+        'timestamp': task['timestamp'],
+        'report': collector.flow_report
+    })
+    return {'items': collector.flow_report['records'], 'result_chunks': 1}
+
+def host_project() -> Optional[str]:
+    return os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
+
+def claim_lease(storage, claim_id: str, now: datetime, lease_seconds: int = FINALIZE_LEASE_SECONDS) -> bool:
+    """Take a claim unless another holder's lease is still live.
+
+    Claims are numbered documents: taking over a lapsed one creates the
+    next number, so of several workers finding it lapsed exactly one wins.
+    """
+    expires_at = (now + timedelta(seconds=lease_seconds)).isoformat()
+    for attempt in range(MAX_CLAIM_TAKEOVERS):
+        doc_id = f"{claim_id}_claim{attempt}"
+        if storage.create_document(TASKS_COLLECTION, doc_id, {'claim_id': claim_id, 'timestamp': now.isoformat(),
+                                                              'expires_at': expires_at}):
+            return True
+        held = storage.get_documents(TASKS_COLLECTION, [doc_id]).get(doc_id)
+        if held is not None and held['expires_at'] > now.isoformat():
+            return False
+    logger.error(f"Claim {claim_id} lapsed {MAX_CLAIM_TAKEOVERS} times; giving up")
+    return False
+
+def execute_task(task: Dict[str, Any], queue=None) -> Dict[str, Any]:
+    """Execute a task unless its outcome is already recorded; returns the outcome.
+
+    Redelivered tasks are skipped. Deliveries racing on the same collection
+    task may both run it, but everything it writes is keyed by the task or
+    by series and timestamp, and only the first outcome recorded counts
+    toward the run. Finalize tasks write state that accumulates, so they
+    run under a claim instead. A failed task is not retried: its slices
+    keep the previous snapshot's resources and stay due for the next run.
+    """
+    storage = get_storage()
+    task_id = task['task_id']
+    recorded = storage.get_documents(TASKS_COLLECTION, [task_id]).get(task_id)
+    if recorded is not None:
+        logger.info(f"Task {task_id} already {recorded['status']}; skipping")
+        return recorded
+    if task['kind'] == FINALIZE_KIND and not claim_lease(storage, task_id, datetime.now(timezone.utc)):
+        logger.info(f"Task {task_id} is claimed by another delivery")
+        return dict(task, status='claimed')
+
+    outcome = {key: value for key, value in task.items() if key != 'zones'}
+    with collector_run(f"task_{task['kind']}", task['project_id']) as run:
+        try:
+            outcome.update(TASK_RUNNERS[task['kind']](storage, task))
+            outcome['status'] = 'done'
+        except Exception as e:
+            logger.error(f"Task {task_id} ({task['kind']}) failed: {str(e)}")
+            outcome.update(status='failed', error=str(e))
+    outcome['duration_ms'] = round(run.duration * 1000, 2)
+    outcome['finished_at'] = datetime.now(timezone.utc).isoformat()
+
+    if not storage.create_document(TASKS_COLLECTION, task_id, outcome):
+        logger.info(f"Task {task_id} was completed by another delivery")
+        return outcome
+
+    # The counters only say when to look: a worker dying between recording its
+    # outcome and counting it is caught by the coordinator's sweep, and both
+    # steps below check the recorded outcomes themselves
+    if task['kind'] == FINALIZE_KIND:
+        run_record = storage.increment(RUNS_COLLECTION, task['run_id'], {'projects_finalized': 1})
+        if run_record['projects_finalized'] >= len(run_record['project_ids']):
+            close_run(storage, task['run_id'])
+        return outcome
+    counter = 'tasks_done' if outcome['status'] == 'done' else 'tasks_failed'
+    run_record = storage.increment(RUNS_COLLECTION, task['run_id'], {counter: 1})
+    if run_record['tasks_done'] + run_record['tasks_failed'] >= run_record['tasks_total']:
+        recorded = storage.get_documents(TASKS_COLLECTION, all_task_ids(run_record))
+        if len(recorded) >= run_record['tasks_total']:
+            begin_finalization(storage, queue or get_queue(host_project()), run_record)
+    return outcome
+
+def _finalize_inventory(storage, run: Dict[str, Any], project_id: str, plan: Dict[str, Any],
+                        outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge polled slices with the previous snapshot's others and store the inventory"""
+    done = [outcome for outcome in outcomes if outcome['status'] == 'done']
+    summary = {'polled_slices': len(done), 'carried_slices': plan['slices'] - len(done),
+               'failed_slices': len(outcomes) - len(done)}
+    if not done:
+        # Nothing polled; the previous snapshot stands
+        return summary
+
+    now = datetime.fromisoformat(run['timestamp'])
+    chunks = storage.get_documents(RESULTS_COLLECTION, [doc_id for outcome in done for doc_id in _result_ids(outcome)])
+    cadence = CollectionCadence(storage, project_id)
+    fresh = {section: [] for section in SLICED_SECTIONS}
+    polled = []
+    for outcome in done:
+        resources = [resource for doc_id in _result_ids(outcome) for resource in chunks[doc_id]['resources']]
+        key = slice_key(outcome['section'], outcome['region'])
+        cadence.record_poll(key, resources, now)
+        fresh[outcome['section']].extend(resources)
+        polled.append(key)
+
+    previous = load_snapshot(storage, project_id)
+    sections = merge_sections(fresh, polled, previous, plan['regions'])
+    data = NetworkDataCollector(project_id).build_inventory(now, sections, slice_keys(plan['regions']), polled, cadence)
+    store_network_data(data, previous)
+    cadence.save(now)
+    summary['resources'] = {section: len(sections[section]) for section in SLICED_SECTIONS}
+    summary['changes'] = data.get('changes', {})
+    return summary
+
+def _finalize_metrics(storage, run: Dict[str, Any], project_id: str, plan: Dict[str, Any],
+                      outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Store the metrics summary and score the window's points for anomalies.
+
+    The detector keeps one state per project, so it runs here once rather
+    than in the metric tasks; the points are read back from storage.
+    """
+    written: Dict[str, int] = {}
+    for outcome in outcomes:
+        if outcome['status'] == 'done':
+            written[outcome['metric_type']] = written.get(outcome['metric_type'], 0) + outcome['items']
+
+    start_ms, end_ms = to_epoch_ms(plan['start']), to_epoch_ms(plan['end'])
+    points = []
+    for metric_type in written:
+        for series in storage.read_series(project_id, metric_type, start_ms, end_ms + 1):
+            points.extend(dict(series.key, timestamp=ts, value=value) for ts, value in series)
+    try:
+        anomalies = detect_anomalies(storage, project_id, points)
+    except Exception as e:
+        logger.error(f"Anomaly detection failed: {str(e)}")
+        anomalies = []
+
+    metrics_count = {
+        category: sum(written.get(metric_type, 0) for metric_type in metric_types)
+        for category, (metric_types, _) in METRIC_CATEGORIES.items()
+    }
+    storage.set_document('metrics-summaries', document_id(project_id, datetime.fromisoformat(run['timestamp'])), {
+        'timestamp': run['timestamp'],
+        'project_id': project_id,
+        'collection_period_minutes': plan['duration_minutes'],
+        'metrics_count': metrics_count,
+        'run_id': run['run_id']
+    })
+    return {'points_written': sum(written.values()), 'metrics_count': metrics_count, 'anomalies_detected': len(anomalies)}
+
+def _finalize_flow_logs(storage, run: Dict[str, Any], project_id: str, plan: Dict[str, Any],
+                        outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Store the flow report; usage only advances past the windows it already covers"""
+    done = [outcome for outcome in outcomes if outcome['status'] == 'done']
+    if not done:
+        return {'records': 0}
+    report = storage.get_documents(RESULTS_COLLECTION, _result_ids(done[0]))[_result_ids(done[0])[0]]['report']
+    store_flow_report(storage, project_id, document_id(project_id, datetime.fromisoformat(run['timestamp'])),
+                      report, run['timestamp'])
+    return {'records': report['records'], 'unused_firewall_rules': len(report.get('unused_rules', []))}
+
+FINALIZERS = {
+    'inventory': _finalize_inventory,
+    'metrics': _finalize_metrics,
+    'flow_logs': _finalize_flow_logs
+}
+
+def all_task_ids(run: Dict[str, Any]) -> List[str]:
+    return [task_id for task_ids in run['task_ids'].values() for task_id in task_ids]
+
+def finalize_tasks(run: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One finalize task per project of the run"""
+    return [make_task(run['run_id'], run['timestamp'], {'kind': FINALIZE_KIND, 'project_id': project_id})
+            for project_id in run['project_ids']]
+
+def begin_finalization(storage, queue, run: Dict[str, Any]) -> int:
+    """Publish the run's finalize tasks that have no outcome yet; returns how many.
+
+    Publishing again is harmless: recorded tasks are skipped and a claimed
+    one is left to its holder until the claim lapses.
+    """
+    tasks = finalize_tasks(run)
+    recorded = storage.get_documents(TASKS_COLLECTION, [task['task_id'] for task in tasks])
+    pending = [task for task in tasks if task['task_id'] not in recorded]
+    if pending:
+        queue.publish(pending)
+        logger.info(f"Run {run['run_id']}: published {len(pending)} finalize tasks")
+    return len(pending)
+
+def _run_finalize_task(storage, task: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble one project's recorded task outcomes into its results"""
+    run_id, project_id = task['run_id'], task['project_id']
+    run = storage.get_documents(RUNS_COLLECTION, [run_id])[run_id]
+    task_ids = run['task_ids'][project_id]
+    recorded = storage.get_documents(TASKS_COLLECTION, task_ids)
+    outcomes = [recorded[task_id] for task_id in task_ids if task_id in recorded]
+
+    results = {}
+    for kind, kind_plan in run['plan'][project_id].items():
+        try:
+            results[kind] = FINALIZERS[kind](storage, run, project_id, kind_plan,
+                                             [outcome for outcome in outcomes if outcome['kind'] == kind])
+        except Exception as e:
+            logger.error(f"Finalizing {kind} of {project_id} in run {run_id} failed: {str(e)}")
+            results[kind] = {'error': str(e)}
+
+    failed = [outcome for outcome in outcomes if outcome['status'] == 'failed']
+    return {
+        'results': results,
+        'tasks_done': len(outcomes) - len(failed),
+        # Tasks never recorded were lost with their worker
+        'tasks_failed': len(task_ids) - len(outcomes) + len(failed),
+        'task_time_ms': round(sum(outcome.get('duration_ms', 0) for outcome in outcomes), 2),
+        'failed_tasks': [
+            {key: outcome.get(key) for key in ('task_id', 'kind', 'project_id', 'section', 'region', 'metric_type', 'error')
+             if outcome.get(key) is not None}
+            for outcome in failed[:MAX_REPORTED_FAILURES]
+        ]
+    }
+
+TASK_RUNNERS = {
+    'inventory': _run_inventory_task,
+    'metrics': _run_metrics_task,
+    'flow_logs': _run_flow_logs_task,
+    FINALIZE_KIND: _run_finalize_task
+}
+
+def close_run(storage, run_id: str) -> Optional[Dict[str, Any]]:
+    """Aggregate the finalize outcomes into the run record once every project has one.
+
+    Returns the closed record, or None while finalize tasks are outstanding.
+    Closing twice writes the same record, so no claim is needed.
+    """
+    run = storage.get_documents(RUNS_COLLECTION, [run_id])[run_id]
+    if run['status'] != 'running':
+        return run
+    tasks = finalize_tasks(run)
+    recorded = storage.get_documents(TASKS_COLLECTION, [task['task_id'] for task in tasks])
+    if len(recorded) < len(tasks):
+        return None
+
+    outcomes = [recorded[task['task_id']] for task in tasks]
+    results = {outcome['project_id']: outcome.get('results', {'error': outcome.get('error')}) for outcome in outcomes}
+    tasks_done = sum(outcome.get('tasks_done', 0) for outcome in outcomes)
+    # A failed finalize task leaves its project's tasks unaccounted for
+    tasks_failed = run['tasks_total'] - tasks_done
+    errors = any(outcome['status'] == 'failed' for outcome in outcomes) or any(
+        'error' in result for project in results.values() for result in project.values()
+    )
+    finished_at = datetime.now(timezone.utc)
+    run.update({
+        'status': 'success' if not tasks_failed and not errors else ('partial' if tasks_done else 'failed'),
+        'finished_at': finished_at.isoformat(),
+        'duration_ms': round((finished_at - datetime.fromisoformat(run['timestamp'])).total_seconds() * 1000, 2),
+        'tasks_done': tasks_done,
+        'tasks_failed': tasks_failed,
+        # Sum of task durations; against duration_ms it shows how far the run fanned out
+        'task_time_ms': round(sum(outcome.get('task_time_ms', 0) for outcome in outcomes), 2),
+        'failed_tasks': [failure for outcome in outcomes
+                         for failure in outcome.get('failed_tasks', [])][:MAX_REPORTED_FAILURES],
+        'results': results
+    })
+    storage.set_document(RUNS_COLLECTION, run_id, run)
+    logger.info(f"Run {run_id} {run['status']}: {run['tasks_done']} of {run['tasks_total']} tasks done "
+                f"in {run['duration_ms']:.0f} ms")
+    return run
+
+def sweep_stale_runs(storage, queue, now: datetime) -> Dict[str, int]:
+    """Move on runs left running by lost messages or workers that died mid-task.
+
+    A stale run is closed if every project has a finalize outcome;
+    otherwise its finalize tasks are (re)published once every collection
+    task is recorded or the task deadline has passed.
+    """
+    stale_before = (now - timedelta(minutes=STALE_RUN_MINUTES)).isoformat()
+    deadline = (now - timedelta(minutes=TASK_DEADLINE_MINUTES)).isoformat()
+    swept = {'closed': 0, 'finalizing': 0}
+    for run_id, run in storage.find_documents(RUNS_COLLECTION, {'status': 'running'}, MAX_SWEPT_RUNS):
+        if run['timestamp'] >= stale_before:
+            continue
+        if close_run(storage, run_id) is not None:
+            swept['closed'] += 1
+            continue
+        task_ids = all_task_ids(run)
+        if run['timestamp'] < deadline or len(storage.get_documents(TASKS_COLLECTION, task_ids)) >= len(task_ids):
+            if begin_finalization(storage, queue, run):
+                swept['finalizing'] += 1
+    if any(swept.values()):
+        logger.info(f"Swept stale runs: {swept['closed']} closed, {swept['finalizing']} finalizing")
+    return swept
+
+@functions_framework.http
+def coordinate_collection(request):
+    """HTTP Cloud Function entry point: split a collection run into tasks and publish them
+
+    Query parameters: kinds (comma-separated, default inventory,metrics),
+    projects (comma-separated, default COLLECTION_PROJECTS or this project),
+    duration (metric window in minutes) and full=true to poll every slice.
+    """
+    try:
+        project_id = host_project()
+        if not project_id:
+            return {'error': 'Project ID not found'}, 400
+
+        args = getattr(request, 'args', {})
+        projects = args.get('projects') or os.environ.get('COLLECTION_PROJECTS') or project_id
+        project_ids = [p.strip() for p in projects.split(',') if p.strip()]
+        kinds = [k.strip() for k in (args.get('kinds') or 'inventory,metrics').split(',') if k.strip()]
+        unknown = [kind for kind in kinds if kind not in TASK_KINDS]
+        if unknown:
+            raise ValueError(f"Unknown task kinds: {', '.join(unknown)}")
+
+        # Limit between 5 minutes and 24 hours, as the metrics collector does
+        duration_minutes = min(max(int(args.get('duration') or 60), 5), 1440)
+        chunk_minutes = int(os.environ.get('METRIC_CHUNK_MINUTES', DEFAULT_METRIC_CHUNK_MINUTES))
+        force = str(args.get('full', '')).lower() == 'true'
+
+        storage = get_storage()
+        queue = get_queue(project_id)
+        try:
+            sweep_stale_runs(storage, queue, datetime.now(timezone.utc))
+        except Exception as e:
+            logger.error(f"Sweeping stale runs failed: {str(e)}")
+        run = start_run(storage, queue, project_ids, kinds, force, duration_minutes, chunk_minutes)
+        # The in-process queue runs the tasks here; report the finished run
+        queue.join()
+        run = storage.get_documents(RUNS_COLLECTION, [run['run_id']])[run['run_id']]
+
+        response = {
+            'status': 'success',
+            'run_id': run['run_id'],
+            'timestamp': run['timestamp'],
+            'run_status': run['status'],
+            'projects': project_ids,
+            'tasks_published': run['tasks_total'],
+            'tasks_by_kind': run['tasks_by_kind']
+        }
+        if run['status'] != 'running':
+            response.update({key: run[key] for key in ('tasks_done', 'tasks_failed', 'duration_ms', 'results')})
+
+        logger.info(f"Collection run {run['run_id']} started: {run['tasks_total']} tasks")
+        return response, 200
+
+    except ValueError as e:
+        logger.error(f"Invalid collection run request: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Collection coordination failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+@functions_framework.http
+def run_collection_task(request):
+    """HTTP Cloud Function entry point for Pub/Sub push deliveries of one task
+
+    Non-2xx responses make Pub/Sub redeliver; task failures are recorded
+    and acknowledged, so only infrastructure errors are retried.
+    """
+    try:
+        envelope = request.get_json(silent=True) or {}
+        message = envelope.get('message') or {}
+        if 'data' not in message:
+            raise ValueError('Not a Pub/Sub push message')
+        task = json.loads(base64.b64decode(message['data']))
+
+        outcome = execute_task(task)
+        return {'status': 'success', 'task_id': task['task_id'], 'task_status': outcome['status']}, 200
+
+    except ValueError as e:
+        logger.error(f"Invalid task message: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Collection task failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+# For local testing: the whole run executes in this process
+if __name__ == '__main__':
+    os.environ['GOOGLE_CLOUD_PROJECT'] = 'your-project-id'
+    os.environ['TASK_QUEUE'] = 'inprocess'
+
+    # Test the function
+    class MockRequest:
+        def __init__(self):
+            self.args = {'kinds': 'inventory,metrics,flow_logs'}
+
+    result = coordinate_collection(MockRequest())
+    print(json.dumps(result, indent=2, default=str))
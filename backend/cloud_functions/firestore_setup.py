@@ -13,15 +13,38 @@ def initialize_firestore():
         # Network inventory collection
         network_inventory_ref = db.collection('network-inventory')
         network_inventory_ref.document('_schema').set({
-            'description': 'Network resource inventory snapshots',
+            'description': 'Network resource inventory snapshot manifests',
             'fields': {
                 'timestamp': 'ISO datetime string',
                 'project_id': 'GCP project ID',
-                'networks': 'Array of VPC networks',
-                'subnetworks': 'Array of subnets',
-                'firewall_rules': 'Array of firewall rules',
-                'routers': 'Array of Cloud Routers',
-                'nat_gateways': 'Array of Cloud NAT gateways'
+                'snapshot_format': 'content-addressed-v1',
+                'sections': 'Map of section name (networks, subnetworks, firewall_rules, routers, nat_gateways) to {count, chunks: [chunk blob hashes]}'
+            }
+        })
+        
+        # Newest inventory manifest per project, kept by the collector
+        inventory_latest_ref = db.collection('inventory-latest')
+        inventory_latest_ref.document('_schema').set({
+            'description': 'Copy of each project\'s newest inventory manifest (<project_id> documents)',
+            'fields': {
+                'manifest_id': 'Document ID of the manifest in network-inventory',
+                'timestamp': 'ISO datetime string',
+                'project_id': 'GCP project ID',
+                'snapshot_format': 'content-addressed-v1',
+                'sections': 'As in network-inventory'
+            }
+        })
+        
+        # Content-addressed blobs referenced by inventory manifests
+        inventory_blobs_ref = db.collection('inventory-blobs')
+        inventory_blobs_ref.document('_schema').set({
+            'description': 'Deduplicated inventory content keyed by content hash',
+            'fields': {
+                'kind': 'resource or chunk',
+                'section': 'Inventory section (resource blobs)',
+                'data': 'Resource record (resource blobs)',
+                'hashes': 'Ordered resource hashes (chunk blobs)',
+                'created_at': 'When the blob was first written'
             }
         })
         
@@ -49,7 +72,30 @@ def initialize_firestore():
                 'region': 'GCP region',
                 'network': 'Parent network name',
                 'ip_cidr_range': 'CIDR range',
-                'available_ips': 'Number of available IPs',
+                'available_ips': 'Number of free IPs (from measured utilization)',
+                'timestamp': 'Collection timestamp'
+            }
+        })
+        
+        # Subnet utilization collection (one current document per subnet)
+        subnet_utilization_ref = db.collection('subnet-utilization')
+        subnet_utilization_ref.document('_schema').set({
+            'description': 'Measured subnet address utilization',
+            'fields': {
+                'name': 'Subnet name',
+                'network': 'Parent network name',
+                'region': 'GCP region',
+                'ip_cidr_range': 'CIDR range',
+                'total_addresses': 'Addresses in the range',
+                'used_addresses': 'Addresses held by VM interfaces and alias ranges',
+                'reserved_addresses': 'Static reservations and Google-reserved addresses',
+                'free_addresses': 'Addresses still available',
+                'utilization_percent': 'Share of the range that is taken',
+                'free_runs': 'Number of contiguous free runs',
+                'largest_free_run': 'Size of the largest contiguous free run',
+                'largest_free_block': 'Largest free CIDR-aligned block, as a prefix length',
+                'fragmentation': '1 - largest_free_run / free_addresses',
+                'project_id': 'GCP project ID',
                 'timestamp': 'Collection timestamp'
             }
         })
@@ -78,9 +124,257 @@ def initialize_firestore():
                 'resource_type': 'GCP resource type',
                 'resource_labels': 'Resource identification labels',
                 'metric_labels': 'Metric-specific labels',
-                'timestamp': 'Metric timestamp',
+                'timestamp': 'Metric timestamp (not indexed on its own)',
                 'value': 'Metric value (numeric)',
-                'collection_timestamp': 'When metric was collected'
+                'collection_timestamp': 'When metric was collected (not indexed)',
+                'shard': 'Series shard (0-15), leads every range scan',
+                'hour': 'Hours since the epoch, scanned per shard by retention'
+            }
+        })
+        
+        # Anomalies flagged by the streaming detector
+        anomalies_ref = db.collection('anomalies')
+        anomalies_ref.document('_schema').set({
+            'description': 'Metric points that deviate from their series baseline',
+            'fields': {
+                'series_id': 'Stable series identifier',
+                'metric_type': 'GCP metric type',
+                'resource_type': 'GCP resource type',
+                'resource_labels': 'Resource identification labels',
+                'timestamp': 'Point timestamp',
+                'value': 'Observed value',
+                'expected': 'EWMA baseline before the point',
+                'std': 'EWMA standard deviation before the point',
+                'score': 'z-score of the point against the baseline',
+                'direction': 'spike or drop'
+            }
+        })
+        
+        # Detector state: packed per-series EWMA records, sharded per project
+        anomaly_state_ref = db.collection('anomaly-state')
+        anomaly_state_ref.document('_schema').set({
+            'description': 'Binary anomaly detector state (<project>_<shard> documents)',
+            'fields': {
+                'data': 'Packed records: series id, EWMA mean, variance, count, last timestamp'
+            }
+        })
+        
+        # Inventory change log: one document per created/modified/deleted resource
+        inventory_changes_ref = db.collection('inventory-changes')
+        inventory_changes_ref.document('_schema').set({
+            'description': 'Per-resource inventory change events between collection runs',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'timestamp': 'Collection run that observed the change',
+                'section': 'Inventory section (firewall_rules, subnetworks, ...)',
+                'resource_key': 'Resource identity within the section',
+                'resource_name': 'Resource name',
+                'event': 'created, modified or deleted',
+                'changes': 'Field-level diffs for modified: field, op (set/unset), old, new',
+                'resource': 'Full resource for created and deleted',
+                'inventory_id': 'Inventory snapshot the event was computed for'
+            }
+        })
+        
+        # Periodic full checkpoints the change log replays from (snapshot manifest format)
+        inventory_checkpoints_ref = db.collection('inventory-checkpoints')
+        inventory_checkpoints_ref.document('_schema').set({
+            'description': 'Checkpoint manifests of tracked inventory sections',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'timestamp': 'Collection run the checkpoint captures',
+                'inventory_id': 'Inventory snapshot the checkpoint was taken from',
+                'key_fields': 'Fields identifying a resource, per section',
+                'sections': 'Per-section resource count and chunk hashes'
+            }
+        })
+        
+        # Flow log traffic summaries, one per metrics collection run
+        flow_summaries_ref = db.collection('flow-summaries')
+        flow_summaries_ref.document('_schema').set({
+            'description': 'VPC Flow Log summaries from heavy-hitter sketches',
+            'fields': {
+                'records': 'Flow records processed',
+                'bytes': 'Bytes across all records',
+                'top_talkers': 'Source IPs by bytes sent (Space-Saving, with error bound)',
+                'top_ports': 'Protocol/destination ports by bytes',
+                'protocols': 'Bytes per protocol',
+                'rule_hits': 'Flow records matched per firewall rule, implied rules included',
+                'unused_rules': 'Enabled rules without hits in the window',
+                'window_start': 'Start of the flow logs read (end of the previous report)',
+                'window_end': 'End of the flow logs read (the last entry read when truncated)',
+                'truncated': 'Whether the read hit MAX_FLOW_LOG_RECORDS; the next run continues from window_end',
+                'project_id': 'GCP project ID',
+                'timestamp': 'Collection timestamp'
+            }
+        })
+        
+        # Firewall rule usage across runs, one document per rule
+        rule_usage_ref = db.collection('firewall-rule-usage')
+        rule_usage_ref.document('_schema').set({
+            'description': 'Cumulative firewall rule hits from flow logs (<project>_<network>_<rule> documents; '
+                           '<project>__cursor holds ingested_until, the end of the last window added)',
+            'fields': {
+                'network': 'Network name',
+                'rule': 'Rule name',
+                'first_seen': 'First run that saw the rule',
+                'last_hit': 'Last run with hits (null if never hit)',
+                'total_hits': 'Flow records matched since first_seen',
+                'project_id': 'GCP project ID',
+                'timestamp': 'Last update'
+            }
+        })
+        
+        # Daily egress costs, one document per day, resource and destination class
+        costs_ref = db.collection('costs')
+        costs_ref.document('_schema').set({
+            'description': 'Egress cost attributed from sent_bytes_count and the pricing table',
+            'fields': {
+                'date': 'UTC day (timestamp at midnight)',
+                'project_id': 'GCP project ID',
+                'resource': 'Instance name (instance ID when not in inventory)',
+                'resource_id': 'Instance ID',
+                'zone': 'GCP zone',
+                'region': 'GCP region',
+                'destination_class': 'intra_zone, inter_zone, inter_region or internet',
+                'destination_class_estimated': 'Split from the project mix or external IPs, not the instance\'s flow logs',
+                'bytes': 'Bytes sent during the day',
+                'cost_usd': 'Cost in USD',
+                'computed_at': 'When the row was computed'
+            }
+        })
+        
+        # Bytes per destination class from flow logs, one document per project, day and source zone
+        egress_destinations_ref = db.collection('egress-destinations')
+        egress_destinations_ref.document('_schema').set({
+            'description': 'Flow log bytes by destination class (<yyyymmdd>_<project>_<zone> documents)',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'date': 'UTC day (YYYY-MM-DD)',
+                'zone': 'Source zone',
+                'instances': 'Instance name -> bytes sent to intra_zone, inter_zone, inter_region, internet'
+            }
+        })
+        
+        # Hourly traffic matrices, one document per project, level and bucket
+        traffic_matrices_ref = db.collection('traffic-matrices')
+        traffic_matrices_ref.document('_schema').set({
+            'description': 'Sparse byte matrices between zones or regions (<project>_<level>_<bucket> documents)',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'level': 'zone or region',
+                'timestamp': 'Bucket start',
+                'bucket_seconds': 'Bucket length',
+                'labels': 'Zones or regions; src and dst index into this list',
+                'src': 'Source label index per entry',
+                'dst': 'Destination label index per entry',
+                'bytes': 'Estimated bytes per entry',
+                'sent_bytes': 'Bytes sent per label',
+                'received_bytes': 'Bytes received per label',
+                'method': 'Estimation method (gravity)',
+                'computed_at': 'When the bucket was last computed'
+            }
+        })
+        
+        # Capacity forecasts, one document per project, kind and series, replaced each run
+        capacity_forecasts_ref = db.collection('capacity-forecasts')
+        capacity_forecasts_ref.document('_schema').set({
+            'description': 'NAT port and VM egress forecasts against their limits (<project>_<kind>_<series> documents)',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'kind': 'nat_port_usage, nat_allocated_ports or instance_egress',
+                'gateway': 'NAT gateway name (NAT kinds)',
+                'instance': 'Instance name (instance_egress)',
+                'limit': 'Ports per VM, or egress cap in bytes/s',
+                'current_peak': 'Latest hourly peak',
+                'trend_per_day': 'Fitted trend per day',
+                'daily_amplitude': 'Peak-to-trough of the fitted daily cycle',
+                'forecast_peak': 'Highest forecast value over 30 days',
+                'hours_to_exhaustion': 'Hours until the forecast reaches the limit (null if not within 30 days)',
+                'exhausts_at': 'When the forecast reaches the limit',
+                'earliest_hours_to_exhaustion': 'Same for the forecast plus two residual deviations',
+                'timestamp': 'Forecast run'
+            }
+        })
+        
+        # Inventory polling schedule, one document per project
+        collection_cadence_ref = db.collection('collection-cadence')
+        collection_cadence_ref.document('_schema').set({
+            'description': 'Change history and poll interval of each inventory slice (<project> documents)',
+            'fields': {
+                'project_id': 'GCP project ID',
+                'timestamp': 'Last run that polled a slice',
+                'slices': 'Map of <section>/<region> to last_polled, fingerprint, changes, seconds, polls '
+                          'and interval_seconds'
+            }
+        })
+        
+        # Collector run reports, one document per collector run
+        collector_runs_ref = db.collection('collector-runs')
+        collector_runs_ref.document('_schema').set({
+            'description': 'Per-stage timing and memory of each collector run',
+            'fields': {
+                'function': 'collect_network_data or collect_network_metrics',
+                'project_id': 'GCP project ID',
+                'timestamp': 'Run start',
+                'status': 'success or failed',
+                'duration_ms': 'Run duration',
+                'timeout_used_percent': 'Duration as a share of the function timeout',
+                'max_rss_mb': 'Process max resident memory',
+                'memory_used_percent': 'Max RSS as a share of the function memory',
+                'traced_peak_mb': 'Peak traced Python allocations (TRACE_MEMORY=1 only)',
+                'span_count': 'Spans recorded',
+                'stages': 'Spans aggregated by kind (list, page, query, convert, commit) and name',
+                'slowest_spans': 'Slowest individual spans, up to 200'
+            }
+        })
+        
+        # Coordinator/worker collection runs, one document per run
+        fanout_runs_ref = db.collection('fanout-runs')
+        fanout_runs_ref.document('_schema').set({
+            'description': 'Collection runs split into tasks by the coordinator, with their aggregated outcome',
+            'fields': {
+                'run_id': 'Document ID of the run',
+                'timestamp': 'Run start',
+                'project_ids': 'Projects collected',
+                'kinds': 'Task kinds: inventory, metrics, flow_logs',
+                'status': 'running, success, partial or failed',
+                'plan': 'Per project and kind: regions and slices, or the metric window',
+                'task_ids': 'Per project: IDs of its collection tasks in fanout-tasks',
+                'tasks_total': 'Tasks published',
+                'tasks_done': 'Tasks completed',
+                'tasks_failed': 'Tasks that failed or were never recorded',
+                'projects_finalized': 'Finalize tasks completed (one per project)',
+                'duration_ms': 'Run start to finalization',
+                'task_time_ms': 'Sum of task durations',
+                'failed_tasks': 'Failed tasks with their errors, up to 50',
+                'results': 'Per project and kind: slices polled, points written, flow records matched'
+            }
+        })
+        
+        # Recorded task outcomes; a task with an outcome is not executed again
+        fanout_tasks_ref = db.collection('fanout-tasks')
+        fanout_tasks_ref.document('_schema').set({
+            'description': 'Outcome of each task (<run>_<spec hash> documents) and finalize claims (<task>_claim<n>)',
+            'fields': {
+                'run_id': 'Run the task belongs to',
+                'task_id': 'Document ID, derived from the run and the task spec',
+                'timestamp': 'Run start',
+                'kind': 'inventory, metrics, flow_logs or finalize',
+                'project_id': 'GCP project ID',
+                'section': 'Inventory section (inventory tasks)',
+                'region': 'Region or global (inventory tasks)',
+                'metric_type': 'Metric type (metrics tasks)',
+                'start': 'Chunk or window start (metrics and flow_logs tasks)',
+                'end': 'Chunk or window end (metrics and flow_logs tasks)',
+                'status': 'done or failed',
+                'error': 'Failure message',
+                'items': 'Resources, points or flow records collected',
+                'result_chunks': 'Result documents in fanout-results',
+                'results': 'Per kind: the project\'s finalized results (finalize tasks)',
+                'expires_at': 'When a finalize claim lapses (claim documents)',
+                'duration_ms': 'Task duration',
+                'finished_at': 'Completion time'
             }
         })
         
@@ -101,11 +395,24 @@ def initialize_firestore():
         # Note: Indexes need to be created via Firebase Console or gcloud CLI
         print("\nRemember to create these composite indexes:")
         print("1. Collection: network-metrics")
-        print("   Fields: project_id (Ascending), metric_type (Ascending), timestamp (Descending)")
+        print("   Fields: project_id (Ascending), metric_type (Ascending), shard (Ascending), timestamp (Ascending)")
+        print("   Fields: shard (Ascending), hour (Ascending)")
+        print("   Single-field exemptions: timestamp, collection_timestamp (no indexing)")
         print("2. Collection: networks") 
         print("   Fields: project_id (Ascending), timestamp (Descending)")
         print("3. Collection: subnetworks")
         print("   Fields: project_id (Ascending), region (Ascending), timestamp (Descending)")
+        print("4. Collection: network-inventory")
+        print("   Fields: project_id (Ascending), timestamp (Descending)")
+        print("5. Collection: inventory-checkpoints")
+        print("   Fields: project_id (Ascending), timestamp (Descending)")
+        print("6. Collection: inventory-changes")
+        print("   Fields: project_id (Ascending), timestamp (Ascending)")
+        print("   Fields: project_id (Ascending), timestamp (Descending)")
+        print("   Fields: project_id (Ascending), section (Ascending), timestamp (Descending)")
+        print("   Fields: section (Ascending), timestamp (Descending)")
+        print("7. Collection: traffic-matrices")
+        print("   Fields: project_id (Ascending), level (Ascending), timestamp (Ascending)")
         print("\nCreate indexes at: https://console.firebase.google.com/")
         
     except Exception as e:
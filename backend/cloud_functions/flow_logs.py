@@ -0,0 +1,535 @@
+import bisect
+import gzip
+import ipaddress
+import json
+import logging
+import socket
+import zlib
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FLOW_SUMMARIES_COLLECTION = 'flow-summaries'
+RULE_USAGE_COLLECTION = 'firewall-rule-usage'
+EGRESS_DESTINATIONS_COLLECTION = 'egress-destinations'
+
+# Where an instance's sent bytes went; indexes of the per-instance byte lists
+DESTINATION_CLASSES = ('intra_zone', 'inter_zone', 'inter_region', 'internet')
+
+HIT_COUNT_METRIC = 'flowlogs/firewall/hit_count'
+
+# Sketch sizes: top-k lists keep TOP_K entries exactly ranked up to the reported error
+TOP_K = 100
+SKETCH_CAPACITY = 1000
+CMS_WIDTH = 1 << 14
+CMS_DEPTH = 4
+CMS_BATCH = 8192
+
+PROTOCOL_NUMBERS = {'icmp': 1, 'ipip': 4, 'tcp': 6, 'udp': 17, 'esp': 50, 'ah': 51, 'icmpv6': 58, 'sctp': 132}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOL_NUMBERS.items()}
+ANY_PROTOCOL = -1
+PORT_MIN = 0
+PORT_MAX = 65535
+
+IMPLIED_INGRESS = 'implied-deny-ingress'
+IMPLIED_EGRESS = 'implied-allow-egress'
+
+class SpaceSaving:
+    """Weighted Space-Saving heavy-hitter summary.
+
+    Up to 2 * capacity counters are kept; when full, the capacity largest
+    survive and the largest evicted count becomes the floor. A key seen again
+    after eviction restarts at floor + weight, so every count is an upper
+    bound that overestimates by at most its recorded error (<= floor).
+    Pruning is a sort every capacity insertions: amortized O(log capacity).
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Any, float] = {}
+        self.errors: Dict[Any, float] = {}
+        self.floor = 0
+        self.total = 0
+
+    def add(self, key, weight=1) -> None:
+        self.total += weight
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+            return
+        counts[key] = self.floor + weight
+        if self.floor:
+            self.errors[key] = self.floor
+        if len(counts) >= 2 * self.capacity:
+            self._prune()
+
+    def _prune(self) -> None:
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        self.counts = dict(ranked[:self.capacity])
+        self.errors = {key: error for key, error in self.errors.items() if key in self.counts}
+
+    def top(self, n: int = TOP_K) -> List[Tuple[Any, float, float]]:
+        """(key, count, max overestimate) of the n largest counters"""
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)[:n]
+        return [(key, count, self.errors.get(key, 0)) for key, count in ranked]
+
+class CountMinSketch:
+    """Count-Min sketch for point estimates of any key, not only heavy hitters.
+
+    Updates are buffered and applied in numpy batches: one crc32 per key, the
+    row indexes derived by double hashing, one bincount per row. Estimates
+    never undercount and overcount by at most 2 * total / width with
+    probability 1 - 2^-depth.
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self._hashes: List[int] = []
+        self._weights: List[float] = []
+
+    def add(self, key: str, weight: float = 1) -> None:
+        self._hashes.append(zlib.crc32(key.encode()))
+        self._weights.append(weight)
+        if len(self._hashes) >= CMS_BATCH:
+            self._flush()
+
+    def _indexes(self, hashes: np.ndarray) -> np.ndarray:
+        h1 = hashes.astype(np.uint64)
+        h2 = ((h1 * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def _flush(self) -> None:
+        if not self._hashes:
+            return
+        indexes = self._indexes(np.array(self._hashes, dtype=np.uint64))
+        weights = np.array(self._weights, dtype=np.float64)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(indexes[row], weights=weights, minlength=self.width)
+        self._hashes, self._weights = [], []
+
+    def estimate(self, key: str) -> float:
+        self._flush()
+        indexes = self._indexes(np.array([zlib.crc32(key.encode())], dtype=np.uint64))[:, 0]
+        return float(self.table[np.arange(self.depth), indexes].min())
+
+def ip_to_int(address: str) -> Tuple[int, int]:
+    """(ip version, integer) of an address string"""
+    if ':' in address:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+    return 4, int.from_bytes(socket.inet_aton(address), 'big')
+
+def parse_range(cidr: str) -> Tuple[int, int, int]:
+    """(ip version, network int, mask int) of a CIDR"""
+    address, _, length = cidr.partition('/')
+    version, value = ip_to_int(address)
+    bits = 32 if version == 4 else 128
+    prefix = int(length) if length else bits
+    mask = ((1 << prefix) - 1) << (bits - prefix)
+    return version, value & mask, mask
+
+class CompiledRule:
+    """A firewall rule reduced to what per-record matching needs"""
+
+    __slots__ = ('name', 'network', 'direction', 'priority', 'deny', 'ranges',
+                 'source_tags', 'source_accounts', 'target_tags', 'target_accounts', 'ports')
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.name = rule['name']
+        self.network = rule.get('network', 'default')
+        self.direction = rule.get('direction', 'INGRESS')
+        self.priority = int(rule.get('priority', 1000))
+        denied = rule.get('denied') or rule.get('denied_ports') or []
+        allowed = rule.get('allowed') or rule.get('allowed_ports') or []
+        self.deny = bool(denied)
+
+        self.source_tags = set(rule.get('source_tags') or [])
+        self.source_accounts = set(rule.get('source_service_accounts') or [])
+        ranges = rule.get('source_ranges' if self.direction == 'INGRESS' else 'destination_ranges') or []
+        if not ranges and not (self.direction == 'INGRESS' and (self.source_tags or self.source_accounts)):
+            ranges = ['0.0.0.0/0', '::/0']
+        self.ranges = [parse_range(cidr) for cidr in ranges]
+
+        self.target_tags = set(rule.get('target_tags') or [])
+        self.target_accounts = set(rule.get('target_service_accounts') or [])
+
+        # protocol number -> port intervals, None for every port
+        self.ports: Dict[int, Optional[List[Tuple[int, int]]]] = {}
+        for entry in denied or allowed:
+            name = str(entry.get('protocol') or entry.get('IPProtocol') or 'all').lower()
+            protocol = ANY_PROTOCOL if name == 'all' else PROTOCOL_NUMBERS.get(name) or int(name)
+            if not entry.get('ports'):
+                self.ports[protocol] = None
+                continue
+            intervals = self.ports.setdefault(protocol, [])
+            if intervals is not None:
+                for port in entry['ports']:
+                    first, _, last = str(port).partition('-')
+                    intervals.append((int(first), int(last or first)))
+
+    def applies_to(self, instance: Optional[Dict[str, Any]]) -> bool:
+        if not self.target_tags and not self.target_accounts:
+            return True
+        if instance is None:
+            return False
+        return bool(self.target_tags & instance['tags'] or self.target_accounts & instance['service_accounts'])
+
+    def port_intervals(self, protocol: int) -> List[Tuple[int, int]]:
+        intervals = []
+        for candidate in (protocol, ANY_PROTOCOL):
+            if candidate in self.ports:
+                intervals.extend(self.ports[candidate] or [(PORT_MIN, PORT_MAX)])
+        return intervals
+
+    def matches_peer(self, version: int, address: int, peer: Optional[Dict[str, Any]]) -> bool:
+        for range_version, network, mask in self.ranges:
+            if range_version == version and address & mask == network:
+                return True
+        if peer is not None and (self.source_tags or self.source_accounts):
+            return bool(self.source_tags & peer['tags'] or self.source_accounts & peer['service_accounts'])
+        return False
+
+class PortTable:
+    """Rules of one VPC and direction that apply to one target, split by port.
+
+    The port space of a protocol is cut at every rule interval boundary; each
+    segment holds the rules matching it, in evaluation order, so a record's
+    candidates are one bisect away whatever its port.
+    """
+
+    def __init__(self, rules: List[CompiledRule], protocol: int):
+        intervals = [(rule, rule.port_intervals(protocol)) for rule in rules]
+        bounds = {PORT_MIN, PORT_MAX + 1}
+        for _, ranges in intervals:
+            for first, last in ranges:
+                bounds.update((first, last + 1))
+        self.starts = sorted(bounds)[:-1]
+        self.segments = [
+            [rule for rule, ranges in intervals if any(first <= start <= last for first, last in ranges)]
+            for start in self.starts
+        ]
+
+    def candidates(self, port: int) -> List[CompiledRule]:
+        return self.segments[max(bisect.bisect_right(self.starts, port) - 1, 0)]
+
+class FlowLogIngester:
+    """Streams VPC Flow Log records into sketches and firewall rule hit counts.
+
+    Records are exported LogEntry objects (jsonPayload holds the flow) or bare
+    flow payloads. Memory is bounded by the sketch sizes and the rule tables,
+    not by the number of records.
+
+    Traffic: Space-Saving summaries of bytes by source IP, destination port
+    and protocol, and a Count-Min sketch of bytes received per destination IP.
+    Flows between two VMs that both log are seen once per reporter.
+
+    Firewall hits: a record reported by the destination VM is evaluated
+    against the ingress rules of its VPC, one reported by the source VM
+    against the egress rules, in GCP order (priority, deny before allow); the
+    first match gets the hit, unmatched flows count against the implied rules.
+    Rules are filtered by target once per distinct tag/service-account set and
+    indexed by port (PortTable), so each record costs a bisect plus peer
+    address/tag checks against the few rules left.
+    """
+
+    def __init__(self, firewall_rules: Optional[List[Dict[str, Any]]] = None,
+                 interfaces: Optional[List[Dict[str, Any]]] = None):
+        self.rules: Dict[Tuple[str, str], List[CompiledRule]] = {}
+        self.rule_hits: Dict[Tuple[str, str], int] = {}
+        self.skipped_rules = 0
+        for rule in firewall_rules or []:
+            if rule.get('disabled'):
+                continue
+            try:
+                compiled = CompiledRule(rule)
+            except (KeyError, ValueError, OSError):
+                self.skipped_rules += 1
+                continue
+            self.rules.setdefault((compiled.network, compiled.direction), []).append(compiled)
+            self.rule_hits[(compiled.network, compiled.name)] = 0
+        for rules in self.rules.values():
+            rules.sort(key=lambda r: (r.priority, 0 if r.deny else 1))
+
+        self.instances: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for interface in interfaces or []:
+            self.instances[(interface.get('instance', ''), interface.get('zone', ''))] = {
+                'tags': set(interface.get('tags') or []),
+                'service_accounts': set(interface.get('service_accounts') or [])
+            }
+
+        self._targets: Dict[Tuple[str, str], tuple] = {}
+        self._tables: Dict[tuple, PortTable] = {}
+        self.talkers = SpaceSaving()
+        self.ports = SpaceSaving()
+        self.protocols = SpaceSaving()
+        self.received = CountMinSketch()
+        self.records = 0
+        self.malformed = 0
+        self.bytes = 0
+        # zone -> instance -> bytes sent per destination class
+        self.destination_bytes: Dict[str, Dict[str, List[int]]] = {}
+
+    def _instance(self, reference: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not reference:
+            return None
+        return self.instances.get((reference.get('vm_name', ''), reference.get('zone', '')))
+
+    def _target(self, reference: Dict[str, Any]) -> tuple:
+        """Hashable tag/service-account set of an instance; instances sharing one share tables"""
+        key = (reference.get('vm_name', ''), reference.get('zone', ''))
+        target = self._targets.get(key)
+        if target is None:
+            instance = self.instances.get(key)
+            target = self._targets[key] = (
+                (frozenset(instance['tags']), frozenset(instance['service_accounts'])) if instance else None
+            )
+        return target
+
+    def _match(self, network: str, direction: str, instance_ref: Dict[str, Any], protocol: int,
+               port: int, peer_ip: str, peer_ref: Optional[Dict[str, Any]]) -> None:
+        target = self._target(instance_ref)
+        table_key = (network, direction, target, protocol)
+        table = self._tables.get(table_key)
+        if table is None:
+            instance = {'tags': target[0], 'service_accounts': target[1]} if target else None
+            rules = [rule for rule in self.rules.get((network, direction), []) if rule.applies_to(instance)]
+            table = self._tables[table_key] = PortTable(rules, protocol)
+
+        candidates = table.candidates(port)
+        if candidates:
+            version, address = ip_to_int(peer_ip)
+            peer = self._instance(peer_ref) if direction == 'INGRESS' else None
+            for rule in candidates:
+                if rule.matches_peer(version, address, peer):
+                    self.rule_hits[(network, rule.name)] += 1
+                    return
+
+        implied = IMPLIED_INGRESS if direction == 'INGRESS' else IMPLIED_EGRESS
+        self.rule_hits[(network, implied)] = self.rule_hits.get((network, implied), 0) + 1
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Fold one flow record (LogEntry or bare payload) into the sketches and hit counts"""
+        payload = record.get('jsonPayload', record)
+        try:
+            connection = payload['connection']
+            src_ip = connection['src_ip']
+            dest_ip = connection['dest_ip']
+            protocol = int(connection.get('protocol', 0))
+            port = int(connection.get('dest_port', 0))
+            sent = int(payload.get('bytes_sent', 0))
+        except (KeyError, TypeError, ValueError):
+            self.malformed += 1
+            return
+
+        self.records += 1
+        self.bytes += sent
+        self.talkers.add(src_ip, sent)
+        self.ports.add((protocol, port), sent)
+        self.protocols.add(protocol, sent)
+        self.received.add(dest_ip, sent)
+
+        try:
+            reporter = payload.get('reporter')
+            if reporter == 'SRC' and payload.get('src_instance'):
+                self._add_destination(payload['src_instance'], payload.get('dest_instance'), dest_ip, sent)
+            if reporter == 'DEST' and payload.get('dest_instance') and payload.get('dest_vpc'):
+                self._match(payload['dest_vpc'].get('vpc_name', ''), 'INGRESS', payload['dest_instance'],
+                            protocol, port, src_ip, payload.get('src_instance'))
+            elif reporter == 'SRC' and payload.get('src_instance') and payload.get('src_vpc'):
+                self._match(payload['src_vpc'].get('vpc_name', ''), 'EGRESS', payload['src_instance'],
+                            protocol, port, dest_ip, None)
+        except (OSError, ValueError):
+            self.malformed += 1
+
+    def _add_destination(self, source: Dict[str, Any], dest: Optional[Dict[str, Any]], dest_ip: str,
+                         sent: int) -> None:
+        """Count a source-reported flow's bytes by destination class.
+
+        Peers without a destination instance count as internet when their
+        address is public; private ones (VPN, peered networks) are left out.
+        """
+        zone = source.get('zone', '')
+        if dest and dest.get('zone'):
+            if dest['zone'] == zone:
+                destination_class = 0
+            elif dest['zone'].rpartition('-')[0] == zone.rpartition('-')[0]:
+                destination_class = 1
+            else:
+                destination_class = 2
+        elif ipaddress.ip_address(dest_ip).is_global:
+            destination_class = 3
+        else:
+            return
+        by_class = self.destination_bytes.setdefault(zone, {}).setdefault(source.get('vm_name', ''), [0, 0, 0, 0])
+        by_class[destination_class] += sent
+
+    def add_records(self, records: Iterable[Dict[str, Any]]) -> 'FlowLogIngester':
+        for record in records:
+            self.add(record)
+        return self
+
+    def add_lines(self, lines: Iterable) -> 'FlowLogIngester':
+        """Fold NDJSON lines (str or bytes); blank and unparsable lines are counted, not fatal"""
+        loads = json.loads
+        add = self.add
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except ValueError:
+                self.malformed += 1
+                continue
+            add(record)
+        return self
+
+    def add_files(self, paths: Iterable[str]) -> 'FlowLogIngester':
+        """Stream exported NDJSON files, gzip-compressed ones included, one line at a time"""
+        for path in paths:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rb') as f:
+                self.add_lines(f)
+        return self
+
+    def report(self, top_n: int = TOP_K) -> Dict[str, Any]:
+        rule_hits = [
+            {'network': network, 'rule': rule, 'hits': hits}
+            for (network, rule), hits in sorted(self.rule_hits.items(), key=lambda item: -item[1])
+        ]
+        implied = (IMPLIED_INGRESS, IMPLIED_EGRESS)
+        return {
+            'records': self.records,
+            'malformed_records': self.malformed,
+            'bytes': self.bytes,
+            'top_talkers': [
+                {'ip': ip, 'bytes_sent': int(count), 'error': int(error),
+                 'bytes_received_estimate': int(self.received.estimate(ip))}
+                for ip, count, error in self.talkers.top(top_n)
+            ],
+            'top_ports': [
+                {'protocol': PROTOCOL_NAMES.get(protocol, str(protocol)), 'port': port,
+                 'bytes': int(count), 'error': int(error)}
+                for (protocol, port), count, error in self.ports.top(top_n)
+            ],
+            'protocols': [
+                {'protocol': PROTOCOL_NAMES.get(protocol, str(protocol)), 'bytes': int(count)}
+                for protocol, count, _ in self.protocols.top(top_n)
+            ],
+            'rule_hits': rule_hits,
+            'unused_rules': [
+                {'network': hit['network'], 'rule': hit['rule']}
+                for hit in rule_hits if hit['hits'] == 0 and hit['rule'] not in implied
+            ],
+            'rules_skipped': self.skipped_rules,
+            'destination_bytes': self.destination_bytes
+        }
+
+def hit_count_points(report: Dict[str, Any], project_id: str, timestamp: str) -> List[Dict[str, Any]]:
+    """One point per rule (implied rules included) in the network-metrics point format"""
+    return [{
+        'metric_type': HIT_COUNT_METRIC,
+        'resource_type': 'gce_firewall_rule',
+        'resource_labels': {'project_id': project_id, 'network': hit['network'], 'rule': hit['rule']},
+        'metric_labels': {},
+        'timestamp': timestamp,
+        'value': float(hit['hits']),
+        'value_type': 'INT64',
+        'metric_kind': 'DELTA'
+    } for hit in report['rule_hits']]
+
+def _cursor_id(project_id: str) -> str:
+    # Network and project names cannot contain underscores, so this never collides with a rule's usage
+    return f"{project_id}__cursor"
+
+def ingestion_start(storage, project_id: str, start: datetime, end: datetime) -> datetime:
+    """Start of the part of [start, end) whose flow logs are not yet in the usage.
+
+    Collection windows overlap (10 minutes every 5); ingesting only from the
+    end of the previous report keeps total_hits from counting a flow twice.
+    """
+    cursor = storage.get_documents(RULE_USAGE_COLLECTION, [_cursor_id(project_id)]).get(_cursor_id(project_id))
+    if cursor is None:
+        return start
+    return min(max(start, datetime.fromisoformat(cursor['ingested_until'])), end)
+
+def store_flow_report(storage, project_id: str, doc_id: str, report: Dict[str, Any], timestamp: str) -> None:
+    """Store a run's traffic summary and advance per-rule usage.
+
+    Usage documents carry first_seen and last_hit across runs, so rules unused
+    for longer than one collection window can be found. A report whose window
+    the usage already covers is a repeat and is dropped.
+    """
+    cursor_id = _cursor_id(project_id)
+    if report.get('window_end'):
+        cursor = storage.get_documents(RULE_USAGE_COLLECTION, [cursor_id]).get(cursor_id)
+        if cursor and datetime.fromisoformat(cursor['ingested_until']) >= datetime.fromisoformat(report['window_end']):
+            logger.info(f"Flow logs of {project_id} up to {report['window_end']} already ingested; skipping")
+            return
+
+    destination_bytes = report.get('destination_bytes') or {}
+    summary = {key: value for key, value in report.items() if key != 'destination_bytes'}
+    storage.set_document(FLOW_SUMMARIES_COLLECTION, doc_id, dict(summary, project_id=project_id, timestamp=timestamp))
+    store_destination_bytes(storage, project_id, report.get('window_end') or timestamp, destination_bytes)
+
+    usage_ids = {f"{project_id}_{hit['network']}_{hit['rule']}": hit for hit in report['rule_hits']}
+    previous = storage.get_documents(RULE_USAGE_COLLECTION, list(usage_ids))
+    usage = {}
+    for usage_id, hit in usage_ids.items():
+        before = previous.get(usage_id, {})
+        usage[usage_id] = {
+            'project_id': project_id,
+            'network': hit['network'],
+            'rule': hit['rule'],
+            'first_seen': before.get('first_seen', timestamp),
+            'last_hit': timestamp if hit['hits'] else before.get('last_hit'),
+            'total_hits': before.get('total_hits', 0) + hit['hits'],
+            'timestamp': timestamp
+        }
+    storage.set_documents(RULE_USAGE_COLLECTION, usage)
+    if report.get('window_end'):
+        storage.set_document(RULE_USAGE_COLLECTION, cursor_id,
+                             {'project_id': project_id, 'ingested_until': report['window_end'], 'timestamp': timestamp})
+
+def _destinations_id(project_id: str, day: str, zone: str) -> str:
+    return f"{day.replace('-', '')}_{project_id}_{zone}"
+
+def store_destination_bytes(storage, project_id: str, until: str,
+                            destination_bytes: Dict[str, Dict[str, List[int]]]) -> None:
+    """Add a report's bytes per destination class to its UTC day, one document per source zone"""
+    if not destination_bytes:
+        return
+    day = until[:10]
+    doc_ids = {zone: _destinations_id(project_id, day, zone) for zone in destination_bytes}
+    previous = storage.get_documents(EGRESS_DESTINATIONS_COLLECTION, list(doc_ids.values()))
+    documents = {}
+    for zone, instances in destination_bytes.items():
+        totals = dict(previous.get(doc_ids[zone], {}).get('instances', {}))
+        for instance, sent in instances.items():
+            totals[instance] = [a + b for a, b in zip(totals.get(instance, [0, 0, 0, 0]), sent)]
+        documents[doc_ids[zone]] = {'project_id': project_id, 'date': day, 'zone': zone, 'instances': totals}
+    storage.set_documents(EGRESS_DESTINATIONS_COLLECTION, documents)
+
+def load_destination_bytes(storage, project_id: str, day: str) -> Dict[Tuple[str, str], List[int]]:
+    """(instance, zone) -> bytes per destination class seen in a UTC day's flow logs"""
+    destination_bytes = {}
+    for _, document in storage.find_documents(EGRESS_DESTINATIONS_COLLECTION,
+                                              {'project_id': project_id, 'date': day}, 1000):
+        for instance, sent in document.get('instances', {}).items():
+            destination_bytes[(instance, document['zone'])] = sent
+    return destination_bytes
+
+# For local testing: python flow_logs.py firewall_rules.json flows-*.json[.gz]
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    with open(sys.argv[1]) as f:
+        rules = json.load(f)
+    ingester = FlowLogIngester(rules.get('firewall_rules', []) if isinstance(rules, dict) else rules)
+    ingester.add_files(sys.argv[2:])
+    print(json.dumps(ingester.report(20), indent=2))
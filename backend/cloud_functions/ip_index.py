@@ -0,0 +1,185 @@
+import ipaddress
+from typing import Dict, List, Any, Optional, Tuple
+
+# Google Cloud reserves the network, gateway, second-to-last and broadcast
+# addresses of every IPv4 primary range
+GCP_RESERVED_V4 = 4
+
+class PrefixTrie:
+    """Binary trie over CIDR prefixes with longest-prefix-match lookup.
+
+    Each node is a [zero, one, value] list; a lookup walks at most the depth
+    of the longest inserted prefix, independent of how many prefixes exist.
+    """
+
+    def __init__(self):
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.depth = {4: 0, 6: 0}
+
+    def insert(self, cidr: str, value: Any) -> None:
+        network = ipaddress.ip_network(cidr, strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        node = self.roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (address >> (bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+        self.depth[network.version] = max(self.depth[network.version], network.prefixlen)
+
+    def lookup(self, address: str) -> Optional[Any]:
+        """Value of the longest prefix containing the address, or None"""
+        ip = ipaddress.ip_address(address)
+        return self.lookup_int(ip.version, int(ip))
+
+    def lookup_int(self, version: int, address: int) -> Optional[Any]:
+        shift = (32 if version == 4 else 128) - 1
+        node = self.roots[version]
+        match = node[2]
+        for i in range(self.depth[version]):
+            node = node[(address >> (shift - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                match = node[2]
+        return match
+
+class SubnetUsage:
+    """Addresses seen inside one subnet, as offsets from its network address"""
+
+    def __init__(self, subnet: Dict[str, Any]):
+        self.subnet = subnet
+        self.network = ipaddress.ip_network(subnet['ip_cidr_range'], strict=False)
+        self.base = int(self.network.network_address)
+        self.used: List[Tuple[int, int]] = []
+        self.reserved: List[Tuple[int, int]] = []
+
+    def add(self, first: int, last: int, reserved: bool = False) -> None:
+        (self.reserved if reserved else self.used).append((first - self.base, last - self.base))
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.network.num_addresses
+        system = []
+        if self.network.version == 4 and total >= GCP_RESERVED_V4:
+            system = [(0, 1), (total - 2, total - 1)]
+
+        in_use = merge_intervals(self.used)
+        held = merge_intervals(self.reserved + system + in_use)
+        occupied = sum(last - first + 1 for first, last in held)
+        used = sum(last - first + 1 for first, last in in_use)
+
+        free_runs = []
+        cursor = 0
+        for first, last in held:
+            if first > cursor:
+                free_runs.append((cursor, first - 1))
+            cursor = max(cursor, last + 1)
+        if cursor < total:
+            free_runs.append((cursor, total - 1))
+
+        free = total - occupied
+        largest_run = max((last - first + 1 for first, last in free_runs), default=0)
+        largest_block = max((largest_aligned_block(first, last) for first, last in free_runs), default=0)
+
+        return {
+            'name': self.subnet.get('name', ''),
+            'network': self.subnet.get('network', ''),
+            'region': self.subnet.get('region', ''),
+            'ip_cidr_range': str(self.network),
+            'total_addresses': total,
+            'used_addresses': used,
+            'reserved_addresses': occupied - used,
+            'free_addresses': free,
+            'utilization_percent': round(100.0 * occupied / total, 2) if total else 0.0,
+            'free_runs': len(free_runs),
+            'largest_free_run': largest_run,
+            'largest_free_block': f"/{self.network.max_prefixlen - largest_block.bit_length() + 1}" if largest_block else None,
+            # 0 when all free space is one contiguous run, towards 1 as it splinters
+            'fragmentation': round(1 - largest_run / free, 4) if free else 0.0
+        }
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+def largest_aligned_block(first: int, last: int) -> int:
+    """Size of the largest CIDR-aligned block inside [first, last] (offsets)"""
+    best = 0
+    size = 1
+    while size <= last - first + 1:
+        start = (first + size - 1) // size * size
+        if start + size - 1 <= last:
+            best = size
+        size <<= 1
+    return best
+
+def address_range(value: str) -> Tuple[int, int, int]:
+    """(ip version, first, last) integer addresses of an IP or CIDR string"""
+    if '/' in value:
+        network = ipaddress.ip_network(value, strict=False)
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    address = ipaddress.ip_address(value)
+    return address.version, int(address), int(address)
+
+class IPIndex:
+    """Per-VPC prefix tries over subnet ranges, accumulating address usage.
+
+    Interfaces and reserved addresses are attributed to subnets with one
+    longest-prefix-match lookup each, so a whole estate is processed in a
+    single pass; per-subnet usage is then sorted and merged once.
+    """
+
+    def __init__(self, subnets: List[Dict[str, Any]]):
+        self.tries: Dict[str, PrefixTrie] = {}
+        self.usage: List[SubnetUsage] = []
+        self.unmatched = 0
+        for subnet in subnets:
+            if not subnet.get('ip_cidr_range'):
+                continue
+            usage = SubnetUsage(subnet)
+            self.usage.append(usage)
+            self.tries.setdefault(subnet.get('network', ''), PrefixTrie()).insert(subnet['ip_cidr_range'], usage)
+
+    def add(self, network: str, value: str, reserved: bool = False) -> bool:
+        """Record an address or alias range in use; False if no subnet contains it"""
+        trie = self.tries.get(network)
+        version, first, last = address_range(value)
+        usage = trie.lookup_int(version, first) if trie else None
+        if usage is None:
+            self.unmatched += 1
+            return False
+        usage.add(first, last, reserved)
+        return True
+
+    def utilization(self) -> List[Dict[str, Any]]:
+        return [usage.summary() for usage in self.usage]
+
+def subnet_utilization(subnets: List[Dict[str, Any]], interfaces: List[Dict[str, Any]],
+                       addresses: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Per-subnet utilization and free-space fragmentation.
+
+    interfaces: {'network', 'internal_ip', 'alias_ip_ranges'} records;
+    addresses: reserved internal addresses ({'network', 'address', 'prefix_length'}).
+    """
+    index = IPIndex(subnets)
+    for interface in interfaces:
+        if interface.get('internal_ip'):
+            index.add(interface.get('network', ''), interface['internal_ip'])
+        for alias in interface.get('alias_ip_ranges', []):
+            index.add(interface.get('network', ''), alias)
+
+    for address in addresses or []:
+        value = address['address']
+        if address.get('prefix_length'):
+            value = f"{value}/{address['prefix_length']}"
+        index.add(address.get('network', ''), value, reserved=True)
+
+    return index.utilization()
@@ -0,0 +1,33 @@
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+# Writes are spread over this many key ranges. Within a shard, keys stay
+# time-ordered, so each shard can still be range-scanned by time. Metric
+# points carry their shard as a field instead, and the indexes that order
+# them by time lead with it
+KEY_SHARDS = 16
+
+def _shard_prefix(shard: int) -> str:
+    return f"{shard:02x}"
+
+def document_id(project_id: str, when: Optional[datetime] = None) -> str:
+    """Write-spreading document ID: <shard>_<project>_<epoch ms>_<random>.
+
+    The shard is derived from the random suffix, so consecutive writes land
+    on different key ranges instead of all appending to the end of one, and
+    two runs in the same second can no longer overwrite each other.
+    """
+    timestamp_ms = int((when.timestamp() if when else time.time()) * 1000)
+    suffix = os.urandom(4).hex()
+    shard = int(suffix, 16) % KEY_SHARDS
+    return f"{_shard_prefix(shard)}_{project_id}_{timestamp_ms:013d}_{suffix}"
+
+def series_shard(series_id: str) -> int:
+    """Shard of a metric series, used for points written under series keys"""
+    return int(series_id[:8], 16) % KEY_SHARDS
+
+def hour_bucket(epoch_ms: int) -> int:
+    """Hours since the epoch, the coarse time field metric points are scanned by per shard"""
+    return epoch_ms // 3_600_000
@@ -0,0 +1,392 @@
+"""Embedded storage for running without Firestore.
+
+TimeSeriesEngine keeps one directory per series. Each directory holds
+append-only columnar segments (``NNNNNN.ts`` with int64 epoch milliseconds
+and ``NNNNNN.val`` with float64 values, host byte order) and a sparse time
+index. Range queries bisect the index, then the mmapped timestamp column,
+and return memoryview slices of the mapped files without copying points.
+
+DocumentLog is an append-only NDJSON file per collection for everything that
+is not a time series (inventory snapshots, summaries, costs).
+"""
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+ITEM_SIZE = 8  # int64 timestamps and float64 values
+
+# Points per segment file before rolling to the next one (1 MiB per column)
+SEGMENT_POINTS = 1 << 17
+
+# One sparse index entry every INDEX_INTERVAL points
+INDEX_INTERVAL = 128
+
+# Sparse index entry: first timestamp, segment number, point offset in segment
+INDEX_ENTRY = struct.Struct('<qII')
+
+# Fields that identify a series; everything else on a point is dropped
+SERIES_KEY_FIELDS = ('project_id', 'metric_type', 'resource_type', 'resource_labels', 'metric_labels')
+
+
+def to_epoch_ms(timestamp) -> int:
+    """Convert an ISO string or datetime to epoch milliseconds (UTC)"""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def from_epoch_ms(epoch_ms: int) -> datetime:
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+
+
+def series_key(point: dict) -> dict:
+    return {field: point.get(field) for field in SERIES_KEY_FIELDS if point.get(field) is not None}
+
+
+def series_id(key: dict) -> str:
+    """Stable ID for a series key"""
+    canonical = json.dumps(key, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:20]
+
+
+class SeriesRange:
+    """Zero-copy view of one series over a time range.
+
+    chunks is a list of (timestamps, values) memoryview pairs, one per
+    segment touched; both are slices of the mmapped segment files.
+    """
+
+    __slots__ = ('series_id', 'key', 'chunks')
+
+    def __init__(self, series_id: str, key: dict, chunks: list):
+        self.series_id = series_id
+        self.key = key
+        self.chunks = chunks
+
+    def __len__(self):
+        return sum(len(timestamps) for timestamps, _ in self.chunks)
+
+    def __iter__(self):
+        """Yield (epoch_ms, value) pairs in time order"""
+        for timestamps, values in self.chunks:
+            yield from zip(timestamps, values)
+
+    def release(self):
+        """Release the mapped views early instead of waiting for GC"""
+        for timestamps, values in self.chunks:
+            timestamps.release()
+            values.release()
+        self.chunks = []
+
+
+class _SeriesState:
+    """Writer-side position of a series, rebuilt from disk on first use"""
+
+    __slots__ = ('segment', 'count', 'last_ts')
+
+    def __init__(self, segment: int, count: int, last_ts):
+        self.segment = segment
+        self.count = count
+        self.last_ts = last_ts
+
+
+class TimeSeriesEngine:
+    """Append-only time-series store with mmapped range reads.
+
+    Points must arrive in time order per series; points at or before the
+    series' last timestamp are skipped, which also drops the overlap between
+    consecutive collection windows. One writer per directory.
+    """
+
+    def __init__(self, root: str, segment_points: int = SEGMENT_POINTS, index_interval: int = INDEX_INTERVAL):
+        if segment_points % index_interval:
+            raise ValueError("segment_points must be a multiple of index_interval")
+        self.root = root
+        self.segment_points = segment_points
+        self.index_interval = index_interval
+        self._lock = threading.Lock()
+        self._catalog = {}
+        self._catalog_size = 0
+        self._states = {}
+        self._maps = {}
+        os.makedirs(os.path.join(root, 'series'), exist_ok=True)
+
+    # Catalog
+
+    def _catalog_path(self):
+        return os.path.join(self.root, 'catalog.ndjson')
+
+    def _refresh_catalog(self):
+        """Pick up series created since the last read (append-only file)"""
+        path = self._catalog_path()
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        if size == self._catalog_size:
+            return
+        with open(path, 'rb') as f:
+            f.seek(self._catalog_size)
+            data = f.read(size - self._catalog_size)
+        # Only consume complete lines; a partial tail is re-read next time
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._catalog[entry['id']] = entry['key']
+        self._catalog_size += len(complete)
+
+    def _register(self, key: dict) -> str:
+        sid = series_id(key)
+        if sid not in self._catalog:
+            self._refresh_catalog()
+        if sid not in self._catalog:
+            os.makedirs(self._series_dir(sid), exist_ok=True)
+            with open(self._catalog_path(), 'a') as f:
+                f.write(json.dumps({'id': sid, 'key': key}, sort_keys=True) + '\n')
+            self._catalog[sid] = key
+        return sid
+
+    def find_series(self, **match) -> list:
+        """(series_id, key) pairs whose key fields equal the given values.
+
+        Dict values (labels) match when every given label is present and equal.
+        """
+        self._refresh_catalog()
+        found = []
+        for sid, key in self._catalog.items():
+            for field, expected in match.items():
+                actual = key.get(field)
+                if isinstance(expected, dict):
+                    if not isinstance(actual, dict) or any(actual.get(k) != v for k, v in expected.items()):
+                        break
+                elif actual != expected:
+                    break
+            else:
+                found.append((sid, key))
+        return found
+
+    # Layout
+
+    def _series_dir(self, sid: str) -> str:
+        return os.path.join(self.root, 'series', sid)
+
+    def _segment_path(self, sid: str, segment: int, column: str) -> str:
+        return os.path.join(self._series_dir(sid), f"{segment:06d}.{column}")
+
+    def _index_path(self, sid: str) -> str:
+        return os.path.join(self._series_dir(sid), 'index')
+
+    def _segment_count(self, sid: str, segment: int) -> int:
+        """Points fully written to both columns of a segment"""
+        try:
+            ts_size = os.path.getsize(self._segment_path(sid, segment, 'ts'))
+            val_size = os.path.getsize(self._segment_path(sid, segment, 'val'))
+        except OSError:
+            return 0
+        return min(ts_size, val_size) // ITEM_SIZE
+
+    # Writes
+
+    def _load_state(self, sid: str) -> _SeriesState:
+        state = self._states.get(sid)
+        if state is not None:
+            return state
+
+        segments = sorted(
+            int(name.split('.')[0]) for name in os.listdir(self._series_dir(sid))
+            if name.endswith('.ts')
+        )
+        segment = segments[-1] if segments else 0
+        count = self._segment_count(sid, segment)
+        last_ts = None
+        if count:
+            with open(self._segment_path(sid, segment, 'ts'), 'rb') as f:
+                f.seek((count - 1) * ITEM_SIZE)
+                last_ts = array('q', f.read(ITEM_SIZE))[0]
+
+        # Drop any torn tail so both columns line up again
+        for column in ('ts', 'val'):
+            path = self._segment_path(sid, segment, column)
+            if os.path.exists(path) and os.path.getsize(path) != count * ITEM_SIZE:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * ITEM_SIZE)
+
+        state = _SeriesState(segment, count, last_ts)
+        self._states[sid] = state
+        return state
+
+    def _flush(self, sid: str, segment: int, timestamps: array, values: array, index_entries: list):
+        # Values first, then timestamps, then the index: readers trust the shorter column
+        with open(self._segment_path(sid, segment, 'val'), 'ab') as f:
+            values.tofile(f)
+        with open(self._segment_path(sid, segment, 'ts'), 'ab') as f:
+            timestamps.tofile(f)
+        if index_entries:
+            with open(self._index_path(sid), 'ab') as f:
+                f.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in index_entries))
+
+    def append(self, key: dict, points) -> int:
+        """Append time-ordered (epoch_ms, value) points to a series.
+
+        Returns the number of points written.
+        """
+        with self._lock:
+            sid = self._register(key)
+            state = self._load_state(sid)
+
+            timestamps, values, index_entries = array('q'), array('d'), []
+            written = 0
+            for ts, value in points:
+                if state.last_ts is not None and ts <= state.last_ts:
+                    continue
+                if state.count == self.segment_points:
+                    self._flush(sid, state.segment, timestamps, values, index_entries)
+                    timestamps, values, index_entries = array('q'), array('d'), []
+                    state.segment += 1
+                    state.count = 0
+                if state.count % self.index_interval == 0:
+                    index_entries.append((ts, state.segment, state.count))
+                timestamps.append(ts)
+                values.append(value)
+                state.count += 1
+                state.last_ts = ts
+                written += 1
+
+            if timestamps:
+                self._flush(sid, state.segment, timestamps, values, index_entries)
+            return written
+
+    def write_points(self, points: list) -> int:
+        """Group metric point dicts into series and append them.
+
+        Points need 'timestamp' and a numeric 'value'; the remaining series
+        key fields identify the series.
+        """
+        grouped = {}
+        for point in points:
+            if point.get('value') is None or point.get('timestamp') is None:
+                continue
+            key = series_key(point)
+            entry = grouped.setdefault(series_id(key), (key, []))
+            entry[1].append((to_epoch_ms(point['timestamp']), float(point['value'])))
+
+        written = 0
+        for key, series_points in grouped.values():
+            series_points.sort(key=lambda p: p[0])
+            written += self.append(key, series_points)
+        return written
+
+    # Reads
+
+    def _map(self, path: str):
+        """mmap a file read-only, remapping when it has grown since the last call"""
+        size = os.path.getsize(path)
+        if size == 0:
+            return None
+        cached = self._maps.get(path)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Earlier maps stay alive for as long as callers hold views into them
+        self._maps[path] = (size, mapped)
+        return mapped
+
+    def _load_index(self, sid: str):
+        path = self._index_path(sid)
+        if not os.path.exists(path):
+            return [], []
+        with open(path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        entries = list(INDEX_ENTRY.iter_unpack(data[:usable]))
+        return [entry[0] for entry in entries], entries
+
+    def range(self, sid: str, start_ms: int, end_ms: int) -> SeriesRange:
+        """Points with start_ms <= timestamp <= end_ms as mmap-backed views"""
+        self._refresh_catalog()
+        key = self._catalog.get(sid)
+        if key is None:
+            raise KeyError(f"Unknown series: {sid}")
+
+        index_ts, entries = self._load_index(sid)
+        if not entries:
+            return SeriesRange(sid, key, [])
+
+        # Start from the last index entry at or before start_ms
+        position = max(bisect.bisect_right(index_ts, start_ms) - 1, 0)
+        _, segment, offset = entries[position]
+
+        chunks = []
+        while True:
+            count = self._segment_count(sid, segment)
+            if count == 0:
+                break
+            ts_map = self._map(self._segment_path(sid, segment, 'ts'))
+            val_map = self._map(self._segment_path(sid, segment, 'val'))
+            if ts_map is None or val_map is None:
+                break
+            count = min(count, len(ts_map) // ITEM_SIZE, len(val_map) // ITEM_SIZE)
+
+            timestamps = memoryview(ts_map)[:count * ITEM_SIZE].cast('q')
+            lo = bisect.bisect_left(timestamps, start_ms, offset, count)
+            hi = bisect.bisect_right(timestamps, end_ms, lo, count)
+            if hi > lo:
+                values = memoryview(val_map)[lo * ITEM_SIZE:hi * ITEM_SIZE].cast('d')
+                chunks.append((timestamps[lo:hi], values))
+            if hi < count:
+                break
+            segment += 1
+            offset = 0
+
+        return SeriesRange(sid, key, chunks)
+
+
+class DocumentLog:
+    """Append-only NDJSON documents per collection; the last write of an ID wins"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, collection: str) -> str:
+        return os.path.join(self.root, f"{collection}.ndjson")
+
+    def write(self, collection: str, documents) -> int:
+        """Append (doc_id, data) pairs; a None data marks a deletion"""
+        lines = [json.dumps({'_id': doc_id, 'data': data}, default=str) + '\n' for doc_id, data in documents]
+        with self._lock:
+            with open(self._path(collection), 'a') as f:
+                f.writelines(lines)
+        return len(lines)
+
+    def read(self, collection: str) -> dict:
+        """Current documents of a collection keyed by ID, in insertion order"""
+        documents = {}
+        path = self._path(collection)
+        if not os.path.exists(path):
+            return documents
+        with open(path) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # torn final write
+                entry = json.loads(line)
+                if entry['data'] is None:
+                    documents.pop(entry['_id'], None)
+                else:
+                    documents[entry['_id']] = entry['data']
+        return documents
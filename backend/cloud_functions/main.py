@@ -4,6 +4,11 @@ from datetime import datetime
 import functions_framework
 from network_collector import collect_network_data
 from metrics_collector import collect_network_metrics
+from retention import run_retention
+from cost_engine import compute_egress_costs
+from traffic_matrix import compute_traffic_matrices
+from capacity_forecast import forecast_capacity
+from fanout import coordinate_collection, run_collection_task
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,4 +22,34 @@ def network_data_collector(request):
 @functions_framework.http
 def network_metrics_collector(request):
     """Network metrics collection function"""
-    return collect_network_metrics(request)
\ No newline at end of file
+    return collect_network_metrics(request)
+
+@functions_framework.http
+def retention_job(request):
+    """Retention and compaction of stored collections"""
+    return run_retention(request)
+
+@functions_framework.http
+def egress_cost_job(request):
+    """Daily egress cost attribution"""
+    return compute_egress_costs(request)
+
+@functions_framework.http
+def traffic_matrix_job(request):
+    """Hourly zone and region traffic matrices"""
+    return compute_traffic_matrices(request)
+
+@functions_framework.http
+def capacity_forecast_job(request):
+    """NAT port and egress bandwidth capacity forecasts"""
+    return forecast_capacity(request)
+
+@functions_framework.http
+def collection_coordinator(request):
+    """Split a collection run into tasks and publish them"""
+    return coordinate_collection(request)
+
+@functions_framework.http
+def collection_worker(request):
+    """Execute one collection task delivered by Pub/Sub push"""
+    return run_collection_task(request)
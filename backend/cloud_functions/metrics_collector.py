@@ -4,22 +4,69 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Any, Optional
 import functions_framework
 from google.cloud import monitoring_v3
-from google.cloud import firestore
+from google.cloud import logging as cloud_logging
 from google.protobuf import duration_pb2
+from storage import get_storage
+from keys import document_id
+from anomalies import detect_anomalies
+from snapshots import load_snapshot
+from flow_logs import FlowLogIngester, hit_count_points, ingestion_start, store_flow_report
+from tracing import collector_run, pages, span, store_run_report
 import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize clients
-db = firestore.Client()
+# Flow log entries read per run; a busy window is read up to the last entry
+# and the next run continues from there
+MAX_FLOW_LOG_RECORDS = 2_000_000
+FLOW_LOG_PAGE_SIZE = 1000
+
+# Cloud Monitoring metric types queried per category
+VPC_METRIC_TYPES = [
+    'compute.googleapis.com/instance/network/sent_bytes_count',
+    'compute.googleapis.com/instance/network/received_bytes_count',
+    'compute.googleapis.com/instance/network/sent_packets_count',
+    'compute.googleapis.com/instance/network/received_packets_count'
+]
+GCE_METRIC_TYPES = [
+    'compute.googleapis.com/instance/network/sent_bytes_count',
+    'compute.googleapis.com/instance/network/received_bytes_count'
+]
+NAT_METRIC_TYPES = [
+    'compute.googleapis.com/nat/sent_bytes_count',
+    'compute.googleapis.com/nat/received_bytes_count',
+    'compute.googleapis.com/nat/sent_packets_count',
+    'compute.googleapis.com/nat/received_packets_count',
+    'compute.googleapis.com/nat/new_connections',
+    'compute.googleapis.com/nat/port_usage',
+    'compute.googleapis.com/nat/allocated_ports'
+]
+LB_METRIC_TYPES = [
+    'loadbalancing.googleapis.com/https/request_count',
+    'loadbalancing.googleapis.com/https/request_bytes_count',
+    'loadbalancing.googleapis.com/https/response_bytes_count',
+    'loadbalancing.googleapis.com/https/backend_latencies'
+]
+
+# Category: (metric types, per-series aligner), as the methods below query them
+METRIC_CATEGORIES = {
+    'vpc_metrics': (VPC_METRIC_TYPES, 'ALIGN_RATE'),
+    'gce_metrics': (GCE_METRIC_TYPES, 'ALIGN_RATE'),
+    'nat_metrics': (NAT_METRIC_TYPES, 'ALIGN_MEAN'),
+    'load_balancer_metrics': (LB_METRIC_TYPES, 'ALIGN_RATE')
+}
 
 class NetworkMetricsCollector:
     def __init__(self, project_id: str):
         self.project_id = project_id
         self.monitoring_client = monitoring_v3.MetricServiceClient()
+        self.logging_client = cloud_logging.Client(project=project_id)
         self.project_name = f"projects/{project_id}"
+        self.flow_report = None
+        self._flow_entries = 0
+        self._flow_last_timestamp = None
         
     def collect_network_metrics(self, duration_minutes: int = 60) -> Dict[str, Any]:
         """Collect network metrics from Cloud Monitoring"""
@@ -37,6 +84,8 @@ class NetworkMetricsCollector:
                 'firewall_metrics': self._get_firewall_metrics(start_time, end_time),
                 'load_balancer_metrics': self._get_load_balancer_metrics(start_time, end_time)
             }
+            if self.flow_report is not None:
+                metrics_data['flow_report'] = self.flow_report
             
             logger.info(f"Collected network metrics for project {self.project_id}")
             return metrics_data
@@ -49,14 +98,7 @@ class NetworkMetricsCollector:
         """Get VPC Flow Logs derived metrics"""
         vpc_metrics = []
         
-        metric_types = [
-            'compute.googleapis.com/instance/network/sent_bytes_count',
-            'compute.googleapis.com/instance/network/received_bytes_count',
-            'compute.googleapis.com/instance/network/sent_packets_count',
-            'compute.googleapis.com/instance/network/received_packets_count'
-        ]
-        
-        for metric_type in metric_types:
+        for metric_type in VPC_METRIC_TYPES:
             try:
                 metric_data = self._query_time_series(
                     metric_type=metric_type,
@@ -78,12 +120,7 @@ class NetworkMetricsCollector:
         """Get GCE instance network metrics"""
         gce_metrics = []
         
-        metric_types = [
-            'compute.googleapis.com/instance/network/sent_bytes_count',
-            'compute.googleapis.com/instance/network/received_bytes_count'
-        ]
-        
-        for metric_type in metric_types:
+        for metric_type in GCE_METRIC_TYPES:
             try:
                 metric_data = self._query_time_series(
                     metric_type=metric_type,
@@ -105,17 +142,7 @@ class NetworkMetricsCollector:
         """Get Cloud NAT gateway metrics"""
         nat_metrics = []
         
-        metric_types = [
-            'compute.googleapis.com/nat/sent_bytes_count',
-            'compute.googleapis.com/nat/received_bytes_count',
-            'compute.googleapis.com/nat/sent_packets_count',
-            'compute.googleapis.com/nat/received_packets_count',
-            'compute.googleapis.com/nat/new_connections',
-            'compute.googleapis.com/nat/port_usage',
-            'compute.googleapis.com/nat/allocated_ports'
-        ]
-        
-        for metric_type in metric_types:
+        for metric_type in NAT_METRIC_TYPES:
             try:
                 metric_data = self._query_time_series(
                     metric_type=metric_type,
@@ -134,27 +161,71 @@ class NetworkMetricsCollector:
         return nat_metrics
     
     def _get_firewall_metrics(self, start_time: datetime, end_time: datetime) -> List[Dict]:
-        """Get firewall-related metrics"""
+        """Get per-rule firewall hit counts by matching VPC Flow Logs against collected rules
+
+        Only the part of the window not ingested by an earlier run is read,
+        so the hit counts are deltas since the previous report.
+        """
         firewall_metrics = []
-        
-        # Note: Firewall hit counts are not directly available as metrics
-        # We would need to analyze VPC Flow Logs for this
-        # For now, we'll return placeholder for firewall rule usage
+        try:
+            storage = get_storage()
+            start_time = ingestion_start(storage, self.project_id, start_time, end_time)
+            # Rules and instance tags come from the latest inventory snapshot
+            snapshot = load_snapshot(storage, self.project_id)
+            sections = snapshot.section_names if snapshot else []
+            ingester = FlowLogIngester(
+                snapshot.section('firewall_rules') if 'firewall_rules' in sections else [],
+                snapshot.section('instance_interfaces') if 'instance_interfaces' in sections else []
+            )
+            # Entries stream through the ingester, so reading and matching share one span
+            with span('flow_logs', kind='ingest') as ingest:
+                ingester.add_records(self._get_flow_log_payloads(start_time, end_time))
+                ingest.items = ingester.records
+            
+            # Entries arrive oldest first (the API's default order); a capped read only covers
+            # the window up to its last entry
+            truncated = self._flow_entries >= MAX_FLOW_LOG_RECORDS and self._flow_last_timestamp is not None
+            window_end = self._flow_last_timestamp if truncated else end_time
+            if truncated:
+                logger.warning(f"Flow logs of {self.project_id} capped at {MAX_FLOW_LOG_RECORDS} entries; "
+                               f"read up to {window_end.isoformat()}")
+            self.flow_report = dict(ingester.report(), window_start=start_time.isoformat(),
+                                    window_end=window_end.isoformat(), truncated=truncated)
+            firewall_metrics = hit_count_points(
+                self.flow_report, self.project_id, end_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            )
+            logger.info(f"Matched {self.flow_report['records']} flow records against "
+                        f"{len(self.flow_report['rule_hits'])} firewall rules")
+        except Exception as e:
+            logger.warning(f"Failed to collect firewall hit counts: {str(e)}")
         
         return firewall_metrics
     
+    def _get_flow_log_payloads(self, start_time: datetime, end_time: datetime):
+        """Stream VPC Flow Log payloads for the window from Cloud Logging"""
+        log_filter = (
+            f'logName="projects/{self.project_id}/logs/compute.googleapis.com%2Fvpc_flows" '
+            f'AND timestamp>="{start_time.isoformat()}" AND timestamp<"{end_time.isoformat()}"'
+        )
+        entries = self.logging_client.list_entries(
+            resource_names=[self.project_name], filter_=log_filter,
+            page_size=FLOW_LOG_PAGE_SIZE, max_results=MAX_FLOW_LOG_RECORDS
+        )
+        self._flow_entries, self._flow_last_timestamp = 0, None
+        for entry in entries:
+            self._flow_entries += 1
+            timestamp = entry.timestamp
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            self._flow_last_timestamp = timestamp or self._flow_last_timestamp
+            if isinstance(entry.payload, dict):
+                yield entry.payload
+    
     def _get_load_balancer_metrics(self, start_time: datetime, end_time: datetime) -> List[Dict]:
         """Get load balancer metrics"""
         lb_metrics = []
         
-        metric_types = [
-            'loadbalancing.googleapis.com/https/request_count',
-            'loadbalancing.googleapis.com/https/request_bytes_count',
-            'loadbalancing.googleapis.com/https/response_bytes_count',
-            'loadbalancing.googleapis.com/https/backend_latencies'
-        ]
-        
-        for metric_type in metric_types:
+        for metric_type in LB_METRIC_TYPES:
             try:
                 metric_data = self._query_time_series(
                     metric_type=metric_type,
@@ -178,9 +249,10 @@ class NetworkMetricsCollector:
         start_time: datetime, 
         end_time: datetime,
         aggregation_alignment_period: int = 300,
-        aggregation_per_series_aligner: monitoring_v3.Aggregation.Aligner = monitoring_v3.Aggregation.Aligner.ALIGN_MEAN
+        aggregation_per_series_aligner: monitoring_v3.Aggregation.Aligner = monitoring_v3.Aggregation.Aligner.ALIGN_MEAN,
+        raise_errors: bool = False
     ) -> List[Dict]:
-        """Query time series data from Cloud Monitoring"""
+        """Query time series data from Cloud Monitoring; failed queries return no points unless raise_errors"""
         
         results = []
         
@@ -207,28 +279,34 @@ class NetworkMetricsCollector:
             })
             
             # Make the request
-            page_result = self.monitoring_client.list_time_series(request=request)
-            
-            # Process results
-            for time_series in page_result:
-                resource_labels = dict(time_series.resource.labels)
-                metric_labels = dict(time_series.metric.labels)
+            with span(metric_type, kind='query') as query:
+                page_result = pages('timeSeries.list', self.monitoring_client.list_time_series(request=request))
                 
-                for point in time_series.points:
-                    result = {
-                        'metric_type': metric_type,
-                        'resource_type': time_series.resource.type,
-                        'resource_labels': resource_labels,
-                        'metric_labels': metric_labels,
-                        'timestamp': point.interval.end_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-                        'value': self._extract_point_value(point),
-                        'value_type': str(time_series.value_type),
-                        'metric_kind': str(time_series.metric_kind)
-                    }
-                    results.append(result)
+                # Process results
+                with span(metric_type, kind='convert') as converted:
+                    for time_series in page_result:
+                        resource_labels = dict(time_series.resource.labels)
+                        metric_labels = dict(time_series.metric.labels)
+                        
+                        for point in time_series.points:
+                            result = {
+                                'metric_type': metric_type,
+                                'resource_type': time_series.resource.type,
+                                'resource_labels': resource_labels,
+                                'metric_labels': metric_labels,
+                                'timestamp': point.interval.end_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                                'value': self._extract_point_value(point),
+                                'value_type': str(time_series.value_type),
+                                'metric_kind': str(time_series.metric_kind)
+                            }
+                            results.append(result)
+                    converted.items = len(results)
+                query.items = len(page_result)
             
         except Exception as e:
             logger.error(f"Error querying time series for {metric_type}: {str(e)}")
+            if raise_errors:
+                raise
             
         return results
     
@@ -246,10 +324,12 @@ class NetworkMetricsCollector:
         return None
 
 def store_metrics_data(data: Dict[str, Any]) -> None:
-    """Store metrics data in Firestore"""
+    """Store metrics data in the configured storage backend"""
     try:
-        # Store in metrics collection with timestamp-based document ID
-        doc_id = f"{data['project_id']}_{int(datetime.now().timestamp())}"
+        storage = get_storage()
+        
+        # Store in metrics collection with a write-spreading document ID
+        doc_id = document_id(data['project_id'])
         
         # Store aggregated metrics summary
         metrics_summary = {
@@ -265,36 +345,41 @@ def store_metrics_data(data: Dict[str, Any]) -> None:
             }
         }
         
-        db.collection('metrics-summaries').document(doc_id).set(metrics_summary)
+        storage.set_document('metrics-summaries', doc_id, metrics_summary)
         
         # Store individual metrics for detailed analysis
         all_metrics = (
             data.get('vpc_metrics', []) +
             data.get('gce_metrics', []) +
             data.get('nat_metrics', []) +
+            data.get('firewall_metrics', []) +
             data.get('load_balancer_metrics', [])
         )
         
-        # Batch write metrics (Firestore has a limit of 500 operations per batch)
-        batch_size = 450
-        for i in range(0, len(all_metrics), batch_size):
-            batch = db.batch()
-            batch_metrics = all_metrics[i:i + batch_size]
-            
-            for metric in batch_metrics:
-                # Add collection metadata
-                metric['collection_timestamp'] = data['timestamp']
-                metric['project_id'] = data['project_id']
-                
-                # Create document reference and add to batch
-                doc_ref = db.collection('network-metrics').document()
-                batch.set(doc_ref, metric)
-            
-            # Commit the batch
-            batch.commit()
+        for metric in all_metrics:
+            # Add collection metadata
+            metric['collection_timestamp'] = data['timestamp']
+            metric['project_id'] = data['project_id']
+        
+        # Backends batch the writes themselves
+        with span('write_metrics', items=len(all_metrics)):
+            storage.write_metrics(all_metrics)
         
         logger.info(f"Successfully stored {len(all_metrics)} metrics for {data['project_id']}")
         
+        # Traffic summary and per-rule usage from flow logs
+        if data.get('flow_report'):
+            with span('flow_report'):
+                store_flow_report(storage, data['project_id'], doc_id, data['flow_report'], data['timestamp'])
+        
+        # Score the new points against each series' running baseline
+        try:
+            with span('anomalies', items=len(all_metrics)):
+                data['anomalies'] = detect_anomalies(storage, data['project_id'], all_metrics)
+        except Exception as e:
+            logger.error(f"Anomaly detection failed: {str(e)}")
+            data['anomalies'] = []
+        
     except Exception as e:
         logger.error(f"Error storing metrics data: {str(e)}")
         raise
@@ -302,6 +387,7 @@ def store_metrics_data(data: Dict[str, Any]) -> None:
 @functions_framework.http
 def collect_network_metrics(request):
     """HTTP Cloud Function entry point for metrics collection"""
+    run = None
     try:
         # Get project ID from environment
         project_id = os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
@@ -317,14 +403,16 @@ def collect_network_metrics(request):
             except ValueError:
                 duration_minutes = 60
         
-        # Initialize collector
-        collector = NetworkMetricsCollector(project_id)
-        
-        # Collect metrics
-        metrics_data = collector.collect_network_metrics(duration_minutes)
-        
-        # Store in Firestore
-        store_metrics_data(metrics_data)
+        # Trace every query, conversion and write of the run
+        with collector_run('collect_network_metrics', project_id) as run:
+            # Initialize collector
+            collector = NetworkMetricsCollector(project_id)
+            
+            # Collect metrics
+            metrics_data = collector.collect_network_metrics(duration_minutes)
+            
+            # Store in Firestore
+            store_metrics_data(metrics_data)
         
         # Return success response
         total_metrics = sum([
@@ -340,13 +428,17 @@ def collect_network_metrics(request):
             'timestamp': metrics_data['timestamp'],
             'duration_minutes': duration_minutes,
             'total_metrics_collected': total_metrics,
+            'anomalies_detected': len(metrics_data.get('anomalies', [])),
+            'flow_records_processed': (metrics_data.get('flow_report') or {}).get('records', 0),
+            'unused_firewall_rules': len((metrics_data.get('flow_report') or {}).get('unused_rules', [])),
             'metrics_breakdown': {
                 'vpc_metrics': len(metrics_data.get('vpc_metrics', [])),
                 'gce_metrics': len(metrics_data.get('gce_metrics', [])),
                 'nat_metrics': len(metrics_data.get('nat_metrics', [])),
                 'firewall_metrics': len(metrics_data.get('firewall_metrics', [])),
                 'load_balancer_metrics': len(metrics_data.get('load_balancer_metrics', []))
-            }
+            },
+            'run_report': store_run_report(get_storage(), run)
         }
         
         logger.info(f"Metrics collection completed: {response}")
@@ -354,6 +446,8 @@ def collect_network_metrics(request):
         
     except Exception as e:
         logger.error(f"Metrics collection failed: {str(e)}")
+        if run is not None:
+            store_run_report(get_storage(), run, status='failed')
         return {'error': str(e), 'status': 'failed'}, 500
 
 # For local testing
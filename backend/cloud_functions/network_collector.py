@@ -1,20 +1,23 @@
 import json
 import logging
 from datetime import datetime, timezone
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import functions_framework
 from google.cloud import compute_v1
 from google.cloud import monitoring_v3
-from google.cloud import firestore
+from storage import get_storage
+from snapshots import write_snapshot, load_snapshot
+from changelog import record_changes
+from keys import document_id
+from ip_index import subnet_utilization
+from cadence import CollectionCadence, GLOBAL, merge_sections, slice_key, slice_keys, slice_resources
+from tracing import collector_run, pages, span, store_run_report
 import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Firestore client
-db = firestore.Client()
-
 class NetworkDataCollector:
     def __init__(self, project_id: str):
         self.project_id = project_id
@@ -25,174 +28,346 @@ class NetworkDataCollector:
         self.firewalls_client = compute_v1.FirewallsClient()
         self.nat_gateways_client = compute_v1.RoutersClient()
         self.monitoring_client = monitoring_v3.MetricServiceClient()
+        # Sections whose last fetch failed; their previous resources are kept
+        self.failed_sections = set()
         
-    def collect_network_resources(self) -> Dict[str, Any]:
-        """Collect all network resource information"""
+    def collect_network_resources(self, cadence: Optional[CollectionCadence] = None, previous=None,
+                                  force: bool = False) -> Dict[str, Any]:
+        """Collect all network resource information
+
+        With a cadence and a previous snapshot, only the slices (resource type
+        x region) the cadence finds due are polled; the others, and sections
+        whose fetch failed, are carried over from the previous snapshot.
+        """
         try:
-            data = {
-                'timestamp': datetime.now(timezone.utc).isoformat(),
-                'project_id': self.project_id,
-                'networks': self._get_networks(),
-                'subnetworks': self._get_subnetworks(),
-                'firewall_rules': self._get_firewall_rules(),
-                'routers': self._get_routers(),
-                'nat_gateways': self._get_nat_gateways()
+            now = datetime.now(timezone.utc)
+            regions = self._get_regions()
+            keys = slice_keys([region.name for region in regions])
+            if cadence is None or previous is None:
+                polled = keys
+            else:
+                polled = cadence.due(keys, now, force)
+            due = set(polled)
+
+            def due_regions(section):
+                return [region for region in regions if slice_key(section, region.name) in due]
+
+            # Aggregated listing is cheaper once every region with instances is due
+            instance_regions = due_regions('instance_interfaces')
+            if len(instance_regions) == len(regions):
+                zones = None
+            else:
+                zones = [zone.split('/')[-1] for region in instance_regions for zone in region.zones]
+
+            fresh = {
+                'networks': self._get_networks() if slice_key('networks') in due else [],
+                'subnetworks': self._get_subnetworks(due_regions('subnetworks')),
+                'firewall_rules': self._get_firewall_rules() if slice_key('firewall_rules') in due else [],
+                'routers': self._get_routers(due_regions('routers')),
+                'nat_gateways': self._get_nat_gateways(due_regions('nat_gateways')),
+                'instance_interfaces': self._get_instance_interfaces(zones)
             }
-            logger.info(f"Collected network resources for project {self.project_id}")
+            # A failed fetch says nothing about its slices; keep what the previous snapshot had
+            for section in self.failed_sections & set(fresh):
+                fresh[section] = []
+            polled = [key for key in polled if key.split('/')[0] not in self.failed_sections]
+            if cadence is not None:
+                for section, resources in fresh.items():
+                    by_slice = slice_resources(section, resources)
+                    for key in polled:
+                        if key.split('/')[0] == section:
+                            cadence.record_poll(key, by_slice.get(key, []), now)
+
+            sections = merge_sections(fresh, polled, previous, [region.name for region in regions])
+            data = self.build_inventory(now, sections, keys, polled, cadence)
+            logger.info(f"Collected network resources for project {self.project_id}: "
+                        f"{len(polled)} of {len(keys)} slices polled")
             return data
         except Exception as e:
             logger.error(f"Error collecting network resources: {str(e)}")
             raise
     
+    def build_inventory(self, now: datetime, sections: Dict[str, List[Dict]], keys: List[str], polled: List[str],
+                        cadence: Optional[CollectionCadence] = None) -> Dict[str, Any]:
+        """Inventory document from whole sections, with subnet utilization and slice bookkeeping"""
+        subnetworks = sections['subnetworks']
+        interfaces = sections['instance_interfaces']
+        utilization = subnet_utilization(subnetworks, interfaces, self._get_reserved_addresses())
+        # Replace the CIDR-size estimate with what is actually free
+        for subnet, usage in zip([s for s in subnetworks if s.get('ip_cidr_range')], utilization):
+            subnet['available_ips'] = usage['free_addresses']
+
+        data = {
+            'timestamp': now.isoformat(),
+            'project_id': self.project_id,
+            **sections,
+            'subnet_utilization': utilization,
+            'polled_slices': len(polled),
+            'carried_slices': len(keys) - len(polled)
+        }
+        if cadence is not None:
+            # When each slice's resources were last read from the API
+            data['slice_timestamps'] = cadence.last_polled(keys)
+        return data
+
+    def collect_slice(self, section: str, region: str = GLOBAL, zones: Optional[List[str]] = None) -> List[Dict]:
+        """Poll one inventory slice; raises when its fetch failed
+
+        zones: the region's zones, for instance interfaces
+        """
+        if section == 'networks':
+            resources = self._get_networks()
+        elif section == 'firewall_rules':
+            resources = self._get_firewall_rules()
+        elif section == 'instance_interfaces':
+            resources = self._get_instance_interfaces([zone.split('/')[-1] for zone in zones or []])
+        else:
+            fetch = {
+                'subnetworks': self._get_subnetworks,
+                'routers': self._get_routers,
+                'nat_gateways': self._get_nat_gateways
+            }[section]
+            resources = fetch([compute_v1.Region(name=region)])
+        if section in self.failed_sections:
+            raise RuntimeError(f"Fetching {slice_key(section, region)} failed")
+        return resources
+    
+    def _get_regions(self) -> List:
+        """List the project's regions; each carries the URLs of its zones"""
+        regions_client = compute_v1.RegionsClient()
+        regions_request = compute_v1.ListRegionsRequest(project=self.project_id)
+        return pages('regions.list', regions_client.list(request=regions_request))
+    
     def _get_networks(self) -> List[Dict]:
         """Get all VPC networks in the project"""
         networks = []
         try:
             request = compute_v1.ListNetworksRequest(project=self.project_id)
-            page_result = self.networks_client.list(request=request)
+            page_result = pages('networks.list', self.networks_client.list(request=request))
             
-            for network in page_result:
-                networks.append({
-                    'name': network.name,
-                    'id': str(network.id),
-                    'description': getattr(network, 'description', ''),
-                    'auto_create_subnetworks': network.auto_create_subnetworks,
-                    'routing_mode': network.routing_config.routing_mode if network.routing_config else 'REGIONAL',
-                    'creation_timestamp': network.creation_timestamp,
-                    'self_link': network.self_link,
-                    'subnet_count': len(network.subnetworks) if hasattr(network, 'subnetworks') else 0
-                })
+            with span('networks', kind='convert', items=len(page_result)):
+                for network in page_result:
+                    networks.append({
+                        'name': network.name,
+                        'id': str(network.id),
+                        'description': getattr(network, 'description', ''),
+                        'auto_create_subnetworks': network.auto_create_subnetworks,
+                        'routing_mode': network.routing_config.routing_mode if network.routing_config else 'REGIONAL',
+                        'creation_timestamp': network.creation_timestamp,
+                        'self_link': network.self_link,
+                        'subnet_count': len(network.subnetworks) if hasattr(network, 'subnetworks') else 0
+                    })
         except Exception as e:
             logger.error(f"Error fetching networks: {str(e)}")
+            self.failed_sections.add('networks')
             
         return networks
     
-    def _get_subnetworks(self) -> List[Dict]:
-        """Get all subnetworks across all regions"""
+    def _get_subnetworks(self, regions: Optional[List] = None) -> List[Dict]:
+        """Get all subnetworks across all regions, or only the given ones"""
         subnetworks = []
         try:
-            # Get all regions first
-            regions_client = compute_v1.RegionsClient()
-            regions_request = compute_v1.ListRegionsRequest(project=self.project_id)
-            regions = regions_client.list(request=regions_request)
+            if regions is None:
+                regions = self._get_regions()
             
             for region in regions:
                 request = compute_v1.ListSubnetworksRequest(
                     project=self.project_id, 
                     region=region.name
                 )
-                page_result = self.subnetworks_client.list(request=request)
+                page_result = pages('subnetworks.list', self.subnetworks_client.list(request=request),
+                                    region=region.name)
                 
-                for subnet in page_result:
-                    subnetworks.append({
-                        'name': subnet.name,
-                        'id': str(subnet.id),
-                        'region': region.name,
-                        'network': subnet.network.split('/')[-1] if subnet.network else '',
-                        'ip_cidr_range': subnet.ip_cidr_range,
-                        'gateway_address': subnet.gateway_address,
-                        'private_ip_google_access': subnet.private_ip_google_access,
-                        'purpose': getattr(subnet, 'purpose', 'PRIVATE_RFC_1918'),
-                        'creation_timestamp': subnet.creation_timestamp,
-                        'available_ips': self._calculate_available_ips(subnet.ip_cidr_range)
-                    })
+                with span('subnetworks', kind='convert', items=len(page_result), region=region.name):
+                    for subnet in page_result:
+                        subnetworks.append({
+                            'name': subnet.name,
+                            'id': str(subnet.id),
+                            'region': region.name,
+                            'network': subnet.network.split('/')[-1] if subnet.network else '',
+                            'ip_cidr_range': subnet.ip_cidr_range,
+                            'gateway_address': subnet.gateway_address,
+                            'private_ip_google_access': subnet.private_ip_google_access,
+                            'purpose': getattr(subnet, 'purpose', 'PRIVATE_RFC_1918'),
+                            'creation_timestamp': subnet.creation_timestamp,
+                            'available_ips': self._calculate_available_ips(subnet.ip_cidr_range)
+                        })
         except Exception as e:
             logger.error(f"Error fetching subnetworks: {str(e)}")
+            self.failed_sections.add('subnetworks')
             
         return subnetworks
     
+    def _get_instance_interfaces(self, zones: Optional[List[str]] = None) -> List[Dict]:
+        """Get every VM network interface with its internal IP, alias ranges and external IP
+
+        One aggregated list covers all zones; given zones are listed one by one.
+        """
+        interfaces = []
+        try:
+            if zones is None:
+                request = compute_v1.AggregatedListInstancesRequest(project=self.project_id)
+                scoped = [
+                    (zone, response.instances)
+                    for zone, response in pages('instances.aggregatedList', self.compute_client.aggregated_list(request=request))
+                ]
+            else:
+                scoped = []
+                for zone in zones:
+                    request = compute_v1.ListInstancesRequest(project=self.project_id, zone=zone)
+                    scoped.append((zone, pages('instances.list', self.compute_client.list(request=request), zone=zone)))
+            with span('instance_interfaces', kind='convert', items=len(scoped)):
+                for zone, instances in scoped:
+                    for instance in instances:
+                        for nic in instance.network_interfaces:
+                            interfaces.append({
+                                'instance': instance.name,
+                                'instance_id': str(instance.id),
+                                'zone': zone.split('/')[-1],
+                                'machine_type': instance.machine_type.split('/')[-1],
+                                'network': nic.network.split('/')[-1] if nic.network else '',
+                                'subnetwork': nic.subnetwork.split('/')[-1] if nic.subnetwork else '',
+                                'internal_ip': nic.network_i_p,
+                                'external_ip': next((c.nat_i_p for c in nic.access_configs if c.nat_i_p), ''),
+                                # Firewall rule targets, for matching flow logs to rules
+                                'tags': list(instance.tags.items) if instance.tags else [],
+                                'service_accounts': [account.email for account in instance.service_accounts],
+                                # Ranges from secondary ranges do not use primary subnet addresses
+                                'alias_ip_ranges': [
+                                    alias.ip_cidr_range for alias in nic.alias_ip_ranges
+                                    if not alias.subnetwork_range_name
+                                ]
+                            })
+        except Exception as e:
+            logger.error(f"Error fetching instance interfaces: {str(e)}")
+            self.failed_sections.add('instance_interfaces')
+            
+        return interfaces
+    
+    def _get_reserved_addresses(self) -> List[Dict]:
+        """Get reserved internal addresses, which hold subnet space even when unattached"""
+        addresses = []
+        try:
+            addresses_client = compute_v1.AddressesClient()
+            request = compute_v1.AggregatedListAddressesRequest(project=self.project_id)
+            scoped = pages('addresses.aggregatedList', addresses_client.aggregated_list(request=request))
+            with span('reserved_addresses', kind='convert', items=len(scoped)):
+                for region, response in scoped:
+                    for address in response.addresses:
+                        if address.address_type != 'INTERNAL' or not address.network:
+                            continue
+                        addresses.append({
+                            'name': address.name,
+                            'region': region.split('/')[-1],
+                            'network': address.network.split('/')[-1],
+                            'address': address.address,
+                            'prefix_length': getattr(address, 'prefix_length', 0),
+                            'status': address.status
+                        })
+        except Exception as e:
+            logger.error(f"Error fetching reserved addresses: {str(e)}")
+            self.failed_sections.add('reserved_addresses')
+            
+        return addresses
+    
     def _get_firewall_rules(self) -> List[Dict]:
         """Get all firewall rules"""
         firewall_rules = []
         try:
             request = compute_v1.ListFirewallsRequest(project=self.project_id)
-            page_result = self.firewalls_client.list(request=request)
+            page_result = pages('firewalls.list', self.firewalls_client.list(request=request))
             
-            for firewall in page_result:
-                firewall_rules.append({
-                    'name': firewall.name,
-                    'id': str(firewall.id),
-                    'description': getattr(firewall, 'description', ''),
-                    'network': firewall.network.split('/')[-1] if firewall.network else '',
-                    'direction': firewall.direction,
-                    'priority': firewall.priority,
-                    'source_ranges': list(firewall.source_ranges) if firewall.source_ranges else [],
-                    'target_tags': list(firewall.target_tags) if firewall.target_tags else [],
-                    'allowed_ports': self._format_firewall_allowed(firewall.allowed) if firewall.allowed else [],
-                    'denied_ports': self._format_firewall_denied(firewall.denied) if firewall.denied else [],
-                    'creation_timestamp': firewall.creation_timestamp,
-                    'disabled': getattr(firewall, 'disabled', False)
-                })
+            with span('firewall_rules', kind='convert', items=len(page_result)):
+                for firewall in page_result:
+                    firewall_rules.append({
+                        'name': firewall.name,
+                        'id': str(firewall.id),
+                        'description': getattr(firewall, 'description', ''),
+                        'network': firewall.network.split('/')[-1] if firewall.network else '',
+                        'direction': firewall.direction,
+                        'priority': firewall.priority,
+                        'source_ranges': list(firewall.source_ranges) if firewall.source_ranges else [],
+                        'destination_ranges': list(firewall.destination_ranges) if firewall.destination_ranges else [],
+                        'source_tags': list(firewall.source_tags) if firewall.source_tags else [],
+                        'source_service_accounts': list(firewall.source_service_accounts) if firewall.source_service_accounts else [],
+                        'target_tags': list(firewall.target_tags) if firewall.target_tags else [],
+                        'target_service_accounts': list(firewall.target_service_accounts) if firewall.target_service_accounts else [],
+                        'allowed_ports': self._format_firewall_allowed(firewall.allowed) if firewall.allowed else [],
+                        'denied_ports': self._format_firewall_denied(firewall.denied) if firewall.denied else [],
+                        'creation_timestamp': firewall.creation_timestamp,
+                        'disabled': getattr(firewall, 'disabled', False)
+                    })
         except Exception as e:
             logger.error(f"Error fetching firewall rules: {str(e)}")
+            self.failed_sections.add('firewall_rules')
             
         return firewall_rules
     
-    def _get_routers(self) -> List[Dict]:
-        """Get all Cloud Routers"""
+    def _get_routers(self, regions: Optional[List] = None) -> List[Dict]:
+        """Get all Cloud Routers, in all regions or only the given ones"""
         routers = []
         try:
-            # Get all regions
-            regions_client = compute_v1.RegionsClient()
-            regions_request = compute_v1.ListRegionsRequest(project=self.project_id)
-            regions = regions_client.list(request=regions_request)
+            if regions is None:
+                regions = self._get_regions()
             
             for region in regions:
                 request = compute_v1.ListRoutersRequest(
                     project=self.project_id,
                     region=region.name
                 )
-                page_result = self.routers_client.list(request=request)
+                page_result = pages('routers.list', self.routers_client.list(request=request), region=region.name)
                 
-                for router in page_result:
-                    routers.append({
-                        'name': router.name,
-                        'id': str(router.id),
-                        'region': region.name,
-                        'network': router.network.split('/')[-1] if router.network else '',
-                        'description': getattr(router, 'description', ''),
-                        'bgp_asn': router.bgp.asn if router.bgp else None,
-                        'bgp_advertise_mode': router.bgp.advertise_mode if router.bgp else None,
-                        'nat_count': len(router.nats) if router.nats else 0,
-                        'creation_timestamp': router.creation_timestamp
-                    })
+                with span('routers', kind='convert', items=len(page_result), region=region.name):
+                    for router in page_result:
+                        routers.append({
+                            'name': router.name,
+                            'id': str(router.id),
+                            'region': region.name,
+                            'network': router.network.split('/')[-1] if router.network else '',
+                            'description': getattr(router, 'description', ''),
+                            'bgp_asn': router.bgp.asn if router.bgp else None,
+                            'bgp_advertise_mode': router.bgp.advertise_mode if router.bgp else None,
+                            'nat_count': len(router.nats) if router.nats else 0,
+                            'creation_timestamp': router.creation_timestamp
+                        })
         except Exception as e:
             logger.error(f"Error fetching routers: {str(e)}")
+            self.failed_sections.add('routers')
             
         return routers
     
-    def _get_nat_gateways(self) -> List[Dict]:
-        """Get all Cloud NAT gateways"""
+    def _get_nat_gateways(self, regions: Optional[List] = None) -> List[Dict]:
+        """Get all Cloud NAT gateways, in all regions or only the given ones"""
         nat_gateways = []
         try:
-            # Get all regions
-            regions_client = compute_v1.RegionsClient()
-            regions_request = compute_v1.ListRegionsRequest(project=self.project_id)
-            regions = regions_client.list(request=regions_request)
+            if regions is None:
+                regions = self._get_regions()
             
             for region in regions:
                 request = compute_v1.ListRoutersRequest(
                     project=self.project_id,
                     region=region.name
                 )
-                routers = self.routers_client.list(request=request)
+                routers = pages('routers.list', self.routers_client.list(request=request), region=region.name)
                 
-                for router in routers:
-                    if router.nats:
-                        for nat in router.nats:
-                            nat_gateways.append({
-                                'name': nat.name,
-                                'router_name': router.name,
-                                'region': region.name,
-                                'nat_ip_allocate_option': nat.nat_ip_allocate_option,
-                                'source_subnetwork_ip_ranges_to_nat': nat.source_subnetwork_ip_ranges_to_nat,
-                                'min_ports_per_vm': getattr(nat, 'min_ports_per_vm', 0),
-                                'max_ports_per_vm': getattr(nat, 'max_ports_per_vm', 0),
-                                'enable_endpoint_independent_mapping': getattr(nat, 'enable_endpoint_independent_mapping', False),
-                                'log_config_enabled': nat.log_config.enable if nat.log_config else False
-                            })
+                with span('nat_gateways', kind='convert', items=len(routers), region=region.name):
+                    for router in routers:
+                        if router.nats:
+                            for nat in router.nats:
+                                nat_gateways.append({
+                                    'name': nat.name,
+                                    'router_name': router.name,
+                                    'region': region.name,
+                                    'nat_ip_allocate_option': nat.nat_ip_allocate_option,
+                                    'source_subnetwork_ip_ranges_to_nat': nat.source_subnetwork_ip_ranges_to_nat,
+                                    'min_ports_per_vm': getattr(nat, 'min_ports_per_vm', 0),
+                                    'max_ports_per_vm': getattr(nat, 'max_ports_per_vm', 0),
+                                    'enable_endpoint_independent_mapping': getattr(nat, 'enable_endpoint_independent_mapping', False),
+                                    'log_config_enabled': nat.log_config.enable if nat.log_config else False
+                                })
         except Exception as e:
             logger.error(f"Error fetching NAT gateways: {str(e)}")
+            self.failed_sections.add('nat_gateways')
             
         return nat_gateways
     
@@ -226,14 +401,26 @@ class NetworkDataCollector:
         except Exception:
             return 0
 
-def store_network_data(data: Dict[str, Any]) -> None:
-    """Store network data in Firestore"""
+def store_network_data(data: Dict[str, Any], previous=None) -> None:
+    """Store network data in the configured storage backend
+
+    previous: the project's latest snapshot, when the caller already loaded it
+    """
     try:
-        # Store in network-inventory collection with timestamp-based document ID
-        doc_id = f"{data['project_id']}_{int(datetime.now().timestamp())}"
+        storage = get_storage()
+        
+        # Store in network-inventory collection with a write-spreading document ID
+        doc_id = document_id(data['project_id'])
+        
+        # Store main inventory as a manifest of deduplicated resource blobs
+        with span('snapshot'):
+            if previous is None:
+                previous = load_snapshot(storage, data['project_id'])
+            write_snapshot(storage, doc_id, data)
         
-        # Store main inventory
-        db.collection('network-inventory').document(doc_id).set(data)
+        # Log field-level changes against the previous snapshot, with periodic checkpoints
+        with span('changelog'):
+            data['changes'] = record_changes(storage, previous, data, doc_id)
         
         # Store individual resource types for easier querying
         timestamp = data['timestamp']
@@ -243,19 +430,27 @@ def store_network_data(data: Dict[str, Any]) -> None:
         for network in data.get('networks', []):
             network['timestamp'] = timestamp
             network['project_id'] = project_id
-            db.collection('networks').add(network)
+        storage.add_documents('networks', data.get('networks', []))
         
         # Subnetworks  
         for subnet in data.get('subnetworks', []):
             subnet['timestamp'] = timestamp
             subnet['project_id'] = project_id
-            db.collection('subnetworks').add(subnet)
+        storage.add_documents('subnetworks', data.get('subnetworks', []))
             
         # Firewall rules
         for firewall in data.get('firewall_rules', []):
             firewall['timestamp'] = timestamp
             firewall['project_id'] = project_id
-            db.collection('firewall-rules').add(firewall)
+        storage.add_documents('firewall-rules', data.get('firewall_rules', []))
+        
+        # Subnet utilization, one current document per subnet
+        utilization = {}
+        for usage in data.get('subnet_utilization', []):
+            usage['timestamp'] = timestamp
+            usage['project_id'] = project_id
+            utilization[f"{project_id}_{usage['network']}_{usage['region']}_{usage['name']}"] = usage
+        storage.set_documents('subnet-utilization', utilization)
             
         logger.info(f"Successfully stored network data for {project_id}")
         
@@ -266,32 +461,52 @@ def store_network_data(data: Dict[str, Any]) -> None:
 @functions_framework.http
 def collect_network_data(request):
     """HTTP Cloud Function entry point"""
+    run = None
     try:
         # Get project ID from environment or request
         project_id = os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
         if not project_id:
             return {'error': 'Project ID not found'}, 400
         
-        # Initialize collector
-        collector = NetworkDataCollector(project_id)
-        
-        # Collect data
-        network_data = collector.collect_network_resources()
+        # ?full=true polls every slice regardless of the cadence
+        force = str(getattr(request, 'args', {}).get('full', '')).lower() == 'true'
         
-        # Store in Firestore
-        store_network_data(network_data)
+        # Trace every list call, conversion and write of the run
+        with collector_run('collect_network_data', project_id) as run:
+            storage = get_storage()
+            previous = load_snapshot(storage, project_id)
+            cadence = CollectionCadence(storage, project_id)
+            
+            # Initialize collector
+            collector = NetworkDataCollector(project_id)
+            
+            # Collect the slices that are due
+            network_data = collector.collect_network_resources(cadence, previous, force)
+            
+            # Store in Firestore; with nothing polled the previous snapshot stands
+            if network_data['polled_slices']:
+                store_network_data(network_data, previous)
+                cadence.save(datetime.fromisoformat(network_data['timestamp']))
         
         # Return success response
         response = {
             'status': 'success',
             'timestamp': network_data['timestamp'],
+            'slices': {
+                'polled': network_data['polled_slices'],
+                'carried_over': network_data['carried_slices'],
+                'failed_sections': sorted(collector.failed_sections)
+            },
             'resources_collected': {
                 'networks': len(network_data.get('networks', [])),
                 'subnetworks': len(network_data.get('subnetworks', [])),
                 'firewall_rules': len(network_data.get('firewall_rules', [])),
                 'routers': len(network_data.get('routers', [])),
-                'nat_gateways': len(network_data.get('nat_gateways', []))
-            }
+                'nat_gateways': len(network_data.get('nat_gateways', [])),
+                'instance_interfaces': len(network_data.get('instance_interfaces', []))
+            },
+            'changes': network_data.get('changes', {}),
+            'run_report': store_run_report(get_storage(), run)
         }
         
         logger.info(f"Network data collection completed: {response}")
@@ -299,6 +514,8 @@ def collect_network_data(request):
         
     except Exception as e:
         logger.error(f"Network data collection failed: {str(e)}")
+        if run is not None:
+            store_run_report(get_storage(), run, status='failed')
         return {'error': str(e), 'status': 'failed'}, 500
 
 # For local testing
@@ -308,7 +525,8 @@ if __name__ == '__main__':
     
     # Test the function
     class MockRequest:
-        pass
+        def __init__(self):
+            self.args = {}
     
     result = collect_network_data(MockRequest())
     print(json.dumps(result, indent=2))
\ No newline at end of file
@@ -0,0 +1,330 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+import functions_framework
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud import firestore
+from keys import KEY_SHARDS, hour_bucket
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Metric points carry the Monitoring API end time format; everything else uses isoformat()
+METRIC_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Retention per collection: raw points are short-lived, inventory snapshots kept longer
+RETENTION_RULES = {
+    # Scanned per shard by hour bucket; the timestamp field is not indexed on its own
+    'network-metrics': {'days': 7, 'time_field': 'timestamp', 'time_format': METRIC_TIMESTAMP_FORMAT,
+                        'shard_field': 'shard', 'bucket_field': 'hour'},
+    'metrics-summaries': {'days': 30, 'time_field': 'timestamp'},
+    'networks': {'days': 30, 'time_field': 'timestamp'},
+    'subnetworks': {'days': 30, 'time_field': 'timestamp'},
+    'firewall-rules': {'days': 30, 'time_field': 'timestamp'},
+    'network-inventory': {'days': 30, 'time_field': 'timestamp'},
+    # Rewritten every run; only subnets that no longer exist age out
+    'subnet-utilization': {'days': 30, 'time_field': 'timestamp'},
+    'anomalies': {'days': 30, 'time_field': 'timestamp'},
+    'flow-summaries': {'days': 30, 'time_field': 'timestamp'},
+    'traffic-matrices': {'days': 90, 'time_field': 'timestamp'},
+    # Rewritten every run; only series that stopped reporting age out
+    'capacity-forecasts': {'days': 7, 'time_field': 'timestamp'},
+    'collector-runs': {'days': 30, 'time_field': 'timestamp'},
+    'fanout-runs': {'days': 30, 'time_field': 'timestamp'},
+    'fanout-tasks': {'days': 7, 'time_field': 'timestamp'},
+    # Slice resources are only read when their run is finalized
+    'fanout-results': {'days': 2, 'time_field': 'timestamp'},
+    # As-of queries reach back as far as both of these are kept
+    'inventory-changes': {'days': 90, 'time_field': 'timestamp'},
+    'inventory-checkpoints': {'days': 90, 'time_field': 'timestamp'}
+}
+
+CHECKPOINT_COLLECTION = 'retention-checkpoints'
+
+# Content-addressed inventory blobs are swept once no manifest references them;
+# the grace period covers blobs written just before their manifest
+INVENTORY_COLLECTION = 'network-inventory'
+INVENTORY_CHECKPOINT_COLLECTION = 'inventory-checkpoints'
+BLOB_COLLECTION = 'inventory-blobs'
+BLOB_GRACE_PERIOD = timedelta(days=1)
+
+# Firestore allows 500 writes per batch; several batches are committed in parallel
+DELETE_BATCH_SIZE = 450
+PARALLEL_BATCHES = 4
+PAGE_SIZE = DELETE_BATCH_SIZE * PARALLEL_BATCHES
+
+# Stop early enough to checkpoint before the 540 s function timeout
+DEFAULT_TIME_BUDGET_SECONDS = 480
+
+def format_cutoff(cutoff: datetime, rule: Dict[str, Any]) -> str:
+    """Render the cutoff the same way the collection stores its time field"""
+    if rule.get('time_format'):
+        return cutoff.strftime(rule['time_format'])
+    return cutoff.isoformat()
+
+def estimate_document_size(collection: str, doc_id: str, data: Dict[str, Any]) -> int:
+    """Approximate stored size using Firestore's documented size rules"""
+    def value_size(value) -> int:
+        if value is None or isinstance(value, bool):
+            return 1
+        if isinstance(value, (int, float, datetime)):
+            return 8
+        if isinstance(value, str):
+            return len(value.encode('utf-8')) + 1
+        if isinstance(value, bytes):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(len(k.encode('utf-8')) + 1 + value_size(v) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return sum(value_size(v) for v in value)
+        return 16  # references, geo points
+
+    name_size = len(collection) + 1 + len(doc_id) + 1 + 16
+    return name_size + value_size(data) + 32
+
+class RetentionJob:
+    """Deletes documents older than each collection's retention window.
+
+    Work is paged oldest-first and checkpointed per collection, so a run cut
+    short by the time budget continues where it stopped with the same cutoff.
+    In dry-run mode nothing is deleted and the savings are estimated instead.
+    """
+
+    def __init__(self, db=None, rules: Optional[Dict[str, Dict]] = None, dry_run: bool = False,
+                 time_budget_seconds: int = DEFAULT_TIME_BUDGET_SECONDS):
+        self.db = db or firestore.Client()
+        self.rules = rules or RETENTION_RULES
+        self.dry_run = dry_run
+        self.deadline = time.monotonic() + time_budget_seconds
+
+    def run(self, collections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Apply retention to the given collections (default: all with rules)"""
+        report = {}
+        for collection in collections or list(self.rules):
+            if collection not in self.rules:
+                raise ValueError(f"No retention rule for collection: {collection}")
+            report[collection] = self._compact_collection(collection, self.rules[collection])
+        if (INVENTORY_COLLECTION in report or INVENTORY_CHECKPOINT_COLLECTION in report) \
+                and time.monotonic() < self.deadline:
+            report[BLOB_COLLECTION] = self._sweep_inventory_blobs()
+        return report
+
+    def _referenced_blobs(self) -> set:
+        """Chunk and resource hashes reachable from the remaining inventory and checkpoint manifests"""
+        chunk_hashes = set()
+        for collection in (INVENTORY_COLLECTION, INVENTORY_CHECKPOINT_COLLECTION):
+            for manifest in self.db.collection(collection).select(['sections']).stream():
+                for section in (manifest.to_dict().get('sections') or {}).values():
+                    chunk_hashes.update(section.get('chunks', []))
+
+        referenced = set(chunk_hashes)
+        blob_ref = self.db.collection(BLOB_COLLECTION)
+        chunk_list = list(chunk_hashes)
+        for i in range(0, len(chunk_list), DELETE_BATCH_SIZE):
+            refs = [blob_ref.document(h) for h in chunk_list[i:i + DELETE_BATCH_SIZE]]
+            for chunk in self.db.get_all(refs, field_paths=['hashes']):
+                if chunk.exists:
+                    referenced.update(chunk.get('hashes') or [])
+        return referenced
+
+    def _sweep_inventory_blobs(self) -> Dict[str, Any]:
+        """Delete blobs no longer referenced by any inventory or checkpoint manifest"""
+        referenced = self._referenced_blobs()
+        grace_cutoff = (datetime.now(timezone.utc) - BLOB_GRACE_PERIOD).isoformat()
+
+        scanned = 0
+        orphans = []
+        blobs = self.db.collection(BLOB_COLLECTION)\
+                       .where('created_at', '<', grace_cutoff)\
+                       .select(['created_at'])\
+                       .stream()
+        for blob in blobs:
+            scanned += 1
+            if blob.id not in referenced:
+                orphans.append(blob)
+
+        complete = True
+        removed = 0
+        if not self.dry_run:
+            with ThreadPoolExecutor(max_workers=PARALLEL_BATCHES) as executor:
+                batches = [orphans[i:i + DELETE_BATCH_SIZE] for i in range(0, len(orphans), DELETE_BATCH_SIZE)]
+                for i in range(0, len(batches), PARALLEL_BATCHES):
+                    if time.monotonic() >= self.deadline:
+                        complete = False
+                        break
+                    removed += sum(executor.map(self._delete_batch, batches[i:i + PARALLEL_BATCHES]))
+
+        result = {
+            'documents_scanned': scanned,
+            'referenced_blobs': len(referenced),
+            'complete': complete
+        }
+        if self.dry_run:
+            result['documents_to_remove'] = len(orphans)
+        else:
+            result['documents_removed'] = removed
+
+        logger.info(f"Inventory blob sweep: {result}")
+        return result
+
+    def _load_checkpoint(self, collection: str, rule: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = self.db.collection(CHECKPOINT_COLLECTION).document(collection).get()
+        checkpoint = snapshot.to_dict() if snapshot.exists else None
+
+        if checkpoint and not checkpoint.get('complete') and checkpoint.get('dry_run') == self.dry_run:
+            checkpoint['resumed'] = True
+            return checkpoint
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=rule['days'])
+        checkpoint = {
+            'cutoff': format_cutoff(cutoff, rule),
+            'retention_days': rule['days'],
+            'dry_run': self.dry_run,
+            'last_value': None,
+            'last_id': None,
+            'scanned': 0,
+            'removed': 0,
+            'estimated_bytes': 0,
+            'complete': False,
+            'resumed': False
+        }
+        if rule.get('shard_field'):
+            # Whole hour buckets before the cutoff, shard by shard
+            checkpoint['bucket_cutoff'] = hour_bucket(int(cutoff.timestamp() * 1000))
+            checkpoint['shard'] = 0
+        return checkpoint
+
+    def _save_checkpoint(self, collection: str, checkpoint: Dict[str, Any]) -> None:
+        checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+        self.db.collection(CHECKPOINT_COLLECTION).document(collection).set(checkpoint)
+
+    def _next_page(self, collection: str, rule: Dict[str, Any], checkpoint: Dict[str, Any]) -> Tuple[str, List]:
+        """(field ordered by, next page of expired documents) after the checkpoint.
+
+        Sharded collections are scanned one shard at a time by their bucket
+        field, then once by the time field for documents written before they
+        were sharded.
+        """
+        collection_ref = self.db.collection(collection)
+        if rule.get('shard_field') and checkpoint.get('shard', KEY_SHARDS) < KEY_SHARDS:
+            field = rule['bucket_field']
+            query = collection_ref.where(rule['shard_field'], '==', checkpoint['shard'])\
+                                  .where(field, '<', checkpoint['bucket_cutoff'])
+        else:
+            field = rule['time_field']
+            query = collection_ref.where(field, '<', checkpoint['cutoff'])
+        query = query.order_by(field).order_by('__name__')
+
+        # Deleting only needs references; dry runs need the data to size it
+        if not self.dry_run:
+            query = query.select([field])
+
+        if checkpoint['last_id'] is not None:
+            query = query.start_after({
+                field: checkpoint['last_value'],
+                '__name__': collection_ref.document(checkpoint['last_id'])
+            })
+
+        try:
+            return field, list(query.limit(PAGE_SIZE).stream())
+        except FailedPrecondition:
+            if not rule.get('shard_field'):
+                raise
+            # The time field index is exempted once no unsharded documents are left
+            logger.info(f"Retention for {collection}: no {field} index, skipping unsharded documents")
+            return field, []
+
+    def _delete_batch(self, docs: List) -> int:
+        batch = self.db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        return len(docs)
+
+    def _compact_collection(self, collection: str, rule: Dict[str, Any]) -> Dict[str, Any]:
+        checkpoint = self._load_checkpoint(collection, rule)
+        logger.info(f"Retention for {collection}: cutoff {checkpoint['cutoff']}, dry_run={self.dry_run}, "
+                    f"resumed={checkpoint['resumed']}")
+
+        with ThreadPoolExecutor(max_workers=PARALLEL_BATCHES) as executor:
+            while time.monotonic() < self.deadline:
+                field, docs = self._next_page(collection, rule, checkpoint)
+                if not docs:
+                    if rule.get('shard_field') and checkpoint.get('shard', KEY_SHARDS) < KEY_SHARDS:
+                        checkpoint.update(shard=checkpoint['shard'] + 1, last_value=None, last_id=None)
+                        continue
+                    checkpoint['complete'] = True
+                    break
+
+                checkpoint['scanned'] += len(docs)
+                if self.dry_run:
+                    checkpoint['removed'] += len(docs)
+                    checkpoint['estimated_bytes'] += sum(
+                        estimate_document_size(collection, doc.id, doc.to_dict()) for doc in docs
+                    )
+                else:
+                    batches = [docs[i:i + DELETE_BATCH_SIZE] for i in range(0, len(docs), DELETE_BATCH_SIZE)]
+                    checkpoint['removed'] += sum(executor.map(self._delete_batch, batches))
+
+                last = docs[-1]
+                checkpoint['last_value'] = last.get(field)
+                checkpoint['last_id'] = last.id
+                self._save_checkpoint(collection, checkpoint)
+
+        self._save_checkpoint(collection, checkpoint)
+        result = {
+            'cutoff': checkpoint['cutoff'],
+            'retention_days': checkpoint['retention_days'],
+            'documents_scanned': checkpoint['scanned'],
+            'complete': checkpoint['complete'],
+            'resumed': checkpoint['resumed']
+        }
+        if self.dry_run:
+            result['documents_to_remove'] = checkpoint['removed']
+            result['estimated_bytes_saved'] = checkpoint['estimated_bytes']
+        else:
+            result['documents_removed'] = checkpoint['removed']
+
+        logger.info(f"Retention for {collection}: {result}")
+        return result
+
+@functions_framework.http
+def run_retention(request):
+    """HTTP Cloud Function entry point for the retention/compaction job"""
+    try:
+        dry_run = str(request.args.get('dry_run', 'false')).lower() in ('1', 'true', 'yes')
+        collections = request.args.get('collections')
+        collections = [c.strip() for c in collections.split(',') if c.strip()] if collections else None
+
+        job = RetentionJob(dry_run=dry_run)
+        report = job.run(collections)
+
+        response = {
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'dry_run': dry_run,
+            'complete': all(r['complete'] for r in report.values()),
+            'collections': report
+        }
+
+        logger.info(f"Retention job completed: {response}")
+        return response, 200
+
+    except ValueError as e:
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Retention job failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+# For local testing
+if __name__ == '__main__':
+    class MockRequest:
+        def __init__(self):
+            self.args = {'dry_run': 'true'}
+
+    result = run_retention(MockRequest())
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_COLLECTION = 'network-inventory'
+BLOB_COLLECTION = 'inventory-blobs'
+# One document per project (ID = project ID): a copy of its newest inventory manifest
+LATEST_COLLECTION = 'inventory-latest'
+
+SNAPSHOT_FORMAT = 'content-addressed-v1'
+
+# Resource hashes per chunk blob; keeps chunk documents far below the 1 MiB limit
+CHUNK_SIZE = 1000
+
+def content_hash(value: Any) -> str:
+    """Hash of the canonical JSON form of a value"""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+def _known_hashes(storage, manifest: Optional[Dict[str, Any]]) -> set:
+    """Blob hashes already stored by the previous snapshot"""
+    if not manifest or manifest.get('snapshot_format') != SNAPSHOT_FORMAT:
+        return set()
+
+    chunk_hashes = [h for section in manifest['sections'].values() for h in section['chunks']]
+    known = set(chunk_hashes)
+    for chunk in storage.get_documents(BLOB_COLLECTION, chunk_hashes).values():
+        known.update(chunk['hashes'])
+    return known
+
+def write_snapshot(storage, doc_id: str, data: Dict[str, Any],
+                   collection: str = INVENTORY_COLLECTION) -> Dict[str, Any]:
+    """Store an inventory dict as a manifest of content-addressed blobs.
+
+    Every list-valued key becomes a section: each resource is stored once
+    under its content hash, sections are split into chunk blobs of resource
+    hashes, and the manifest lists the chunk hashes. Blobs already referenced
+    by the project's previous snapshot in the same collection are not written
+    again. Inventory manifests are also copied to the project's document in
+    LATEST_COLLECTION, so readers of every project's current inventory fetch
+    one document per project. Returns write statistics.
+    """
+    previous = storage.latest_document(collection, {'project_id': data['project_id']})
+    known = _known_hashes(storage, previous[1] if previous else None)
+
+    manifest = {key: value for key, value in data.items() if not isinstance(value, list)}
+    manifest['snapshot_format'] = SNAPSHOT_FORMAT
+    manifest['sections'] = {}
+
+    new_blobs = {}
+    total_resources = 0
+    created_at = datetime.now(timezone.utc).isoformat()
+    for section, resources in data.items():
+        if not isinstance(resources, list):
+            continue
+
+        chunks = []
+        for i in range(0, len(resources), CHUNK_SIZE):
+            hashes = []
+            for resource in resources[i:i + CHUNK_SIZE]:
+                resource_hash = content_hash(resource)
+                hashes.append(resource_hash)
+                if resource_hash not in known:
+                    new_blobs[resource_hash] = {
+                        'kind': 'resource', 'section': section, 'data': resource, 'created_at': created_at
+                    }
+
+            chunk_hash = content_hash(hashes)
+            chunks.append(chunk_hash)
+            if chunk_hash not in known:
+                new_blobs[chunk_hash] = {'kind': 'chunk', 'hashes': hashes, 'created_at': created_at}
+
+        manifest['sections'][section] = {'count': len(resources), 'chunks': chunks}
+        total_resources += len(resources)
+
+    # Blobs before the manifest, so a manifest never points at missing content
+    if new_blobs:
+        storage.set_documents(BLOB_COLLECTION, new_blobs)
+    storage.set_document(collection, doc_id, manifest)
+    if collection == INVENTORY_COLLECTION:
+        storage.set_document(LATEST_COLLECTION, data['project_id'], dict(manifest, manifest_id=doc_id))
+
+    stats = {
+        'resources': total_resources,
+        'blobs_written': len(new_blobs),
+        'blobs_reused': total_resources + sum(len(s['chunks']) for s in manifest['sections'].values()) - len(new_blobs)
+    }
+    logger.info(f"Stored inventory snapshot {doc_id}: {stats}")
+    return stats
+
+class InventorySnapshot:
+    """Lazily rebuilt inventory snapshot.
+
+    Sections are fetched from blob storage on first access, so callers that
+    only need firewall rules never read subnet blobs.
+    """
+
+    def __init__(self, storage, doc_id: str, manifest: Dict[str, Any]):
+        self.storage = storage
+        self.doc_id = doc_id
+        self.manifest = manifest
+        self._sections = {}
+
+    @property
+    def is_legacy(self) -> bool:
+        """Snapshots written before content addressing hold their sections inline"""
+        return self.manifest.get('snapshot_format') != SNAPSHOT_FORMAT
+
+    @property
+    def section_names(self) -> List[str]:
+        if self.is_legacy:
+            return [key for key, value in self.manifest.items() if isinstance(value, list)]
+        return list(self.manifest['sections'])
+
+    def section(self, name: str) -> List[Dict[str, Any]]:
+        """Resources of one section, in collection order"""
+        if self.is_legacy:
+            return self.manifest.get(name, [])
+        if name in self._sections:
+            return self._sections[name]
+        if name not in self.manifest['sections']:
+            raise KeyError(f"Snapshot {self.doc_id} has no section {name}")
+
+        chunk_hashes = self.manifest['sections'][name]['chunks']
+        chunks = self.storage.get_documents(BLOB_COLLECTION, chunk_hashes)
+        resource_hashes = [h for chunk_hash in chunk_hashes for h in chunks[chunk_hash]['hashes']]
+
+        blobs = self.storage.get_documents(BLOB_COLLECTION, list(dict.fromkeys(resource_hashes)))
+        missing = [h for h in resource_hashes if h not in blobs]
+        if missing:
+            raise ValueError(f"Snapshot {self.doc_id} references {len(missing)} missing blobs in {name}")
+
+        resources = [dict(blobs[h]['data']) for h in resource_hashes]
+        self._sections[name] = resources
+        return resources
+
+    def resource_hashes(self, name: str) -> List[str]:
+        """Content hashes of one section's resources, read from chunk blobs only"""
+        if self.is_legacy:
+            return [content_hash(resource) for resource in self.manifest.get(name, [])]
+        if name not in self.manifest['sections']:
+            return []
+        chunk_hashes = self.manifest['sections'][name]['chunks']
+        chunks = self.storage.get_documents(BLOB_COLLECTION, chunk_hashes)
+        return [h for chunk_hash in chunk_hashes for h in chunks[chunk_hash]['hashes']]
+
+    def to_dict(self, sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Rebuild the inventory dict, limited to the requested sections"""
+        if self.is_legacy:
+            result = {k: v for k, v in self.manifest.items() if not isinstance(v, list)}
+        else:
+            result = {k: v for k, v in self.manifest.items() if k not in ('sections', 'snapshot_format')}
+        for name in sections if sections is not None else self.section_names:
+            result[name] = self.section(name)
+        return result
+
+def load_snapshot(storage, project_id: Optional[str] = None, doc_id: Optional[str] = None,
+                  collection: str = INVENTORY_COLLECTION) -> Optional[InventorySnapshot]:
+    """Open a snapshot by document ID, or the newest one for a project"""
+    if doc_id is not None:
+        manifest = storage.get_documents(collection, [doc_id]).get(doc_id)
+        return InventorySnapshot(storage, doc_id, manifest) if manifest else None
+
+    latest = storage.latest_document(collection, {'project_id': project_id})
+    return InventorySnapshot(storage, latest[0], latest[1]) if latest else None
@@ -0,0 +1,285 @@
+import logging
+import os
+import threading
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+from local_store import (DocumentLog, TimeSeriesEngine, SeriesRange, SERIES_KEY_FIELDS,
+                         series_id, series_key, to_epoch_ms, from_epoch_ms)
+from keys import KEY_SHARDS, hour_bucket, series_shard
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Firestore allows 500 operations per batch; stay under it
+FIRESTORE_BATCH_SIZE = 450
+
+METRICS_COLLECTION = 'network-metrics'
+
+# Metric shards queried at once by read_series
+READ_PARALLELISM = 8
+
+# Metric points carry the Monitoring API end time format
+METRIC_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+class FirestoreStorage:
+    """Storage backend writing to Firestore (the default)"""
+
+    def __init__(self, client=None):
+        self.db = client or firestore.Client()
+
+    def set_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        with span(collection, kind='commit', items=1):
+            self.db.collection(collection).document(doc_id).set(data)
+
+    def create_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        """Write a document unless it exists; returns whether this call created it"""
+        try:
+            with span(collection, kind='commit', items=1):
+                self.db.collection(collection).document(doc_id).create(data)
+            return True
+        except AlreadyExists:
+            return False
+
+    def increment(self, collection: str, doc_id: str, counts: Dict[str, int]) -> Dict[str, Any]:
+        """Atomically add to numeric fields of an existing document; returns it as updated"""
+        doc_ref = self.db.collection(collection).document(doc_id)
+        with span(collection, kind='commit', items=1):
+            doc_ref.update({field: firestore.Increment(count) for field, count in counts.items()})
+        # Concurrent increments may already be included; never fewer than this call's
+        return doc_ref.get().to_dict()
+
+    def _write_batched(self, collection: str, items: List) -> int:
+        """Write (doc_id, data) pairs in batched commits; None IDs are generated"""
+        collection_ref = self.db.collection(collection)
+        for i in range(0, len(items), FIRESTORE_BATCH_SIZE):
+            batch = self.db.batch()
+            for doc_id, document in items[i:i + FIRESTORE_BATCH_SIZE]:
+                batch.set(collection_ref.document(doc_id) if doc_id else collection_ref.document(), document)
+            with span(collection, kind='commit', items=min(FIRESTORE_BATCH_SIZE, len(items) - i)):
+                batch.commit()
+        return len(items)
+
+    def set_documents(self, collection: str, documents: Dict[str, Dict[str, Any]]) -> int:
+        """Write documents with known IDs in batched commits"""
+        return self._write_batched(collection, list(documents.items()))
+
+    def add_documents(self, collection: str, documents: List[Dict[str, Any]]) -> int:
+        """Write documents with generated IDs in batched commits"""
+        return self._write_batched(collection, [(None, d) for d in documents])
+
+    def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch documents by ID; missing ones are left out"""
+        collection_ref = self.db.collection(collection)
+        refs = [collection_ref.document(doc_id) for doc_id in doc_ids]
+        return {snap.id: snap.to_dict() for snap in self.db.get_all(refs) if snap.exists}
+
+    def find_documents(self, collection: str, filters: Dict[str, Any], limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """(doc_id, data) of up to limit documents matching equality filters, in no particular order"""
+        query = self.db.collection(collection)
+        for field, value in filters.items():
+            query = query.where(field, '==', value)
+        return [(doc.id, doc.to_dict()) for doc in query.limit(limit).stream()]
+
+    def latest_document(self, collection: str, filters: Dict[str, Any], order_field: str = 'timestamp'):
+        """(doc_id, data) of the newest document matching equality filters, or None"""
+        query = self.db.collection(collection)
+        for field, value in filters.items():
+            query = query.where(field, '==', value)
+        query = query.order_by(order_field, direction=firestore.Query.DESCENDING).limit(1)
+        for doc in query.stream():
+            return doc.id, doc.to_dict()
+        return None
+
+    def get_binary(self, collection: str, names: List[str]) -> Dict[str, bytes]:
+        """Fetch opaque binary state blobs by name; missing ones are left out"""
+        return {name: bytes(data['data']) for name, data in self.get_documents(collection, names).items()}
+
+    def set_binary(self, collection: str, blobs: Dict[str, bytes]) -> int:
+        """Store opaque binary state blobs (each under the 1 MiB document limit)"""
+        return self.set_documents(collection, {name: {'data': data} for name, data in blobs.items()})
+
+    def write_metrics(self, metrics: List[Dict[str, Any]], idempotent: bool = False) -> int:
+        """Write time-series points, one document per point.
+
+        Each point gets a shard and its hour bucket. The timestamp fields are
+        exempt from single-field indexing, so writes do not all land at the end
+        of one index range; reads and retention go through composite indexes
+        that lead with the shard.
+
+        Idempotent writes key each point by series and timestamp, so writing
+        the same points again overwrites them instead of duplicating them;
+        their shard is the series'. Other points are spread over the shards
+        by position, which saves hashing every point's labels.
+        """
+        items = []
+        times = {}
+        for position, point in enumerate(metrics):
+            # Points of one run share a few timestamps; convert each once
+            converted = times.get(point['timestamp'])
+            if converted is None:
+                epoch_ms = to_epoch_ms(point['timestamp'])
+                converted = times[point['timestamp']] = (epoch_ms, hour_bucket(epoch_ms))
+            epoch_ms, point['hour'] = converted
+            if idempotent:
+                sid = series_id(series_key(point))
+                point['shard'] = series_shard(sid)
+                items.append((f"{sid}_{epoch_ms}", point))
+            else:
+                point['shard'] = position % KEY_SHARDS
+                items.append((None, point))
+        return self._write_batched(METRICS_COLLECTION, items)
+
+    def _read_shard(self, project_id: str, metric_type: str, shard: int, start_ms: int, end_ms: int) -> List[Dict]:
+        query = self.db.collection(METRICS_COLLECTION)\
+            .where('project_id', '==', project_id)\
+            .where('metric_type', '==', metric_type)\
+            .where('shard', '==', shard)\
+            .where('timestamp', '>=', from_epoch_ms(start_ms).strftime(METRIC_TIMESTAMP_FORMAT))\
+            .where('timestamp', '<', from_epoch_ms(end_ms).strftime(METRIC_TIMESTAMP_FORMAT))\
+            .select(list(SERIES_KEY_FIELDS) + ['timestamp', 'value'])
+        return [doc.to_dict() for doc in query.stream()]
+
+    def read_series(self, project_id: str, metric_type: str, start_ms: int, end_ms: int) -> List[SeriesRange]:
+        """Points of one metric type with start_ms <= timestamp < end_ms, grouped by series.
+
+        The shards are queried in parallel. A series may span shards, so its
+        points are put back in time order after grouping.
+        """
+        with ThreadPoolExecutor(max_workers=READ_PARALLELISM) as executor:
+            shards = list(executor.map(
+                lambda shard: self._read_shard(project_id, metric_type, shard, start_ms, end_ms), range(KEY_SHARDS)
+            ))
+
+        series = {}
+        for data in (data for documents in shards for data in documents):
+            if data.get('value') is None:
+                continue
+            key = series_key(data)
+            sid = series_id(key)
+            if sid not in series:
+                series[sid] = (key, array('q'), array('d'))
+            series[sid][1].append(to_epoch_ms(data['timestamp']))
+            series[sid][2].append(float(data['value']))
+        ranges = []
+        for sid, (key, timestamps, values) in series.items():
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            ranges.append(SeriesRange(sid, key, [(array('q', (timestamps[i] for i in order)),
+                                                  array('d', (values[i] for i in order)))]))
+        return ranges
+
+class LocalStorage:
+    """Embedded storage backend for isolated hosts and offline benchmarks.
+
+    Metric points go to the append-only TimeSeriesEngine, all other documents
+    to per-collection NDJSON logs under the same root directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.documents = DocumentLog(os.path.join(root, 'documents'))
+        self.timeseries = TimeSeriesEngine(os.path.join(root, 'timeseries'))
+        self._lock = threading.Lock()
+
+    def set_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        with span(collection, kind='commit', items=1):
+            self.documents.write(collection, [(doc_id, data)])
+
+    def set_documents(self, collection: str, documents: Dict[str, Dict[str, Any]]) -> int:
+        with span(collection, kind='commit', items=len(documents)):
+            return self.documents.write(collection, list(documents.items()))
+
+    def add_documents(self, collection: str, documents: List[Dict[str, Any]]) -> int:
+        with span(collection, kind='commit', items=len(documents)):
+            return self.documents.write(collection, [(uuid.uuid4().hex[:20], d) for d in documents])
+
+    def create_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        # Atomic within this process, which is all the local backend serves
+        with self._lock, span(collection, kind='commit', items=1):
+            if doc_id in self.documents.read(collection):
+                return False
+            self.documents.write(collection, [(doc_id, data)])
+            return True
+
+    def increment(self, collection: str, doc_id: str, counts: Dict[str, int]) -> Dict[str, Any]:
+        with self._lock, span(collection, kind='commit', items=1):
+            document = self.documents.read(collection)[doc_id]
+            for field, count in counts.items():
+                document[field] = document.get(field, 0) + count
+            self.documents.write(collection, [(doc_id, document)])
+            return document
+
+    def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        documents = self.documents.read(collection)
+        return {doc_id: documents[doc_id] for doc_id in doc_ids if doc_id in documents}
+
+    def find_documents(self, collection: str, filters: Dict[str, Any], limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (doc_id, data) for doc_id, data in self.documents.read(collection).items()
+            if all(data.get(field) == value for field, value in filters.items())
+        ][:limit]
+
+    def latest_document(self, collection: str, filters: Dict[str, Any], order_field: str = 'timestamp'):
+        matches = [
+            (doc_id, data) for doc_id, data in self.documents.read(collection).items()
+            if all(data.get(field) == value for field, value in filters.items()) and order_field in data
+        ]
+        if not matches:
+            return None
+        return max(matches, key=lambda item: item[1][order_field])
+
+    def _binary_path(self, collection: str, name: str) -> str:
+        return os.path.join(self.root, 'binary', collection, f"{name}.bin")
+
+    def get_binary(self, collection: str, names: List[str]) -> Dict[str, bytes]:
+        blobs = {}
+        for name in names:
+            path = self._binary_path(collection, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    blobs[name] = f.read()
+        return blobs
+
+    def set_binary(self, collection: str, blobs: Dict[str, bytes]) -> int:
+        os.makedirs(os.path.join(self.root, 'binary', collection), exist_ok=True)
+        for name, data in blobs.items():
+            # Replace atomically so a crash never leaves a torn state file
+            path = self._binary_path(collection, name)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+        return len(blobs)
+
+    def write_metrics(self, metrics: List[Dict[str, Any]], idempotent: bool = False) -> int:
+        # Series only take points newer than their last, so rewrites are always dropped
+        with span(METRICS_COLLECTION, kind='commit', items=len(metrics)):
+            return self.timeseries.write_points(metrics)
+
+    def read_series(self, project_id: str, metric_type: str, start_ms: int, end_ms: int) -> List[SeriesRange]:
+        return [
+            self.timeseries.range(sid, start_ms, end_ms - 1)
+            for sid, _ in self.timeseries.find_series(project_id=project_id, metric_type=metric_type)
+        ]
+
+_storage = None
+
+def get_storage():
+    """Storage backend selected by STORAGE_BACKEND ('firestore' or 'local').
+
+    The local backend keeps its files under LOCAL_STORAGE_PATH.
+    """
+    global _storage
+    if _storage is None:
+        backend = os.environ.get('STORAGE_BACKEND', 'firestore').lower()
+        if backend == 'local':
+            root = os.environ.get('LOCAL_STORAGE_PATH', 'local-data')
+            _storage = LocalStorage(root)
+            logger.info(f"Using local storage at {root}")
+        elif backend == 'firestore':
+            _storage = FirestoreStorage()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return _storage
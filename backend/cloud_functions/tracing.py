@@ -0,0 +1,235 @@
+import contextvars
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+from keys import document_id
+
+logger = logging.getLogger(__name__)
+
+RUNS_COLLECTION = 'collector-runs'
+
+# Spans kept in the stored report, slowest first; stages are always complete
+MAX_REPORT_SPANS = 200
+
+# Limits the run is measured against; Cloud Functions sets these in the environment
+DEFAULT_TIMEOUT_SECONDS = 540
+DEFAULT_MEMORY_MB = 512
+
+_current = contextvars.ContextVar('collector_run', default=None)
+
+class Span:
+    """One timed stage: an API list call, a page, a query, a conversion or a commit"""
+    __slots__ = ('name', 'kind', 'attributes', 'items', 'start', 'duration', 'peak_bytes', 'depth')
+
+    def __init__(self, name: str, kind: str, items: Optional[int], attributes: Dict[str, Any], depth: int):
+        self.name = name
+        self.kind = kind
+        self.items = items
+        self.attributes = attributes
+        self.depth = depth
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.peak_bytes = None
+
+    def add(self, count: int = 1) -> None:
+        self.items = (self.items or 0) + count
+
+    def to_dict(self, run_start: float) -> Dict[str, Any]:
+        record = {
+            'name': self.name,
+            'kind': self.kind,
+            'offset_ms': round((self.start - run_start) * 1000, 2),
+            'duration_ms': round(self.duration * 1000, 2),
+            'depth': self.depth
+        }
+        if self.items is not None:
+            record['items'] = self.items
+        if self.peak_bytes is not None:
+            record['peak_mb'] = round(self.peak_bytes / 2 ** 20, 2)
+        if self.attributes:
+            record['attributes'] = self.attributes
+        return record
+
+class RunTracer:
+    """Spans of one collector run, with per-span peak memory from tracemalloc.
+
+    tracemalloc keeps a single peak, so each span resets it on entry and the
+    peaks seen inside a span are carried up to its parent on exit; every
+    span reports the peak of its own extent and the run reports the overall
+    one.
+    """
+
+    def __init__(self, function: str, project_id: str, track_memory: bool = True):
+        self.function = function
+        self.project_id = project_id
+        self.track_memory = track_memory
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self._peaks: List[int] = [0]   # highest peak seen so far in each open span, run at the bottom
+        self.duration = None
+        self.peak_bytes = None
+
+    def _peak(self) -> int:
+        return tracemalloc.get_traced_memory()[1]
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'stage', items: Optional[int] = None, **attributes):
+        span = Span(name, kind, items, attributes, len(self._peaks) - 1)
+        if self.track_memory:
+            self._peaks[-1] = max(self._peaks[-1], self._peak())
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            if self.track_memory:
+                span.peak_bytes = max(self._peaks.pop(), self._peak())
+                self._peaks[-1] = max(self._peaks[-1], span.peak_bytes)
+            self.spans.append(span)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({'span': span.to_dict(self.start), 'run': self.function}))
+
+    def pages(self, name: str, pager, **attributes) -> List:
+        """Drain a list call into a list, with a span per page fetched.
+
+        Client library pagers expose .pages; each page's fetch is timed as a
+        page span. Plain iterables are timed as a whole.
+        """
+        items = []
+        with self.span(name, kind='list', **attributes) as call:
+            if hasattr(pager, 'pages'):
+                pages = iter(pager.pages)
+                number = 0
+                while True:
+                    with self.span(name, kind='page', page=number) as page_span:
+                        page = next(pages, None)
+                        page_items = _page_items(page) if page is not None else []
+                        page_span.items = len(page_items)
+                    if page is None:
+                        # The last span timed only the end of iteration
+                        self.spans.pop()
+                        break
+                    items.extend(page_items)
+                    number += 1
+            else:
+                items = list(pager)
+            call.items = len(items)
+        return items
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start
+        if self.track_memory:
+            self.peak_bytes = max(self._peaks[0], self._peak())
+
+    def stages(self) -> List[Dict[str, Any]]:
+        """Spans aggregated by kind and name, in order of first appearance"""
+        stages: Dict[tuple, Dict[str, Any]] = {}
+        for span in sorted(self.spans, key=lambda s: s.start):
+            stage = stages.setdefault((span.kind, span.name), {
+                'name': span.name, 'kind': span.kind, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'items': 0
+            })
+            stage['count'] += 1
+            stage['total_ms'] += span.duration * 1000
+            stage['max_ms'] = max(stage['max_ms'], span.duration * 1000)
+            stage['items'] += span.items or 0
+            if span.peak_bytes is not None:
+                stage['peak_mb'] = max(stage.get('peak_mb', 0.0), span.peak_bytes / 2 ** 20)
+        for stage in stages.values():
+            for field in ('total_ms', 'max_ms', 'peak_mb'):
+                if field in stage:
+                    stage[field] = round(stage[field], 2)
+        return list(stages.values())
+
+    def report(self, include_spans: bool = True) -> Dict[str, Any]:
+        if self.duration is None:
+            self.finish()
+        timeout = float(os.environ.get('FUNCTION_TIMEOUT_SEC', DEFAULT_TIMEOUT_SECONDS))
+        memory_mb = float(os.environ.get('FUNCTION_MEMORY_MB', DEFAULT_MEMORY_MB))
+        # ru_maxrss is in KiB on Linux
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        report = {
+            'function': self.function,
+            'project_id': self.project_id,
+            'timestamp': self.started_at.isoformat(),
+            'duration_ms': round(self.duration * 1000, 2),
+            'timeout_used_percent': round(self.duration / timeout * 100, 1),
+            'max_rss_mb': round(rss_mb, 1),
+            'memory_used_percent': round(rss_mb / memory_mb * 100, 1),
+            'span_count': len(self.spans),
+            'stages': self.stages()
+        }
+        if self.peak_bytes is not None:
+            report['traced_peak_mb'] = round(self.peak_bytes / 2 ** 20, 2)
+        if include_spans:
+            slowest = sorted(self.spans, key=lambda s: s.duration, reverse=True)[:MAX_REPORT_SPANS]
+            report['slowest_spans'] = [span.to_dict(self.start) for span in slowest]
+        return report
+
+def _page_items(page) -> List:
+    """Items of one page: a list, or the repeated / map field of a list response"""
+    if isinstance(page, list):
+        return page
+    for field in ('time_series', 'entries', 'items'):
+        items = getattr(page, field, None)
+        if items is not None:
+            # Aggregated lists map scope -> scoped list, and iterate as pairs
+            return list(items.items()) if callable(getattr(items, 'items', None)) else list(items)
+    return list(page)
+
+def current() -> Optional[RunTracer]:
+    return _current.get()
+
+def span(name: str, kind: str = 'stage', items: Optional[int] = None, **attributes):
+    """Span on the active run, or a no-op outside one"""
+    tracer = _current.get()
+    if tracer is None:
+        return nullcontext(Span(name, kind, items, attributes, 0))
+    return tracer.span(name, kind, items, **attributes)
+
+def pages(name: str, pager, **attributes) -> List:
+    tracer = _current.get()
+    return tracer.pages(name, pager, **attributes) if tracer is not None else list(pager)
+
+@contextmanager
+def collector_run(function: str, project_id: str, track_memory: Optional[bool] = None):
+    """Trace a collector run.
+
+    Per-span peak memory needs tracemalloc, which slows allocation-heavy
+    stages several times over, so it is only tracked with TRACE_MEMORY=1;
+    the report always carries the process max RSS.
+    """
+    if track_memory is None:
+        track_memory = os.environ.get('TRACE_MEMORY') == '1'
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracer = RunTracer(function, project_id, track_memory)
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        tracer.finish()
+        _current.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+def store_run_report(storage, tracer: RunTracer, status: str = 'success') -> Dict[str, Any]:
+    """Store the full report in collector-runs; returns the summary for the function response"""
+    report = dict(tracer.report(), status=status)
+    try:
+        storage.set_document(RUNS_COLLECTION, document_id(tracer.project_id, tracer.started_at), report)
+    except Exception as e:
+        logger.error(f"Failed to store run report: {str(e)}")
+    slowest = max(report['stages'], key=lambda stage: stage['total_ms'], default=None)
+    logger.info(f"{tracer.function} run: {report['duration_ms']:.0f} ms in {report['span_count']} spans, "
+                f"max RSS {report['max_rss_mb']} MB"
+                + (f", slowest stage {slowest['kind']} {slowest['name']} ({slowest['total_ms']:.0f} ms)" if slowest else ''))
+    return {key: value for key, value in report.items() if key != 'slowest_spans'}
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional
+import functions_framework
+import numpy as np
+from storage import get_storage
+from snapshots import load_snapshot
+from local_store import to_epoch_ms, from_epoch_ms
+from cost_engine import ALIGNMENT_SECONDS, EGRESS_METRIC, flatten_points, region_of
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MATRICES_COLLECTION = 'traffic-matrices'
+INGRESS_METRIC = 'compute.googleapis.com/instance/network/received_bytes_count'
+
+LEVELS = ('zone', 'region')
+BUCKET_SECONDS = 3600
+
+# The newest stored bucket is recomputed each run to pick up late points;
+# a project without matrices, or one that fell behind, starts this far back
+MAX_CATCHUP = timedelta(days=2)
+
+# Entries below one byte are estimation noise, not traffic
+MIN_ENTRY_BYTES = 1.0
+
+class TrafficMatrixBuilder:
+    """Sparse zone x zone and region x region byte matrices per time bucket.
+
+    Per-instance sent and received byte series are placed by the instance's
+    zone and subnet region from the inventory, falling back to the series'
+    zone label. All points are flattened and deduplicated (flatten_points),
+    then one bincount per direction gives bytes per (bucket, zone).
+
+    Instance metrics carry no destination, so each bucket's matrix is the
+    gravity estimate: a zone's sent bytes are split across destination zones
+    in proportion to the bytes they received, T[i, j] = S[i] R[j] / sum(R),
+    computed for all buckets at once by broadcasting. Region matrices are the
+    zone matrices summed through a zone-to-region indicator, so both levels
+    stay consistent. Sent and received totals include internet traffic,
+    which the estimate spreads over the zones like any other bytes.
+    """
+
+    def __init__(self, interfaces: Optional[List[Dict[str, Any]]] = None,
+                 subnetworks: Optional[List[Dict[str, Any]]] = None):
+        subnet_regions = {
+            (subnet.get('network', ''), subnet.get('name', '')): subnet.get('region', '')
+            for subnet in subnetworks or []
+        }
+        # Primary interface decides placement; later interfaces only fill gaps
+        self.placement: Dict[str, tuple] = {}
+        for interface in interfaces or []:
+            instance_id = str(interface.get('instance_id', ''))
+            if instance_id in self.placement or not interface.get('zone'):
+                continue
+            zone = interface['zone']
+            region = subnet_regions.get((interface.get('network', ''), interface.get('subnetwork', ''))) \
+                or region_of(zone)
+            self.placement[instance_id] = (zone, region)
+
+    def _place(self, series) -> Optional[tuple]:
+        labels = series.key.get('resource_labels') or {}
+        placed = self.placement.get(str(labels.get('instance_id', '')))
+        if placed:
+            return placed
+        zone = labels.get('zone', '')
+        return (zone, region_of(zone)) if zone else None
+
+    def _bucket_bytes(self, series_ranges: List, zone_index: Dict[str, int],
+                      start_ms: int, end_ms: int, bucket_ms: int) -> np.ndarray:
+        """bytes[bucket, zone] from ALIGN_RATE points"""
+        n_buckets = (end_ms - start_ms) // bucket_ms
+        placed = [(series, self._place(series)) for series in series_ranges]
+        placed = [(series, where) for series, where in placed if where]
+        if not placed:
+            return np.zeros((n_buckets, len(zone_index)))
+
+        series_zone = np.array([zone_index[where[0]] for _, where in placed], dtype=np.int64)
+        series_ids, timestamps, rates = flatten_points([series for series, _ in placed], start_ms, end_ms)
+        cells = (timestamps - start_ms) // bucket_ms * len(zone_index) + series_zone[series_ids]
+        totals = np.bincount(cells, weights=np.maximum(rates, 0.0) * ALIGNMENT_SECONDS,
+                             minlength=n_buckets * len(zone_index))
+        return totals.reshape(n_buckets, len(zone_index))
+
+    def build(self, sent: List, received: List, start_ms: int, end_ms: int,
+              bucket_seconds: int = BUCKET_SECONDS) -> List[Dict[str, Any]]:
+        """Matrix documents, one per level and bucket with traffic, for [start_ms, end_ms)"""
+        bucket_ms = bucket_seconds * 1000
+        end_ms = start_ms + (end_ms - start_ms) // bucket_ms * bucket_ms
+
+        placements = {where for where in map(self._place, list(sent) + list(received)) if where}
+        zones = sorted({zone for zone, _ in placements})
+        if not zones or end_ms <= start_ms:
+            return []
+        zone_index = {zone: i for i, zone in enumerate(zones)}
+        zone_region = dict(placements)
+        regions = sorted(set(zone_region.values()))
+        to_region = np.zeros((len(zones), len(regions)))
+        for zone, i in zone_index.items():
+            to_region[i, regions.index(zone_region[zone])] = 1.0
+
+        sent_bytes = self._bucket_bytes(sent, zone_index, start_ms, end_ms, bucket_ms)
+        received_bytes = self._bucket_bytes(received, zone_index, start_ms, end_ms, bucket_ms)
+
+        received_total = received_bytes.sum(axis=1)
+        scale = np.divide(1.0, received_total, out=np.zeros_like(received_total), where=received_total > 0)
+        zone_matrices = sent_bytes[:, :, None] * received_bytes[:, None, :] * scale[:, None, None]
+        region_matrices = to_region.T @ zone_matrices @ to_region
+
+        levels = {
+            'zone': (zones, zone_matrices, sent_bytes, received_bytes),
+            'region': (regions, region_matrices, sent_bytes @ to_region, received_bytes @ to_region)
+        }
+        documents = []
+        for level, (labels, matrices, level_sent, level_received) in levels.items():
+            for bucket in np.nonzero(matrices.reshape(len(matrices), -1).max(axis=1) >= MIN_ENTRY_BYTES)[0]:
+                src, dst = np.nonzero(matrices[bucket] >= MIN_ENTRY_BYTES)
+                documents.append({
+                    'level': level,
+                    'timestamp': from_epoch_ms(start_ms + int(bucket) * bucket_ms).isoformat(),
+                    'bucket_seconds': bucket_seconds,
+                    'labels': labels,
+                    'src': src.tolist(),
+                    'dst': dst.tolist(),
+                    'bytes': np.rint(matrices[bucket][src, dst]).astype(np.int64).tolist(),
+                    'sent_bytes': np.rint(level_sent[bucket]).astype(np.int64).tolist(),
+                    'received_bytes': np.rint(level_received[bucket]).astype(np.int64).tolist(),
+                    'method': 'gravity'
+                })
+
+        logger.info(f"Built {len(documents)} traffic matrices over {len(zones)} zones, "
+                    f"{len(regions)} regions and {len(sent_bytes)} buckets")
+        return documents
+
+def matrix_document_id(project_id: str, level: str, bucket_start: datetime) -> str:
+    return f"{project_id}_{level}_{bucket_start:%Y%m%d%H%M}"
+
+def update_traffic_matrices(storage, project_id: str, now: Optional[datetime] = None,
+                            bucket_seconds: int = BUCKET_SECONDS) -> Dict[str, Any]:
+    """Compute matrices for complete buckets since the newest stored one.
+
+    Documents are keyed by project, level and bucket, so recomputing a bucket
+    replaces it; each run costs the new buckets plus the last stored one.
+    """
+    now = now or datetime.now(timezone.utc)
+    bucket_ms = bucket_seconds * 1000
+    end_ms = to_epoch_ms(now) // bucket_ms * bucket_ms
+    earliest_ms = to_epoch_ms(now - MAX_CATCHUP) // bucket_ms * bucket_ms
+
+    latest = storage.latest_document(MATRICES_COLLECTION, {'project_id': project_id, 'level': 'zone'})
+    start_ms = max(to_epoch_ms(latest[1]['timestamp']), earliest_ms) if latest else earliest_ms
+    if start_ms >= end_ms:
+        return {'buckets_computed': 0, 'documents_written': 0}
+
+    snapshot = load_snapshot(storage, project_id)
+    interfaces, subnetworks = [], []
+    if snapshot is not None and 'instance_interfaces' in snapshot.section_names:
+        interfaces = snapshot.section('instance_interfaces')
+        subnetworks = snapshot.section('subnetworks') if 'subnetworks' in snapshot.section_names else []
+    else:
+        logger.warning(f"No instance inventory for {project_id}; placing instances by metric zone labels")
+
+    builder = TrafficMatrixBuilder(interfaces, subnetworks)
+    documents = builder.build(
+        storage.read_series(project_id, EGRESS_METRIC, start_ms, end_ms),
+        storage.read_series(project_id, INGRESS_METRIC, start_ms, end_ms),
+        start_ms, end_ms, bucket_seconds
+    )
+
+    computed_at = now.isoformat()
+    storage.set_documents(MATRICES_COLLECTION, {
+        matrix_document_id(project_id, document['level'], datetime.fromisoformat(document['timestamp'])):
+            dict(document, project_id=project_id, computed_at=computed_at)
+        for document in documents
+    })
+    return {
+        'window_start': from_epoch_ms(start_ms).isoformat(),
+        'window_end': from_epoch_ms(end_ms).isoformat(),
+        'buckets_computed': (end_ms - start_ms) // bucket_ms,
+        'documents_written': len(documents)
+    }
+
+@functions_framework.http
+def compute_traffic_matrices(request):
+    """HTTP Cloud Function entry point for incremental traffic matrix computation"""
+    try:
+        project_id = os.environ.get('GCP_PROJECT') or os.environ.get('GOOGLE_CLOUD_PROJECT')
+        if not project_id:
+            return {'error': 'Project ID not found'}, 400
+
+        stats = update_traffic_matrices(get_storage(), project_id)
+
+        response = {
+            'status': 'success',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            **stats
+        }
+
+        logger.info(f"Traffic matrix computation completed: {response}")
+        return response, 200
+
+    except ValueError as e:
+        return {'error': str(e), 'status': 'failed'}, 400
+    except Exception as e:
+        logger.error(f"Traffic matrix computation failed: {str(e)}")
+        return {'error': str(e), 'status': 'failed'}, 500
+
+# For local testing
+if __name__ == '__main__':
+    os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'your-project-id')
+
+    class MockRequest:
+        def __init__(self):
+            self.args = {}
+
+    result = compute_traffic_matrices(MockRequest())
+    print(json.dumps(result, indent=2))
@@ -1,12 +1,16 @@
 from network_collector import GCPNetworkCollector
 from metrics_collector import GCPMetricsCollector
-from shared.data_models import DataProcessor
+from shared.data_models import (DataProcessor, FirewallRule, Instance, NetworkSummary, cost_insights,
+                                last_segment, security_insights)
+from shared.record_stream import EXTENSIONS, StreamReader, StreamWriter
+from network_collector import REGIONS
+import argparse
 import json
 import os
 from datetime import datetime
+from itertools import groupby
 
-def collect_all_data():
-    """Collect both network resources and metrics"""
+def get_project_id():
     project_id = os.environ.get('GOOGLE_CLOUD_PROJECT')
     if not project_id:
         import subprocess
@@ -17,13 +21,20 @@ def collect_all_data():
         except:
             print("Could not determine project ID")
             return None
+    return project_id
+
+def collect_all_data():
+    """Collect both network resources and metrics"""
+    project_id = get_project_id()
+    if not project_id:
+        return None
     
     print(f"Collecting complete network data for project: {project_id}")
     print("="*70)
     
     # Collect network resources
     network_collector = GCPNetworkCollector(project_id)
-    network_data = network_collector.collect_all_data()
+    inventory = network_collector.collect_all_data()
     
     print("\n" + "="*70)
     
@@ -31,28 +42,21 @@ def collect_all_data():
     try:
         metrics_collector = GCPMetricsCollector(project_id)
         metrics_data = metrics_collector.collect_all_instance_metrics()
-        network_data['metrics'] = metrics_data
+        inventory.metrics = metrics_data
     except Exception as e:
         print(f"Metrics collection failed (this is normal): {e}")
-        network_data['metrics'] = {}
+        inventory.metrics = {}
     
-    # Process data and generate insights
-    processor = DataProcessor(network_data)
+    # Process data and generate insights on the typed inventory; dicts only for output
+    processor = DataProcessor(inventory)
     summary = processor.get_network_summary()
     security_insights = processor.get_security_insights()
     cost_insights = processor.get_cost_insights()
     
     # Add insights to data
-    network_data['summary'] = {
-        'total_networks': summary.total_networks,
-        'total_subnets': summary.total_subnets,
-        'total_instances': summary.total_instances,
-        'total_firewall_rules': summary.total_firewall_rules
-    }
-    network_data['insights'] = {
-        'security': security_insights,
-        'cost': cost_insights
-    }
+    network_data = inventory.to_dict()
+    network_data.setdefault('metrics', {})
+    network_data.update(insights_record(summary, security_insights, cost_insights))
     
     # Save complete data
     output_file = 'complete_network_data.json'
@@ -62,6 +66,25 @@ def collect_all_data():
     print("\n" + "="*70)
     print("COLLECTION COMPLETE!")
     print(f"Data saved to: {output_file}")
+    print_summary(summary, security_insights, cost_insights)
+    
+    return network_data
+
+def insights_record(summary, security_insights, cost_insights):
+    return {
+        'summary': {
+            'total_networks': summary.total_networks,
+            'total_subnets': summary.total_subnets,
+            'total_instances': summary.total_instances,
+            'total_firewall_rules': summary.total_firewall_rules
+        },
+        'insights': {
+            'security': security_insights,
+            'cost': cost_insights
+        }
+    }
+
+def print_summary(summary, security_insights, cost_insights):
     print("\nSummary:")
     print(f"  📊 Networks: {summary.total_networks}")
     print(f"  🌐 Subnets: {summary.total_subnets}")
@@ -77,8 +100,122 @@ def collect_all_data():
         print(f"\n💰 Cost Insights:")
         for insight in cost_insights:
             print(f"  {insight}")
+
+def stream_all_data(output_dir, compression=None):
+    """Collect into resumable compressed NDJSON, one unit per section, region or zone.
+
+    Each unit is written while it is collected and checkpointed once it is
+    complete, so memory holds one region or zone at a time and rerunning
+    with the same output directory continues after the last finished unit.
+    Insights are computed at the end from the written sections: counts come
+    from the checkpoint and instances stream through once, so only the
+    firewall rules are held in memory.
+    """
+    project_id = get_project_id()
+    if not project_id:
+        return None
     
-    return network_data
+    out = StreamWriter(output_dir, project_id, compression)
+    if out.checkpoint['complete']:
+        print(f"{output_dir} already holds a complete collection for {project_id}")
+        return output_dir
+    print(f"{'Resuming' if out.resumed else 'Streaming'} network data for project {project_id} to {output_dir}")
+    print("="*70)
+    
+    network_collector = GCPNetworkCollector(project_id)
+    failed = []
+    
+    def write_unit(section, collect, part=None):
+        # A failed unit is left out of the checkpoint and retried on the next run
+        if out.done(section, part):
+            return
+        try:
+            count = out.write_unit(section, collect(), part)
+            print(f"  {section}{f' [{part}]' if part else ''}: {count}")
+        except Exception as e:
+            print(f"  {section}{f' [{part}]' if part else ''} failed: {e}")
+            failed.append((section, part))
+    
+    write_unit('networks', network_collector.list_networks)
+    write_unit('firewall_rules', network_collector.list_firewall_rules)
+    for region in REGIONS:
+        write_unit('subnets', lambda: network_collector.collect_region_subnets(region), region)
+    
+    # Instances arrive zone by zone from the aggregated list, a zone split
+    # across pages in consecutive pages; each zone is gathered into one unit
+    # named after it, so units are the same whatever the page boundaries
+    zones_seen = set()
+    try:
+        pages = network_collector.iter_instances_by_zone()
+        for zone, zone_pages in groupby(pages, key=lambda page: last_segment(page[0])):
+            instances = [instance for _, page in zone_pages for instance in page]
+            # Should a zone ever come back after another, its later instances are keyed by the first of them
+            part = zone if zone not in zones_seen else f"{zone}@{instances[0].name}"
+            zones_seen.add(zone)
+            write_unit('instances', lambda: instances, part)
+    except Exception as e:
+        print(f"  instances failed: {e}")
+        failed.append(('instances', None))
+    
+    # Metrics per zone for the running instances, read back from the stream;
+    # they wait until every instance unit is written so no zone is partial
+    if any(section == 'instances' for section, _ in failed):
+        print("\n" + "="*70)
+        print(f"{len(failed)} units failed; rerun with the same --output-dir to resume")
+        return None
+    reader = StreamReader(output_dir)
+    running = {}
+    for instance in reader.models('instances', Instance):
+        if instance.status == 'RUNNING':
+            running.setdefault(instance.zone, []).append(instance.name)
+    if running:
+        try:
+            metrics_collector = GCPMetricsCollector(project_id)
+        except Exception as e:
+            print(f"Metrics collection failed (this is normal): {e}")
+            metrics_collector = None
+        for zone, names in sorted(running.items()) if metrics_collector else ():
+            write_unit('metrics', lambda: (
+                {'instance': f"{name}_{zone}", 'metric_type': metric_type, 'points': series.to_points()}
+                for name in names
+                for metric_type, series in metrics_collector.get_instance_metrics(name, zone).items()
+            ), zone)
+    
+    if failed:
+        print("\n" + "="*70)
+        print(f"{len(failed)} units failed; rerun with the same --output-dir to resume")
+        return None
+    
+    reader = StreamReader(output_dir)
+    summary = NetworkSummary(
+        project_id=project_id,
+        collection_timestamp=datetime.fromisoformat(out.collection_timestamp),
+        total_networks=reader.count('networks'),
+        total_subnets=reader.count('subnets'),
+        total_instances=reader.count('instances'),
+        total_firewall_rules=reader.count('firewall_rules')
+    )
+    security = security_insights(list(reader.models('firewall_rules', FirewallRule)))
+    cost = cost_insights(reader.models('instances', Instance))
+    write_unit('insights', lambda: [insights_record(summary, security, cost)])
+    out.finish()
+    
+    print("\n" + "="*70)
+    print("COLLECTION COMPLETE!")
+    print(f"Data streamed to: {output_dir}")
+    print_summary(summary, security, cost)
+    
+    return output_dir
 
 if __name__ == "__main__":
-    collect_all_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Collect network resources, metrics and insights')
+    parser.add_argument('--output-dir', help='Stream resumable compressed NDJSON into this directory '
+                                             'instead of writing complete_network_data.json')
+    parser.add_argument('--compression', choices=sorted(EXTENSIONS),
+                        help='Compression for --output-dir (default: zstd when installed, else gzip)')
+    args = parser.parse_args()
+    
+    if args.output_dir:
+        stream_all_data(args.output_dir, args.compression)
+    else:
+        collect_all_data()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from google.cloud import monitoring_v3
 from google.cloud import compute_v1
+from shared.data_models import MetricSeries, metrics_to_dict, raw_proto
 from datetime import datetime, timedelta
 import json
 import os
@@ -48,20 +49,16 @@ class GCPMetricsCollector:
                 results = self.monitoring_client.list_time_series(request=request, timeout=10)
                 
                 # Process results
-                values = []
+                series = MetricSeries(metric_type)
                 for result in results:
-                    for point in result.points:
-                        values.append({
-                            'timestamp': point.interval.end_time.isoformat(),
-                            'value': point.value.double_value or point.value.int64_value
-                        })
+                    series.add_proto(result)
                 
-                metrics_data[metric_type] = values
-                print(f"  Found {len(values)} data points for {metric_type.split('/')[-1]}")
+                metrics_data[metric_type] = series
+                print(f"  Found {len(series)} data points for {metric_type.split('/')[-1]}")
                 
             except Exception as e:
                 print(f"  Warning: Could not get {metric_type}: {e}")
-                metrics_data[metric_type] = []
+                metrics_data[metric_type] = MetricSeries(metric_type)
         
         return metrics_data
     
@@ -79,6 +76,7 @@ class GCPMetricsCollector:
         for zone, response in instance_list:
             if hasattr(response, 'instances') and response.instances:
                 for instance in response.instances:
+                    instance = raw_proto(instance)
                     if instance.status == 'RUNNING':
                         zone_name = zone.split('/')[-1]
                         metrics = self.get_instance_metrics(instance.name, zone_name)
@@ -104,15 +102,12 @@ class GCPMetricsCollector:
         ]
         
         for metric_type in metric_types:
-            values = []
+            series = MetricSeries(metric_type, integer=True)
             for i in range(12):  # 12 data points over last hour
                 timestamp = now - timedelta(minutes=i*5)
-                values.append({
-                    'timestamp': timestamp.isoformat(),
-                    'value': 1000000 + (i * 50000)  # Sample increasing values
-                })
+                series.append(timestamp.timestamp(), 1000000 + (i * 50000))  # Sample increasing values
             
-            sample_data[metric_type] = values
+            sample_data[metric_type] = series
         
         return sample_data
 
@@ -139,7 +134,7 @@ def main():
             json.dump({
                 'collection_timestamp': datetime.now().isoformat(),
                 'project_id': project_id,
-                'metrics': metrics_data
+                'metrics': metrics_to_dict(metrics_data)
             }, f, indent=2, default=str)
         
         print(f"\nMetrics data saved to {output_file}")
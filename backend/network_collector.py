@@ -1,8 +1,12 @@
 from google.cloud import compute_v1
+from shared.data_models import Inventory, Network, Subnet, FirewallRule, Instance
 import json
 from datetime import datetime
 import os
 
+# Regions scanned for subnets
+REGIONS = ['us-central1', 'us-east1', 'us-west1', 'europe-west1']
+
 class GCPNetworkCollector:
     def __init__(self, project_id):
         self.project_id = project_id
@@ -12,25 +16,17 @@ class GCPNetworkCollector:
         self.firewalls_client = compute_v1.FirewallsClient()
         self.routers_client = compute_v1.RoutersClient()
     
+    def list_networks(self):
+        """VPC networks; errors propagate to the caller"""
+        request = compute_v1.ListNetworksRequest(project=self.project_id)
+        return [Network.from_proto(network) for network in self.networks_client.list(request=request)]
+    
     def collect_networks(self):
         """Collect VPC network information"""
         print("Collecting VPC networks...")
-        networks = []
         
         try:
-            request = compute_v1.ListNetworksRequest(project=self.project_id)
-            network_list = self.networks_client.list(request=request)
-            
-            for network in network_list:
-                networks.append({
-                    'name': network.name,
-                    'id': network.id,
-                    'self_link': network.self_link,
-                    'auto_create_subnetworks': network.auto_create_subnetworks,
-                    'routing_mode': network.routing_config.routing_mode if network.routing_config else 'REGIONAL',
-                    'creation_timestamp': network.creation_timestamp
-                })
-                
+            networks = self.list_networks()
             print(f"Found {len(networks)} VPC networks")
             return networks
             
@@ -38,6 +34,14 @@ class GCPNetworkCollector:
             print(f"Error collecting networks: {e}")
             return []
     
+    def collect_region_subnets(self, region):
+        """Subnets of one region; errors propagate to the caller"""
+        request = compute_v1.ListSubnetworksRequest(
+            project=self.project_id,
+            region=region
+        )
+        return [Subnet.from_proto(subnet, region) for subnet in self.subnetworks_client.list(request=request)]
+    
     def collect_subnets(self):
         """Collect subnet information"""
         print("Collecting subnets...")
@@ -45,26 +49,9 @@ class GCPNetworkCollector:
         
         try:
             # List subnets across all regions
-            regions = ['us-central1', 'us-east1', 'us-west1', 'europe-west1']
-            
-            for region in regions:
+            for region in REGIONS:
                 try:
-                    request = compute_v1.ListSubnetworksRequest(
-                        project=self.project_id,
-                        region=region
-                    )
-                    subnet_list = self.subnetworks_client.list(request=request)
-                    
-                    for subnet in subnet_list:
-                        subnets.append({
-                            'name': subnet.name,
-                            'region': region,
-                            'network': subnet.network.split('/')[-1],
-                            'ip_cidr_range': subnet.ip_cidr_range,
-                            'gateway_address': subnet.gateway_address,
-                            'private_ip_google_access': subnet.private_ip_google_access,
-                            'creation_timestamp': subnet.creation_timestamp
-                        })
+                    subnets.extend(self.collect_region_subnets(region))
                 except Exception as e:
                     # Region might not have subnets, that's okay
                     continue
@@ -76,28 +63,17 @@ class GCPNetworkCollector:
             print(f"Error collecting subnets: {e}")
             return []
     
+    def list_firewall_rules(self):
+        """Firewall rules; errors propagate to the caller"""
+        request = compute_v1.ListFirewallsRequest(project=self.project_id)
+        return [FirewallRule.from_proto(firewall) for firewall in self.firewalls_client.list(request=request)]
+    
     def collect_firewall_rules(self):
         """Collect firewall rules"""
         print("Collecting firewall rules...")
-        firewalls = []
         
         try:
-            request = compute_v1.ListFirewallsRequest(project=self.project_id)
-            firewall_list = self.firewalls_client.list(request=request)
-            
-            for firewall in firewall_list:
-                firewalls.append({
-                    'name': firewall.name,
-                    'direction': firewall.direction,
-                    'priority': firewall.priority,
-                    'network': firewall.network.split('/')[-1] if firewall.network else 'default',
-                    'source_ranges': list(firewall.source_ranges) if firewall.source_ranges else [],
-                    'target_tags': list(firewall.target_tags) if firewall.target_tags else [],
-                    'allowed': [{'protocol': rule.I_p_protocol, 'ports': list(rule.ports) if rule.ports else []} 
-                              for rule in firewall.allowed] if firewall.allowed else [],
-                    'creation_timestamp': firewall.creation_timestamp
-                })
-                
+            firewalls = self.list_firewall_rules()
             print(f"Found {len(firewalls)} firewall rules")
             return firewalls
             
@@ -105,33 +81,23 @@ class GCPNetworkCollector:
             print(f"Error collecting firewall rules: {e}")
             return []
     
+    def iter_instances_by_zone(self):
+        """(zone, [Instance]) per zone of the aggregated list, as pages arrive"""
+        request = compute_v1.AggregatedListInstancesRequest(project=self.project_id)
+        instance_list = self.compute_client.aggregated_list(request=request)
+        
+        for zone, response in instance_list:
+            if hasattr(response, 'instances') and response.instances:
+                yield zone, [Instance.from_proto(instance, zone) for instance in response.instances]
+    
     def collect_instances(self):
         """Collect VM instances"""
         print("Collecting VM instances...")
         instances = []
         
         try:
-            request = compute_v1.AggregatedListInstancesRequest(project=self.project_id)
-            instance_list = self.compute_client.aggregated_list(request=request)
-            
-            for zone, response in instance_list:
-                if hasattr(response, 'instances') and response.instances:
-                    for instance in response.instances:
-                        instances.append({
-                            'name': instance.name,
-                            'zone': zone.split('/')[-1],
-                            'machine_type': instance.machine_type.split('/')[-1],
-                            'status': instance.status,
-                            'internal_ip': instance.network_interfaces[0].network_i_p if instance.network_interfaces else None,
-                            'external_ip': instance.network_interfaces[0].access_configs[0].nat_i_p 
-                                         if instance.network_interfaces and instance.network_interfaces[0].access_configs 
-                                         else None,
-                            'network': instance.network_interfaces[0].network.split('/')[-1] 
-                                     if instance.network_interfaces else None,
-                            'subnet': instance.network_interfaces[0].subnetwork.split('/')[-1] 
-                                    if instance.network_interfaces else None,
-                            'creation_timestamp': instance.creation_timestamp
-                        })
+            for _, zone_instances in self.iter_instances_by_zone():
+                instances.extend(zone_instances)
                         
             print(f"Found {len(instances)} VM instances")
             return instances
@@ -145,21 +111,21 @@ class GCPNetworkCollector:
         print(f"Starting data collection for project: {self.project_id}")
         print("=" * 60)
         
-        data = {
-            'collection_timestamp': datetime.now().isoformat(),
-            'project_id': self.project_id,
-            'networks': self.collect_networks(),
-            'subnets': self.collect_subnets(),
-            'firewall_rules': self.collect_firewall_rules(),
-            'instances': self.collect_instances()
-        }
+        data = Inventory(
+            project_id=self.project_id,
+            collection_timestamp=datetime.now().isoformat(),
+            networks=self.collect_networks(),
+            subnets=self.collect_subnets(),
+            firewall_rules=self.collect_firewall_rules(),
+            instances=self.collect_instances()
+        )
         
         print("=" * 60)
         print(f"Collection complete! Summary:")
-        print(f"  - Networks: {len(data['networks'])}")
-        print(f"  - Subnets: {len(data['subnets'])}")
-        print(f"  - Firewall Rules: {len(data['firewall_rules'])}")
-        print(f"  - VM Instances: {len(data['instances'])}")
+        print(f"  - Networks: {len(data.networks)}")
+        print(f"  - Subnets: {len(data.subnets)}")
+        print(f"  - Firewall Rules: {len(data.firewall_rules)}")
+        print(f"  - VM Instances: {len(data.instances)}")
         
         return data
 
@@ -182,7 +148,7 @@ def main():
     # Save to JSON file
     output_file = 'network_data.json'
     with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
+        json.dump(data.to_dict(), f, indent=2, default=str)
     
     print(f"\nData saved to {output_file}")
 
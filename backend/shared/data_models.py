@@ -1,27 +1,377 @@
-from dataclasses import dataclass
-from typing import List, Dict, Optional
-from datetime import datetime
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Any, Iterable
+from datetime import datetime, timezone
+from shared.firewall_analysis import analyze_firewall_rules
 
-@dataclass
-class NetworkResource:
+# Compact resource models. Collectors convert Compute and Monitoring protos
+# straight into these slotted records and analysis works on them; dicts are
+# built only when the data is serialized (to_dict). Strings repeated across
+# resources (zones, networks, machine types) are interned, and metric points
+# live in typed arrays rather than a dict per point. from_dict reads records
+# back from saved output.
+
+def raw_proto(message):
+    """The protobuf behind a proto-plus message; reading its fields skips the marshal layer"""
+    pb = getattr(type(message), 'pb', None)
+    return pb(message) if pb is not None else message
+
+def last_segment(url: str) -> str:
+    """'.../zones/us-central1-a' -> 'us-central1-a', interned"""
+    return sys.intern(url.rpartition('/')[2]) if url else ''
+
+def shared(value: str) -> str:
+    return sys.intern(value) if value else ''
+
+@dataclass(slots=True)
+class Network:
     name: str
-    resource_type: str
-    project_id: str
-    region: Optional[str] = None
-    zone: Optional[str] = None
-    creation_timestamp: Optional[str] = None
-    metadata: Optional[Dict] = None
-
-@dataclass  
-class NetworkMetric:
-    resource_name: str
+    id: int
+    self_link: str
+    auto_create_subnetworks: bool
+    routing_mode: str
+    creation_timestamp: str
+
+    @classmethod
+    def from_proto(cls, network) -> 'Network':
+        pb = raw_proto(network)
+        return cls(
+            name=pb.name,
+            id=pb.id,
+            self_link=pb.self_link,
+            auto_create_subnetworks=pb.auto_create_subnetworks,
+            routing_mode=shared(pb.routing_config.routing_mode) or 'REGIONAL',
+            creation_timestamp=pb.creation_timestamp
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'id': self.id,
+            'self_link': self.self_link,
+            'auto_create_subnetworks': self.auto_create_subnetworks,
+            'routing_mode': self.routing_mode,
+            'creation_timestamp': self.creation_timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Network':
+        return cls(
+            name=data['name'],
+            id=data.get('id', 0),
+            self_link=data.get('self_link', ''),
+            auto_create_subnetworks=data.get('auto_create_subnetworks', False),
+            routing_mode=shared(data.get('routing_mode', '')) or 'REGIONAL',
+            creation_timestamp=data.get('creation_timestamp', '')
+        )
+
+@dataclass(slots=True)
+class Subnet:
+    name: str
+    region: str
+    network: str
+    ip_cidr_range: str
+    gateway_address: str
+    private_ip_google_access: bool
+    creation_timestamp: str
+
+    @classmethod
+    def from_proto(cls, subnet, region: Optional[str] = None) -> 'Subnet':
+        pb = raw_proto(subnet)
+        return cls(
+            name=pb.name,
+            region=shared(region) if region else last_segment(pb.region),
+            network=last_segment(pb.network),
+            ip_cidr_range=pb.ip_cidr_range,
+            gateway_address=pb.gateway_address,
+            private_ip_google_access=pb.private_ip_google_access,
+            creation_timestamp=pb.creation_timestamp
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'region': self.region,
+            'network': self.network,
+            'ip_cidr_range': self.ip_cidr_range,
+            'gateway_address': self.gateway_address,
+            'private_ip_google_access': self.private_ip_google_access,
+            'creation_timestamp': self.creation_timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Subnet':
+        return cls(
+            name=data['name'],
+            region=shared(data.get('region', '')),
+            network=shared(data.get('network', '')),
+            ip_cidr_range=data.get('ip_cidr_range', ''),
+            gateway_address=data.get('gateway_address', ''),
+            private_ip_google_access=data.get('private_ip_google_access', False),
+            creation_timestamp=data.get('creation_timestamp', '')
+        )
+
+@dataclass(slots=True)
+class PortRule:
+    """One allowed/denied entry: a protocol and its port specs ('22', '8000-8080')"""
+    protocol: str
+    ports: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_proto(cls, entry) -> 'PortRule':
+        return cls(protocol=shared(entry.I_p_protocol), ports=tuple(entry.ports))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'protocol': self.protocol, 'ports': list(self.ports)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PortRule':
+        return cls(protocol=shared(data.get('protocol', '')), ports=tuple(data.get('ports') or ()))
+
+@dataclass(slots=True)
+class FirewallRule:
+    name: str
+    direction: str
+    priority: int
+    network: str
+    source_ranges: Tuple[str, ...]
+    destination_ranges: Tuple[str, ...]
+    source_tags: Tuple[str, ...]
+    source_service_accounts: Tuple[str, ...]
+    target_tags: Tuple[str, ...]
+    target_service_accounts: Tuple[str, ...]
+    allowed: Tuple[PortRule, ...]
+    denied: Tuple[PortRule, ...]
+    disabled: bool
+    creation_timestamp: str
+
+    @classmethod
+    def from_proto(cls, firewall) -> 'FirewallRule':
+        pb = raw_proto(firewall)
+        return cls(
+            name=pb.name,
+            direction=shared(pb.direction),
+            priority=pb.priority,
+            network=last_segment(pb.network) or 'default',
+            source_ranges=tuple(pb.source_ranges),
+            destination_ranges=tuple(pb.destination_ranges),
+            source_tags=tuple(pb.source_tags),
+            source_service_accounts=tuple(pb.source_service_accounts),
+            target_tags=tuple(pb.target_tags),
+            target_service_accounts=tuple(pb.target_service_accounts),
+            allowed=tuple(PortRule.from_proto(entry) for entry in pb.allowed),
+            denied=tuple(PortRule.from_proto(entry) for entry in pb.denied),
+            disabled=pb.disabled,
+            creation_timestamp=pb.creation_timestamp
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'direction': self.direction,
+            'priority': self.priority,
+            'network': self.network,
+            'source_ranges': list(self.source_ranges),
+            'destination_ranges': list(self.destination_ranges),
+            'source_tags': list(self.source_tags),
+            'source_service_accounts': list(self.source_service_accounts),
+            'target_tags': list(self.target_tags),
+            'target_service_accounts': list(self.target_service_accounts),
+            'allowed': [entry.to_dict() for entry in self.allowed],
+            'denied': [entry.to_dict() for entry in self.denied],
+            'disabled': self.disabled,
+            'creation_timestamp': self.creation_timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FirewallRule':
+        return cls(
+            name=data['name'],
+            direction=shared(data.get('direction', 'INGRESS')),
+            priority=data.get('priority', 1000),
+            network=shared(data.get('network', 'default')),
+            source_ranges=tuple(data.get('source_ranges') or ()),
+            destination_ranges=tuple(data.get('destination_ranges') or ()),
+            source_tags=tuple(data.get('source_tags') or ()),
+            source_service_accounts=tuple(data.get('source_service_accounts') or ()),
+            target_tags=tuple(data.get('target_tags') or ()),
+            target_service_accounts=tuple(data.get('target_service_accounts') or ()),
+            allowed=tuple(PortRule.from_dict(entry) for entry in data.get('allowed') or ()),
+            denied=tuple(PortRule.from_dict(entry) for entry in data.get('denied') or ()),
+            disabled=data.get('disabled', False),
+            creation_timestamp=data.get('creation_timestamp', '')
+        )
+
+@dataclass(slots=True)
+class NetworkInterface:
+    network: Optional[str]
+    subnet: Optional[str]
+    internal_ip: str
+    external_ip: Optional[str]
+    alias_ip_ranges: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_proto(cls, nic) -> 'NetworkInterface':
+        access_configs = nic.access_configs
+        return cls(
+            network=last_segment(nic.network) or None,
+            subnet=last_segment(nic.subnetwork) or None,
+            internal_ip=nic.network_i_p,
+            external_ip=(access_configs[0].nat_i_p or None) if access_configs else None,
+            alias_ip_ranges=tuple(alias.ip_cidr_range for alias in nic.alias_ip_ranges
+                                  if not alias.subnetwork_range_name)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'network': self.network,
+            'subnet': self.subnet,
+            'internal_ip': self.internal_ip,
+            'alias_ip_ranges': list(self.alias_ip_ranges)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], external_ip: Optional[str] = None) -> 'NetworkInterface':
+        return cls(
+            network=shared(data.get('network') or '') or None,
+            subnet=shared(data.get('subnet') or '') or None,
+            internal_ip=data.get('internal_ip', ''),
+            external_ip=external_ip,
+            alias_ip_ranges=tuple(data.get('alias_ip_ranges') or ())
+        )
+
+@dataclass(slots=True)
+class Instance:
+    name: str
+    zone: str
+    machine_type: str
+    status: str
+    creation_timestamp: str
+    interfaces: Tuple[NetworkInterface, ...] = ()
+
+    @classmethod
+    def from_proto(cls, instance, zone: Optional[str] = None) -> 'Instance':
+        pb = raw_proto(instance)
+        return cls(
+            name=pb.name,
+            zone=last_segment(zone or pb.zone),
+            machine_type=last_segment(pb.machine_type),
+            status=shared(pb.status),
+            creation_timestamp=pb.creation_timestamp,
+            interfaces=tuple(NetworkInterface.from_proto(nic) for nic in pb.network_interfaces)
+        )
+
+    # The primary interface, as the flat collector record reported it
+    @property
+    def internal_ip(self) -> Optional[str]:
+        return self.interfaces[0].internal_ip if self.interfaces else None
+
+    @property
+    def external_ip(self) -> Optional[str]:
+        return self.interfaces[0].external_ip if self.interfaces else None
+
+    @property
+    def network(self) -> Optional[str]:
+        return self.interfaces[0].network if self.interfaces else None
+
+    @property
+    def subnet(self) -> Optional[str]:
+        return self.interfaces[0].subnet if self.interfaces else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'zone': self.zone,
+            'machine_type': self.machine_type,
+            'status': self.status,
+            'internal_ip': self.internal_ip,
+            'external_ip': self.external_ip,
+            'network': self.network,
+            'subnet': self.subnet,
+            'network_interfaces': [nic.to_dict() for nic in self.interfaces],
+            'creation_timestamp': self.creation_timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Instance':
+        # Records carry the external IP of the primary interface only
+        return cls(
+            name=data['name'],
+            zone=shared(data.get('zone', '')),
+            machine_type=shared(data.get('machine_type', '')),
+            status=shared(data.get('status', '')),
+            creation_timestamp=data.get('creation_timestamp', ''),
+            interfaces=tuple(
+                NetworkInterface.from_dict(nic, data.get('external_ip') if i == 0 else None)
+                for i, nic in enumerate(data.get('network_interfaces') or ())
+            )
+        )
+
+@dataclass(slots=True)
+class MetricSeries:
+    """Points of one metric as parallel arrays of epoch seconds and values"""
     metric_type: str
-    timestamp: datetime
-    value: float
-    unit: str
-    labels: Optional[Dict[str, str]] = None
+    integer: bool = False
+    timestamps: array = field(default_factory=lambda: array('d'))
+    values: array = field(default_factory=lambda: array('d'))
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+    def add_proto(self, time_series) -> None:
+        """Append the points of a Monitoring TimeSeries"""
+        append_time, append_value = self.timestamps.append, self.values.append
+        for point in raw_proto(time_series).points:
+            end_time = point.interval.end_time
+            kind = point.value.WhichOneof('value')
+            if kind == 'int64_value':
+                self.integer = True
+            append_time(end_time.seconds + end_time.nanos / 1e9)
+            append_value(getattr(point.value, kind) if kind in ('double_value', 'int64_value') else 0.0)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_points(self) -> List[Dict[str, Any]]:
+        cast = int if self.integer else float
+        return [
+            {'timestamp': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), 'value': cast(value)}
+            for timestamp, value in zip(self.timestamps, self.values)
+        ]
+
+def metrics_to_dict(metrics: Dict[str, Dict[str, MetricSeries]]) -> Dict[str, Dict[str, List[Dict]]]:
+    """{instance key: {metric type: series}} in the saved {timestamp, value} point format"""
+    return {
+        key: {metric_type: series.to_points() for metric_type, series in by_type.items()}
+        for key, by_type in metrics.items()
+    }
+
+@dataclass(slots=True)
+class Inventory:
+    project_id: str
+    collection_timestamp: str
+    networks: List[Network] = field(default_factory=list)
+    subnets: List[Subnet] = field(default_factory=list)
+    firewall_rules: List[FirewallRule] = field(default_factory=list)
+    instances: List[Instance] = field(default_factory=list)
+    metrics: Dict[str, Dict[str, MetricSeries]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'collection_timestamp': self.collection_timestamp,
+            'project_id': self.project_id,
+            'networks': [network.to_dict() for network in self.networks],
+            'subnets': [subnet.to_dict() for subnet in self.subnets],
+            'firewall_rules': [rule.to_dict() for rule in self.firewall_rules],
+            'instances': [instance.to_dict() for instance in self.instances]
+        }
+        if self.metrics:
+            data['metrics'] = metrics_to_dict(self.metrics)
+        return data
 
-@dataclass
+@dataclass(slots=True)
 class NetworkSummary:
     project_id: str
     collection_timestamp: datetime
@@ -29,55 +379,69 @@ class NetworkSummary:
     total_subnets: int
     total_instances: int
     total_firewall_rules: int
-    
+
 class DataProcessor:
     """Process and aggregate network data"""
-    
-    def __init__(self, raw_data: Dict):
-        self.raw_data = raw_data
-        
+
+    def __init__(self, inventory: Inventory):
+        self.inventory = inventory
+
     def get_network_summary(self) -> NetworkSummary:
         """Create a summary of network resources"""
+        inventory = self.inventory
         return NetworkSummary(
-            project_id=self.raw_data.get('project_id', ''),
-            collection_timestamp=datetime.fromisoformat(self.raw_data.get('collection_timestamp', datetime.now().isoformat())),
-            total_networks=len(self.raw_data.get('networks', [])),
-            total_subnets=len(self.raw_data.get('subnets', [])),
-            total_instances=len(self.raw_data.get('instances', [])),
-            total_firewall_rules=len(self.raw_data.get('firewall_rules', []))
+            project_id=inventory.project_id,
+            collection_timestamp=datetime.fromisoformat(inventory.collection_timestamp),
+            total_networks=len(inventory.networks),
+            total_subnets=len(inventory.subnets),
+            total_instances=len(inventory.instances),
+            total_firewall_rules=len(inventory.firewall_rules)
         )
-    
+
     def get_security_insights(self) -> List[str]:
         """Generate security insights from firewall rules"""
-        insights = []
-        
-        firewall_rules = self.raw_data.get('firewall_rules', [])
-        
-        for rule in firewall_rules:
-            # Check for overly permissive rules
-            source_ranges = rule.get('source_ranges', [])
-            if '0.0.0.0/0' in source_ranges:
-                allowed = rule.get('allowed', [])
-                for allow in allowed:
-                    if allow.get('protocol') == 'tcp' and ('22' in allow.get('ports', []) or not allow.get('ports')):
-                        insights.append(f"⚠️  Firewall rule '{rule['name']}' allows SSH from anywhere (0.0.0.0/0)")
-        
-        return insights
-    
+        return security_insights(self.inventory.firewall_rules)
+
     def get_cost_insights(self) -> List[str]:
         """Generate cost optimization insights"""
-        insights = []
-        
-        instances = self.raw_data.get('instances', [])
-        
+        return cost_insights(self.inventory.instances)
+
+def security_insights(firewall_rules: List[FirewallRule]) -> List[str]:
+    """Security insights from a project's firewall rules"""
+    insights = []
+
+    report = analyze_firewall_rules(firewall_rules)
+
+    for finding in report.exposure:
+        insights.append(f"⚠️  Firewall rule '{finding.rule}' {finding.detail}")
+
+    for finding in report.shadowed:
+        insights.append(f"🚫 Firewall rule '{finding.rule}' ({finding.network}, {finding.direction}) is shadowed by "
+                        f"{', '.join(finding.related_rules)} and never takes effect")
+
+    for finding in report.redundant:
+        insights.append(f"♻️  Firewall rule '{finding.rule}' ({finding.network}, {finding.direction}) is redundant "
+                        f"with {', '.join(finding.related_rules)}")
+
+    return insights
+
+def cost_insights(instances: Iterable[Instance]) -> List[str]:
+    """Cost optimization insights from one pass over instances, which may be a stream"""
+    insights = []
+
+    external_ip_count = 0
+    premium_zone_count = 0
+    for instance in instances:
         # Check for instances with external IPs
-        external_ip_count = sum(1 for instance in instances if instance.get('external_ip'))
-        if external_ip_count > 0:
-            insights.append(f"💰 {external_ip_count} instances have external IPs - consider Cloud NAT for cost savings")
-        
+        if instance.external_ip:
+            external_ip_count += 1
         # Check for instances in expensive zones (this is just an example)
-        premium_zones = [instance for instance in instances if 'us-west' in instance.get('zone', '')]
-        if premium_zones:
-            insights.append(f"💰 {len(premium_zones)} instances in potentially more expensive regions")
-        
-        return insights
\ No newline at end of file
+        if 'us-west' in instance.zone:
+            premium_zone_count += 1
+
+    if external_ip_count > 0:
+        insights.append(f"💰 {external_ip_count} instances have external IPs - consider Cloud NAT for cost savings")
+    if premium_zone_count:
+        insights.append(f"💰 {premium_zone_count} instances in potentially more expensive regions")
+
+    return insights
@@ -0,0 +1,197 @@
+import functools
+import importlib
+import random
+import sys
+import threading
+import time
+import types
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+# Drop-in stand-ins for google.cloud.compute_v1, monitoring_v3 and logging,
+# served from a synthetic estate (shared.synthetic_estate). install() puts
+# them in sys.modules, so collectors imported afterwards run unchanged and
+# offline. Every page fetch is one simulated RPC: it sleeps for the
+# configured latency and can fail with a quota error like the real API.
+
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except ImportError:
+    class ResourceExhausted(Exception):
+        """Quota error raised by the fake clients (google.api_core's when installed)"""
+        code = 429
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.0                       # seconds per page fetch
+    latency_jitter: float = 0.0                # up to this much extra, uniformly
+    page_size: int = 500                       # Compute list default (maxResults)
+    time_series_page_size: int = 1000          # series per list_time_series page
+    quota_error_rate: float = 0.0              # chance a page fetch fails with ResourceExhausted
+    requests_per_second: Optional[float] = None  # per-API quota; fetches above it fail
+    seed: int = 0
+
+class FakeBackend:
+    """Estate, config and call accounting shared by every fake client"""
+
+    def __init__(self, estate, config: Optional[FakeConfig] = None):
+        self.estate = estate
+        self.config = config or FakeConfig()
+        self.random = random.Random(self.config.seed)
+        self.calls: Dict[str, int] = {}
+        self.quota_errors = 0
+        self._recent: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def rpc(self, api: str) -> None:
+        """Account for one page fetch, sleeping and failing as configured"""
+        config = self.config
+        with self._lock:
+            self.calls[api] = self.calls.get(api, 0) + 1
+            failed = config.quota_error_rate > 0 and self.random.random() < config.quota_error_rate
+            if config.requests_per_second:
+                now = time.monotonic()
+                recent = self._recent.setdefault(api.split('.')[0], deque())
+                while recent and now - recent[0] >= 1.0:
+                    recent.popleft()
+                if len(recent) >= config.requests_per_second:
+                    failed = True
+                else:
+                    recent.append(now)
+            delay = config.latency + (self.random.uniform(0, config.latency_jitter) if config.latency_jitter else 0)
+            if failed:
+                self.quota_errors += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise ResourceExhausted(f"Quota exceeded for {api}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'calls': dict(self.calls), 'quota_errors': self.quota_errors}
+
+_backend: Optional[FakeBackend] = None
+
+def backend() -> FakeBackend:
+    if _backend is None:
+        raise RuntimeError("fake_gcp is not installed; call fake_gcp.install(estate) first")
+    return _backend
+
+class Message:
+    """Attribute bag standing in for a proto-plus message.
+
+    Built like one, from a mapping and/or keyword fields; fields not given
+    read as the class defaults, as unset proto fields do, and a message with
+    no field set is falsy. A default that is a Message class reads as an
+    empty message of that type.
+    """
+    _defaults: Dict[str, Any] = {}
+
+    def __init__(self, mapping: Optional[Dict[str, Any]] = None, **fields):
+        for name, default in self._defaults.items():
+            if isinstance(default, list):
+                default = list(default)
+            elif isinstance(default, type) and issubclass(default, Message):
+                default = default()
+            setattr(self, name, default)
+        for name, value in {**(mapping or {}), **fields}.items():
+            setattr(self, name, value)
+
+    def __bool__(self):
+        defaults = self._defaults
+        return any(name not in defaults or (bool(value) if isinstance(value, Message) else value != defaults[name])
+                   for name, value in vars(self).items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in vars(self).items())})"
+
+def message(type_name: str, /, **defaults) -> type:
+    return type(type_name, (Message,), {'_defaults': defaults})
+
+class Pager:
+    """Iterates items across pages like the client library pagers; each page is one RPC"""
+
+    def __init__(self, api: str, items: List, page_size: int):
+        self.api = api
+        self.items = items
+        self.page_size = max(1, page_size)
+
+    @property
+    def pages(self) -> Iterator[List]:
+        # The first page is fetched even when there is nothing to list
+        for start in range(0, max(len(self.items), 1), self.page_size):
+            backend().rpc(self.api)
+            yield self.items[start:start + self.page_size]
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+def flattened(method):
+    """Accept request=... or the request's fields as keyword arguments, like the generated clients"""
+    @functools.wraps(method)
+    def call(self, request=None, *, retry=None, timeout=None, metadata=(), **fields):
+        return method(self, request if request is not None else Message(fields))
+    return call
+
+def page_size(request, default: int) -> int:
+    return getattr(request, 'max_results', None) or getattr(request, 'page_size', None) or default
+
+MODULES = {
+    'google.cloud.compute_v1': 'compute_v1',
+    'google.cloud.monitoring_v3': 'monitoring_v3',
+    'google.cloud.logging': 'cloud_logging'
+}
+
+_saved: Dict[str, Any] = {}
+
+def install(estate, config: Optional[FakeConfig] = None) -> FakeBackend:
+    """Serve estate through fake google.cloud modules until uninstall().
+
+    Call before importing the collectors; modules that already imported the
+    real clients keep them.
+    """
+    global _backend
+    from shared.fake_gcp import compute_v1, monitoring_v3, cloud_logging
+    fakes = {'compute_v1': compute_v1, 'monitoring_v3': monitoring_v3, 'cloud_logging': cloud_logging}
+
+    _backend = FakeBackend(estate, config)
+    if not _saved:
+        cloud = _package('google.cloud')
+        for name, fake in MODULES.items():
+            attr = name.rpartition('.')[2]
+            _saved[name] = (sys.modules.get(name), getattr(cloud, attr, None))
+            sys.modules[name] = fakes[fake]
+            setattr(cloud, attr, fakes[fake])
+    return _backend
+
+def uninstall() -> None:
+    global _backend
+    cloud = sys.modules.get('google.cloud')
+    for name, (module, attribute) in _saved.items():
+        attr = name.rpartition('.')[2]
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+        if cloud is not None:
+            if attribute is None:
+                cloud.__dict__.pop(attr, None)
+            else:
+                setattr(cloud, attr, attribute)
+    _saved.clear()
+    _backend = None
+
+def _package(name: str):
+    """The installed package, or an empty one when the client libraries are missing"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        pass
+    parent, _, child = name.rpartition('.')
+    module = types.ModuleType(name)
+    module.__path__ = []
+    sys.modules[name] = module
+    if parent:
+        setattr(_package(parent), child, module)
+    return module
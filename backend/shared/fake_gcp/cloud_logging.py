@@ -0,0 +1,43 @@
+import re
+from datetime import datetime
+from shared.fake_gcp import backend, message
+
+# Fake google.cloud.logging: list_entries serves the synthetic estate's VPC
+# Flow Log records for the timestamp bounds in the filter, a page per RPC.
+
+DEFAULT_PAGE_SIZE = 1000
+
+StructEntry = message('StructEntry', log_name='', timestamp=None, payload=None, resource=None)
+
+TIMESTAMP_TERM = re.compile(r'timestamp\s*(>=|>|<=|<)\s*"([^"]+)"')
+
+def _bounds(expression: str, now: float):
+    start, end = now - 3600, now
+    for operator, value in TIMESTAMP_TERM.findall(expression or ''):
+        seconds = datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        if operator.startswith('>'):
+            start = seconds
+        else:
+            end = seconds
+    return start, end
+
+class Client:
+    def __init__(self, project=None, **kwargs):
+        self.project = project
+
+    def list_entries(self, resource_names=None, filter_=None, order_by=None, max_results=None,
+                     page_size=None, page_token=None):
+        fake = backend()
+        estate = fake.estate
+        if self.project not in (None, estate.project_id) or 'vpc_flows' not in (filter_ or ''):
+            fake.rpc('logging.entries.list')
+            return
+        start, end = _bounds(filter_, estate.now)
+        size = page_size or DEFAULT_PAGE_SIZE
+        log_name = f"projects/{estate.project_id}/logs/compute.googleapis.com%2Fvpc_flows"
+
+        for i, payload in enumerate(estate.flow_records(start, end, max_results)):
+            if i % size == 0:
+                fake.rpc('logging.entries.list')
+            yield StructEntry(log_name=log_name, timestamp=payload['end_time'], payload=payload,
+                              resource={'type': 'gce_subnetwork'})
@@ -0,0 +1,174 @@
+from typing import Dict, List
+from shared.fake_gcp import Message, Pager, backend, flattened, message, page_size
+
+# Fake google.cloud.compute_v1: the resource messages the synthetic estate is
+# built from, and list clients paging over it. Request messages of any name
+# resolve to plain attribute bags (module __getattr__ below).
+
+AccessConfig = message('AccessConfig', name='External NAT', type_='ONE_TO_ONE_NAT', nat_i_p='')
+AliasIpRange = message('AliasIpRange', ip_cidr_range='', subnetwork_range_name='')
+NetworkInterface = message('NetworkInterface', name='nic0', network='', subnetwork='', network_i_p='',
+                           access_configs=[], alias_ip_ranges=[])
+Tags = message('Tags', items=[])
+ServiceAccount = message('ServiceAccount', email='', scopes=[])
+Instance = message('Instance', name='', id=0, zone='', machine_type='', status='RUNNING',
+                   creation_timestamp='', network_interfaces=[], tags=Tags, service_accounts=[],
+                   labels={})
+NetworkRoutingConfig = message('NetworkRoutingConfig', routing_mode='REGIONAL')
+Network = message('Network', name='', id=0, description='', auto_create_subnetworks=False,
+                  routing_config=NetworkRoutingConfig, creation_timestamp='', self_link='', subnetworks=[])
+SubnetworkSecondaryRange = message('SubnetworkSecondaryRange', range_name='', ip_cidr_range='')
+Subnetwork = message('Subnetwork', name='', id=0, region='', network='', ip_cidr_range='',
+                     gateway_address='', private_ip_google_access=False, purpose='PRIVATE',
+                     secondary_ip_ranges=[], creation_timestamp='', self_link='')
+Allowed = message('Allowed', I_p_protocol='', ports=[])
+Denied = message('Denied', I_p_protocol='', ports=[])
+FirewallLogConfig = message('FirewallLogConfig', enable=False)
+Firewall = message('Firewall', name='', id=0, description='', network='', direction='INGRESS',
+                   priority=1000, source_ranges=[], destination_ranges=[], source_tags=[],
+                   source_service_accounts=[], target_tags=[], target_service_accounts=[],
+                   allowed=[], denied=[], disabled=False, log_config=FirewallLogConfig, creation_timestamp='')
+RouterBgp = message('RouterBgp', asn=0, advertise_mode='DEFAULT')
+RouterNatLogConfig = message('RouterNatLogConfig', enable=False, filter='ALL')
+RouterNat = message('RouterNat', name='', nat_ip_allocate_option='AUTO_ONLY',
+                    source_subnetwork_ip_ranges_to_nat='ALL_SUBNETWORKS_ALL_IP_RANGES',
+                    min_ports_per_vm=0, max_ports_per_vm=0, enable_dynamic_port_allocation=False,
+                    enable_endpoint_independent_mapping=False, log_config=RouterNatLogConfig)
+Router = message('Router', name='', id=0, region='', network='', description='', bgp=RouterBgp, nats=[],
+                 creation_timestamp='')
+Address = message('Address', name='', id=0, region='', address='', address_type='INTERNAL', purpose='',
+                  network='', subnetwork='', prefix_length=0, status='RESERVED', users=[])
+Region = message('Region', name='', status='UP', zones=[])
+Zone = message('Zone', name='', region='', status='UP')
+InstancesScopedList = message('InstancesScopedList', instances=[])
+AddressesScopedList = message('AddressesScopedList', addresses=[])
+SubnetworksScopedList = message('SubnetworksScopedList', subnetworks=[])
+
+_requests: Dict[str, type] = {}
+
+def __getattr__(name: str):
+    # ListNetworksRequest, AggregatedListInstancesRequest, ...: fields are read
+    # back by the clients, so any request shape works
+    if name.endswith('Request'):
+        return _requests.setdefault(name, message(name))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _estate(request):
+    """The estate, or None when the request is for another project"""
+    estate = backend().estate
+    return estate if getattr(request, 'project', estate.project_id) == estate.project_id else None
+
+def _list(api: str, request, items: List) -> Pager:
+    return Pager(api, items, page_size(request, backend().config.page_size))
+
+class AggregatedPager:
+    """Aggregated list pager: iterates (scope, ScopedList) pairs, .pages yields responses with an items map"""
+
+    def __init__(self, api: str, pages: List[Dict]):
+        self.api = api
+        self._pages = pages
+
+    @property
+    def pages(self):
+        for items in self._pages:
+            backend().rpc(self.api)
+            yield Message({'items': items})
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page.items.items()
+
+def _scoped(prefix: str, by_scope: Dict[str, List], field: str, scoped_type, request):
+    """(scope, ScopedList) pairs as aggregated_list yields them.
+
+    Pages hold up to page_size resources, so a scope that spans a page
+    boundary appears once per page; scopes without resources come first.
+    """
+    size = page_size(request, backend().config.page_size)
+    flat = [(scope, item) for scope, items in by_scope.items() for item in items]
+    pages = []
+    for start in range(0, max(len(flat), 1), size):
+        page: Dict[str, List] = {}
+        for scope, item in flat[start:start + size]:
+            page.setdefault(scope, []).append(item)
+        pages.append(list(page.items()))
+    pages[0] = [(scope, []) for scope, items in by_scope.items() if not items] + pages[0]
+
+    return AggregatedPager(f'compute.{prefix}.aggregatedList', [
+        {f'{prefix}/{scope}': scoped_type(**{field: items}) for scope, items in page} for page in pages
+    ])
+
+class NetworksClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.networks.list', request, estate.networks if estate else [])
+
+class SubnetworksClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.subnetworks.list', request,
+                     estate.subnets_by_region.get(request.region, []) if estate else [])
+
+    @flattened
+    def aggregated_list(self, request):
+        estate = _estate(request)
+        return _scoped('regions', estate.subnets_by_region if estate else {}, 'subnetworks',
+                       SubnetworksScopedList, request)
+
+class FirewallsClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.firewalls.list', request, estate.firewalls if estate else [])
+
+class InstancesClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.instances.list', request,
+                     estate.instances_by_zone.get(request.zone, []) if estate else [])
+
+    @flattened
+    def aggregated_list(self, request):
+        estate = _estate(request)
+        return _scoped('zones', estate.instances_by_zone if estate else {}, 'instances',
+                       InstancesScopedList, request)
+
+class RoutersClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.routers.list', request,
+                     estate.routers_by_region.get(request.region, []) if estate else [])
+
+class AddressesClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.addresses.list', request,
+                     estate.addresses_by_region.get(request.region, []) if estate else [])
+
+    @flattened
+    def aggregated_list(self, request):
+        estate = _estate(request)
+        return _scoped('regions', estate.addresses_by_region if estate else {}, 'addresses',
+                       AddressesScopedList, request)
+
+class RegionsClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.regions.list', request, [
+            Region(name=region, zones=[zone for zone in estate.instances_by_zone if zone.startswith(region + '-')])
+            for region in estate.regions
+        ] if estate else [])
+
+class ZonesClient:
+    @flattened
+    def list(self, request):
+        estate = _estate(request)
+        return _list('compute.zones.list', request, [
+            Zone(name=zone, region=zone.rpartition('-')[0]) for zone in estate.instances_by_zone
+        ] if estate else [])
@@ -0,0 +1,163 @@
+import enum
+import re
+from datetime import datetime, timedelta, timezone
+from shared.fake_gcp import Message, Pager, backend, flattened, message
+
+# Fake google.cloud.monitoring_v3: list_time_series over the synthetic
+# estate's series. Filters on metric.type and label equality are honoured,
+# the aligner decides whether DELTA points come back as rates or counts, and
+# points are returned newest first, as the real API returns them.
+
+# Sampling period of unaligned (raw) points
+RAW_PERIOD_SECONDS = 60
+
+class Timestamp(datetime):
+    """datetime with the seconds/nanos of the underlying protobuf Timestamp"""
+
+    @classmethod
+    def from_seconds(cls, seconds: float) -> 'Timestamp':
+        return cls.fromtimestamp(seconds, timezone.utc)
+
+    @property
+    def seconds(self) -> int:
+        return int(self.timestamp())
+
+    @property
+    def nanos(self) -> int:
+        return self.microsecond * 1000
+
+def _timestamp(value) -> Timestamp:
+    if isinstance(value, dict):
+        return Timestamp.from_seconds(value.get('seconds', 0) + value.get('nanos', 0) / 1e9)
+    if isinstance(value, datetime):
+        return Timestamp.from_seconds((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+    if hasattr(value, 'seconds'):
+        return Timestamp.from_seconds(value.seconds + getattr(value, 'nanos', 0) / 1e9)
+    return Timestamp.from_seconds(float(value))
+
+def _seconds(duration) -> int:
+    if isinstance(duration, dict):
+        return int(duration.get('seconds', 0))
+    if isinstance(duration, timedelta):
+        return int(duration.total_seconds())
+    return int(getattr(duration, 'seconds', duration) or 0)
+
+class TimeInterval(Message):
+    _defaults = {'start_time': None, 'end_time': None}
+
+    def __init__(self, mapping=None, **fields):
+        super().__init__(mapping, **fields)
+        self.start_time = _timestamp(self.start_time) if self.start_time is not None else None
+        self.end_time = _timestamp(self.end_time) if self.end_time is not None else None
+
+class TypedValue(Message):
+    _defaults = {'bool_value': False, 'int64_value': 0, 'double_value': 0.0, 'string_value': ''}
+
+    def __init__(self, mapping=None, **fields):
+        super().__init__(mapping, **fields)
+        self._set = next(iter({**(mapping or {}), **fields}), None)
+
+    def WhichOneof(self, group: str):
+        return self._set
+
+    def HasField(self, name: str) -> bool:
+        return self._set == name
+
+class Aggregation(Message):
+    class Aligner(enum.IntEnum):
+        ALIGN_NONE = 0
+        ALIGN_DELTA = 1
+        ALIGN_RATE = 2
+        ALIGN_MIN = 10
+        ALIGN_MAX = 11
+        ALIGN_MEAN = 12
+        ALIGN_SUM = 14
+
+    class Reducer(enum.IntEnum):
+        REDUCE_NONE = 0
+        REDUCE_MEAN = 1
+        REDUCE_SUM = 2
+
+    _defaults = {'alignment_period': None, 'per_series_aligner': 0, 'cross_series_reducer': 0,
+                 'group_by_fields': []}
+
+class MetricDescriptor:
+    class MetricKind(enum.Enum):
+        GAUGE = 1
+        DELTA = 2
+        CUMULATIVE = 3
+
+    class ValueType(enum.Enum):
+        BOOL = 1
+        INT64 = 2
+        DOUBLE = 3
+
+class ListTimeSeriesRequest(Message):
+    class TimeSeriesView(enum.IntEnum):
+        FULL = 0
+        HEADERS = 1
+
+    _defaults = {'name': '', 'filter': '', 'interval': None, 'aggregation': None, 'view': 0, 'page_size': 0}
+
+Point = message('Point', interval=None, value=None)
+Metric = message('Metric', type='', labels={})
+MonitoredResource = message('MonitoredResource', type='', labels={})
+TimeSeries = message('TimeSeries', metric=None, resource=None, metric_kind=None, value_type=None,
+                     points=[], unit='')
+
+FILTER_TERM = re.compile(r'([\w.]+)\s*=\s*"([^"]*)"')
+
+def parse_filter(expression: str):
+    """(metric type, {label: value}) from 'metric.type="..." AND resource.labels.zone="..."'"""
+    metric_type, matches = '', {}
+    for field, value in FILTER_TERM.findall(expression or ''):
+        if field == 'metric.type':
+            metric_type = value
+        elif '.labels.' in field:
+            matches[field.rpartition('.')[2]] = value
+    return metric_type, matches
+
+class MetricServiceClient:
+    @flattened
+    def list_time_series(self, request):
+        estate = backend().estate
+        metric_type, matches = parse_filter(request.filter)
+        interval = request.interval if isinstance(request.interval, TimeInterval) else TimeInterval(request.interval)
+        aggregation = request.aggregation
+        if isinstance(aggregation, dict):
+            aggregation = Aggregation(aggregation)
+        aligner = int(aggregation.per_series_aligner) if aggregation else 0
+        step = _seconds(aggregation.alignment_period) if aggregation and aligner else 0
+        step = step or RAW_PERIOD_SECONDS
+
+        end = interval.end_time.timestamp()
+        start = interval.start_time.timestamp() if interval.start_time else end - step
+        if request.name != f"projects/{estate.project_id}":
+            return Pager('monitoring.timeSeries.list', [], 1)
+
+        results = []
+        rate_aligners = (Aggregation.Aligner.ALIGN_RATE, Aggregation.Aligner.ALIGN_MEAN)
+        for series in estate.time_series(metric_type, matches, start, end, step):
+            # DELTA series hold rates: ALIGN_RATE keeps them, ALIGN_MEAN gives the
+            # mean raw sample, anything else the count over each period
+            if series.metric_kind == 'GAUGE' or aligner == Aggregation.Aligner.ALIGN_RATE:
+                scale = 1
+            else:
+                scale = RAW_PERIOD_SECONDS if aligner == Aggregation.Aligner.ALIGN_MEAN else step
+            integer = series.value_type == 'INT64' and aligner not in rate_aligners
+            points = []
+            for timestamp, value in zip(reversed(series.timestamps), reversed(series.values)):
+                points.append(Point(
+                    interval=TimeInterval(start_time={'seconds': timestamp - step}, end_time={'seconds': timestamp}),
+                    value=TypedValue(int64_value=int(round(value * scale))) if integer
+                    else TypedValue(double_value=value * scale)
+                ))
+            results.append(TimeSeries(
+                metric=Metric(type=metric_type, labels=series.metric_labels),
+                resource=MonitoredResource(type=series.resource_type, labels=series.resource_labels),
+                metric_kind=MetricDescriptor.MetricKind['GAUGE' if aligner in rate_aligners else series.metric_kind],
+                value_type=MetricDescriptor.ValueType['INT64' if integer else 'DOUBLE'],
+                points=points
+            ))
+        return Pager('monitoring.timeSeries.list', results,
+                     getattr(request, 'page_size', 0) or backend().config.time_series_page_size)
@@ -0,0 +1,296 @@
+import bisect
+import ipaddress
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
+
+PORT_MIN = 0
+PORT_MAX = 65535
+
+# Protocols that carry ports; for the rest a rule always matches the whole protocol
+PORT_PROTOCOLS = {'tcp', 'udp', 'sctp'}
+
+# Exposure checks: source prefixes at least this broad and not private count as "the internet"
+BROAD_SOURCE_PREFIX = 8
+WIDE_PORT_SPAN = 1024
+SENSITIVE_PORTS = {
+    22: 'SSH', 23: 'Telnet', 445: 'SMB', 1433: 'MSSQL', 3306: 'MySQL', 3389: 'RDP',
+    5432: 'PostgreSQL', 6379: 'Redis', 9200: 'Elasticsearch', 11211: 'Memcached', 27017: 'MongoDB'
+}
+
+ALL_TARGETS = '*'
+
+@dataclass
+class FirewallFinding:
+    rule: str
+    network: str
+    direction: str
+    kind: str  # 'shadowed', 'redundant' or 'exposure'
+    detail: str
+    related_rules: List[str] = field(default_factory=list)
+
+@dataclass
+class FirewallReport:
+    rules_analyzed: int
+    rules_skipped: int
+    shadowed: List[FirewallFinding]
+    redundant: List[FirewallFinding]
+    exposure: List[FirewallFinding]
+
+@dataclass
+class ParsedRule:
+    name: str
+    network: str
+    direction: str
+    priority: int
+    deny: bool
+    cidrs: List[Tuple[int, int, int]]        # (ip version, network int, prefix length)
+    targets: List[str]                       # ALL_TARGETS or target tags / service accounts
+    ports: List[Tuple[str, int, int]]        # (protocol, first port, last port)
+
+    @property
+    def precedence(self) -> Tuple[int, int]:
+        # Lower priority numbers win; at equal priority deny wins over allow
+        return (self.priority, 0 if self.deny else 1)
+
+class IntervalSet:
+    """Disjoint, sorted integer intervals; each remembers the first rule that covered it"""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.names: List[str] = []
+
+    def add(self, lo: int, hi: int, name: str) -> None:
+        i = bisect.bisect_left(self.ends, lo - 1)
+        j = bisect.bisect_right(self.starts, hi + 1)
+        if i < j:
+            lo = min(lo, self.starts[i])
+            hi = max(hi, self.ends[j - 1])
+            name = self.names[i]
+        self.starts[i:j] = [lo]
+        self.ends[i:j] = [hi]
+        self.names[i:j] = [name]
+
+    def overlapping(self, lo: int, hi: int):
+        i = bisect.bisect_left(self.ends, lo)
+        while i < len(self.starts) and self.starts[i] <= hi:
+            yield self.starts[i], self.ends[i], self.names[i]
+            i += 1
+
+def covering_rules(pieces: List[Tuple[int, int, str]], lo: int, hi: int) -> Optional[List[str]]:
+    """Names of the rules whose intervals jointly cover [lo, hi], or None if there is a gap"""
+    pieces = sorted(pieces)
+    reached = lo - 1
+    names = []
+    for start, end, name in pieces:
+        if start > reached + 1:
+            break
+        if end > reached:
+            reached = end
+            names.append(name)
+        if reached >= hi:
+            return names
+    return None
+
+def field_getter(record):
+    """get(field, default) over a dict record or a typed model's attributes"""
+    if isinstance(record, dict):
+        return record.get
+    return lambda name, default=None: getattr(record, name, default)
+
+def parse_ports(entries: List[Dict]) -> List[Tuple[str, int, int]]:
+    """Expand allowed/denied entries into (protocol, first port, last port) intervals"""
+    ports = []
+    for entry in entries:
+        get = field_getter(entry)
+        protocol = str(get('protocol') or get('IPProtocol') or 'all').lower()
+        if protocol not in PORT_PROTOCOLS or not get('ports'):
+            ports.append((protocol, PORT_MIN, PORT_MAX))
+            continue
+        for port in get('ports'):
+            first, _, last = str(port).partition('-')
+            ports.append((protocol, int(first), int(last or first)))
+    return ports
+
+def parse_cidr(cidr: str) -> Tuple[int, int, int]:
+    network = ipaddress.ip_network(cidr, strict=False)
+    return network.version, int(network.network_address), network.prefixlen
+
+def parse_rule(rule: Dict) -> Optional[ParsedRule]:
+    """Normalize a collected firewall rule; None when it cannot be reasoned about by address"""
+    get = field_getter(rule)
+    if get('disabled'):
+        return None
+
+    direction = get('direction', 'INGRESS')
+    ranges = get('source_ranges' if direction == 'INGRESS' else 'destination_ranges') or []
+    if not ranges:
+        # Tag- and service-account-only sources are matched by instance, not address
+        if direction == 'INGRESS' and (get('source_tags') or get('source_service_accounts')):
+            return None
+        ranges = ['0.0.0.0/0']
+
+    denied = get('denied') or get('denied_ports') or []
+    allowed = get('allowed') or get('allowed_ports') or []
+    targets = list(get('target_tags') or []) + \
+              [f"sa:{account}" for account in get('target_service_accounts') or []]
+
+    return ParsedRule(
+        name=get('name'),
+        network=get('network', 'default'),
+        direction=direction,
+        priority=int(get('priority', 1000)),
+        deny=bool(denied),
+        cidrs=[parse_cidr(cidr) for cidr in ranges],
+        targets=targets or [ALL_TARGETS],
+        ports=parse_ports(denied or allowed)
+    )
+
+def network_of(cidr: Tuple[int, int, int]):
+    version, address, prefixlen = cidr
+    network_class = ipaddress.IPv4Network if version == 4 else ipaddress.IPv6Network
+    return network_class((address, prefixlen))
+
+def supernets(cidr: Tuple[int, int, int]):
+    """The CIDR itself and every prefix containing it"""
+    version, address, prefixlen = cidr
+    bits = 32 if version == 4 else 128
+    for length in range(prefixlen, -1, -1):
+        mask = ((1 << length) - 1) << (bits - length)
+        yield version, address & mask, length
+
+class FirewallAnalyzer:
+    """Finds shadowed, redundant and overly broad firewall rules.
+
+    Rules are parsed into CIDR and port intervals and processed per network
+    and direction in evaluation order. Earlier rules are indexed by
+    (prefix, target, protocol) into merged port interval sets, one per action.
+    Because CIDRs nest, the rules that can cover a range are exactly those on
+    one of its at most 33 (IPv4) supernets, so each rule costs a bounded number
+    of lookups plus logarithmic interval searches: O(n log n) overall.
+
+    A rule counts as covered when, for every source/destination CIDR, target
+    and port range it matches, earlier rules on a containing prefix cover the
+    ports, possibly several of them together. It is shadowed when the cover
+    includes rules of the opposite action, and redundant when rules of the same
+    action alone cover it. Covers pieced together from sibling prefixes
+    (two /25s covering a /24) are not detected.
+    """
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+
+    def analyze(self) -> FirewallReport:
+        groups: Dict[Tuple[str, str], List[ParsedRule]] = {}
+        skipped = 0
+        for rule in self.rules:
+            parsed = parse_rule(rule)
+            if parsed is None:
+                skipped += 1
+                continue
+            groups.setdefault((parsed.network, parsed.direction), []).append(parsed)
+
+        report = FirewallReport(rules_analyzed=len(self.rules) - skipped, rules_skipped=skipped,
+                                shadowed=[], redundant=[], exposure=[])
+        for parsed_rules in groups.values():
+            self._analyze_group(parsed_rules, report)
+        return report
+
+    def _analyze_group(self, rules: List[ParsedRule], report: FirewallReport) -> None:
+        index: Dict[tuple, Tuple[IntervalSet, IntervalSet]] = {}
+        rules.sort(key=lambda r: r.precedence)
+
+        # Rules with equal precedence do not cover each other
+        i = 0
+        while i < len(rules):
+            j = i
+            while j < len(rules) and rules[j].precedence == rules[i].precedence:
+                j += 1
+            for rule in rules[i:j]:
+                finding = self._coverage(rule, index)
+                if finding:
+                    (report.shadowed if finding.kind == 'shadowed' else report.redundant).append(finding)
+                elif rule.direction == 'INGRESS' and not rule.deny:
+                    exposure = self._exposure(rule)
+                    if exposure:
+                        report.exposure.append(exposure)
+            for rule in rules[i:j]:
+                self._index_rule(rule, index)
+            i = j
+
+    def _index_rule(self, rule: ParsedRule, index) -> None:
+        action = 1 if rule.deny else 0
+        for cidr in rule.cidrs:
+            for target in rule.targets:
+                for protocol, first, last in rule.ports:
+                    sets = index.get((cidr, target, protocol))
+                    if sets is None:
+                        sets = index[(cidr, target, protocol)] = (IntervalSet(), IntervalSet())
+                    sets[action].add(first, last, rule.name)
+
+    def _coverage(self, rule: ParsedRule, index) -> Optional[FirewallFinding]:
+        same_action = 1 if rule.deny else 0
+        all_covering, same_covering = set(), set()
+        same_action_only = True
+        for cidr in rule.cidrs:
+            prefixes = list(supernets(cidr))
+            for target in rule.targets:
+                # An instance matched through a tag is also matched by untargeted rules
+                candidate_targets = (ALL_TARGETS,) if target == ALL_TARGETS else (ALL_TARGETS, target)
+                for protocol, first, last in rule.ports:
+                    pieces = ([], [])
+                    for prefix in prefixes:
+                        for candidate in candidate_targets:
+                            for candidate_protocol in {protocol, 'all'}:
+                                sets = index.get((prefix, candidate, candidate_protocol))
+                                if sets:
+                                    pieces[0].extend(sets[0].overlapping(first, last))
+                                    pieces[1].extend(sets[1].overlapping(first, last))
+
+                    names = covering_rules(pieces[0] + pieces[1], first, last)
+                    if names is None:
+                        return None
+                    all_covering.update(names)
+                    same_names = covering_rules(pieces[same_action], first, last)
+                    if same_names is None:
+                        same_action_only = False
+                    else:
+                        same_covering.update(same_names)
+
+        if same_action_only:
+            return FirewallFinding(rule.name, rule.network, rule.direction, 'redundant',
+                                   'fully covered by earlier rules with the same action',
+                                   sorted(same_covering))
+        return FirewallFinding(rule.name, rule.network, rule.direction, 'shadowed',
+                               'never takes effect: earlier rules, including ones with the opposite action, match all its traffic',
+                               sorted(all_covering))
+
+    def _exposure(self, rule: ParsedRule) -> Optional[FirewallFinding]:
+        broad = [
+            network_of(cidr) for cidr in rule.cidrs
+            if cidr[2] <= BROAD_SOURCE_PREFIX and not network_of(cidr).is_private
+        ]
+        if not broad:
+            return None
+
+        exposed = []
+        for protocol, first, last in rule.ports:
+            if protocol not in PORT_PROTOCOLS and protocol != 'all':
+                continue
+            if last - first + 1 >= WIDE_PORT_SPAN:
+                exposed.append(f"{protocol}:{first}-{last}")
+                continue
+            exposed.extend(
+                f"{service} ({protocol}:{port})" for port, service in SENSITIVE_PORTS.items()
+                if first <= port <= last
+            )
+        if not exposed:
+            return None
+
+        sources = ', '.join(str(network) for network in broad)
+        return FirewallFinding(rule.name, rule.network, rule.direction, 'exposure',
+                               f"allows {', '.join(exposed)} from {sources}")
+
+def analyze_firewall_rules(rules: List[Dict]) -> FirewallReport:
+    """Analyze collected firewall rules (collector or Cloud Function records, or FirewallRule models)"""
+    return FirewallAnalyzer(rules).analyze()
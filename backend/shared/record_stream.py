@@ -0,0 +1,207 @@
+import gzip
+import io
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+# Optional compressor - streams fall back to gzip when it is missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Collected sections written as compressed NDJSON, one file per unit of work
+# (a whole section, or one region or zone of it). A unit is written to a
+# .partial file and renamed once complete, then recorded in checkpoint.json;
+# an interrupted run resumes by skipping the units the checkpoint lists.
+
+CHECKPOINT_FILE = 'checkpoint.json'
+EXTENSIONS = {'zstd': '.ndjson.zst', 'gzip': '.ndjson.gz', 'none': '.ndjson'}
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+def default_compression() -> str:
+    return 'zstd' if zstandard else 'gzip'
+
+def _open_write(path: str, compression: str):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(path, 'wb'))
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    return open(path, 'wb')
+
+def _open_lines(path: str) -> Iterator[str]:
+    """Lines of an NDJSON unit file, decompressed as they are read"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path} needs the zstandard package")
+        with open(path, 'rb') as raw:
+            with io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding='utf-8') as f:
+                yield from f
+    else:
+        with (gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')) as f:
+            yield from f
+
+def _as_record(record) -> Dict[str, Any]:
+    return record.to_dict() if hasattr(record, 'to_dict') else record
+
+class UnitWriter:
+    """Appends records of one unit; counts them for the checkpoint"""
+
+    def __init__(self, f):
+        self._f = f
+        self.records = 0
+
+    def write(self, record) -> None:
+        self._f.write(json.dumps(_as_record(record), default=str).encode('utf-8'))
+        self._f.write(b'\n')
+        self.records += 1
+
+    def write_all(self, records: Iterable) -> int:
+        for record in records:
+            self.write(record)
+        return self.records
+
+class StreamWriter:
+    """Resumable, compressed NDJSON output of one collection run.
+
+    Opening a directory with a checkpoint for the same project resumes that
+    run: its collection timestamp and compression are kept, and done()
+    reports the units already written so callers can skip collecting them.
+    """
+
+    def __init__(self, directory: str, project_id: str, compression: Optional[str] = None,
+                 collection_timestamp: Optional[str] = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint = self._load_checkpoint()
+
+        if self.checkpoint and self.checkpoint['project_id'] != project_id:
+            raise ValueError(f"{directory} holds a run for project {self.checkpoint['project_id']}, "
+                             f"not {project_id}")
+        if not self.checkpoint:
+            compression = compression or default_compression()
+            if compression not in EXTENSIONS:
+                raise ValueError(f"Unknown compression: {compression}")
+            if compression == 'zstd' and zstandard is None:
+                raise ValueError("zstd compression needs the zstandard package")
+            self.checkpoint = {
+                'project_id': project_id,
+                'collection_timestamp': collection_timestamp or datetime.now().isoformat(),
+                'compression': compression,
+                'complete': False,
+                'units': []
+            }
+            self._save_checkpoint()
+        self._done = {(unit['section'], unit['part']) for unit in self.checkpoint['units']}
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.checkpoint['units'])
+
+    @property
+    def collection_timestamp(self) -> str:
+        return self.checkpoint['collection_timestamp']
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self) -> None:
+        # Replace atomically so a crash never leaves a torn checkpoint
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.checkpoint, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def done(self, section: str, part: Optional[str] = None) -> bool:
+        return (section, part) in self._done
+
+    def _file_name(self, section: str, part: Optional[str]) -> str:
+        stem = f"{section}.{part.replace('/', '_')}" if part else section
+        return stem + EXTENSIONS[self.checkpoint['compression']]
+
+    @contextmanager
+    def unit(self, section: str, part: Optional[str] = None):
+        """Write one unit; it is checkpointed only when the block completes"""
+        if self.done(section, part):
+            raise ValueError(f"Unit {section}/{part} is already written")
+        name = self._file_name(section, part)
+        path = os.path.join(self.directory, name)
+        f = _open_write(path + '.partial', self.checkpoint['compression'])
+        writer = UnitWriter(f)
+        try:
+            yield writer
+        except BaseException:
+            f.close()
+            os.remove(path + '.partial')
+            raise
+        f.close()
+        os.replace(path + '.partial', path)
+
+        self.checkpoint['units'].append({
+            'section': section,
+            'part': part,
+            'file': name,
+            'records': writer.records,
+            'completed_at': datetime.now().isoformat()
+        })
+        self._done.add((section, part))
+        self._save_checkpoint()
+
+    def write_unit(self, section: str, records: Iterable, part: Optional[str] = None) -> int:
+        """Write a whole unit from an iterable; an already written unit is skipped"""
+        if self.done(section, part):
+            return 0
+        with self.unit(section, part) as out:
+            return out.write_all(records)
+
+    def finish(self) -> None:
+        self.checkpoint['complete'] = True
+        self._save_checkpoint()
+
+class StreamReader:
+    """Lazy reader of a StreamWriter directory; records are decoded one line at a time"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, CHECKPOINT_FILE)) as f:
+            self.checkpoint = json.load(f)
+
+    @property
+    def project_id(self) -> str:
+        return self.checkpoint['project_id']
+
+    @property
+    def collection_timestamp(self) -> str:
+        return self.checkpoint['collection_timestamp']
+
+    @property
+    def complete(self) -> bool:
+        return self.checkpoint['complete']
+
+    def sections(self) -> List[str]:
+        """Section names in the order they were first written"""
+        return list(dict.fromkeys(unit['section'] for unit in self.checkpoint['units']))
+
+    def count(self, section: str) -> int:
+        return sum(unit['records'] for unit in self.checkpoint['units'] if unit['section'] == section)
+
+    def records(self, section: str) -> Iterator[Dict[str, Any]]:
+        for unit in self.checkpoint['units']:
+            if unit['section'] != section:
+                continue
+            for line in _open_lines(os.path.join(self.directory, unit['file'])):
+                if line.strip():
+                    yield json.loads(line)
+
+    def models(self, section: str, model) -> Iterator:
+        """Records of a section as typed models (model.from_dict)"""
+        return map(model.from_dict, self.records(section))
@@ -0,0 +1,555 @@
+import ipaddress
+import math
+import random
+import zlib
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterator, NamedTuple, Optional, Tuple
+from shared.fake_gcp import compute_v1
+
+# Synthetic GCP estates for offline load tests. An Estate holds Compute
+# resources as compute_v1-shaped messages (served by shared.fake_gcp) and
+# produces metric series and flow log records on demand, so months of
+# history cost nothing until they are read. Everything is derived from the
+# spec's seed: the same spec always gives the same estate and the same
+# values for a series at a given time.
+
+DEFAULT_REGIONS = (
+    'us-central1', 'us-east1', 'us-east4', 'us-west1', 'us-west2', 'europe-west1',
+    'europe-west2', 'europe-west3', 'europe-west4', 'asia-east1', 'asia-northeast1', 'asia-southeast1'
+)
+# Hours ahead of UTC, so daily peaks follow local business hours
+REGION_UTC_OFFSETS = {'us': -6, 'europe': 1, 'asia': 8, 'australia': 10, 'southamerica': -3}
+
+TEAMS = ('payments', 'search', 'ads', 'data', 'platform', 'web', 'mobile', 'ml', 'infra', 'security')
+MACHINE_TYPES = (
+    ('e2-medium', 30), ('e2-standard-4', 20), ('n2-standard-4', 15), ('n2-standard-8', 10),
+    ('n2-highmem-16', 5), ('c3-standard-8', 8), ('c2-standard-30', 2), ('e2-small', 7), ('n1-standard-1', 3)
+)
+STATUSES = (('RUNNING', 88), ('TERMINATED', 10), ('STOPPING', 1), ('SUSPENDED', 1))
+APP_PORTS = ('8080', '8443', '9090', '5432', '6379', '27017', '3306', '9200', '50051')
+IAP_RANGE = '35.235.240.0/20'
+HEALTH_CHECK_RANGES = ('130.211.0.0/22', '35.191.0.0/16')
+
+INSTANCE_METRICS = {
+    'compute.googleapis.com/instance/network/sent_bytes_count',
+    'compute.googleapis.com/instance/network/received_bytes_count',
+    'compute.googleapis.com/instance/network/sent_packets_count',
+    'compute.googleapis.com/instance/network/received_packets_count'
+}
+NAT_METRICS = {
+    'compute.googleapis.com/nat/sent_bytes_count',
+    'compute.googleapis.com/nat/received_bytes_count',
+    'compute.googleapis.com/nat/sent_packets_count',
+    'compute.googleapis.com/nat/received_packets_count',
+    'compute.googleapis.com/nat/new_connections',
+    'compute.googleapis.com/nat/port_usage',
+    'compute.googleapis.com/nat/allocated_ports'
+}
+LB_METRICS = {
+    'loadbalancing.googleapis.com/https/request_count',
+    'loadbalancing.googleapis.com/https/request_bytes_count',
+    'loadbalancing.googleapis.com/https/response_bytes_count',
+    'loadbalancing.googleapis.com/https/backend_latencies'
+}
+GAUGE_METRICS = {
+    'compute.googleapis.com/nat/port_usage',
+    'compute.googleapis.com/nat/allocated_ports',
+    'loadbalancing.googleapis.com/https/backend_latencies'
+}
+DOUBLE_METRICS = {'loadbalancing.googleapis.com/https/backend_latencies'}
+
+@dataclass(frozen=True)
+class EstateSpec:
+    project_id: str = 'synthetic-estate'
+    networks: int = 2000
+    subnets: int = 8000
+    firewall_rules: int = 20000
+    instances: int = 50000
+    regions: Tuple[str, ...] = DEFAULT_REGIONS
+    zones_per_region: int = 3
+    nat_fraction: float = 0.4              # (network, region) pairs with subnets that get Cloud NAT
+    external_ip_fraction: float = 0.1
+    reserved_addresses: int = 2000
+    load_balancers: int = 100
+    flow_records_per_hour: int = 100_000
+    history_days: int = 180                # resources are created over this many days before now
+    seed: int = 42
+
+PRESETS = {
+    'small': EstateSpec(networks=10, subnets=40, firewall_rules=200, instances=500, reserved_addresses=20,
+                        load_balancers=5, flow_records_per_hour=5_000),
+    'medium': EstateSpec(networks=200, subnets=1000, firewall_rules=4000, instances=10000,
+                         reserved_addresses=400, load_balancers=30, flow_records_per_hour=30_000),
+    'large': EstateSpec()
+}
+
+class SyntheticSeries(NamedTuple):
+    """One series of a metric over a window; DELTA values are per-second rates"""
+    resource_type: str
+    resource_labels: Dict[str, str]
+    metric_labels: Dict[str, str]
+    metric_kind: str
+    value_type: str
+    timestamps: List[int]
+    values: List[float]
+
+def _weighted(rng: random.Random, choices) -> str:
+    return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+def _skewed_counts(rng: random.Random, total: int, buckets: int, minimum: int = 0) -> List[int]:
+    """Split total over buckets with a heavy tail, as real estates are: a few large VPCs, many small"""
+    weights = [rng.paretovariate(1.2) for _ in range(buckets)]
+    scale = max(total - minimum * buckets, 0) / sum(weights)
+    counts = [minimum + int(weight * scale) for weight in weights]
+    for i in rng.sample(range(buckets), min(buckets, total - sum(counts))) if total > sum(counts) else ():
+        counts[i] += 1
+    return counts
+
+def _timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + '-00:00'
+
+def _key_seed(seed: int, *parts) -> int:
+    return zlib.crc32('|'.join(map(str, parts)).encode('utf-8'), seed & 0xffffffff)
+
+class Estate:
+    """A generated estate: compute_v1 resources plus on-demand metrics and flow logs"""
+
+    def __init__(self, spec: EstateSpec = EstateSpec(), now: Optional[float] = None):
+        self.spec = spec
+        self.project_id = spec.project_id
+        self.now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        self.regions = list(spec.regions)
+        self.zones = [f"{region}-{suffix}" for region in self.regions
+                      for suffix in 'abcdef'[:spec.zones_per_region]]
+        rng = random.Random(spec.seed)
+
+        self.networks: List[Any] = []
+        self.subnets_by_region: Dict[str, List[Any]] = {region: [] for region in self.regions}
+        self.firewalls: List[Any] = []
+        self.instances_by_zone: Dict[str, List[Any]] = {zone: [] for zone in self.zones}
+        self.routers_by_region: Dict[str, List[Any]] = {region: [] for region in self.regions}
+        self.addresses_by_region: Dict[str, List[Any]] = {region: [] for region in self.regions}
+        self.load_balancers: List[Dict[str, str]] = []
+
+        # Per-instance facts the metric and flow log generators need
+        self._instances_by_name: Dict[str, List[Tuple[Any, str]]] = {}
+        self._running: List[Tuple[Any, str, str, str]] = []   # (instance, zone, network, subnet)
+        self._nat_instances: Dict[str, Tuple[Any, str, Any, Any]] = {}  # id -> (instance, zone, router, nat)
+
+        self._build_networks(rng)
+        subnets = self._build_subnets(rng)
+        self._build_instances(rng, subnets)
+        self._build_firewalls(rng)
+        self._build_nats(rng)
+        self._build_addresses(rng, subnets)
+        self._build_load_balancers(rng)
+
+    def _url(self, path: str) -> str:
+        return f"https://www.googleapis.com/compute/v1/projects/{self.project_id}/{path}"
+
+    def _created(self, rng: random.Random) -> str:
+        return _timestamp(self.now - rng.uniform(0, self.spec.history_days) * 86400)
+
+    def _build_networks(self, rng: random.Random) -> None:
+        for i in range(self.spec.networks):
+            name = 'default' if i == 0 else f"vpc-{TEAMS[i % len(TEAMS)]}-{i:04d}"
+            self.networks.append(compute_v1.Network(
+                name=name,
+                id=rng.getrandbits(63),
+                description=f"{TEAMS[i % len(TEAMS)]} network",
+                auto_create_subnetworks=i == 0,
+                routing_config=compute_v1.NetworkRoutingConfig(routing_mode='GLOBAL' if rng.random() < 0.3 else 'REGIONAL'),
+                creation_timestamp=self._created(rng),
+                self_link=self._url(f"global/networks/{name}")
+            ))
+
+    def _build_subnets(self, rng: random.Random) -> List[Tuple[Any, Any, ipaddress.IPv4Network]]:
+        """Subnets carved out of one /16 per network; VPCs reuse ranges as separate estates do"""
+        subnets = []
+        counts = _skewed_counts(rng, self.spec.subnets, len(self.networks), minimum=1)
+        for i, (network, count) in enumerate(zip(self.networks, counts)):
+            block = ipaddress.ip_network(f"10.{i % 256}.0.0/16")
+            prefix = min(28, max(20, 16 + math.ceil(math.log2(max(count, 1)))))
+            # A network spans a few regions, with most subnets in its home region
+            home = rng.sample(self.regions, min(len(self.regions), rng.randint(1, 4)))
+            for j, cidr in zip(range(count), block.subnets(new_prefix=prefix)):
+                region = home[0] if rng.random() < 0.6 else rng.choice(home)
+                name = f"{network.name}-{region}-{j}"
+                subnet = compute_v1.Subnetwork(
+                    name=name,
+                    id=rng.getrandbits(63),
+                    region=self._url(f"regions/{region}"),
+                    network=network.self_link,
+                    ip_cidr_range=str(cidr),
+                    gateway_address=str(cidr.network_address + 1),
+                    private_ip_google_access=rng.random() < 0.7,
+                    secondary_ip_ranges=[compute_v1.SubnetworkSecondaryRange(
+                        range_name='pods', ip_cidr_range=f"100.{64 + j % 64}.0.0/16"
+                    )] if rng.random() < 0.05 else [],
+                    creation_timestamp=self._created(rng),
+                    self_link=self._url(f"regions/{region}/subnetworks/{name}")
+                )
+                network.subnetworks.append(subnet.self_link)
+                self.subnets_by_region[region].append(subnet)
+                subnets.append((network, subnet, cidr))
+        return subnets
+
+    def _build_instances(self, rng: random.Random, subnets: List) -> None:
+        # Addresses .2 onwards; the top quarter stays free for reserved addresses
+        capacity = [cidr.num_addresses * 3 // 4 - 2 for _, _, cidr in subnets]
+        counts = [min(count, hosts) for count, hosts in
+                  zip(_skewed_counts(rng, self.spec.instances, len(subnets)), capacity)]
+        # What full subnets could not take goes to subnets with room
+        overflow = self.spec.instances - sum(counts)
+        open_subnets = [i for i in range(len(subnets)) if counts[i] < capacity[i]]
+        while overflow > 0 and open_subnets:
+            i = rng.choice(open_subnets)
+            added = min(overflow, capacity[i] - counts[i], max(1, overflow // len(open_subnets)))
+            counts[i] += added
+            overflow -= added
+            if counts[i] == capacity[i]:
+                open_subnets.remove(i)
+
+        serial = 0
+        for (network, subnet, cidr), count in zip(subnets, counts):
+            region = subnet.region.rpartition('/')[2]
+            zones = [zone for zone in self.zones if zone.startswith(region + '-')]
+            team = network.name.split('-')[1] if '-' in network.name else 'default'
+            for k in range(count):
+                serial += 1
+                zone = rng.choice(zones)
+                name = f"{team}-{rng.choice(('web', 'api', 'worker', 'db', 'cache', 'batch'))}-{serial:06d}"
+                tags = rng.sample(('web', 'ssh', 'db', 'internal', f"app-{serial % 20}", 'lb-backend'),
+                                  rng.randint(0, 3))
+                nic = compute_v1.NetworkInterface(
+                    network=network.self_link,
+                    subnetwork=subnet.self_link,
+                    network_i_p=str(cidr.network_address + 2 + k),
+                    access_configs=[compute_v1.AccessConfig(nat_i_p=f"34.{64 + serial % 64}.{serial >> 8 & 255}.{serial & 255}")]
+                    if rng.random() < self.spec.external_ip_fraction else [],
+                    alias_ip_ranges=[compute_v1.AliasIpRange(
+                        ip_cidr_range=f"100.{64 + serial % 64}.{serial >> 8 & 255}.0/24", subnetwork_range_name='pods'
+                    )] if subnet.secondary_ip_ranges else []
+                )
+                instance = compute_v1.Instance(
+                    name=name,
+                    id=rng.getrandbits(63),
+                    zone=self._url(f"zones/{zone}"),
+                    machine_type=self._url(f"zones/{zone}/machineTypes/{_weighted(rng, MACHINE_TYPES)}"),
+                    status=_weighted(rng, STATUSES),
+                    creation_timestamp=self._created(rng),
+                    network_interfaces=[nic],
+                    tags=compute_v1.Tags(items=tags),
+                    service_accounts=[compute_v1.ServiceAccount(
+                        email=f"{team}-sa@{self.project_id}.iam.gserviceaccount.com"
+                    )],
+                    labels={'team': team}
+                )
+                self.instances_by_zone[zone].append(instance)
+                self._instances_by_name.setdefault(name, []).append((instance, zone))
+                if instance.status == 'RUNNING':
+                    self._running.append((instance, zone, network.name, subnet.name))
+
+    def _build_firewalls(self, rng: random.Random) -> None:
+        counts = _skewed_counts(rng, self.spec.firewall_rules, len(self.networks))
+        for i, (network, count) in enumerate(zip(self.networks, counts)):
+            internal = f"10.{i % 256}.0.0/16"
+            for j in range(count):
+                kind = rng.random()
+                rule = {'direction': 'INGRESS', 'source_ranges': [], 'target_tags': []}
+                if j == 0:
+                    rule.update(kind='allow-internal', source_ranges=[internal],
+                                allowed=[compute_v1.Allowed(I_p_protocol='all')], priority=65534)
+                elif j == 1:
+                    rule.update(kind='allow-iap-ssh', source_ranges=[IAP_RANGE],
+                                allowed=[compute_v1.Allowed(I_p_protocol='tcp', ports=['22'])])
+                elif kind < 0.03:
+                    # The findings the security insights look for
+                    port = rng.choice(('22', '3389', '3306', '1-65535'))
+                    rule.update(kind='open', source_ranges=['0.0.0.0/0'],
+                                allowed=[compute_v1.Allowed(I_p_protocol='tcp', ports=[port])])
+                elif kind < 0.15:
+                    rule.update(kind='allow-web', source_ranges=['0.0.0.0/0'], target_tags=['web'],
+                                allowed=[compute_v1.Allowed(I_p_protocol='tcp', ports=['80', '443'])])
+                elif kind < 0.25:
+                    rule.update(kind='allow-health-checks', source_ranges=list(HEALTH_CHECK_RANGES),
+                                target_tags=['lb-backend'],
+                                allowed=[compute_v1.Allowed(I_p_protocol='tcp', ports=[rng.choice(APP_PORTS)])])
+                elif kind < 0.35:
+                    rule.update(kind='deny-egress', direction='EGRESS',
+                                destination_ranges=[f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.0.0/16"],
+                                denied=[compute_v1.Denied(I_p_protocol=rng.choice(('tcp', 'udp', 'all')))])
+                else:
+                    ports = rng.sample(APP_PORTS, rng.randint(1, 3))
+                    rule.update(kind='allow-app',
+                                source_tags=[f"app-{rng.randrange(20)}"] if rng.random() < 0.6 else [],
+                                source_ranges=[] if rng.random() < 0.6 else [f"10.{i % 256}.{rng.randrange(256)}.0/24"],
+                                target_tags=[f"app-{rng.randrange(20)}"],
+                                allowed=[compute_v1.Allowed(I_p_protocol=rng.choice(('tcp', 'udp')), ports=ports)])
+                    if not rule['source_tags'] and not rule['source_ranges']:
+                        rule['source_ranges'] = [internal]
+                kind = rule.pop('kind')
+                self.firewalls.append(compute_v1.Firewall(
+                    name=f"{network.name}-{kind}-{j}",
+                    id=rng.getrandbits(63),
+                    network=network.self_link,
+                    priority=rule.pop('priority', rng.choice((100, 500, 900, 1000, 1000, 1000, 2000))),
+                    disabled=rng.random() < 0.03,
+                    log_config=compute_v1.FirewallLogConfig(enable=rng.random() < 0.1),
+                    creation_timestamp=self._created(rng),
+                    **rule
+                ))
+
+    def _build_nats(self, rng: random.Random) -> None:
+        used = {}
+        for instance, zone, network, _ in self._running:
+            used.setdefault((network, zone.rpartition('-')[0]), []).append((instance, zone))
+        for (network, region), members in sorted(used.items()):
+            if rng.random() >= self.spec.nat_fraction:
+                continue
+            dynamic = rng.random() < 0.3
+            nat = compute_v1.RouterNat(
+                name=f"nat-{network}-{region}",
+                min_ports_per_vm=rng.choice((64, 128, 256)) if not dynamic else 32,
+                max_ports_per_vm=rng.choice((1024, 4096, 65536)) if dynamic else 0,
+                enable_dynamic_port_allocation=dynamic,
+                log_config=compute_v1.RouterNatLogConfig(enable=rng.random() < 0.2)
+            )
+            router = compute_v1.Router(
+                name=f"router-{network}-{region}",
+                id=rng.getrandbits(63),
+                region=self._url(f"regions/{region}"),
+                network=self._url(f"global/networks/{network}"),
+                bgp=compute_v1.RouterBgp(asn=64512 + rng.randrange(1000)),
+                nats=[nat],
+                creation_timestamp=self._created(rng)
+            )
+            self.routers_by_region[region].append(router)
+            for instance, zone in members:
+                if not instance.network_interfaces[0].access_configs:
+                    self._nat_instances[str(instance.id)] = (instance, zone, router, nat)
+
+    def _build_addresses(self, rng: random.Random, subnets: List) -> None:
+        for i in range(self.spec.reserved_addresses if subnets else 0):
+            network, subnet, cidr = rng.choice(subnets)
+            region = subnet.region.rpartition('/')[2]
+            # From the top quarter of the subnet, which instances leave free
+            offset = cidr.num_addresses - 2 - rng.randrange(max(1, cidr.num_addresses // 4 - 2))
+            self.addresses_by_region[region].append(compute_v1.Address(
+                name=f"addr-{subnet.name}-{i}",
+                id=rng.getrandbits(63),
+                region=subnet.region,
+                address=str(cidr.network_address + offset),
+                address_type='INTERNAL',
+                purpose='GCE_ENDPOINT',
+                network=network.self_link,
+                subnetwork=subnet.self_link,
+                status=rng.choice(('RESERVED', 'IN_USE'))
+            ))
+
+    def _build_load_balancers(self, rng: random.Random) -> None:
+        for i in range(self.spec.load_balancers):
+            team = TEAMS[i % len(TEAMS)]
+            self.load_balancers.append({
+                'project_id': self.project_id,
+                'region': 'global',
+                'forwarding_rule_name': f"{team}-https-fr-{i}",
+                'url_map_name': f"{team}-url-map-{i}",
+                'target_proxy_name': f"{team}-https-proxy-{i}",
+                'backend_target_name': f"{team}-backend-{i}",
+                'backend_target_type': 'BACKEND_SERVICE',
+                'matched_url_path_rule': 'UNMATCHED'
+            })
+
+    # Summary
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            'networks': len(self.networks),
+            'subnets': sum(map(len, self.subnets_by_region.values())),
+            'firewall_rules': len(self.firewalls),
+            'instances': sum(map(len, self.instances_by_zone.values())),
+            'running_instances': len(self._running),
+            'routers': sum(map(len, self.routers_by_region.values())),
+            'nat_instances': len(self._nat_instances),
+            'reserved_addresses': sum(map(len, self.addresses_by_region.values())),
+            'load_balancers': len(self.load_balancers)
+        }
+
+    # Metrics
+
+    def _shape(self, key_seed: int, t: float, utc_offset: float, amplitude: float, trend: float) -> float:
+        """Relative load at t: daily and weekly cycles, slow trend, deterministic noise and bursts"""
+        local = t + utc_offset * 3600
+        daily = 1 + amplitude * math.sin((local / 86400 - 0.375) * 2 * math.pi)
+        weekend = 0.6 if (int(local // 86400) + 3) % 7 >= 5 else 1.0
+        phase = key_seed % 1000
+        noise = 1 + 0.08 * math.sin(t * 0.0123 + phase) + 0.05 * math.sin(t * 0.00071 + 2 * phase)
+        growth = max(0.05, 1 + trend * (t - self.now) / 86400)
+        burst = 4.0 if (int(t // 3600) * 2654435761 + key_seed) % 997 < 3 else 1.0
+        return max(0.0, daily * weekend * noise * growth * burst)
+
+    def _params(self, *key) -> Tuple[int, random.Random]:
+        key_seed = _key_seed(self.spec.seed, *key)
+        return key_seed, random.Random(key_seed)
+
+    @staticmethod
+    def _utc_offset(region: str) -> int:
+        return REGION_UTC_OFFSETS.get(region.split('-')[0], 0)
+
+    def _created_at(self, resource) -> float:
+        return datetime.fromisoformat(resource.creation_timestamp).timestamp()
+
+    def _window(self, start: float, end: float, step: int, since: float = 0) -> List[int]:
+        """Aligned point end times in (start, end], none before the resource existed"""
+        first = int(max(start, since) // step + 1) * step
+        return list(range(first, int(end) + 1, step))
+
+    def _instance_series(self, metric_type: str, instance, zone: str, timestamps: List[int]) -> SyntheticSeries:
+        key_seed, rng = self._params(instance.id)
+        base = rng.lognormvariate(9.5, 1.6)          # bytes/s sent; median ~13 KB/s
+        amplitude, trend = rng.uniform(0.2, 0.8), rng.uniform(-0.001, 0.006)
+        direction, unit = metric_type.rsplit('/', 1)[1].split('_')[:2]
+        scale = base * (rng.uniform(0.3, 3.0) if direction == 'received' else 1.0)
+        if unit == 'packets':
+            scale /= rng.uniform(400, 1200)
+        offset = self._utc_offset(zone)
+        return SyntheticSeries(
+            'gce_instance',
+            {'project_id': self.project_id, 'instance_id': str(instance.id), 'zone': zone},
+            {'instance_name': instance.name, 'loadbalanced': 'false'},
+            'DELTA', 'INT64', timestamps,
+            [scale * self._shape(key_seed, t, offset, amplitude, trend) for t in timestamps]
+        )
+
+    def _nat_series(self, metric_type: str, entry, timestamps: List[int]) -> SyntheticSeries:
+        instance, zone, router, nat = entry
+        key_seed, rng = self._params('nat', instance.id)
+        amplitude = rng.uniform(0.2, 0.7)
+        # One VM in twenty is on its way to exhausting its ports
+        trend = rng.uniform(0.01, 0.03) if rng.random() < 0.05 else rng.uniform(-0.001, 0.004)
+        ports = rng.uniform(4, 48)
+        offset = self._utc_offset(zone)
+        name = metric_type.rsplit('/', 1)[1]
+        shape = [self._shape(key_seed, t, offset, amplitude, trend) for t in timestamps]
+        limit = nat.max_ports_per_vm or nat.min_ports_per_vm or 64
+        if name == 'port_usage':
+            values = [min(limit, ports * s) for s in shape]
+        elif name == 'allocated_ports':
+            if nat.enable_dynamic_port_allocation:
+                # Doubles from the minimum until it covers the usage
+                values = [min(limit, max(nat.min_ports_per_vm, 2 ** math.ceil(math.log2(max(ports * s, 1)))))
+                          for s in shape]
+            else:
+                values = [float(nat.min_ports_per_vm)] * len(shape)
+        else:
+            per_port = {'sent_bytes_count': 2000.0, 'received_bytes_count': 9000.0, 'sent_packets_count': 3.0,
+                        'received_packets_count': 7.0, 'new_connections': 0.2}[name]
+            values = [ports * s * per_port for s in shape]
+        return SyntheticSeries(
+            'gce_instance',
+            {'project_id': self.project_id, 'instance_id': str(instance.id), 'zone': zone},
+            {'nat_gateway_name': nat.name, 'router_id': str(router.id), 'ip_protocol': '6'},
+            'GAUGE' if metric_type in GAUGE_METRICS else 'DELTA', 'INT64', timestamps, values
+        )
+
+    def _lb_series(self, metric_type: str, labels: Dict[str, str], timestamps: List[int]) -> SyntheticSeries:
+        key_seed, rng = self._params('lb', labels['forwarding_rule_name'])
+        rate = rng.lognormvariate(3.5, 1.2)          # requests/s; median ~33
+        amplitude, trend = rng.uniform(0.3, 0.8), rng.uniform(0.0, 0.005)
+        shape = [self._shape(key_seed, t, 0, amplitude, trend) for t in timestamps]
+        name = metric_type.rsplit('/', 1)[1]
+        if name == 'backend_latencies':
+            latency = rng.uniform(20, 250)
+            values = [latency * (0.8 + 0.4 * min(s, 3.0)) for s in shape]
+        else:
+            per_request = {'request_count': 1.0, 'request_bytes_count': 900.0, 'response_bytes_count': 24000.0}[name]
+            values = [rate * per_request * s for s in shape]
+        return SyntheticSeries(
+            'https_lb_rule', dict(labels), {'response_code_class': '200', 'cache_result': 'DISABLED'},
+            'GAUGE' if metric_type in GAUGE_METRICS else 'DELTA',
+            'DOUBLE' if metric_type in DOUBLE_METRICS else 'INT64', timestamps, values
+        )
+
+    def time_series(self, metric_type: str, matches: Dict[str, str], start: float, end: float,
+                    step: int) -> Iterator[SyntheticSeries]:
+        """Series of metric_type over (start, end] at step seconds, filtered by label equality.
+
+        matches maps label names (instance_name, zone, instance_id, ...) to
+        values; a label is matched against the resource and metric labels.
+        """
+        def wanted(series_labels: Dict[str, str]) -> bool:
+            return all(series_labels.get(name, value) == value for name, value in matches.items())
+
+        if metric_type in INSTANCE_METRICS or metric_type in NAT_METRICS:
+            if 'instance_name' in matches:
+                candidates = [(instance, zone) for instance, zone in self._instances_by_name.get(matches['instance_name'], [])
+                              if instance.status == 'RUNNING']
+            else:
+                candidates = [(instance, zone) for instance, zone, _, _ in self._running]
+            for instance, zone in candidates:
+                labels = {'project_id': self.project_id, 'instance_id': str(instance.id), 'zone': zone,
+                          'instance_name': instance.name}
+                if not wanted(labels):
+                    continue
+                timestamps = self._window(start, end, step, self._created_at(instance))
+                if metric_type in INSTANCE_METRICS:
+                    yield self._instance_series(metric_type, instance, zone, timestamps)
+                elif str(instance.id) in self._nat_instances:
+                    yield self._nat_series(metric_type, self._nat_instances[str(instance.id)], timestamps)
+        elif metric_type in LB_METRICS:
+            for labels in self.load_balancers:
+                if wanted(labels):
+                    yield self._lb_series(metric_type, labels, self._window(start, end, step))
+
+    # Flow logs
+
+    def flow_records(self, start: float, end: float, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """VPC Flow Log payloads for (start, end], spread evenly over the window"""
+        total = int(self.spec.flow_records_per_hour * max(end - start, 0) / 3600)
+        total = min(total, limit) if limit is not None else total
+        if not self._running or not total:
+            return
+        rng = random.Random(_key_seed(self.spec.seed, 'flows', int(start), int(end)))
+        by_network: Dict[str, List] = {}
+        for entry in self._running:
+            by_network.setdefault(entry[2], []).append(entry)
+
+        for i in range(total):
+            src, zone, network, subnet = rng.choice(self._running)
+            src_ip = src.network_interfaces[0].network_i_p
+            payload = {
+                'src_instance': {'vm_name': src.name, 'zone': zone, 'project_id': self.project_id,
+                                 'region': zone.rpartition('-')[0]},
+                'src_vpc': {'vpc_name': network, 'subnetwork_name': subnet, 'project_id': self.project_id}
+            }
+            if rng.random() < 0.7:
+                dest, dest_zone, _, dest_subnet = rng.choice(by_network[network])
+                dest_ip = dest.network_interfaces[0].network_i_p
+                payload['dest_instance'] = {'vm_name': dest.name, 'zone': dest_zone, 'project_id': self.project_id,
+                                            'region': dest_zone.rpartition('-')[0]}
+                payload['dest_vpc'] = {'vpc_name': network, 'subnetwork_name': dest_subnet,
+                                       'project_id': self.project_id}
+                port = int(rng.choice(APP_PORTS + ('22', '443')))
+            else:
+                dest_ip = f"{rng.randint(1, 223)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+                port = rng.choice((443, 443, 443, 80, 53))
+            sent = int(rng.lognormvariate(8, 2))
+            timestamp = start + (i + 0.5) * (end - start) / total
+            payload.update({
+                'connection': {'src_ip': src_ip, 'dest_ip': dest_ip, 'src_port': rng.randint(32768, 60999),
+                               'dest_port': port, 'protocol': 17 if port == 53 else 6},
+                'reporter': rng.choice(('SRC', 'DEST')) if 'dest_instance' in payload else 'SRC',
+                'bytes_sent': str(sent),
+                'packets_sent': str(max(1, sent // 1000)),
+                'start_time': _timestamp(timestamp - 5),
+                'end_time': _timestamp(timestamp)
+            })
+            yield payload
+
+def generate_estate(preset: str = 'large', now: Optional[float] = None, **overrides) -> Estate:
+    """Estate from a named preset (small, medium, large) with spec fields overridden"""
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset: {preset}")
+    return Estate(replace(PRESETS[preset], **overrides), now=now)
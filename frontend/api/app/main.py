@@ -1,13 +1,26 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from app.routes.network import network_bp
 from app.routes.metrics import metrics_bp
+from app.routes.stream import DEFAULT_MAX_SUBSCRIBERS, stream_bp
+from app.routes.batch import batch_bp
+from app.utils.encoding import init_compression
+from app.utils.observability import OPENMETRICS_CONTENT_TYPE, init_observability, render_openmetrics
+from app.services.storage import storage_backend
 import os
 import logging
 
 def create_app():
     app = Flask(__name__)
     CORS(app)  # Enable CORS for frontend
+    init_observability(app)  # before compression, so request latency includes it
+    init_compression(app)  # gzip/zstd per Accept-Encoding
+    
+    # Live updates come from one Firestore watcher per process; disable for local runs
+    watcher_default = 'true' if storage_backend() == 'firestore' else 'false'
+    app.config['STREAM_WATCHER'] = os.environ.get('STREAM_WATCHER', watcher_default).lower() != 'false'
+    # Open streams per worker process; keep below the worker's thread count
+    app.config['STREAM_MAX_SUBSCRIBERS'] = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', DEFAULT_MAX_SUBSCRIBERS))
     
     # Configure logging
     logging.basicConfig(level=logging.INFO)
@@ -15,12 +28,19 @@ def create_app():
     # Register blueprints
     app.register_blueprint(network_bp, url_prefix='/api/network')
     app.register_blueprint(metrics_bp, url_prefix='/api/metrics')
+    app.register_blueprint(stream_bp, url_prefix='/api/stream')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
     
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return jsonify({'status': 'healthy', 'service': 'network-monitor-api'})
     
+    # Request latency, Firestore reads and cache hits summed over all workers
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_openmetrics(), content_type=OPENMETRICS_CONTENT_TYPE)
+    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+from flask import Blueprint, jsonify, request
+from app.routes.metrics import (
+    data_service, summarize_metrics, TIMESERIES_FIELDS, SUMMARY_FIELDS, COST_FIELDS
+)
+from app.routes.network import build_topology, filter_resources, TOPOLOGY_FIELDS, RESOURCE_FIELDS
+from app.services.batch_service import Read, execute_batch
+from app.utils.projection import parse_fields
+import logging
+
+batch_bp = Blueprint('batch', __name__)
+
+MAX_SUB_QUERIES = 20
+
+def _fields_arg(params):
+    """Sub-query fields may be sent as a list or a comma-separated string"""
+    fields = params.get('fields')
+    if isinstance(fields, (list, tuple)):
+        return ','.join(fields)
+    return fields
+
+def plan_timeseries(params):
+    fields = parse_fields(_fields_arg(params), TIMESERIES_FIELDS)
+    reads = {'metrics': Read('metrics', params.get('type', 'vpc'), int(params.get('hours', 24)), fields)}
+    
+    def build(data):
+        return {'success': True, 'data': data['metrics'], 'count': len(data['metrics'])}
+    return reads, build
+
+def plan_summary(params):
+    reads = {
+        'vpc': Read('metrics', 'vpc', 1, SUMMARY_FIELDS),
+        'nat_gateway': Read('metrics', 'nat_gateway', 1, SUMMARY_FIELDS),
+        'load_balancer': Read('metrics', 'load_balancer', 1, SUMMARY_FIELDS)
+    }
+    
+    def build(data):
+        summary = summarize_metrics(data['vpc'], data['nat_gateway'], data['load_balancer'])
+        return {'success': True, 'data': summary}
+    return reads, build
+
+def plan_costs(params):
+    fields = parse_fields(_fields_arg(params), COST_FIELDS, required_fields=['date'])
+    reads = {'costs': Read('costs', None, int(params.get('days', 30)), fields)}
+    
+    def build(data):
+        return {'success': True, 'data': data['costs'], 'count': len(data['costs'])}
+    return reads, build
+
+def plan_topology(params):
+    fields = parse_fields(_fields_arg(params), TOPOLOGY_FIELDS, required_fields=['resource_type'])
+    reads = {'resources': Read('resources', params.get('project_id'), None, fields)}
+    
+    def build(data):
+        return {'success': True, 'data': build_topology(data['resources'])}
+    return reads, build
+
+def plan_resources(params):
+    fields = parse_fields(_fields_arg(params), RESOURCE_FIELDS, required_fields=['resource_type'])
+    reads = {'resources': Read('resources', params.get('project_id'), None, fields)}
+    
+    def build(data):
+        resources = filter_resources(data['resources'], params.get('type'))
+        return {'success': True, 'data': resources, 'count': len(resources)}
+    return reads, build
+
+# Sub-query paths mirror the standalone endpoints
+PLANNERS = {
+    '/metrics/timeseries': plan_timeseries,
+    '/metrics/summary': plan_summary,
+    '/metrics/costs': plan_costs,
+    '/network/topology': plan_topology,
+    '/network/resources': plan_resources
+}
+
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    """Run several dashboard queries in one request.
+
+    Body: {"queries": [{"id": "...", "path": "/metrics/summary", "params": {...}}]}
+    Sub-queries that read the same collection share one Firestore query.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        queries = body.get('queries')
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'success': False, 'error': 'queries must be a non-empty list'}), 400
+        if len(queries) > MAX_SUB_QUERIES:
+            return jsonify({'success': False, 'error': f'At most {MAX_SUB_QUERIES} queries per batch'}), 400
+        
+        plans = {}
+        responses = {}
+        for index, query in enumerate(queries):
+            query_id = str(query.get('id', index)) if isinstance(query, dict) else str(index)
+            if query_id in plans or query_id in responses:
+                return jsonify({'success': False, 'error': f'Duplicate query id: {query_id}'}), 400
+            
+            try:
+                planner = PLANNERS.get(query.get('path')) if isinstance(query, dict) else None
+                if planner is None:
+                    raise ValueError(f"Unsupported query path: {query.get('path') if isinstance(query, dict) else query}")
+                plans[query_id] = planner(query.get('params') or {})
+            except (ValueError, TypeError) as e:
+                responses[query_id] = {'success': False, 'error': str(e)}
+        
+        responses.update(execute_batch(data_service, plans))
+        
+        return jsonify({
+            'success': True,
+            'data': responses
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in run_batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,9 +1,69 @@
 from flask import Blueprint, jsonify, request
-from app.services.firestore_service import FirestoreService
+from app.services.storage import create_data_service
+from app.utils.projection import parse_fields
+from app.utils.encoding import timeseries_response
 import logging
 
 metrics_bp = Blueprint('metrics', __name__)
-firestore_service = FirestoreService()
+data_service = create_data_service()
+
+# Default projections - chart views only need the point itself plus its series identity
+TIMESERIES_FIELDS = ['metric_type', 'resource_type', 'resource_labels', 'timestamp', 'value']
+SUMMARY_FIELDS = ['resource_id', 'utilization', 'bytes_sent', 'bytes_received']
+COST_FIELDS = ['date', 'resource', 'zone', 'region', 'destination_class',
+               'destination_class_estimated', 'bytes', 'cost_usd']
+ANOMALY_FIELDS = [
+    'metric_type', 'resource_type', 'resource_labels', 'timestamp', 'value',
+    'expected', 'score', 'direction'
+]
+
+TRAFFIC_MATRIX_LEVELS = ('zone', 'region')
+
+def merge_traffic_matrices(buckets):
+    """Relabel stored buckets onto one shared axis and total them for the heatmap.
+
+    Zones come and go between buckets, so each bucket's src/dst indexes are
+    mapped from its own labels to the sorted union of all labels.
+    """
+    labels = sorted({label for bucket in buckets for label in bucket.get('labels', [])})
+    position = {label: i for i, label in enumerate(labels)}
+    total = [[0] * len(labels) for _ in labels]
+    merged = []
+    for bucket in buckets:
+        own = bucket.get('labels', [])
+        entries = []
+        for src, dst, value in zip(bucket.get('src', []), bucket.get('dst', []), bucket.get('bytes', [])):
+            i, j = position[own[src]], position[own[dst]]
+            total[i][j] += value
+            entries.append({'src': i, 'dst': j, 'bytes': value})
+        merged.append({
+            'timestamp': bucket['timestamp'],
+            'bucket_seconds': bucket.get('bucket_seconds'),
+            'entries': entries
+        })
+    return {'labels': labels, 'total': total, 'buckets': merged}
+
+def summarize_metrics(vpc_metrics, nat_metrics, lb_metrics):
+    """Aggregate recent VPC, NAT and load balancer metrics into dashboard totals"""
+    summary = {
+        'total_vpcs': len(set(m.get('resource_id') for m in vpc_metrics)),
+        'total_nat_gateways': len(set(m.get('resource_id') for m in nat_metrics)),
+        'total_load_balancers': len(set(m.get('resource_id') for m in lb_metrics)),
+        'avg_utilization': 0,
+        'total_bytes_processed': 0
+    }
+    
+    # Calculate averages
+    all_metrics = vpc_metrics + nat_metrics + lb_metrics
+    if all_metrics:
+        utilizations = [m.get('utilization', 0) for m in all_metrics if m.get('utilization')]
+        if utilizations:
+            summary['avg_utilization'] = sum(utilizations) / len(utilizations)
+        
+        bytes_processed = [m.get('bytes_sent', 0) + m.get('bytes_received', 0) for m in all_metrics]
+        summary['total_bytes_processed'] = sum(bytes_processed)
+    
+    return summary
 
 @metrics_bp.route('/timeseries', methods=['GET'])
 def get_timeseries_metrics():
@@ -11,14 +71,15 @@ def get_timeseries_metrics():
     try:
         resource_type = request.args.get('type', 'vpc')
         hours = int(request.args.get('hours', 24))
+        try:
+            fields = parse_fields(request.args.get('fields'), TIMESERIES_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        metrics = firestore_service.get_metrics_data(resource_type, hours)
+        metrics = data_service.get_metrics_data(resource_type, hours, fields=fields)
         
-        return jsonify({
-            'success': True,
-            'data': metrics,
-            'count': len(metrics)
-        })
+        # JSON by default, columnar MessagePack when the client asks for it
+        return timeseries_response(metrics)
         
     except Exception as e:
         logging.error(f"Error in get_timeseries_metrics: {str(e)}")
@@ -28,28 +89,12 @@ def get_timeseries_metrics():
 def get_metrics_summary():
     """Get aggregated metrics summary"""
     try:
-        # Get recent metrics for summary
-        vpc_metrics = firestore_service.get_metrics_data('vpc', 1)
-        nat_metrics = firestore_service.get_metrics_data('nat_gateway', 1)
-        lb_metrics = firestore_service.get_metrics_data('load_balancer', 1)
-        
-        summary = {
-            'total_vpcs': len(set(m.get('resource_id') for m in vpc_metrics)),
-            'total_nat_gateways': len(set(m.get('resource_id') for m in nat_metrics)),
-            'total_load_balancers': len(set(m.get('resource_id') for m in lb_metrics)),
-            'avg_utilization': 0,
-            'total_bytes_processed': 0
-        }
-        
-        # Calculate averages
-        all_metrics = vpc_metrics + nat_metrics + lb_metrics
-        if all_metrics:
-            utilizations = [m.get('utilization', 0) for m in all_metrics if m.get('utilization')]
-            if utilizations:
-                summary['avg_utilization'] = sum(utilizations) / len(utilizations)
-            
-            bytes_processed = [m.get('bytes_sent', 0) + m.get('bytes_received', 0) for m in all_metrics]
-            summary['total_bytes_processed'] = sum(bytes_processed)
+        # Get recent metrics for summary - only the fields the aggregation reads
+        vpc_metrics = data_service.get_metrics_data('vpc', 1, fields=SUMMARY_FIELDS)
+        nat_metrics = data_service.get_metrics_data('nat_gateway', 1, fields=SUMMARY_FIELDS)
+        lb_metrics = data_service.get_metrics_data('load_balancer', 1, fields=SUMMARY_FIELDS)
+        
+        summary = summarize_metrics(vpc_metrics, nat_metrics, lb_metrics)
         
         return jsonify({
             'success': True,
@@ -65,7 +110,12 @@ def get_cost_metrics():
     """Get cost analytics data"""
     try:
         days = int(request.args.get('days', 30))
-        costs = firestore_service.get_cost_data(days)
+        try:
+            fields = parse_fields(request.args.get('fields'), COST_FIELDS, required_fields=['date'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        costs = data_service.get_cost_data(days, fields=fields)
         
         return jsonify({
             'success': True,
@@ -75,4 +125,54 @@ def get_cost_metrics():
         
     except Exception as e:
         logging.error(f"Error in get_cost_metrics: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@metrics_bp.route('/anomalies', methods=['GET'])
+def get_anomalies():
+    """Get metric anomalies flagged by the streaming detector"""
+    try:
+        hours = int(request.args.get('hours', 24))
+        try:
+            fields = parse_fields(request.args.get('fields'), ANOMALY_FIELDS, required_fields=['timestamp'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        anomalies = data_service.get_anomalies(hours, fields=fields)
+        
+        return jsonify({
+            'success': True,
+            'data': anomalies,
+            'count': len(anomalies)
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_anomalies: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@metrics_bp.route('/traffic-matrix', methods=['GET'])
+def get_traffic_matrix():
+    """Get zone x zone or region x region traffic matrices for heatmaps"""
+    try:
+        project_id = request.args.get('project_id')
+        if not project_id:
+            return jsonify({'success': False, 'error': 'project_id is required'}), 400
+        level = request.args.get('level', 'zone')
+        if level not in TRAFFIC_MATRIX_LEVELS:
+            return jsonify({'success': False, 'error': f"level must be one of {', '.join(TRAFFIC_MATRIX_LEVELS)}"}), 400
+        try:
+            hours = int(request.args.get('hours', 24))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'hours must be an integer'}), 400
+        
+        buckets = data_service.get_traffic_matrices(project_id, level, hours)
+        
+        return jsonify({
+            'success': True,
+            'level': level,
+            'data': merge_traffic_matrices(buckets),
+            'count': len(buckets)
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_traffic_matrix: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
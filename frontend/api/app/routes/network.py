@@ -1,64 +1,104 @@
 from flask import Blueprint, jsonify, request
-from app.services.firestore_service import FirestoreService
+from app.services.storage import create_data_service
+from app.services.overlap_service import OverlapService
+from app.services.history_service import HistoryService, parse_as_of
+from app.utils.projection import parse_fields
+from datetime import datetime, timedelta, timezone
 import logging
 
 network_bp = Blueprint('network', __name__)
-firestore_service = FirestoreService()
+data_service = create_data_service()
+overlap_service = OverlapService(data_service)
+history_service = HistoryService(data_service)
+
+# Default projections - descriptions and self_links stay in Firestore unless asked for
+TOPOLOGY_FIELDS = [
+    'resource_type', 'name', 'region', 'zone', 'cidr_block', 'status',
+    'vpc_id', 'subnet_id', 'lb_type'
+]
+RESOURCE_FIELDS = [
+    'resource_type', 'name', 'project_id', 'region', 'zone', 'network',
+    'cidr_block', 'status'
+]
+UTILIZATION_FIELDS = [
+    'name', 'network', 'region', 'ip_cidr_range', 'total_addresses', 'used_addresses',
+    'reserved_addresses', 'free_addresses', 'utilization_percent', 'largest_free_block',
+    'fragmentation', 'timestamp'
+]
+CHANGE_FIELDS = [
+    'timestamp', 'project_id', 'section', 'resource_key', 'resource_name', 'event', 'changes'
+]
+
+def build_topology(resources):
+    """Transform resource documents into the topology visualization shape"""
+    topology = {
+        'vpcs': [],
+        'subnets': [],
+        'nat_gateways': [],
+        'load_balancers': [],
+        'connections': []
+    }
+    
+    for resource in resources:
+        resource_type = resource.get('resource_type', '').lower()
+        
+        if 'vpc' in resource_type:
+            topology['vpcs'].append({
+                'id': resource['id'],
+                'name': resource.get('name', ''),
+                'region': resource.get('region', ''),
+                'cidr_block': resource.get('cidr_block', ''),
+                'status': resource.get('status', 'unknown')
+            })
+        elif 'subnet' in resource_type:
+            topology['subnets'].append({
+                'id': resource['id'],
+                'name': resource.get('name', ''),
+                'vpc_id': resource.get('vpc_id', ''),
+                'cidr_block': resource.get('cidr_block', ''),
+                'zone': resource.get('zone', '')
+            })
+        elif 'nat' in resource_type:
+            topology['nat_gateways'].append({
+                'id': resource['id'],
+                'name': resource.get('name', ''),
+                'subnet_id': resource.get('subnet_id', ''),
+                'status': resource.get('status', 'unknown')
+            })
+        elif 'load_balancer' in resource_type or 'lb' in resource_type:
+            topology['load_balancers'].append({
+                'id': resource['id'],
+                'name': resource.get('name', ''),
+                'type': resource.get('lb_type', 'unknown'),
+                'status': resource.get('status', 'unknown')
+            })
+    
+    return topology
+
+def filter_resources(resources, resource_type):
+    """Keep resources whose resource_type contains the requested type"""
+    if not resource_type:
+        return resources
+    return [r for r in resources if resource_type.lower() in r.get('resource_type', '').lower()]
 
 @network_bp.route('/topology', methods=['GET'])
 def get_network_topology():
     """Get network topology data for visualization"""
     try:
         project_id = request.args.get('project_id')
-        resources = firestore_service.get_network_resources(project_id)
-        
-        # Transform data for topology visualization
-        topology = {
-            'vpcs': [],
-            'subnets': [],
-            'nat_gateways': [],
-            'load_balancers': [],
-            'connections': []
-        }
-        
-        for resource in resources:
-            resource_type = resource.get('resource_type', '').lower()
-            
-            if 'vpc' in resource_type:
-                topology['vpcs'].append({
-                    'id': resource['id'],
-                    'name': resource.get('name', ''),
-                    'region': resource.get('region', ''),
-                    'cidr_block': resource.get('cidr_block', ''),
-                    'status': resource.get('status', 'unknown')
-                })
-            elif 'subnet' in resource_type:
-                topology['subnets'].append({
-                    'id': resource['id'],
-                    'name': resource.get('name', ''),
-                    'vpc_id': resource.get('vpc_id', ''),
-                    'cidr_block': resource.get('cidr_block', ''),
-                    'zone': resource.get('zone', '')
-                })
-            elif 'nat' in resource_type:
-                topology['nat_gateways'].append({
-                    'id': resource['id'],
-                    'name': resource.get('name', ''),
-                    'subnet_id': resource.get('subnet_id', ''),
-                    'status': resource.get('status', 'unknown')
-                })
-            elif 'load_balancer' in resource_type or 'lb' in resource_type:
-                topology['load_balancers'].append({
-                    'id': resource['id'],
-                    'name': resource.get('name', ''),
-                    'type': resource.get('lb_type', 'unknown'),
-                    'status': resource.get('status', 'unknown')
-                })
+        try:
+            fields = parse_fields(request.args.get('fields'), TOPOLOGY_FIELDS, required_fields=['resource_type'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        resources = data_service.get_network_resources(project_id, fields=fields)
+        
+        topology = build_topology(resources)
         
         return jsonify({
             'success': True,
             'data': topology,
-            'timestamp': firestore_service.db.collection('_').document().create_time
+            'timestamp': datetime.now(timezone.utc).isoformat()
         })
         
     except Exception as e:
@@ -71,11 +111,14 @@ def get_network_resources():
     try:
         project_id = request.args.get('project_id')
         resource_type = request.args.get('type')
+        try:
+            fields = parse_fields(request.args.get('fields'), RESOURCE_FIELDS, required_fields=['resource_type'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        resources = firestore_service.get_network_resources(project_id)
+        resources = data_service.get_network_resources(project_id, fields=fields)
         
-        if resource_type:
-            resources = [r for r in resources if resource_type.lower() in r.get('resource_type', '').lower()]
+        resources = filter_resources(resources, resource_type)
         
         return jsonify({
             'success': True,
@@ -85,4 +128,121 @@ def get_network_resources():
         
     except Exception as e:
         logging.error(f"Error in get_network_resources: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@network_bp.route('/utilization', methods=['GET'])
+def get_subnet_utilization():
+    """Get measured per-subnet address utilization and fragmentation"""
+    try:
+        project_id = request.args.get('project_id')
+        network = request.args.get('network')
+        try:
+            fields = parse_fields(request.args.get('fields'), UTILIZATION_FIELDS,
+                                  required_fields=['utilization_percent'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        subnets = data_service.get_subnet_utilization(project_id, network, fields=fields)
+        
+        return jsonify({
+            'success': True,
+            'data': subnets,
+            'count': len(subnets)
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_subnet_utilization: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@network_bp.route('/overlaps', methods=['GET'])
+def get_subnet_overlaps():
+    """Get overlapping subnet ranges across networks and projects, by network pair"""
+    try:
+        project_id = request.args.get('project_id')
+        try:
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        
+        report = overlap_service.get_overlaps()
+        
+        network_pairs = report['network_pairs']
+        if project_id:
+            network_pairs = [
+                p for p in network_pairs
+                if any(n['project_id'] == project_id for n in p['networks'])
+            ]
+        
+        return jsonify({
+            'success': True,
+            'data': network_pairs[:limit],
+            'count': len(network_pairs),
+            'overlapping_pairs': sum(p['overlap_count'] for p in network_pairs),
+            'subnets_analyzed': report['subnets_analyzed'],
+            'inventory_fingerprint': report['fingerprint']
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_subnet_overlaps: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@network_bp.route('/inventory', methods=['GET'])
+def get_inventory_as_of():
+    """Get the inventory as it was at a point in time, rebuilt from the change log"""
+    try:
+        project_id = request.args.get('project_id')
+        if not project_id:
+            return jsonify({'success': False, 'error': 'project_id is required'}), 400
+        try:
+            as_of = parse_as_of(request.args.get('as_of'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'as_of must be an ISO 8601 timestamp'}), 400
+        sections = request.args.get('sections')
+        sections = [s.strip() for s in sections.split(',') if s.strip()] if sections else None
+        
+        inventory = history_service.inventory_as_of(project_id, as_of, sections)
+        if inventory is None:
+            return jsonify({'success': False, 'error': f'No inventory checkpoint at or before {as_of}'}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': inventory['sections'],
+            'as_of': inventory['as_of'],
+            'checkpoint': inventory['checkpoint'],
+            'events_replayed': inventory['events_replayed']
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_inventory_as_of: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@network_bp.route('/changes', methods=['GET'])
+def get_change_timeline():
+    """Get recent inventory changes, newest first"""
+    try:
+        project_id = request.args.get('project_id')
+        section = request.args.get('section')
+        try:
+            hours = int(request.args.get('hours', 24))
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'hours and limit must be integers'}), 400
+        try:
+            fields = parse_fields(request.args.get('fields'), CHANGE_FIELDS, required_fields=['timestamp'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        after = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+        changes = data_service.get_inventory_changes(
+            project_id, after=after, section=section, limit=limit, newest_first=True, fields=fields
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': changes,
+            'count': len(changes)
+        })
+        
+    except Exception as e:
+        logging.error(f"Error in get_change_timeline: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,66 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from app.services.stream_service import get_publisher
+import json
+import logging
+
+stream_bp = Blueprint('stream', __name__)
+
+EVENT_TYPES = ('summary', 'topology')
+
+# Comment lines keep idle connections open through proxies
+HEARTBEAT_SECONDS = 15
+
+# Each open stream holds one worker thread for as long as it lasts; the cap
+# stays below the thread count so other requests are still served
+DEFAULT_MAX_SUBSCRIBERS = 12
+
+def format_event(event):
+    """Serialize an event in text/event-stream format"""
+    data = json.dumps(event['data'], default=str)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+def event_stream(subscription):
+    try:
+        yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+        while True:
+            event = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield format_event(event)
+    except GeneratorExit:
+        pass
+    finally:
+        subscription.close()
+
+@stream_bp.route('', methods=['GET'])
+def stream_updates():
+    """Server-Sent Events stream of summary values and topology generation changes"""
+    requested = request.args.get('events')
+    if requested:
+        event_types = [e.strip() for e in requested.split(',') if e.strip()]
+        unknown = [e for e in event_types if e not in EVENT_TYPES]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown event types: {', '.join(unknown)}"}), 400
+    else:
+        event_types = EVENT_TYPES
+
+    publisher = get_publisher(start_watcher=current_app.config.get('STREAM_WATCHER', True))
+    subscription = publisher.subscribe(
+        event_types, limit=current_app.config.get('STREAM_MAX_SUBSCRIBERS', DEFAULT_MAX_SUBSCRIBERS)
+    )
+    if subscription is None:
+        logging.warning(f"Stream subscriber refused: {publisher.subscriber_count()} streams open")
+        response = jsonify({'success': False, 'error': 'Too many open streams on this instance; retry later'})
+        response.headers['Retry-After'] = str(HEARTBEAT_SECONDS)
+        return response, 503
+    logging.info(f"Stream subscriber connected ({publisher.subscriber_count()} open)")
+
+    return Response(
+        event_stream(subscription),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
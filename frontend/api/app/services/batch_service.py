@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from datetime import datetime, timedelta
+import logging
+from app.utils.observability import record_cache
+
+MAX_WORKERS = 8
+
+class Read:
+    """One Firestore read a sub-query depends on.
+
+    kind: 'metrics' (key=resource_type, window in hours),
+          'resources' (key=project_id, no window) or
+          'costs' (no key, window in days)
+    fields: projection list, or None for full documents
+    """
+
+    TIME_FIELDS = {'metrics': 'timestamp', 'costs': 'date'}
+
+    def __init__(self, kind, key=None, window=None, fields=None):
+        self.kind = kind
+        self.key = key
+        self.window = window
+        self.fields = list(fields) if fields is not None else None
+
+    @property
+    def group(self):
+        return (self.kind, self.key)
+
+    def cutoff(self, now):
+        if self.kind == 'metrics':
+            return now - timedelta(hours=self.window)
+        if self.kind == 'costs':
+            return now - timedelta(days=self.window)
+        return None
+
+def merge_reads(reads):
+    """Collapse reads of the same collection/key into one covering read.
+
+    The merged read spans the widest window and the union of projections, so
+    overlapping sub-queries are served from a single Firestore query.
+    """
+    merged = {}
+    for read in reads:
+        current = merged.get(read.group)
+        if current is None:
+            merged[read.group] = Read(read.kind, read.key, read.window, read.fields)
+            continue
+
+        if read.window is not None and (current.window is None or read.window > current.window):
+            current.window = read.window
+        if current.fields is None or read.fields is None:
+            current.fields = None
+        else:
+            current.fields.extend(f for f in read.fields if f not in current.fields)
+
+    # Narrower reads are filtered by time in memory, so the time field must come back
+    for read in merged.values():
+        time_field = Read.TIME_FIELDS.get(read.kind)
+        if time_field and read.fields is not None and time_field not in read.fields:
+            read.fields.append(time_field)
+    return merged
+
+def fetch_read(service, read):
+    """Run a merged read against FirestoreService"""
+    if read.kind == 'metrics':
+        return service.get_metrics_data(read.key, read.window, fields=read.fields)
+    if read.kind == 'resources':
+        return service.get_network_resources(read.key, fields=read.fields)
+    if read.kind == 'costs':
+        return service.get_cost_data(read.window, fields=read.fields)
+    raise ValueError(f"Unknown read kind: {read.kind}")
+
+def _parse_time(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return value
+
+def slice_result(read, merged, documents, now):
+    """Cut a merged result down to what a single read asked for"""
+    if read.window is not None and read.window != merged.window:
+        time_field = Read.TIME_FIELDS[read.kind]
+        cutoff = read.cutoff(now)
+        documents = [d for d in documents if d.get(time_field) and _parse_time(d[time_field]) >= cutoff]
+
+    if read.fields is not None and read.fields != merged.fields:
+        keep = set(read.fields) | {'id'}
+        documents = [{k: v for k, v in d.items() if k in keep} for d in documents]
+    return documents
+
+def execute_batch(service, plans):
+    """Execute planned sub-queries with shared, concurrent Firestore reads.
+
+    plans: {query_id: (reads, build)} where reads maps names to Read objects and
+    build turns {name: documents} into that sub-query's response body.
+    Returns {query_id: response body}.
+    """
+    now = datetime.utcnow()
+    requested = [read for reads, _ in plans.values() for read in reads.values()]
+    merged = merge_reads(requested)
+    # A read served by another sub-query's covering read is a hit
+    record_cache('batch_reads', True, len(requested) - len(merged))
+    record_cache('batch_reads', False, len(merged))
+
+    results = {}
+    if merged:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(merged))) as executor:
+            # Each read runs in a copy of this context, so its Firestore reads count towards the route
+            futures = {group: executor.submit(contextvars.copy_context().run, fetch_read, service, read)
+                       for group, read in merged.items()}
+            for group, future in futures.items():
+                try:
+                    results[group] = future.result()
+                except Exception as e:
+                    # Fails only the sub-queries that depend on this read
+                    results[group] = e
+
+    logging.info(f"Batch served {len(plans)} sub-queries with {len(merged)} Firestore queries")
+
+    responses = {}
+    for query_id, (reads, build) in plans.items():
+        try:
+            data = {}
+            for name, read in reads.items():
+                documents = results[read.group]
+                if isinstance(documents, Exception):
+                    raise documents
+                data[name] = slice_result(read, merged[read.group], documents, now)
+            responses[query_id] = build(data)
+        except Exception as e:
+            logging.error(f"Error in batch sub-query {query_id}: {str(e)}")
+            responses[query_id] = {'success': False, 'error': str(e)}
+    return responses
@@ -1,20 +1,82 @@
 from google.cloud import firestore
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import logging
+from app.utils.observability import record_firestore_read
+
+class CountedQuery:
+    """Collection or query whose stream() records the documents it returns.
+
+    Builder calls (where, order_by, select, limit, ...) hand back counted
+    queries for the same collection; anything else passes through.
+    """
+
+    def __init__(self, query, collection):
+        self._query = query
+        self._collection = collection
+
+    def stream(self, *args, **kwargs):
+        documents = 0
+        try:
+            for doc in self._query.stream(*args, **kwargs):
+                documents += 1
+                yield doc
+        finally:
+            record_firestore_read(self._collection, documents)
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return CountedQuery(result, self._collection) if hasattr(result, 'stream') else result
+        return call
+
+class CountedClient:
+    """Firestore client wrapper counting queries and documents read per route and collection"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def collection(self, name):
+        return CountedQuery(self._client.collection(name), name)
+
+    def get_all(self, refs, *args, **kwargs):
+        refs = list(refs)
+        collection = refs[0].parent.id if refs and getattr(refs[0], 'parent', None) is not None else 'unknown'
+        documents = 0
+        try:
+            for snap in self._client.get_all(refs, *args, **kwargs):
+                documents += 1
+                yield snap
+        finally:
+            record_firestore_read(collection, documents)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
 
 class FirestoreService:
     def __init__(self):
-        self.db = firestore.Client()
+        self.db = CountedClient(firestore.Client())
         
-    def get_network_resources(self, project_id=None):
-        """Get current network resource inventory"""
+    def get_network_resources(self, project_id=None, fields=None):
+        """Get current network resource inventory
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
         try:
             collection_ref = self.db.collection('network_resources')
             
             if project_id:
-                docs = collection_ref.where('project_id', '==', project_id).stream()
+                query = collection_ref.where('project_id', '==', project_id)
             else:
-                docs = collection_ref.limit(100).stream()
+                query = collection_ref.limit(100)
+            
+            if fields is not None:
+                query = query.select(fields)
+            docs = query.stream()
                 
             resources = []
             for doc in docs:
@@ -27,18 +89,24 @@ class FirestoreService:
             logging.error(f"Error fetching network resources: {str(e)}")
             return []
     
-    def get_metrics_data(self, resource_type, time_range_hours=24):
-        """Get time-series metrics data"""
+    def get_metrics_data(self, resource_type, time_range_hours=24, fields=None):
+        """Get time-series metrics data
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
         try:
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(hours=time_range_hours)
             
             collection_ref = self.db.collection('metrics')
-            docs = collection_ref.where('resource_type', '==', resource_type)\
+            query = collection_ref.where('resource_type', '==', resource_type)\
                                 .where('timestamp', '>=', start_time)\
                                 .where('timestamp', '<=', end_time)\
-                                .order_by('timestamp')\
-                                .stream()
+                                .order_by('timestamp')
+            
+            if fields is not None:
+                query = query.select(fields)
+            docs = query.stream()
             
             metrics = []
             for doc in docs:
@@ -53,17 +121,23 @@ class FirestoreService:
             logging.error(f"Error fetching metrics: {str(e)}")
             return []
             
-    def get_cost_data(self, time_range_days=30):
-        """Get cost analytics data"""
+    def get_cost_data(self, time_range_days=30, fields=None):
+        """Get cost analytics data
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
         try:
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=time_range_days)
             
             collection_ref = self.db.collection('costs')
-            docs = collection_ref.where('date', '>=', start_date)\
+            query = collection_ref.where('date', '>=', start_date)\
                                 .where('date', '<=', end_date)\
-                                .order_by('date')\
-                                .stream()
+                                .order_by('date')
+            
+            if fields is not None:
+                query = query.select(fields)
+            docs = query.stream()
             
             costs = []
             for doc in docs:
@@ -75,4 +149,194 @@ class FirestoreService:
             return costs
         except Exception as e:
             logging.error(f"Error fetching cost data: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_subnet_utilization(self, project_id=None, network=None, fields=None):
+        """Get measured per-subnet address utilization, most utilized first
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
+        try:
+            query = self.db.collection('subnet-utilization')
+            if project_id:
+                query = query.where('project_id', '==', project_id)
+            if network:
+                query = query.where('network', '==', network)
+            
+            if fields is not None:
+                query = query.select(fields)
+            docs = query.stream()
+            
+            subnets = []
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                subnets.append(data)
+            
+            subnets.sort(key=lambda s: s.get('utilization_percent', 0), reverse=True)
+            return subnets
+        except Exception as e:
+            logging.error(f"Error fetching subnet utilization: {str(e)}")
+            return []
+
+    def get_anomalies(self, time_range_hours=24, fields=None):
+        """Get anomalies flagged by the collector, newest first
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=time_range_hours)).isoformat()
+            query = self.db.collection('anomalies')\
+                           .where('timestamp', '>=', cutoff)\
+                           .order_by('timestamp', direction=firestore.Query.DESCENDING)
+            
+            if fields is not None:
+                query = query.select(fields)
+            
+            anomalies = []
+            for doc in query.stream():
+                data = doc.to_dict()
+                data['id'] = doc.id
+                anomalies.append(data)
+            
+            return anomalies
+        except Exception as e:
+            logging.error(f"Error fetching anomalies: {str(e)}")
+            return []
+
+    def _get_blobs(self, hashes):
+        collection_ref = self.db.collection('inventory-blobs')
+        blobs = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 300):
+            refs = [collection_ref.document(h) for h in hashes[i:i + 300]]
+            for snap in self.db.get_all(refs):
+                if snap.exists:
+                    blobs[snap.id] = snap.to_dict()
+        return blobs
+
+    def get_subnet_inventory(self, known_fingerprint=None):
+        """Subnets from the latest inventory snapshot of every project
+
+        Reads the per-project copies of the newest manifest that the
+        collector keeps in inventory-latest, one document per project.
+        Returns (fingerprint, subnets). The fingerprint is built from the
+        manifests alone; when it equals known_fingerprint the blobs are not
+        read and subnets is None.
+        """
+        query = self.db.collection('inventory-latest')\
+                       .select(['project_id', 'manifest_id', 'snapshot_format', 'sections'])
+
+        manifests = {}
+        for doc in query.stream():
+            data = doc.to_dict()
+            if data.get('project_id'):
+                manifests[data['project_id']] = (data['manifest_id'], data)
+
+        fingerprint = inventory_fingerprint(manifests)
+        if fingerprint == known_fingerprint:
+            return fingerprint, None
+
+        subnets = []
+        chunk_hashes = {}
+        for project_id, (doc_id, data) in manifests.items():
+            section = data['sections'].get('subnetworks', {'chunks': []})
+            chunk_hashes[project_id] = section['chunks']
+
+        chunks = self._get_blobs({h for hashes in chunk_hashes.values() for h in hashes})
+        resources = self._get_blobs({h for chunk in chunks.values() for h in chunk.get('hashes', [])})
+        for project_id, hashes in chunk_hashes.items():
+            for chunk_hash in hashes:
+                for resource_hash in chunks.get(chunk_hash, {}).get('hashes', []):
+                    if resource_hash in resources:
+                        subnets.append(dict(resources[resource_hash]['data'], project_id=project_id))
+
+        return fingerprint, subnets
+
+    def _section_resources(self, manifest, names):
+        """Rebuild snapshot sections from their chunk and resource blobs"""
+        chunks = self._get_blobs({h for name in names for h in manifest['sections'][name]['chunks']})
+        resources = self._get_blobs({h for chunk in chunks.values() for h in chunk.get('hashes', [])})
+        return {
+            name: [
+                resources[resource_hash]['data']
+                for chunk_hash in manifest['sections'][name]['chunks']
+                for resource_hash in chunks.get(chunk_hash, {}).get('hashes', [])
+                if resource_hash in resources
+            ]
+            for name in names
+        }
+
+    def get_inventory_checkpoint(self, project_id, as_of, sections=None):
+        """Newest change-log checkpoint at or before as_of
+
+        Returns (doc_id, manifest, {section: resources}) limited to the
+        requested sections, or None when there is no earlier checkpoint.
+        """
+        query = self.db.collection('inventory-checkpoints')\
+                       .where('project_id', '==', project_id)\
+                       .where('timestamp', '<=', as_of)\
+                       .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                       .limit(1)
+        for doc in query.stream():
+            manifest = doc.to_dict()
+            names = [name for name in manifest['sections'] if sections is None or name in sections]
+            return doc.id, manifest, self._section_resources(manifest, names)
+        return None
+
+    def get_inventory_changes(self, project_id=None, after=None, until=None, section=None,
+                              limit=None, newest_first=False, fields=None):
+        """Inventory change events with after < timestamp <= until, in time order
+
+        fields: optional list of field paths; only those are fetched and deserialized
+        """
+        query = self.db.collection('inventory-changes')
+        if project_id:
+            query = query.where('project_id', '==', project_id)
+        if section:
+            query = query.where('section', '==', section)
+        if after:
+            query = query.where('timestamp', '>', after)
+        if until:
+            query = query.where('timestamp', '<=', until)
+        direction = firestore.Query.DESCENDING if newest_first else firestore.Query.ASCENDING
+        query = query.order_by('timestamp', direction=direction)
+        if limit:
+            query = query.limit(limit)
+        if fields is not None:
+            query = query.select(fields)
+
+        events = []
+        for doc in query.stream():
+            data = doc.to_dict()
+            data['id'] = doc.id
+            events.append(data)
+        return events
+
+    def get_traffic_matrices(self, project_id, level='zone', time_range_hours=24):
+        """Sparse traffic matrix buckets of one level, oldest first"""
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=time_range_hours)).isoformat()
+            query = self.db.collection('traffic-matrices')\
+                           .where('project_id', '==', project_id)\
+                           .where('level', '==', level)\
+                           .where('timestamp', '>=', cutoff)\
+                           .order_by('timestamp')
+            return [doc.to_dict() for doc in query.stream()]
+        except Exception as e:
+            logging.error(f"Error fetching traffic matrices: {str(e)}")
+            return []
+
+def inventory_fingerprint(manifests):
+    """Identity of the subnet inventory described by {project_id: (doc_id, manifest)}
+
+    Content-addressed manifests are identified by their subnet chunk hashes,
+    so a new snapshot with unchanged subnets keeps the fingerprint.
+    """
+    parts = []
+    for project_id, (doc_id, data) in sorted(manifests.items()):
+        if 'sections' in data:
+            parts.append([project_id, data['sections'].get('subnetworks', {}).get('chunks', [])])
+        else:
+            parts.append([project_id, doc_id])
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
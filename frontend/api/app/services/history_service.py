@@ -0,0 +1,77 @@
+import copy
+from datetime import datetime, timezone
+
+def resource_key(resource, key_fields):
+    # Must match changelog.resource_key in the collector
+    return '/'.join(str(resource.get(field, '')) for field in key_fields)
+
+def apply_change(resource, change):
+    """Apply one field-level diff ({'field': dotted path, 'op': 'set'|'unset', 'new'})"""
+    *parents, last = change['field'].split('.')
+    target = resource
+    for part in parents:
+        target = target.setdefault(part, {})
+    if change.get('op') == 'unset':
+        target.pop(last, None)
+    else:
+        target[last] = copy.deepcopy(change['new'])
+
+def rebuild_inventory(sections, key_fields, events):
+    """Replay change events, oldest first, onto checkpoint sections"""
+    state = {
+        section: {resource_key(r, key_fields.get(section, ['name'])): r for r in resources}
+        for section, resources in sections.items()
+    }
+    for event in sorted(events, key=lambda e: e.get('timestamp', '')):
+        resources = state.get(event.get('section'))
+        if resources is None:
+            continue
+        key = event['resource_key']
+        if event['event'] == 'created':
+            resources[key] = copy.deepcopy(event['resource'])
+        elif event['event'] == 'deleted':
+            resources.pop(key, None)
+        elif event['event'] == 'modified' and key in resources:
+            for change in event.get('changes', []):
+                apply_change(resources[key], change)
+    return {section: list(resources.values()) for section, resources in state.items()}
+
+def parse_as_of(value):
+    """ISO timestamp (naive means UTC) to the isoformat the collector stores; now when empty"""
+    if not value:
+        return datetime.now(timezone.utc).isoformat()
+    when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc).isoformat()
+
+class HistoryService:
+    """Point-in-time inventory from checkpoints and the change log.
+
+    The newest checkpoint at or before the requested time is loaded and the
+    events after it replayed, so a query reads one checkpoint and at most a
+    checkpoint interval of events, never the full history.
+    """
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+
+    def inventory_as_of(self, project_id, as_of, sections=None):
+        """Inventory sections as of an ISO timestamp, or None before the first checkpoint"""
+        checkpoint = self.data_service.get_inventory_checkpoint(project_id, as_of, sections)
+        if checkpoint is None:
+            return None
+        checkpoint_id, manifest, resources = checkpoint
+
+        events = [
+            event for event in self.data_service.get_inventory_changes(
+                project_id, after=manifest['timestamp'], until=as_of)
+            if event.get('section') in resources
+        ]
+        return {
+            'project_id': project_id,
+            'as_of': as_of,
+            'checkpoint': {'id': checkpoint_id, 'timestamp': manifest['timestamp']},
+            'events_replayed': len(events),
+            'sections': rebuild_inventory(resources, manifest.get('key_fields', {}), events)
+        }
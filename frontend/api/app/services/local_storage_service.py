@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import os
+from app.services.firestore_service import inventory_fingerprint
+
+# The embedded engine ships with the collectors (backend/cloud_functions);
+# it must be on PYTHONPATH when STORAGE_BACKEND=local
+try:
+    from local_store import DocumentLog, TimeSeriesEngine, from_epoch_ms, to_epoch_ms
+except ImportError:
+    DocumentLog = TimeSeriesEngine = None
+
+class LocalStorageService:
+    """Read side of the embedded storage backend, same interface as FirestoreService"""
+
+    def __init__(self, root):
+        if TimeSeriesEngine is None:
+            raise RuntimeError("STORAGE_BACKEND=local needs backend/cloud_functions on PYTHONPATH")
+        self.root = root
+        self.documents = DocumentLog(os.path.join(root, 'documents'))
+        self.timeseries = TimeSeriesEngine(os.path.join(root, 'timeseries'))
+
+    def _project(self, data, fields):
+        if fields is None:
+            return data
+        return {k: v for k, v in data.items() if k in fields}
+
+    def get_network_resources(self, project_id=None, fields=None):
+        """Get current network resource inventory"""
+        try:
+            documents = self.documents.read('network_resources')
+
+            resources = []
+            for doc_id, data in documents.items():
+                if project_id and data.get('project_id') != project_id:
+                    continue
+                data = self._project(data, fields)
+                data['id'] = doc_id
+                resources.append(data)
+                if not project_id and len(resources) >= 100:
+                    break
+
+            return resources
+        except Exception as e:
+            logging.error(f"Error fetching network resources: {str(e)}")
+            return []
+
+    def get_metrics_data(self, resource_type, time_range_hours=24, fields=None):
+        """Get time-series metrics data, merged across series in time order"""
+        try:
+            end_time = datetime.now(timezone.utc)
+            start_time = end_time - timedelta(hours=time_range_hours)
+            start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+
+            ranges = [
+                self.timeseries.range(sid, start_ms, end_ms)
+                for sid, _ in self.timeseries.find_series(resource_type=resource_type)
+            ]
+
+            def points(series_range):
+                for ts, value in series_range:
+                    yield ts, value, series_range.key
+
+            metrics = []
+            for ts, value, key in heapq.merge(*(points(r) for r in ranges), key=lambda p: p[0]):
+                data = dict(key)
+                data['timestamp'] = from_epoch_ms(ts).isoformat()
+                data['value'] = value
+                metrics.append(self._project(data, fields))
+
+            return metrics
+        except Exception as e:
+            logging.error(f"Error fetching metrics: {str(e)}")
+            return []
+
+    def get_cost_data(self, time_range_days=30, fields=None):
+        """Get cost analytics data"""
+        try:
+            end_date = datetime.now(timezone.utc)
+            start_date = end_date - timedelta(days=time_range_days)
+
+            costs = []
+            for data in self.documents.read('costs').values():
+                if 'date' not in data:
+                    continue
+                date = datetime.fromisoformat(str(data['date']).replace('Z', '+00:00'))
+                if date.tzinfo is None:
+                    date = date.replace(tzinfo=timezone.utc)
+                if start_date <= date <= end_date:
+                    costs.append((date, data))
+
+            costs.sort(key=lambda c: c[0])
+            return [self._project(data, fields) for _, data in costs]
+        except Exception as e:
+            logging.error(f"Error fetching cost data: {str(e)}")
+            return []
+
+    def get_subnet_utilization(self, project_id=None, network=None, fields=None):
+        """Get measured per-subnet address utilization, most utilized first"""
+        try:
+            subnets = []
+            for doc_id, data in self.documents.read('subnet-utilization').items():
+                if project_id and data.get('project_id') != project_id:
+                    continue
+                if network and data.get('network') != network:
+                    continue
+                utilization = data.get('utilization_percent', 0)
+                data = self._project(data, fields)
+                data['id'] = doc_id
+                subnets.append((utilization, data))
+
+            subnets.sort(key=lambda s: s[0], reverse=True)
+            return [data for _, data in subnets]
+        except Exception as e:
+            logging.error(f"Error fetching subnet utilization: {str(e)}")
+            return []
+
+    def get_anomalies(self, time_range_hours=24, fields=None):
+        """Get anomalies flagged by the collector, newest first"""
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=time_range_hours)).isoformat()
+            anomalies = [
+                (data['timestamp'], doc_id, data)
+                for doc_id, data in self.documents.read('anomalies').items()
+                if data.get('timestamp', '') >= cutoff
+            ]
+            anomalies.sort(key=lambda a: a[0], reverse=True)
+            return [dict(self._project(data, fields), id=doc_id) for _, doc_id, data in anomalies]
+        except Exception as e:
+            logging.error(f"Error fetching anomalies: {str(e)}")
+            return []
+
+    def get_subnet_inventory(self, known_fingerprint=None):
+        """Subnets from the latest inventory snapshot of every project (see FirestoreService)"""
+        manifests = {
+            data['project_id']: (data['manifest_id'], data)
+            for data in self.documents.read('inventory-latest').values() if data.get('project_id')
+        }
+
+        fingerprint = inventory_fingerprint(manifests)
+        if fingerprint == known_fingerprint:
+            return fingerprint, None
+
+        blobs = self.documents.read('inventory-blobs')
+        subnets = []
+        for project_id, (doc_id, data) in manifests.items():
+            for chunk_hash in data['sections'].get('subnetworks', {'chunks': []})['chunks']:
+                for resource_hash in blobs.get(chunk_hash, {}).get('hashes', []):
+                    if resource_hash in blobs:
+                        subnets.append(dict(blobs[resource_hash]['data'], project_id=project_id))
+
+        return fingerprint, subnets
+
+    def get_inventory_checkpoint(self, project_id, as_of, sections=None):
+        """Newest change-log checkpoint at or before as_of (see FirestoreService)"""
+        candidates = [
+            (data['timestamp'], doc_id, data)
+            for doc_id, data in self.documents.read('inventory-checkpoints').items()
+            if data.get('project_id') == project_id and data.get('timestamp', '') <= as_of
+        ]
+        if not candidates:
+            return None
+        _, doc_id, manifest = max(candidates, key=lambda c: c[0])
+
+        blobs = self.documents.read('inventory-blobs')
+        resources = {}
+        for name, section in manifest['sections'].items():
+            if sections is not None and name not in sections:
+                continue
+            resources[name] = [
+                blobs[resource_hash]['data']
+                for chunk_hash in section['chunks']
+                for resource_hash in blobs.get(chunk_hash, {}).get('hashes', [])
+                if resource_hash in blobs
+            ]
+        return doc_id, manifest, resources
+
+    def get_inventory_changes(self, project_id=None, after=None, until=None, section=None,
+                              limit=None, newest_first=False, fields=None):
+        """Inventory change events with after < timestamp <= until, in time order"""
+        events = [
+            dict(self._project(data, fields), id=doc_id)
+            for doc_id, data in self.documents.read('inventory-changes').items()
+            if (not project_id or data.get('project_id') == project_id)
+            and (not section or data.get('section') == section)
+            and (not after or data.get('timestamp', '') > after)
+            and (not until or data.get('timestamp', '') <= until)
+        ]
+        events.sort(key=lambda e: e.get('timestamp', ''), reverse=newest_first)
+        return events[:limit] if limit else events
+
+    def get_traffic_matrices(self, project_id, level='zone', time_range_hours=24):
+        """Sparse traffic matrix buckets of one level, oldest first"""
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=time_range_hours)).isoformat()
+            matrices = [
+                data for data in self.documents.read('traffic-matrices').values()
+                if data.get('project_id') == project_id and data.get('level') == level
+                and data.get('timestamp', '') >= cutoff
+            ]
+            matrices.sort(key=lambda m: m['timestamp'])
+            return matrices
+        except Exception as e:
+            logging.error(f"Error fetching traffic matrices: {str(e)}")
+            return []
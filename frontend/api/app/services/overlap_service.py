@@ -0,0 +1,102 @@
+import ipaddress
+import logging
+import threading
+from app.utils.observability import record_cache
+
+# Example subnet pairs kept per network pair; counts are always exact
+MAX_EXAMPLES = 20
+
+def subnet_ref(subnet):
+    return {
+        'project_id': subnet.get('project_id', ''),
+        'network': subnet.get('network', ''),
+        'region': subnet.get('region', ''),
+        'name': subnet.get('name', ''),
+        'ip_cidr_range': subnet.get('ip_cidr_range', '')
+    }
+
+def find_overlaps(subnets, max_examples=MAX_EXAMPLES):
+    """Overlapping subnet ranges across networks, grouped by network pair.
+
+    Ranges are encoded as integer intervals and swept in start order. CIDR
+    ranges either nest or are disjoint, so the ranges still open at any point
+    form a chain that fits a stack: each range is pushed and popped once, and
+    every range left on the stack when a new one starts contains it. Cost is
+    O(n log n) for the sort plus O(k) for the k overlapping pairs.
+    """
+    intervals = []
+    skipped = 0
+    for i, subnet in enumerate(subnets):
+        try:
+            network = ipaddress.ip_network(subnet['ip_cidr_range'], strict=False)
+        except (KeyError, ValueError):
+            skipped += 1
+            continue
+        # Containing ranges sort before the ranges they contain
+        intervals.append((network.version, int(network.network_address), -int(network.broadcast_address), i))
+    intervals.sort()
+
+    pairs = {}
+    stack = []
+    for version, start, negative_end, i in intervals:
+        while stack and (stack[-1][0] != version or stack[-1][1] < start):
+            stack.pop()
+
+        subnet = subnets[i]
+        network_key = (subnet.get('project_id', ''), subnet.get('network', ''))
+        for _, _, j in stack:
+            other = subnets[j]
+            other_key = (other.get('project_id', ''), other.get('network', ''))
+            if other_key == network_key:
+                continue
+
+            a, b = (other, subnet) if other_key < network_key else (subnet, other)
+            key = tuple(sorted((other_key, network_key)))
+            entry = pairs.get(key)
+            if entry is None:
+                entry = pairs[key] = {
+                    'networks': [{'project_id': p, 'network': n} for p, n in key],
+                    'overlap_count': 0,
+                    'overlaps': []
+                }
+            entry['overlap_count'] += 1
+            if len(entry['overlaps']) < max_examples:
+                entry['overlaps'].append([subnet_ref(a), subnet_ref(b)])
+
+        stack.append((version, -negative_end, i))
+
+    network_pairs = sorted(pairs.values(), key=lambda p: p['overlap_count'], reverse=True)
+    return {
+        'subnets_analyzed': len(intervals),
+        'subnets_skipped': skipped,
+        'network_pairs': network_pairs,
+        'overlapping_pairs': sum(p['overlap_count'] for p in network_pairs)
+    }
+
+class OverlapService:
+    """Overlap report for the whole estate, recomputed only when subnets change.
+
+    The cache key is the inventory fingerprint from the data service, which
+    is derived from the snapshot manifests alone; an unchanged estate costs
+    one manifest query per request.
+    """
+
+    def __init__(self, data_service):
+        self.data_service = data_service
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._report = None
+
+    def get_overlaps(self):
+        with self._lock:
+            fingerprint, subnets = self.data_service.get_subnet_inventory(self._fingerprint)
+            record_cache('subnet_overlaps', subnets is None and self._report is not None)
+            if subnets is not None or self._report is None:
+                if subnets is None:
+                    fingerprint, subnets = self.data_service.get_subnet_inventory()
+                self._report = find_overlaps(subnets)
+                self._report['fingerprint'] = fingerprint
+                self._fingerprint = fingerprint
+                logging.info(f"Recomputed subnet overlaps for inventory {fingerprint}: "
+                             f"{self._report['overlapping_pairs']} overlapping pairs")
+            return self._report
@@ -0,0 +1,19 @@
+from app.services.firestore_service import FirestoreService
+import logging
+import os
+
+def storage_backend():
+    """Configured storage backend name: 'firestore' (default) or 'local'"""
+    return os.environ.get('STORAGE_BACKEND', 'firestore').lower()
+
+def create_data_service():
+    """Build the read service for the configured storage backend"""
+    backend = storage_backend()
+    if backend == 'local':
+        from app.services.local_storage_service import LocalStorageService
+        root = os.environ.get('LOCAL_STORAGE_PATH', 'local-data')
+        logging.info(f"Using local storage at {root}")
+        return LocalStorageService(root)
+    if backend == 'firestore':
+        return FirestoreService()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,162 @@
+from google.cloud import firestore
+import itertools
+import logging
+import queue
+import threading
+
+# Per-subscriber backlog; a slow client loses its oldest events first
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Subscription:
+    """One client's view of the event stream"""
+
+    def __init__(self, publisher, event_types=None):
+        self.publisher = publisher
+        self.event_types = set(event_types) if event_types else None
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+    def wants(self, event_type):
+        return self.event_types is None or event_type in self.event_types
+
+    def put(self, event):
+        """Queue an event, discarding the oldest one if the client has fallen behind"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Next event, or None when nothing arrived within timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.publisher.unsubscribe(self)
+
+class EventPublisher:
+    """In-process fan-out of events to every open subscription.
+
+    The latest event of each type is kept so new subscribers start from the
+    current state instead of waiting for the next change. Tests publish to
+    this directly without any Firestore watcher.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._latest = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, event_types=None, limit=None):
+        """Open a subscription, or return None when limit subscriptions are already open"""
+        subscription = Subscription(self, event_types)
+        with self._lock:
+            if limit is not None and len(self._subscriptions) >= limit:
+                return None
+            self._subscriptions.add(subscription)
+            latest = [e for e in self._latest.values() if subscription.wants(e['event'])]
+        for event in sorted(latest, key=lambda e: e['id']):
+            subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, event_type, data):
+        """Send an event to all subscribers interested in its type"""
+        with self._lock:
+            event = {'id': next(self._ids), 'event': event_type, 'data': data}
+            self._latest[event_type] = event
+            subscriptions = [s for s in self._subscriptions if s.wants(event_type)]
+        for subscription in subscriptions:
+            subscription.put(event)
+        return event
+
+class FirestoreWatcher:
+    """Single per-process Firestore listener feeding an EventPublisher.
+
+    Watches the newest metrics-summaries and network-inventory documents, so
+    Firestore load stays constant no matter how many clients are connected.
+    """
+
+    def __init__(self, publisher, db=None):
+        self.publisher = publisher
+        self.db = db or firestore.Client()
+        self._watches = []
+        self._topology_generation = None
+
+    def start(self):
+        summaries = self.db.collection('metrics-summaries')\
+                           .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                           .limit(1)
+        inventory = self.db.collection('network-inventory')\
+                           .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                           .limit(1)
+
+        self._watches = [
+            summaries.on_snapshot(self._on_summary_snapshot),
+            inventory.on_snapshot(self._on_inventory_snapshot)
+        ]
+        logging.info("Started Firestore watcher for live updates")
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def _on_summary_snapshot(self, docs, changes, read_time):
+        try:
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                self.publisher.publish('summary', data)
+        except Exception as e:
+            logging.error(f"Error publishing summary update: {str(e)}")
+
+    def _on_inventory_snapshot(self, docs, changes, read_time):
+        try:
+            for doc in docs:
+                # Only the generation marker is pushed; clients refetch topology on change
+                if doc.id == self._topology_generation:
+                    continue
+                self._topology_generation = doc.id
+                self.publisher.publish('topology', {
+                    'generation': doc.id,
+                    'timestamp': doc.get('timestamp')
+                })
+        except Exception as e:
+            logging.error(f"Error publishing topology update: {str(e)}")
+
+_publisher = None
+_watcher = None
+_init_lock = threading.Lock()
+
+def get_publisher(start_watcher=True):
+    """Process-wide publisher; the Firestore watcher is started on first use"""
+    global _publisher, _watcher
+    with _init_lock:
+        if _publisher is None:
+            _publisher = EventPublisher()
+        if start_watcher and _watcher is None:
+            _watcher = FirestoreWatcher(_publisher)
+            try:
+                _watcher.start()
+            except Exception as e:
+                logging.error(f"Could not start Firestore watcher: {str(e)}")
+                _watcher = None
+        return _publisher
@@ -0,0 +1,149 @@
+import gzip
+import logging
+from flask import Response, jsonify, request
+
+# Optional encoders - negotiation falls back to gzip / JSON when missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+# Written once per series in the packed time-series encoding
+SERIES_KEY_FIELDS = ('metric_type', 'resource_type', 'resource_labels')
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+
+
+def available_encodings():
+    """Content-Encodings this process can produce, in order of preference"""
+    encodings = ['zstd'] if zstandard else []
+    encodings.append('gzip')
+    return encodings
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best Content-Encoding the client accepts, or None for identity"""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_body(body, encoding):
+    """Compress a response body with the given Content-Encoding"""
+    if encoding == 'zstd':
+        return _zstd_compressor.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_response(response):
+    """after_request hook: compress the body according to Accept-Encoding"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    try:
+        response.set_data(compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    except Exception as e:
+        logging.warning(f"Response compression failed, sending identity: {str(e)}")
+        response.set_data(body)
+    return response
+
+
+def init_compression(app):
+    """Register response compression on the Flask app"""
+    app.after_request(compress_response)
+
+
+def wants_msgpack():
+    """True when the client prefers MessagePack over JSON"""
+    if msgpack is None:
+        return False
+    best = request.accept_mimetypes.best_match([MSGPACK_MIMETYPE, 'application/json'])
+    return best == MSGPACK_MIMETYPE
+
+
+def pack_timeseries(metrics):
+    """Group points into series so shared keys are written once per series.
+
+    Each series carries its identity fields once plus one column per
+    remaining point field (timestamp, value, ...), all of equal length.
+    """
+    series_index = {}
+    series = []
+    for metric in metrics:
+        labels = metric.get('resource_labels')
+        key = (
+            metric.get('metric_type'),
+            metric.get('resource_type'),
+            tuple(sorted(labels.items())) if labels else ()
+        )
+        entry = series_index.get(key)
+        if entry is None:
+            entry = {field: metric[field] for field in SERIES_KEY_FIELDS if field in metric}
+            entry['length'] = 0
+            entry['columns'] = {}
+            series_index[key] = entry
+            series.append(entry)
+
+        columns = entry['columns']
+        for field, value in metric.items():
+            if field in SERIES_KEY_FIELDS:
+                continue
+            column = columns.get(field)
+            if column is None:
+                # Field first seen mid-series - pad earlier points
+                column = columns[field] = [None] * entry['length']
+            column.append(value)
+        entry['length'] += 1
+        for column in columns.values():
+            if len(column) < entry['length']:
+                column.append(None)
+    return series
+
+
+def timeseries_response(metrics):
+    """Encode time-series points as MessagePack or JSON depending on Accept"""
+    if wants_msgpack():
+        payload = {
+            'success': True,
+            'series': pack_timeseries(metrics),
+            'count': len(metrics)
+        }
+        response = Response(msgpack.packb(payload, use_bin_type=True), mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify({
+            'success': True,
+            'data': metrics,
+            'count': len(metrics)
+        })
+    response.vary.add('Accept')
+    return response
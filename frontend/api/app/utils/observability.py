@@ -0,0 +1,303 @@
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request
+
+# Self-observability of the API: request latency, Firestore reads and cache
+# hits, rendered in OpenMetrics text format on /metrics.
+#
+# Every thread records into its own shard, so the request path never takes a
+# lock; a scrape sums the shards. With METRICS_DIR set, each gunicorn worker
+# writes its totals to a file there every few seconds and whenever it answers
+# a scrape, which sums all the files so /metrics describes the whole server
+# rather than one worker.
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Request latency buckets in seconds; SSE responses count until their headers are sent
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help, label names)
+METRICS = {
+    'api_requests': ('counter', 'HTTP requests handled', ('route', 'method', 'status')),
+    'api_request_duration_seconds': ('histogram', 'HTTP request latency', ('route', 'method')),
+    'api_requests_in_flight': ('gauge', 'HTTP requests being handled', ()),
+    'api_firestore_queries': ('counter', 'Firestore queries and batched gets', ('route', 'collection')),
+    'api_firestore_documents_read': ('counter', 'Firestore documents returned', ('route', 'collection')),
+    'api_cache_requests': ('counter', 'Cache lookups by result', ('cache', 'result')),
+    'api_cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits', ('cache',))
+}
+
+# Seconds between a worker's writes of its totals to METRICS_DIR
+FLUSH_SECONDS = 5
+
+# Totals of exited workers, folded in by the gunicorn master; gauges are dropped
+ARCHIVE_FILE = 'archive.json'
+
+# Route template of the request being handled; reads outside a request are 'none'
+_route = contextvars.ContextVar('observability_route', default='none')
+
+class _Shard:
+    __slots__ = ('thread', 'values', 'histograms')
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.values = {}       # (name, labels) -> count or gauge delta
+        self.histograms = {}   # (name, labels) -> [bucket counts..., sum, count]
+
+class Registry:
+    """Per-thread metric shards, summed on collection.
+
+    Only a thread's own first record and collection take the lock. Shards
+    of finished threads (batch read pools) are folded into one retired
+    shard so they do not pile up.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(self.buckets) + 3)
+        # Non-cumulative per bucket; the last bucket slot is +Inf
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @staticmethod
+    def _merge(into, values, histograms):
+        for key, value in values.items():
+            into.values[key] = into.values.get(key, 0) + value
+        for key, counts in histograms.items():
+            total = into.histograms.setdefault(key, [0] * len(counts))
+            for i, count in enumerate(counts):
+                total[i] += count
+
+    def collect(self):
+        """(values, histograms) summed over all shards.
+
+        Copies of live shards are taken under the GIL; a histogram being
+        updated at that moment may be one observation ahead in some fields.
+        """
+        total = _Shard()
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    self._merge(self._retired, shard.values, shard.histograms)
+            self._shards = live
+            self._merge(total, self._retired.values, self._retired.histograms)
+        for shard in live:
+            self._merge(total, shard.values.copy(),
+                        {key: list(counts) for key, counts in shard.histograms.copy().items()})
+        return total.values, total.histograms
+
+registry = Registry()
+
+def current_route():
+    return _route.get()
+
+def record_firestore_read(collection, documents, queries=1):
+    labels = (current_route(), collection)
+    registry.inc('api_firestore_queries', labels, queries)
+    registry.inc('api_firestore_documents_read', labels, documents)
+
+def record_cache(cache, hit, count=1):
+    registry.inc('api_cache_requests', (cache, 'hit' if hit else 'miss'), count)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def metrics_dir():
+    return os.environ.get('METRICS_DIR')
+
+def _worker_file(directory, pid):
+    return os.path.join(directory, f"worker_{pid}.json")
+
+# With the pid, identifies this worker's file in the archive's folded list even if the pid is reused
+_STARTED_NS = time.time_ns()
+_write_lock = threading.Lock()
+
+def _dump(path, values, histograms, **extra):
+    # Replace atomically so a scrape never reads a torn file
+    with open(path + '.tmp', 'w') as f:
+        json.dump(dict(extra, **{
+            'values': [[name, list(labels), value] for (name, labels), value in values.items()],
+            'histograms': [[name, list(labels), counts] for (name, labels), counts in histograms.items()]
+        }), f)
+    os.replace(path + '.tmp', path)
+
+def _load(path):
+    """Contents of a worker or archive file; None if it vanished meanwhile"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    data['values'] = {(name, tuple(labels)): value for name, labels, value in data['values']}
+    data['histograms'] = {(name, tuple(labels)): counts for name, labels, counts in data['histograms']}
+    return data
+
+def write_worker_file(reg=None, directory=None):
+    """Write this worker's current totals for scrapes"""
+    directory = directory or metrics_dir()
+    with _write_lock:
+        values, histograms = (reg or registry).collect()
+        _dump(_worker_file(directory, os.getpid()), values, histograms, worker=f"{os.getpid()}:{_STARTED_NS}")
+
+def mark_worker_dead(pid, directory=None):
+    """Fold an exited worker's counters and histograms into the archive (gunicorn master only).
+
+    The archive lists the worker as folded before its file is removed, so a
+    scrape between the two steps skips the file instead of counting it twice.
+    """
+    directory = directory or metrics_dir()
+    if not directory:
+        return
+    worker = _load(_worker_file(directory, pid))
+    if worker is None:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _load(archive_path) or {'values': {}, 'histograms': {}, 'folded': []}
+    total = _Shard()
+    Registry._merge(total, archive['values'], archive['histograms'])
+    Registry._merge(total, {key: value for key, value in worker['values'].items() if METRICS[key[0]][0] != 'gauge'},
+                    worker['histograms'])
+    _dump(archive_path, total.values, total.histograms, folded=archive['folded'] + [worker['worker']])
+    os.remove(_worker_file(directory, pid))
+
+def collect_all(reg=None, directory=None):
+    """(values, histograms) summed over every worker's file and the archive.
+
+    The scraping worker writes its own file first and its live values are not
+    used directly: mixing them with older files of other workers would let a
+    counter go down when consecutive scrapes land on different workers.
+    Worker files are read before the archive, so a worker folded meanwhile is
+    found in one of them and counted once.
+    """
+    directory = directory or metrics_dir()
+    if not directory:
+        return (reg or registry).collect()
+    write_worker_file(reg, directory)
+    workers = [_load(path) for path in glob.glob(os.path.join(directory, 'worker_*.json'))]
+    archive = _load(os.path.join(directory, ARCHIVE_FILE)) or {'values': {}, 'histograms': {}, 'folded': []}
+    folded = set(archive['folded'])
+    total = _Shard()
+    for data in workers + [archive]:
+        if data is not None and data.get('worker') not in folded:
+            Registry._merge(total, data['values'], data['histograms'])
+    return total.values, total.histograms
+
+def _flush_periodically(directory):
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            write_worker_file(directory=directory)
+        except OSError:
+            pass
+
+def render_openmetrics(reg=None, directory=None):
+    """Current values, summed over all workers when METRICS_DIR is set, in OpenMetrics text format"""
+    values, histograms = collect_all(reg, directory)
+    buckets = (reg or registry).buckets
+
+    # Hit ratios are derived at scrape time from the lookup counters
+    lookups = {}
+    for (name, labels), count in values.items():
+        if name == 'api_cache_requests':
+            cache, result = labels
+            hits, total = lookups.get(cache, (0, 0))
+            lookups[cache] = (hits + (count if result == 'hit' else 0), total + count)
+    values = dict(values)
+    for cache, (hits, total) in lookups.items():
+        values[('api_cache_hit_ratio', (cache,))] = hits / total if total else 0.0
+
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'# HELP {name} {help_text}.')
+        if kind == 'histogram':
+            for (metric, labels), counts in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_labels(label_names, labels, (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(counts[-2])}')
+                lines.append(f'{name}_count{_labels(label_names, labels)} {counts[-1]}')
+            continue
+        suffix = '_total' if kind == 'counter' else ''
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if kind == 'gauge' and not label_names and not samples:
+            samples = [((), 0)]
+        for labels, value in samples:
+            lines.append(f'{name}{suffix}{_labels(label_names, labels)} {_number(value)}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+def _before_request():
+    g._observability = time.perf_counter()
+    _route.set(request.url_rule.rule if request.url_rule is not None else 'unmatched')
+    registry.inc('api_requests_in_flight')
+
+def _after_request(response):
+    started = getattr(g, '_observability', None)
+    if started is not None:
+        route = current_route()
+        registry.observe('api_request_duration_seconds', (route, request.method), time.perf_counter() - started)
+        registry.inc('api_requests', (route, request.method, str(response.status_code)))
+    return response
+
+def _teardown_request(error=None):
+    started = g.pop('_observability', None)
+    if started is not None:
+        registry.inc('api_requests_in_flight', value=-1)
+        _route.set('none')
+
+def init_observability(app):
+    """Record every request; register before other after_request hooks so latency includes them"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    directory = metrics_dir()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=_flush_periodically, args=(directory,), daemon=True,
+                         name='metrics-flush').start()
@@ -0,0 +1,32 @@
+import re
+
+# Firestore field paths we accept from the query string (dotted for map fields)
+FIELD_PATH_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+# Passing fields=* asks for full documents
+ALL_FIELDS = '*'
+
+
+def parse_fields(raw_fields, default_fields, required_fields=()):
+    """Turn a comma-separated ``fields`` query parameter into a Firestore projection.
+
+    Returns a list of field paths, or None when full documents were requested.
+    Fields the route itself depends on are always added to the projection.
+    Raises ValueError for malformed field paths.
+    """
+    if raw_fields is None or not raw_fields.strip():
+        fields = list(default_fields)
+    elif raw_fields.strip() == ALL_FIELDS:
+        return None
+    else:
+        fields = [f.strip() for f in raw_fields.split(',') if f.strip()]
+        for field in fields:
+            if not FIELD_PATH_PATTERN.match(field):
+                raise ValueError(f"Invalid field name: {field}")
+
+    for field in required_fields:
+        if field not in fields:
+            fields.append(field)
+
+    # 'id' is the document ID, not a stored field
+    return [f for f in fields if f != 'id']
@@ -0,0 +1,15 @@
+# Gunicorn hooks keeping METRICS_DIR consistent across worker restarts
+import os
+import shutil
+
+from app.utils.observability import mark_worker_dead, metrics_dir
+
+def on_starting(server):
+    # Files of a previous server would be summed into this one's totals
+    directory = metrics_dir()
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    mark_worker_dead(worker.pid)
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { decodeMsgpack } from './msgpack';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8080/api';
 
@@ -32,35 +33,197 @@ api.interceptors.response.use(
   }
 );
 
+const MSGPACK_MIMETYPE = 'application/x-msgpack';
+
+// Expand packed series (identity fields once, one array per point field)
+// back into the row shape the JSON endpoint returns
+const unpackTimeSeries = (series) => {
+  const rows = [];
+  series.forEach(({ columns, length, ...identity }) => {
+    const fields = Object.keys(columns);
+    for (let i = 0; i < length; i++) {
+      const row = { ...identity };
+      fields.forEach((field) => {
+        row[field] = columns[field][i];
+      });
+      rows.push(row);
+    }
+  });
+  return rows;
+};
+
+// Decode a time-series body as MessagePack or JSON based on Content-Type
+const decodeTimeSeries = (data, headers) => {
+  const contentType = String(headers?.['content-type'] || '');
+  if (contentType.includes(MSGPACK_MIMETYPE)) {
+    const { series, ...rest } = decodeMsgpack(data);
+    return { ...rest, data: unpackTimeSeries(series) };
+  }
+  const text = new TextDecoder().decode(data);
+  return text ? JSON.parse(text) : {};
+};
+
+// Optional field projection - an array of field names, or '*' for full documents
+const fieldsParam = (fields) =>
+  Array.isArray(fields) ? fields.join(',') : fields;
+
+// Batched calls made in the same tick are coalesced into one POST /batch;
+// each caller still gets its own sub-query response
+let pendingBatch = null;
+
+const flushBatch = async (batch) => {
+  const queries = batch.map(({ path, params }, index) => ({ id: String(index), path, params }));
+  try {
+    const response = await api.post('/batch', { queries });
+    batch.forEach(({ resolve, reject }, index) => {
+      const result = response.data?.[String(index)];
+      if (result?.success) {
+        resolve(result);
+      } else {
+        reject(result || { error: 'Missing batch result' });
+      }
+    });
+  } catch (error) {
+    batch.forEach(({ reject }) => reject(error));
+  }
+};
+
+const batchQuery = (path, params = {}) =>
+  new Promise((resolve, reject) => {
+    if (!pendingBatch) {
+      pendingBatch = [];
+      queueMicrotask(() => {
+        const batch = pendingBatch;
+        pendingBatch = null;
+        flushBatch(batch);
+      });
+    }
+    pendingBatch.push({ path, params, resolve, reject });
+  });
+
 // Network API calls
 export const networkAPI = {
-  getTopology: (projectId) => 
-    api.get('/network/topology', { params: { project_id: projectId } }),
+  getTopology: (projectId, fields) => 
+    api.get('/network/topology', { 
+      params: { 
+        project_id: projectId, 
+        fields: fieldsParam(fields) 
+      } 
+    }),
   
-  getResources: (projectId, resourceType) => 
+  getResources: (projectId, resourceType, fields) => 
     api.get('/network/resources', { 
       params: { 
         project_id: projectId, 
-        type: resourceType 
-      } 
+        type: resourceType,
+        fields: fieldsParam(fields)
+      }
+    }),
+
+  getUtilization: (projectId, network, fields) =>
+    api.get('/network/utilization', {
+      params: {
+        project_id: projectId,
+        network,
+        fields: fieldsParam(fields)
+      }
+    }),
+
+  getOverlaps: (projectId, limit = 100) =>
+    api.get('/network/overlaps', { params: { project_id: projectId, limit } }),
+
+  // asOf: ISO timestamp (defaults to now); sections: array of inventory section names
+  getInventoryAsOf: (projectId, asOf, sections) =>
+    api.get('/network/inventory', {
+      params: {
+        project_id: projectId,
+        as_of: asOf,
+        sections: Array.isArray(sections) ? sections.join(',') : sections
+      }
     }),
+
+  getChanges: (projectId, hours = 24, section, fields) =>
+    api.get('/network/changes', {
+      params: {
+        project_id: projectId,
+        hours,
+        section,
+        fields: fieldsParam(fields)
+      }
+    }),
+
+  // Same calls routed through /batch
+  batched: {
+    getTopology: (projectId, fields) =>
+      batchQuery('/network/topology', { project_id: projectId, fields: fieldsParam(fields) }),
+    
+    getResources: (projectId, resourceType, fields) =>
+      batchQuery('/network/resources', {
+        project_id: projectId,
+        type: resourceType,
+        fields: fieldsParam(fields)
+      }),
+  },
 };
 
 // Metrics API calls
 export const metricsAPI = {
-  getTimeSeries: (resourceType, hours = 24) =>
+  getTimeSeries: (resourceType, hours = 24, fields) =>
     api.get('/metrics/timeseries', { 
       params: { 
         type: resourceType, 
-        hours 
-      } 
+        hours,
+        fields: fieldsParam(fields)
+      },
+      headers: { Accept: `${MSGPACK_MIMETYPE}, application/json;q=0.9` },
+      responseType: 'arraybuffer',
+      transformResponse: [decodeTimeSeries],
     }),
     
   getSummary: () =>
     api.get('/metrics/summary'),
     
-  getCosts: (days = 30) =>
-    api.get('/metrics/costs', { params: { days } }),
+  getCosts: (days = 30, fields) =>
+    api.get('/metrics/costs', { params: { days, fields: fieldsParam(fields) } }),
+  
+  getAnomalies: (hours = 24, fields) =>
+    api.get('/metrics/anomalies', { params: { hours, fields: fieldsParam(fields) } }),
+  
+  getTrafficMatrix: (projectId, level = 'zone', hours = 24) =>
+    api.get('/metrics/traffic-matrix', { params: { project_id: projectId, level, hours } }),
+  
+  // Same calls routed through /batch
+  batched: {
+    getTimeSeries: (resourceType, hours = 24, fields) =>
+      batchQuery('/metrics/timeseries', { type: resourceType, hours, fields: fieldsParam(fields) }),
+    
+    getSummary: () =>
+      batchQuery('/metrics/summary'),
+    
+    getCosts: (days = 30, fields) =>
+      batchQuery('/metrics/costs', { days, fields: fieldsParam(fields) }),
+  },
+};
+
+// Live updates over Server-Sent Events; returns a function that closes the stream
+export const streamAPI = {
+  subscribe: (handlers, eventTypes = Object.keys(handlers)) => {
+    const url = `${API_BASE_URL}/stream?events=${encodeURIComponent(eventTypes.join(','))}`;
+    const source = new EventSource(url);
+    
+    eventTypes.forEach((eventType) => {
+      source.addEventListener(eventType, (event) => {
+        handlers[eventType]?.(JSON.parse(event.data));
+      });
+    });
+    
+    source.onerror = (error) => {
+      // EventSource reconnects on its own using the server's retry interval
+      console.error('Stream error:', error);
+    };
+    
+    return () => source.close();
+  },
 };
 
 export default api;
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import bisect
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Import the collector modules without installing them
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'cloud_functions'))
+
+from keys import document_id
+
+# Range-partitioned store model: each tablet sustains a fixed write rate and
+# splits at its median key after a saturated second (load-based splitting)
+TABLET_WRITES_PER_SEC = 500
+MAX_TABLETS = 1024
+
+def legacy_document_id(project_id, when):
+    """The previous scheme: <project>_<epoch seconds>"""
+    return f"{project_id}_{int(when.timestamp())}"
+
+def monotonic_document_id(project_id, when):
+    """Unique but time-ordered keys: fixes overwrites, not the hotspot"""
+    return f"{project_id}_{int(when.timestamp() * 1000):013d}_{random.getrandbits(32):08x}"
+
+class RangePartitionedStore:
+    """Stand-in for Firestore's tablet layout, enough to expose key hotspots.
+
+    Writes a saturated tablet cannot take within the second are rejected, as
+    contention errors would be; clients retrying them only add load.
+    """
+
+    def __init__(self, capacity=TABLET_WRITES_PER_SEC):
+        self.capacity = capacity
+        self.splits = []  # sorted tablet boundaries
+        self.keys = set()
+        self.rejected = 0
+
+    def _tablet(self, key):
+        return bisect.bisect_right(self.splits, key)
+
+    def write_second(self, keys):
+        """Offer one second of writes; returns the number committed"""
+        by_tablet = {}
+        for key in keys:
+            by_tablet.setdefault(self._tablet(key), []).append(key)
+
+        committed = 0
+        for tablet_keys in by_tablet.values():
+            done = tablet_keys[:self.capacity]
+            self.keys.update(done)
+            committed += len(done)
+            if len(tablet_keys) > self.capacity:
+                self.rejected += len(tablet_keys) - self.capacity
+                if len(self.splits) < MAX_TABLETS:
+                    median = sorted(tablet_keys)[len(tablet_keys) // 2]
+                    if median not in self.splits:
+                        bisect.insort(self.splits, median)
+        return committed
+
+def offered_load(make_id, rate, duration, projects):
+    """Per-second key lists for `rate` concurrent collector writes per second"""
+    start = datetime(2025, 8, 24, tzinfo=timezone.utc)
+    seconds = []
+    for second in range(duration):
+        keys = []
+        for i in range(rate):
+            when = start + timedelta(seconds=second, microseconds=i * 1_000_000 // rate)
+            keys.append(make_id(random.choice(projects), when))
+        seconds.append(keys)
+    return seconds
+
+def run_model(rate=8000, duration=30, num_projects=3):
+    """Compare sustained write throughput of both schemes on the range-partitioned model"""
+    projects = [f"network-monitor-{i}" for i in range(num_projects)]
+    schemes = [
+        ('<project>_<epoch s> (legacy)', legacy_document_id),
+        ('<project>_<ms>_<rand>', monotonic_document_id),
+        ('<shard>_<project>_<ms>_<rand>', document_id)
+    ]
+
+    print(f"Range-partitioned model: {rate} writes/s offered for {duration}s, "
+          f"{TABLET_WRITES_PER_SEC} writes/s per tablet")
+    print("-" * 78)
+    print(f"{'scheme':<32}{'committed/s':>12}{'rejected':>10}{'stored':>10}{'tablets':>10}")
+
+    for name, make_id in schemes:
+        store = RangePartitionedStore()
+        committed = sum(store.write_second(keys) for keys in offered_load(make_id, rate, duration, projects))
+        total = rate * duration
+        # 'stored' counts distinct documents: same-second legacy IDs overwrite each other
+        print(f"{name:<32}{committed / duration:>12,.0f}{store.rejected / total:>10.1%}"
+              f"{len(store.keys):>10,}{len(store.splits) + 1:>10}")
+
+def run_emulator(writes=2000, threads=16):
+    """Measure real write throughput against the Firestore emulator"""
+    from google.cloud import firestore
+
+    db = firestore.Client()
+    schemes = [
+        ('legacy', legacy_document_id),
+        ('monotonic', monotonic_document_id),
+        ('sharded', document_id)
+    ]
+
+    print(f"\nFirestore emulator at {os.environ['FIRESTORE_EMULATOR_HOST']}: {writes} writes, {threads} threads")
+    print("-" * 78)
+    for name, make_id in schemes:
+        collection = db.collection(f"key-benchmark-{name}")
+
+        def write(i):
+            collection.document(make_id('network-monitor-demo', datetime.now(timezone.utc))).set({'i': i})
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(write, range(writes)))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<32}{writes / elapsed:>14,.0f} writes/s")
+
+if __name__ == '__main__':
+    random.seed(42)
+    run_model()
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        run_emulator()
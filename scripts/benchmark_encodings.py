@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+# Import the API package without installing it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'frontend', 'api'))
+
+from flask import Flask, jsonify
+from app.utils import encoding
+
+def generate_points(num_instances=50, hours=24, step_minutes=5):
+    """Build time-series points shaped like FirestoreService.get_metrics_data output"""
+    metric_types = [
+        'compute.googleapis.com/instance/network/sent_bytes_count',
+        'compute.googleapis.com/instance/network/received_bytes_count'
+    ]
+    start = datetime(2025, 8, 24)
+    steps = hours * 60 // step_minutes
+    points = []
+
+    for i in range(num_instances):
+        labels = {
+            'project_id': 'network-monitor-demo',
+            'instance_id': str(1000000000000000000 + i),
+            'zone': random.choice(['us-central1-a', 'us-east1-b', 'europe-west1-c'])
+        }
+        for metric_type in metric_types:
+            for step in range(steps):
+                points.append({
+                    'metric_type': metric_type,
+                    'resource_type': 'gce_instance',
+                    'resource_labels': labels,
+                    'timestamp': (start + timedelta(minutes=step * step_minutes)).isoformat(),
+                    'value': random.uniform(1e3, 1e7)
+                })
+    return points
+
+def time_encoder(encode, repeats=5):
+    """Return (payload bytes, best encode time in ms) for an encoder"""
+    best = None
+    payload = b''
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = encode()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(payload), best * 1000
+
+def run_benchmark(num_instances=50, hours=24):
+    """Compare payload size and encode time of each response encoding"""
+    app = Flask(__name__)
+    points = generate_points(num_instances, hours)
+
+    def json_body():
+        return jsonify({'success': True, 'data': points, 'count': len(points)}).get_data()
+
+    def msgpack_body():
+        payload = {'success': True, 'series': encoding.pack_timeseries(points), 'count': len(points)}
+        return encoding.msgpack.packb(payload, use_bin_type=True)
+
+    encoders = [('jsonify (baseline)', json_body)]
+    encoders.append(('jsonify + gzip', lambda: encoding.compress_body(json_body(), 'gzip')))
+    if encoding.zstandard:
+        encoders.append(('jsonify + zstd', lambda: encoding.compress_body(json_body(), 'zstd')))
+    if encoding.msgpack:
+        encoders.append(('msgpack columnar', msgpack_body))
+        encoders.append(('msgpack columnar + gzip', lambda: encoding.compress_body(msgpack_body(), 'gzip')))
+        if encoding.zstandard:
+            encoders.append(('msgpack columnar + zstd', lambda: encoding.compress_body(msgpack_body(), 'zstd')))
+
+    print(f"Time-series payload: {len(points)} points ({num_instances} instances, {hours}h)")
+    print("-" * 70)
+    print(f"{'encoding':<28}{'bytes':>14}{'ratio':>10}{'encode ms':>14}")
+
+    with app.app_context():
+        baseline_bytes = None
+        for name, encode in encoders:
+            size, elapsed_ms = time_encoder(encode)
+            baseline_bytes = baseline_bytes or size
+            print(f"{name:<28}{size:>14,}{size / baseline_bytes:>10.3f}{elapsed_ms:>14.1f}")
+
+if __name__ == '__main__':
+    random.seed(42)
+    run_benchmark()
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Import the collectors, the standalone models and the API without installing them
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'cloud_functions'))
+sys.path.insert(0, os.path.join(ROOT, 'frontend', 'api'))
+
+from shared import fake_gcp
+from shared.synthetic_estate import generate_estate
+
+# Microbenchmarks of the collector, storage, analysis and API hot paths at
+# several data sizes, against in-memory stand-ins for GCP and Firestore.
+# Results are compared with a JSON baseline; a case slower than the baseline
+# by more than the threshold fails the run. Times are normalized by a fixed
+# pure-Python calibration workload, so a baseline recorded on one machine
+# still means something on another.
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'benchmark_baselines', 'hot_paths.json')
+DEFAULT_THRESHOLD = 1.3
+PROJECT_ID = 'synthetic-estate'
+
+CASES = []
+
+def benchmark(name, sizes):
+    """Register a case; the function takes a size and returns the callable to time"""
+    def register(setup):
+        CASES.append((name, sizes, setup))
+        return setup
+    return register
+
+def calibrate(repeats=5):
+    """Seconds for a fixed mix of dict building, string formatting and JSON, best of repeats"""
+    def workload():
+        records = [{'id': i, 'name': f"vm-{i:06d}", 'value': i * 1.5, 'labels': {'zone': 'us-central1-a'}}
+                   for i in range(20000)]
+        json.loads(json.dumps(records))
+        return sorted(records, key=lambda r: -r['value'])
+    return time_call(workload, repeats)['best']
+
+def time_call(run, repeats):
+    run()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return {'best': min(samples), 'median': statistics.median(samples)}
+
+# In-memory stand-ins
+
+class InMemoryFirestore:
+    """The slice of firestore.Client that FirestoreStorage writes and reads through"""
+
+    class Snapshot:
+        def __init__(self, doc_id, data):
+            self.id, self._data = doc_id, data
+            self.exists = data is not None
+
+        def to_dict(self):
+            return self._data
+
+    class Reference:
+        def __init__(self, db, collection, doc_id):
+            self.db, self.collection, self.id = db, collection, doc_id
+
+        def set(self, data):
+            self.db.collections.setdefault(self.collection, {})[self.id] = data
+
+    class Collection:
+        def __init__(self, db, name):
+            self.db, self.name = db, name
+
+        def document(self, doc_id=None):
+            if doc_id is None:
+                self.db.generated += 1
+                doc_id = f"auto-{self.db.generated}"
+            return InMemoryFirestore.Reference(self.db, self.name, doc_id)
+
+    class Batch:
+        def __init__(self, db):
+            self.db, self.writes = db, []
+
+        def set(self, reference, data):
+            self.writes.append((reference, data))
+
+        def commit(self):
+            self.db.commits += 1
+            for reference, data in self.writes:
+                reference.set(data)
+
+    def __init__(self):
+        self.collections = {}
+        self.commits = 0
+        self.generated = 0
+
+    def collection(self, name):
+        return InMemoryFirestore.Collection(self, name)
+
+    def batch(self):
+        return InMemoryFirestore.Batch(self)
+
+    def get_all(self, references):
+        return [InMemoryFirestore.Snapshot(r.id, self.collections.get(r.collection, {}).get(r.id))
+                for r in references]
+
+class StaticMetricClient:
+    """MetricServiceClient returning pre-built series, so only record building is timed"""
+
+    def __init__(self, series):
+        self.series = series
+
+    def list_time_series(self, request=None, **kwargs):
+        return self.series
+
+def estate_for(instances):
+    return generate_estate('large', networks=max(2, instances // 25), subnets=max(4, instances // 6),
+                           firewall_rules=max(10, instances * 2 // 5), instances=instances,
+                           reserved_addresses=max(1, instances // 25), load_balancers=10)
+
+# Cases
+
+@benchmark('metrics_collector._query_time_series', sizes=(100, 1000, 5000))
+def bench_query_time_series(num_series):
+    """Record building for num_series series of 12 points (one hour at 5 minutes)"""
+    # About nine in ten instances are running and have series
+    estate = estate_for(num_series * 5 // 4)
+    fake_gcp.install(estate)
+    import metrics_collector
+    from google.cloud import monitoring_v3
+
+    end = datetime.fromtimestamp(estate.now, timezone.utc)
+    request = monitoring_v3.ListTimeSeriesRequest(
+        name=f"projects/{PROJECT_ID}",
+        filter='metric.type="compute.googleapis.com/instance/network/sent_bytes_count"',
+        interval=monitoring_v3.TimeInterval(end_time=end, start_time={'seconds': int(estate.now) - 3600}),
+        aggregation=monitoring_v3.Aggregation(alignment_period={'seconds': 300},
+                                              per_series_aligner=monitoring_v3.Aggregation.Aligner.ALIGN_RATE)
+    )
+    series = list(monitoring_v3.MetricServiceClient().list_time_series(request=request))[:num_series]
+    collector = metrics_collector.NetworkMetricsCollector(PROJECT_ID)
+    collector.monitoring_client = StaticMetricClient(series)
+    start = datetime.fromtimestamp(estate.now - 3600, timezone.utc)
+
+    return lambda: collector._query_time_series(
+        'compute.googleapis.com/instance/network/sent_bytes_count', start, end, 300,
+        monitoring_v3.Aggregation.Aligner.ALIGN_RATE
+    )
+
+@benchmark('metrics_collector.store_metrics_data', sizes=(1000, 10000, 50000))
+def bench_store_metrics_data(num_points):
+    """Summary, batched point writes and anomaly scoring into an in-memory Firestore"""
+    import metrics_collector
+    from storage import FirestoreStorage
+
+    instances = max(1, num_points // 12)
+    base = int(time.time()) // 300 * 300 - 3600
+    points = [{
+        'metric_type': 'compute.googleapis.com/instance/network/sent_bytes_count',
+        'resource_type': 'gce_instance',
+        'resource_labels': {'project_id': PROJECT_ID, 'instance_id': str(1000 + i % instances),
+                            'zone': 'us-central1-a'},
+        'metric_labels': {'instance_name': f"vm-{i % instances}"},
+        'timestamp': datetime.fromtimestamp(base + 300 * (i // instances), timezone.utc)
+                             .strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        'value': float(1000 + i % 977)
+    } for i in range(num_points)]
+
+    def run():
+        storage = FirestoreStorage(client=InMemoryFirestore())
+        metrics_collector.get_storage = lambda: storage
+        metrics_collector.store_metrics_data({
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'project_id': PROJECT_ID,
+            'collection_period_minutes': 60,
+            'vpc_metrics': [dict(point) for point in points]
+        })
+    return run
+
+@benchmark('DataProcessor insights', sizes=(1000, 10000, 50000))
+def bench_data_processor(num_instances):
+    """Summary, security and cost insights over typed models of an estate"""
+    from shared.data_models import DataProcessor, FirewallRule, Instance, Inventory, Network, Subnet
+
+    estate = estate_for(num_instances)
+    inventory = Inventory(
+        project_id=PROJECT_ID,
+        collection_timestamp=datetime.now(timezone.utc).isoformat(),
+        networks=[Network.from_proto(network) for network in estate.networks],
+        subnets=[Subnet.from_proto(subnet) for subnets in estate.subnets_by_region.values() for subnet in subnets],
+        firewall_rules=[FirewallRule.from_proto(rule) for rule in estate.firewalls],
+        instances=[Instance.from_proto(instance, zone) for zone, instances in estate.instances_by_zone.items()
+                   for instance in instances]
+    )
+
+    def run():
+        processor = DataProcessor(inventory)
+        processor.get_network_summary()
+        processor.get_security_insights()
+        processor.get_cost_insights()
+    return run
+
+def network_resources(count):
+    """Resource documents as the API services return them"""
+    kinds = ('vpc_network', 'subnet', 'nat_gateway', 'load_balancer', 'instance')
+    return [{
+        'id': f"resource-{i}",
+        'resource_type': kinds[i % len(kinds)],
+        'name': f"{kinds[i % len(kinds)]}-{i}",
+        'project_id': PROJECT_ID,
+        'region': 'us-central1',
+        'zone': 'us-central1-a',
+        'network': f"vpc-{i % 50}",
+        'cidr_block': f"10.{i % 256}.{i // 256 % 256}.0/24",
+        'vpc_id': f"resource-{i - i % 5}",
+        'subnet_id': f"resource-{i - i % 5 + 1}",
+        'status': 'RUNNING',
+        'lb_type': 'EXTERNAL'
+    } for i in range(count)]
+
+def network_routes():
+    from app.routes import network
+    return network
+
+@benchmark('routes.network.build_topology', sizes=(1000, 10000, 100000))
+def bench_build_topology(count):
+    resources, network = network_resources(count), network_routes()
+    return lambda: network.build_topology(resources)
+
+@benchmark('routes.network.filter_resources', sizes=(1000, 10000, 100000))
+def bench_filter_resources(count):
+    resources, network = network_resources(count), network_routes()
+    return lambda: network.filter_resources(resources, 'subnet')
+
+# Runner
+
+def run_cases(name_filter=None, repeats=5, max_size=None):
+    results = {}
+    for name, sizes, setup in CASES:
+        if name_filter and name_filter not in name:
+            continue
+        for size in sizes:
+            if max_size and size > max_size:
+                continue
+            timing = time_call(setup(size), repeats)
+            results[f"{name}[{size}]"] = timing
+            print(f"  {name}[{size}]".ljust(56) + f"{timing['best'] * 1000:>12.2f} ms")
+    return results
+
+def compare(results, calibration, baseline, threshold):
+    """Print each case against the baseline; returns the names that regressed"""
+    scale = calibration / baseline['calibration_seconds']
+    print(f"\nCalibration {calibration * 1000:.1f} ms vs baseline {baseline['calibration_seconds'] * 1000:.1f} ms "
+          f"(times scaled by {1 / scale:.2f})")
+    print(f"{'case':<56}{'ms':>10}{'baseline':>10}{'ratio':>8}  status")
+    regressions = []
+    for name, timing in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<56}{timing['best'] * 1000:>10.2f}{'-':>10}{'-':>8}  new")
+            continue
+        ratio = timing['best'] / scale / before['best']
+        status = 'REGRESSION' if ratio > threshold else ('faster' if ratio < 1 / threshold else 'ok')
+        if ratio > threshold:
+            regressions.append(name)
+        print(f"{name:<56}{timing['best'] * 1000:>10.2f}{before['best'] * scale * 1000:>10.2f}{ratio:>8.2f}  {status}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark collector, storage, analysis and API hot paths')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Fail when a case is this many times slower than its baseline')
+    parser.add_argument('--filter', help='Only run cases whose name contains this')
+    parser.add_argument('--max-size', type=int, help='Skip data sizes above this')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    # The API's data service is built at import; point it at an empty local store
+    os.environ.setdefault('STORAGE_BACKEND', 'local')
+    os.environ.setdefault('LOCAL_STORAGE_PATH', tempfile.mkdtemp(prefix='benchmark-'))
+    os.environ.setdefault('GOOGLE_CLOUD_PROJECT', PROJECT_ID)
+    # Fake clients must be in place before the collectors import google.cloud
+    fake_gcp.install(estate_for(10))
+
+    calibration = calibrate()
+    print(f"Running benchmarks (calibration {calibration * 1000:.1f} ms)")
+    results = run_cases(args.filter, args.repeats, args.max_size)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'recorded_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'calibration_seconds': calibration,
+                'results': results
+            }, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, calibration, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold:.2f}x the baseline: {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
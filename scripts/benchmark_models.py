@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+# Import the backend package without installing it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from google.cloud import compute_v1, monitoring_v3
+from shared.data_models import Instance, MetricSeries
+
+ZONES = ['us-central1-a', 'us-central1-b', 'us-east1-b', 'europe-west1-c']
+MACHINE_TYPES = ['e2-medium', 'n2-standard-4', 'c3-standard-8']
+POINT_SECONDS = 60
+
+def generate_instances(count):
+    """Instance protos shaped like an aggregated_list response"""
+    instances = []
+    for i in range(count):
+        zone = random.choice(ZONES)
+        nic = compute_v1.NetworkInterface(
+            network='https://www.googleapis.com/compute/v1/projects/demo/global/networks/vpc-main',
+            subnetwork=f"https://www.googleapis.com/compute/v1/projects/demo/regions/{zone[:-2]}/subnetworks/subnet-{i % 64}",
+            network_i_p=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            access_configs=[compute_v1.AccessConfig(nat_i_p=f"34.1.{(i >> 8) & 255}.{i & 255}")] if i % 10 == 0 else []
+        )
+        instances.append((f"zones/{zone}", compute_v1.Instance(
+            name=f"vm-{i:06d}",
+            machine_type=f"zones/{zone}/machineTypes/{random.choice(MACHINE_TYPES)}",
+            status='RUNNING',
+            creation_timestamp='2025-08-24T00:00:00.000-07:00',
+            network_interfaces=[nic]
+        )))
+    return instances
+
+def generate_time_series(count, points_per_series=60):
+    """TimeSeries protos holding count points in total"""
+    series = []
+    start = 1756000000
+    for s in range(max(1, count // points_per_series)):
+        points = [
+            monitoring_v3.Point(
+                interval=monitoring_v3.TimeInterval(end_time={'seconds': start + p * POINT_SECONDS}),
+                value=monitoring_v3.TypedValue(int64_value=random.randrange(10 ** 9))
+            )
+            for p in range(points_per_series)
+        ]
+        series.append(monitoring_v3.TimeSeries(points=points))
+    return series
+
+def legacy_instance(zone, instance):
+    """The dict the collector used to build per instance through proto-plus accessors"""
+    return {
+        'name': instance.name,
+        'zone': zone.split('/')[-1],
+        'machine_type': instance.machine_type.split('/')[-1],
+        'status': instance.status,
+        'internal_ip': instance.network_interfaces[0].network_i_p if instance.network_interfaces else None,
+        'external_ip': instance.network_interfaces[0].access_configs[0].nat_i_p
+                     if instance.network_interfaces and instance.network_interfaces[0].access_configs
+                     else None,
+        'network': instance.network_interfaces[0].network.split('/')[-1]
+                 if instance.network_interfaces else None,
+        'subnet': instance.network_interfaces[0].subnetwork.split('/')[-1]
+                if instance.network_interfaces else None,
+        'network_interfaces': [{
+            'network': nic.network.split('/')[-1] if nic.network else None,
+            'subnet': nic.subnetwork.split('/')[-1] if nic.subnetwork else None,
+            'internal_ip': nic.network_i_p,
+            'alias_ip_ranges': [alias.ip_cidr_range for alias in nic.alias_ip_ranges
+                                if not alias.subnetwork_range_name]
+        } for nic in instance.network_interfaces],
+        'creation_timestamp': instance.creation_timestamp
+    }
+
+def legacy_points(time_series):
+    values = []
+    for result in time_series:
+        for point in result.points:
+            values.append({
+                'timestamp': point.interval.end_time.isoformat(),
+                'value': point.value.double_value or point.value.int64_value
+            })
+    return values
+
+def typed_points(time_series):
+    series = MetricSeries('compute.googleapis.com/instance/network/sent_bytes_count')
+    for result in time_series:
+        series.add_proto(result)
+    return series
+
+def measure(convert):
+    """(result, seconds, bytes retained by the result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = convert()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+def report(label, count, elapsed, retained, per=100_000):
+    print(f"{label:<34}{count / elapsed:>14,.0f}{retained * per / count / 2 ** 20:>16.1f}")
+
+def run_benchmark(num_resources=100_000):
+    """Conversion throughput and retained memory, dict records against slotted models"""
+    print(f"Building {num_resources:,} instance protos and {num_resources:,} metric points...")
+    instances = generate_instances(num_resources)
+    time_series = generate_time_series(num_resources)
+    num_points = sum(len(series.points) for series in time_series)
+
+    print("-" * 64)
+    print(f"{'conversion':<34}{'items/s':>14}{'MiB per 100k':>16}")
+
+    # Throughput is timed with tracing on in both cases, so compare the ratio
+    _, elapsed, retained = measure(lambda: [legacy_instance(zone, i) for zone, i in instances])
+    report('instances -> dicts (before)', num_resources, elapsed, retained)
+    models, elapsed, retained = measure(lambda: [Instance.from_proto(i, zone) for zone, i in instances])
+    report('instances -> Instance models', num_resources, elapsed, retained)
+    _, elapsed, _ = measure(lambda: [instance.to_dict() for instance in models])
+    print(f"{'  models -> dicts at serialization':<34}{num_resources / elapsed:>14,.0f}")
+
+    _, elapsed, retained = measure(lambda: legacy_points(time_series))
+    report('points -> dicts (before)', num_points, elapsed, retained)
+    _, elapsed, retained = measure(lambda: typed_points(time_series))
+    report('points -> MetricSeries arrays', num_points, elapsed, retained)
+
+if __name__ == '__main__':
+    random.seed(42)
+    run_benchmark()
@@ -38,6 +38,10 @@ gcloud projects add-iam-policy-binding $PROJECT_ID \
     --member="serviceAccount:network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com" \
     --role="roles/datastore.user"
 
+gcloud projects add-iam-policy-binding $PROJECT_ID \
+    --member="serviceAccount:network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com" \
+    --role="roles/logging.viewer"
+
 # Deploy network data collector function
 echo "Deploying network data collector function..."
 gcloud functions deploy network-data-collector \
@@ -68,6 +72,118 @@ gcloud functions deploy network-metrics-collector \
     --set-env-vars=GCP_PROJECT=$PROJECT_ID \
     --allow-unauthenticated
 
+# Deploy retention job function
+echo "Deploying retention job function..."
+gcloud functions deploy network-monitor-retention \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=retention_job \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=512MB \
+    --timeout=540s \
+    --max-instances=1 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID
+
+# Deploy egress cost function
+echo "Deploying egress cost function..."
+gcloud functions deploy network-monitor-egress-costs \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=egress_cost_job \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=1GB \
+    --timeout=540s \
+    --max-instances=1 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID
+
+# Deploy traffic matrix function
+echo "Deploying traffic matrix function..."
+gcloud functions deploy network-monitor-traffic-matrices \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=traffic_matrix_job \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=1GB \
+    --timeout=540s \
+    --max-instances=1 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID
+
+# Deploy capacity forecast function
+echo "Deploying capacity forecast function..."
+gcloud functions deploy network-monitor-capacity-forecast \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=capacity_forecast_job \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=1GB \
+    --timeout=540s \
+    --max-instances=1 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID
+
+# Task queue for coordinator/worker collection
+echo "Creating collection task topic..."
+gcloud services enable pubsub.googleapis.com
+gcloud pubsub topics create collection-tasks --message-retention-duration=1h
+
+gcloud pubsub topics add-iam-policy-binding collection-tasks \
+    --member="serviceAccount:network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com" \
+    --role="roles/pubsub.publisher"
+
+# Deploy collection coordinator function
+echo "Deploying collection coordinator function..."
+gcloud functions deploy network-monitor-collection-coordinator \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=collection_coordinator \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=512MB \
+    --timeout=300s \
+    --max-instances=2 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID,TASK_QUEUE=pubsub,TASK_TOPIC=collection-tasks
+
+# Deploy collection worker function
+echo "Deploying collection worker function..."
+gcloud functions deploy network-monitor-collection-worker \
+    --gen2 \
+    --runtime=python311 \
+    --region=$REGION \
+    --source=$FUNCTIONS_SOURCE_DIR \
+    --entry-point=collection_worker \
+    --trigger=http \
+    --service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --memory=1GB \
+    --timeout=540s \
+    --max-instances=50 \
+    --concurrency=1 \
+    --set-env-vars=GCP_PROJECT=$PROJECT_ID,FUNCTION_TIMEOUT_SEC=540,FUNCTION_MEMORY_MB=1024
+
+# Push tasks to the workers in order per ordering key
+WORKER_URL=$(gcloud functions describe network-monitor-collection-worker --region=$REGION --format="value(serviceConfig.uri)")
+gcloud pubsub subscriptions create collection-workers \
+    --topic=collection-tasks \
+    --push-endpoint=$WORKER_URL \
+    --push-auth-service-account=network-monitor-functions@$PROJECT_ID.iam.gserviceaccount.com \
+    --ack-deadline=600 \
+    --message-retention-duration=1h \
+    --enable-message-ordering \
+    --min-retry-delay=10s \
+    --max-retry-delay=300s
+
 echo "Getting function URLs..."
 DATA_COLLECTOR_URL=$(gcloud functions describe network-data-collector --region=$REGION --format="value(serviceConfig.uri)")
 METRICS_COLLECTOR_URL=$(gcloud functions describe network-metrics-collector --region=$REGION --format="value(serviceConfig.uri)")
@@ -0,0 +1,162 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# Import the backend package without installing it
+BACKEND = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, BACKEND)
+
+from shared import fake_gcp
+from shared.synthetic_estate import PRESETS, generate_estate
+
+# Runs every collector offline against a synthetic estate served by the fake
+# GCP clients, and backfills metric history into local storage so the API
+# and the analysis jobs can be timed against it afterwards. The backfill runs
+# first: local series only accept points newer than their last one.
+
+BACKFILL_STEP_SECONDS = 300
+RATE_PREFIXES = ('compute.googleapis.com/instance/', 'loadbalancing.googleapis.com/')
+
+def load_module(name, path):
+    """Load a collector by path; the standalone and Cloud Function collectors share module names"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def timed(label, call):
+    start = time.perf_counter()
+    result = call()
+    print(f"  {label:<40}{time.perf_counter() - start:>10.2f} s")
+    return result
+
+class MockRequest:
+    def __init__(self, args=None):
+        self.args = args or {}
+
+def backfill_metrics(storage, estate, days, max_instances):
+    """Write days of 5 minute points for a sample of instances and every load balancer.
+
+    Values follow what the metrics collector stores: rates for instance and
+    load balancer counters (ALIGN_RATE), mean raw samples for Cloud NAT.
+    Days are written oldest first; raises if storage drops any point, which
+    happens when a series already holds newer points.
+    """
+    from shared.fake_gcp.monitoring_v3 import RAW_PERIOD_SECONDS
+    from shared.synthetic_estate import INSTANCE_METRICS, LB_METRICS, NAT_METRICS
+
+    names = sorted({instance.name for instance, _, _, _ in estate._running})[:max_instances]
+    end = int(estate.now) // BACKFILL_STEP_SECONDS * BACKFILL_STEP_SECONDS
+    written = 0
+    for day in range(days, 0, -1):
+        start, stop = end - day * 86400, end - (day - 1) * 86400
+        collected = datetime.fromtimestamp(stop, timezone.utc).isoformat()
+        points = []
+        queries = [(metric_type, {'instance_name': name}) for metric_type in sorted(INSTANCE_METRICS | NAT_METRICS)
+                   for name in names] + [(metric_type, {}) for metric_type in sorted(LB_METRICS)]
+        for metric_type, matches in queries:
+            for series in estate.time_series(metric_type, matches, start, stop, BACKFILL_STEP_SECONDS):
+                scale = 1 if series.metric_kind == 'GAUGE' or metric_type.startswith(RATE_PREFIXES) \
+                    else RAW_PERIOD_SECONDS
+                for timestamp, value in zip(series.timestamps, series.values):
+                    points.append({
+                        'project_id': estate.project_id,
+                        'metric_type': metric_type,
+                        'resource_type': series.resource_type,
+                        'resource_labels': series.resource_labels,
+                        'metric_labels': series.metric_labels,
+                        'timestamp': datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                        'value': value * scale,
+                        'collection_timestamp': collected
+                    })
+        stored = storage.write_metrics(points)
+        if stored < len(points):
+            raise RuntimeError(f"Storage kept {stored:,} of {len(points):,} backfilled points for "
+                               f"{collected[:10]}; backfill into an empty --storage-path")
+        written += stored
+    return written
+
+def run_load_test(args):
+    overrides = {name: getattr(args, name) for name in ('networks', 'subnets', 'firewall_rules', 'instances')
+                 if getattr(args, name) is not None}
+    print(f"Generating '{args.preset}' estate {overrides or ''}...")
+    estate = timed('generate estate', lambda: generate_estate(args.preset, seed=args.seed, **overrides))
+    for name, count in estate.counts().items():
+        print(f"    {name:<38}{count:>12,}")
+
+    os.environ['STORAGE_BACKEND'] = 'local'
+    os.environ['LOCAL_STORAGE_PATH'] = args.storage_path
+    os.environ['GOOGLE_CLOUD_PROJECT'] = estate.project_id
+    fake = fake_gcp.install(estate, fake_gcp.FakeConfig(
+        latency=args.latency, latency_jitter=args.jitter, page_size=args.page_size,
+        quota_error_rate=args.quota_error_rate, requests_per_second=args.requests_per_second, seed=args.seed
+    ))
+
+    functions = os.path.join(BACKEND, 'cloud_functions')
+    sys.path.insert(0, functions)
+    if args.backfill_days:
+        from storage import get_storage
+        written = timed(f'backfill {args.backfill_days} days',
+                        lambda: backfill_metrics(get_storage(), estate, args.backfill_days, args.backfill_instances))
+        print(f"    {written:,} points")
+
+    print("\nStandalone collectors")
+    network = load_module('standalone_network_collector', os.path.join(BACKEND, 'network_collector.py'))
+    metrics = load_module('standalone_metrics_collector', os.path.join(BACKEND, 'metrics_collector.py'))
+    inventory = timed('GCPNetworkCollector.collect_all_data',
+                      lambda: network.GCPNetworkCollector(estate.project_id).collect_all_data())
+    sample = [instance for instance in inventory.instances if instance.status == 'RUNNING'][:args.sample_instances]
+    collector = metrics.GCPMetricsCollector(estate.project_id)
+    timed(f'get_instance_metrics x {len(sample)}',
+          lambda: [collector.get_instance_metrics(instance.name, instance.zone) for instance in sample])
+
+    print("\nCloud Functions")
+    network = load_module('network_collector', os.path.join(functions, 'network_collector.py'))
+    print(f"    {timed('collect_network_data', lambda: network.collect_network_data(MockRequest()))[1]}")
+    if not args.skip_metrics:
+        metrics = load_module('metrics_collector', os.path.join(functions, 'metrics_collector.py'))
+        print(f"    {timed('collect_network_metrics', lambda: metrics.collect_network_metrics(MockRequest()))[1]}")
+    if args.fanout:
+        # The coordinator runs every task on a thread pool standing in for Pub/Sub and the workers
+        os.environ['TASK_QUEUE'] = 'inprocess'
+        os.environ['LOCAL_WORKERS'] = str(args.fanout_workers)
+        fanout = load_module('fanout', os.path.join(functions, 'fanout.py'))
+        kinds = 'inventory' if args.skip_metrics else 'inventory,metrics,flow_logs'
+        response, code = timed(f'coordinate_collection x {args.fanout_workers} workers',
+                               lambda: fanout.coordinate_collection(MockRequest({'kinds': kinds, 'full': 'true'})))
+        print(f"    {code}: {response.get('run_status')}, {response.get('tasks_done')} of "
+              f"{response.get('tasks_published')} tasks done, {response.get('tasks_failed')} failed")
+
+    stats = fake.stats()
+    print(f"\nFake API calls: {sum(stats['calls'].values()):,}, quota errors: {stats['quota_errors']:,}")
+    for api, calls in sorted(stats['calls'].items()):
+        print(f"    {api:<38}{calls:>12,}")
+    print(f"\nStorage written to {args.storage_path}; serve it with "
+          f"STORAGE_BACKEND=local LOCAL_STORAGE_PATH={args.storage_path}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the collectors offline against a synthetic estate')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--networks', type=int)
+    parser.add_argument('--subnets', type=int)
+    parser.add_argument('--firewall-rules', type=int)
+    parser.add_argument('--instances', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per simulated page fetch')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency, up to this many seconds')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--quota-error-rate', type=float, default=0.0)
+    parser.add_argument('--requests-per-second', type=float, help='Per-API quota; calls above it fail')
+    parser.add_argument('--sample-instances', type=int, default=50,
+                        help='Instances the standalone metrics collector queries one by one')
+    parser.add_argument('--skip-metrics', action='store_true', help='Skip the Cloud Function metrics collector')
+    parser.add_argument('--fanout', action='store_true',
+                        help='Also run the coordinator with in-process task workers')
+    parser.add_argument('--fanout-workers', type=int, default=8)
+    parser.add_argument('--backfill-days', type=int, default=0, help='Days of metric history to write')
+    parser.add_argument('--backfill-instances', type=int, default=200)
+    parser.add_argument('--storage-path', default='synthetic-data')
+    run_load_test(parser.parse_args())
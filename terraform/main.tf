@@ -25,6 +25,12 @@ variable "environment" {
   default     = "dev"
 }
 
+variable "fanout_collection" {
+  description = "Collect through the coordinator and task workers instead of the single-invocation collectors"
+  type        = bool
+  default     = false
+}
+
 resource "google_project_service" "cloudfunctions" {
   service = "cloudfunctions.googleapis.com"
 }
@@ -74,7 +80,8 @@ resource "google_project_iam_member" "function_permissions" {
     "roles/compute.viewer",
     "roles/monitoring.viewer", 
     "roles/datastore.user",
-    "roles/logging.logWriter"
+    "roles/logging.logWriter",
+    "roles/logging.viewer"  # VPC Flow Logs for firewall hit counts
   ])
   
   project = var.project_id
@@ -106,13 +113,137 @@ resource "google_firestore_database" "network_monitor_db" {
   depends_on = [google_project_service.required_apis]
 }
 
+# Metric points arrive with monotonically increasing timestamps; a single-field
+# index on them would hotspot one tablet, so range scans lead with the shard
+resource "google_firestore_field" "metrics_timestamp" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "network-metrics"
+  field      = "timestamp"
+
+  index_config {}
+}
+
+resource "google_firestore_field" "metrics_collection_timestamp" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "network-metrics"
+  field      = "collection_timestamp"
+
+  index_config {}
+}
+
+resource "google_firestore_index" "metrics_series_range" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "network-metrics"
+
+  fields {
+    field_path = "project_id"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "metric_type"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "shard"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "timestamp"
+    order      = "ASCENDING"
+  }
+}
+
+resource "google_firestore_index" "metrics_retention" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "network-metrics"
+
+  fields {
+    field_path = "shard"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "hour"
+    order      = "ASCENDING"
+  }
+}
+
+# Inventory changes: replay after a checkpoint (oldest first) and the /changes timeline (newest first)
+resource "google_firestore_index" "changes_replay" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "inventory-changes"
+
+  fields {
+    field_path = "project_id"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "timestamp"
+    order      = "ASCENDING"
+  }
+}
+
+resource "google_firestore_index" "changes_timeline" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "inventory-changes"
+
+  fields {
+    field_path = "project_id"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "timestamp"
+    order      = "DESCENDING"
+  }
+}
+
+resource "google_firestore_index" "changes_timeline_section" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "inventory-changes"
+
+  fields {
+    field_path = "project_id"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "section"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "timestamp"
+    order      = "DESCENDING"
+  }
+}
+
+resource "google_firestore_index" "changes_timeline_section_all_projects" {
+  project    = var.project_id
+  database   = google_firestore_database.network_monitor_db.name
+  collection = "inventory-changes"
+
+  fields {
+    field_path = "section"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "timestamp"
+    order      = "DESCENDING"
+  }
+}
+
 # Cloud Scheduler Jobs
 resource "google_cloud_scheduler_job" "network_data_collection" {
   name             = "network-data-collection"
-  description      = "Collect network resource data every 15 minutes"
+  description      = "Collect the network resource slices that are due, checked every 15 minutes"
   schedule         = "*/15 * * * *"  # Every 15 minutes
   time_zone        = "UTC"
   attempt_deadline = "600s"
+  paused           = var.fanout_collection
   
   retry_config {
     retry_count = 3
@@ -139,6 +270,7 @@ resource "google_cloud_scheduler_job" "network_metrics_collection" {
   schedule         = "*/5 * * * *"   # Every 5 minutes
   time_zone        = "UTC"
   attempt_deadline = "600s"
+  paused           = var.fanout_collection
   
   retry_config {
     retry_count = 3
@@ -159,6 +291,164 @@ resource "google_cloud_scheduler_job" "network_metrics_collection" {
   ]
 }
 
+resource "google_cloud_scheduler_job" "retention_job" {
+  name             = "network-monitor-retention"
+  description      = "Delete metric points and inventory snapshots past their retention window"
+  schedule         = "30 3 * * *"  # Daily at 03:30
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.retention_job.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.retention_job
+  ]
+}
+
+resource "google_cloud_scheduler_job" "egress_costs" {
+  name             = "network-monitor-egress-costs"
+  description      = "Attribute the previous day's egress bytes to cost per resource, zone, region and destination"
+  schedule         = "15 2 * * *"  # Daily at 02:15, after the UTC day is complete
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.egress_costs.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.egress_costs
+  ]
+}
+
+resource "google_cloud_scheduler_job" "traffic_matrices" {
+  name             = "network-monitor-traffic-matrices"
+  description      = "Extend zone and region traffic matrices with the last complete hour"
+  schedule         = "10 * * * *"  # Hourly, after the metrics collection of the closing hour
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.traffic_matrices.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.traffic_matrices
+  ]
+}
+
+resource "google_cloud_scheduler_job" "capacity_forecast" {
+  name             = "network-monitor-capacity-forecast"
+  description      = "Forecast Cloud NAT port and VM egress headroom and time to exhaustion"
+  schedule         = "20 */6 * * *"  # Every 6 hours; forecasts look days ahead
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = google_cloudfunctions2_function.capacity_forecast.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.capacity_forecast
+  ]
+}
+
+resource "google_cloud_scheduler_job" "fanout_inventory" {
+  name             = "network-monitor-fanout-inventory"
+  description      = "Publish a task per due inventory slice (resource type x region) for the collection workers"
+  schedule         = "*/15 * * * *"  # Same tick as the inventory collector
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  paused           = !var.fanout_collection
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = "${google_cloudfunctions2_function.collection_coordinator.service_config[0].uri}?kinds=inventory"
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.collection_coordinator
+  ]
+}
+
+resource "google_cloud_scheduler_job" "fanout_metrics" {
+  name             = "network-monitor-fanout-metrics"
+  description      = "Publish a task per metric type and time chunk, plus flow log matching, for the collection workers"
+  schedule         = "*/5 * * * *"   # Same period as the metrics collector
+  time_zone        = "UTC"
+  attempt_deadline = "600s"
+  paused           = !var.fanout_collection
+  
+  retry_config {
+    retry_count = 3
+  }
+  
+  http_target {
+    http_method = "POST"
+    uri         = "${google_cloudfunctions2_function.collection_coordinator.service_config[0].uri}?kinds=metrics,flow_logs&duration=5"
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_cloudfunctions2_function.collection_coordinator
+  ]
+}
+
 # Cloud Function for Network Data Collection
 resource "google_cloudfunctions2_function" "network_data_collector" {
   name        = "network-data-collector"
@@ -186,6 +476,12 @@ resource "google_cloudfunctions2_function" "network_data_collector" {
     
     environment_variables = {
       GCP_PROJECT = var.project_id
+      # Run reports measure duration and memory against these
+      FUNCTION_TIMEOUT_SEC = 540
+      FUNCTION_MEMORY_MB   = 512
+      # Slices are polled between every scheduler tick and at least this often
+      COLLECTION_TICK_MINUTES = 15
+      MAX_STALENESS_MINUTES   = 360
     }
   }
   
@@ -222,6 +518,9 @@ resource "google_cloudfunctions2_function" "network_metrics_collector" {
     
     environment_variables = {
       GCP_PROJECT = var.project_id
+      # Run reports measure duration and memory against these
+      FUNCTION_TIMEOUT_SEC = 540
+      FUNCTION_MEMORY_MB   = 1024
     }
   }
   
@@ -231,6 +530,270 @@ resource "google_cloudfunctions2_function" "network_metrics_collector" {
   ]
 }
 
+# Cloud Function for retention and compaction
+resource "google_cloudfunctions2_function" "retention_job" {
+  name        = "network-monitor-retention"
+  location    = var.region
+  description = "Apply retention rules to stored network data"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "retention_job"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 1  # checkpoints assume a single runner
+    min_instance_count    = 0
+    available_memory      = "512M"
+    timeout_seconds       = 540
+    service_account_email = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Cloud Function for daily egress cost attribution
+resource "google_cloudfunctions2_function" "egress_costs" {
+  name        = "network-monitor-egress-costs"
+  location    = var.region
+  description = "Compute daily egress costs from collected byte counters"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "egress_cost_job"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 1
+    min_instance_count    = 0
+    available_memory      = "1Gi"  # a day of points is held in arrays
+    timeout_seconds       = 540
+    service_account_email = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Cloud Function for hourly traffic matrices
+resource "google_cloudfunctions2_function" "traffic_matrices" {
+  name        = "network-monitor-traffic-matrices"
+  location    = var.region
+  description = "Build zone x zone and region x region traffic matrices from byte counters"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "traffic_matrix_job"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 1
+    min_instance_count    = 0
+    available_memory      = "1Gi"  # catch-up windows hold up to two days of points in arrays
+    timeout_seconds       = 540
+    service_account_email = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Cloud Function for NAT port and bandwidth capacity forecasts
+resource "google_cloudfunctions2_function" "capacity_forecast" {
+  name        = "network-monitor-capacity-forecast"
+  location    = var.region
+  description = "Forecast NAT port and egress bandwidth exhaustion from collected metrics"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "capacity_forecast_job"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 1
+    min_instance_count    = 0
+    available_memory      = "1Gi"  # two weeks of hourly peaks per series in arrays
+    timeout_seconds       = 540
+    service_account_email = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Pub/Sub topic carrying collection tasks from the coordinator to the workers
+resource "google_pubsub_topic" "collection_tasks" {
+  name = "collection-tasks"
+  
+  # Undelivered tasks are replaced by the next run's
+  message_retention_duration = "3600s"
+  
+  depends_on = [google_project_service.pubsub]
+}
+
+# Cloud Function splitting collection runs into tasks
+resource "google_cloudfunctions2_function" "collection_coordinator" {
+  name        = "network-monitor-collection-coordinator"
+  location    = var.region
+  description = "Split collection runs into tasks and publish them"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "collection_coordinator"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count    = 2
+    min_instance_count    = 0
+    available_memory      = "512M"
+    timeout_seconds       = 300
+    service_account_email = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+      TASK_QUEUE  = "pubsub"
+      TASK_TOPIC  = google_pubsub_topic.collection_tasks.name
+      # Comma-separated projects collected per run; defaults to GCP_PROJECT
+      COLLECTION_PROJECTS  = var.project_id
+      METRIC_CHUNK_MINUTES = 60
+      # The cadence decides which slices are due, as for the inventory collector
+      COLLECTION_TICK_MINUTES = 15
+      MAX_STALENESS_MINUTES   = 360
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Cloud Function executing collection tasks; capacity scales with its instances
+resource "google_cloudfunctions2_function" "collection_worker" {
+  name        = "network-monitor-collection-worker"
+  location    = var.region
+  description = "Execute one collection task per Pub/Sub push delivery"
+  
+  build_config {
+    runtime     = "python311"
+    entry_point = "collection_worker"
+    
+    source {
+      storage_source {
+        bucket = google_storage_bucket.function_source.name
+        object = google_storage_bucket_object.function_source_zip.name
+      }
+    }
+  }
+  
+  service_config {
+    max_instance_count               = 50
+    min_instance_count               = 0
+    max_instance_request_concurrency = 1
+    available_memory                 = "1G"
+    timeout_seconds                  = 540
+    service_account_email            = google_service_account.cloud_functions_sa.email
+    
+    environment_variables = {
+      GCP_PROJECT = var.project_id
+      # Run reports measure duration and memory against these
+      FUNCTION_TIMEOUT_SEC = 540
+      FUNCTION_MEMORY_MB   = 1024
+      # Finalizing an inventory run updates the slice cadence
+      COLLECTION_TICK_MINUTES = 15
+      MAX_STALENESS_MINUTES   = 360
+    }
+  }
+  
+  depends_on = [
+    google_project_service.required_apis,
+    google_storage_bucket_object.function_source_zip
+  ]
+}
+
+# Push subscription delivering tasks to the workers; chunks of a metric type stay in order
+resource "google_pubsub_subscription" "collection_workers" {
+  name  = "collection-workers"
+  topic = google_pubsub_topic.collection_tasks.id
+  
+  ack_deadline_seconds       = 600
+  message_retention_duration = "3600s"
+  enable_message_ordering    = true
+  
+  retry_policy {
+    minimum_backoff = "10s"
+    maximum_backoff = "300s"
+  }
+  
+  push_config {
+    push_endpoint = google_cloudfunctions2_function.collection_worker.service_config[0].uri
+    
+    oidc_token {
+      service_account_email = google_service_account.cloud_functions_sa.email
+    }
+  }
+}
+
 # Upload function source code
 data "archive_file" "function_source" {
   type        = "zip"
@@ -261,6 +824,69 @@ resource "google_cloudfunctions2_function_iam_member" "metrics_collector_invoker
   member         = "allUsers"
 }
 
+resource "google_cloudfunctions2_function_iam_member" "retention_job_invoker" {
+  project        = google_cloudfunctions2_function.retention_job.project
+  location       = google_cloudfunctions2_function.retention_job.location
+  cloud_function = google_cloudfunctions2_function.retention_job.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "egress_costs_invoker" {
+  project        = google_cloudfunctions2_function.egress_costs.project
+  location       = google_cloudfunctions2_function.egress_costs.location
+  cloud_function = google_cloudfunctions2_function.egress_costs.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "traffic_matrices_invoker" {
+  project        = google_cloudfunctions2_function.traffic_matrices.project
+  location       = google_cloudfunctions2_function.traffic_matrices.location
+  cloud_function = google_cloudfunctions2_function.traffic_matrices.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "capacity_forecast_invoker" {
+  project        = google_cloudfunctions2_function.capacity_forecast.project
+  location       = google_cloudfunctions2_function.capacity_forecast.location
+  cloud_function = google_cloudfunctions2_function.capacity_forecast.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "collection_coordinator_invoker" {
+  project        = google_cloudfunctions2_function.collection_coordinator.project
+  location       = google_cloudfunctions2_function.collection_coordinator.location
+  cloud_function = google_cloudfunctions2_function.collection_coordinator.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_cloudfunctions2_function_iam_member" "collection_worker_invoker" {
+  project        = google_cloudfunctions2_function.collection_worker.project
+  location       = google_cloudfunctions2_function.collection_worker.location
+  cloud_function = google_cloudfunctions2_function.collection_worker.name
+  role           = "roles/cloudfunctions.invoker"
+  member         = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+resource "google_pubsub_topic_iam_member" "collection_tasks_publisher" {
+  topic  = google_pubsub_topic.collection_tasks.name
+  role   = "roles/pubsub.publisher"
+  member = "serviceAccount:${google_service_account.cloud_functions_sa.email}"
+}
+
+# Pub/Sub signs the push requests' OIDC tokens as the functions service account
+data "google_project" "project" {}
+
+resource "google_service_account_iam_member" "pubsub_token_creator" {
+  service_account_id = google_service_account.cloud_functions_sa.name
+  role               = "roles/iam.serviceAccountTokenCreator"
+  member             = "serviceAccount:service-${data.google_project.project.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
+}
+
 # Outputs
 output "network_data_collector_url" {
   description = "URL of the network data collector function"
@@ -272,6 +898,11 @@ output "network_metrics_collector_url" {
   value       = google_cloudfunctions2_function.network_metrics_collector.service_config[0].uri
 }
 
+output "collection_coordinator_url" {
+  description = "URL of the collection coordinator function"
+  value       = google_cloudfunctions2_function.collection_coordinator.service_config[0].uri
+}
+
 output "firestore_database" {
   description = "Firestore database name"
   value       = google_firestore_database.network_monitor_db.name
@@ -287,5 +918,11 @@ output "scheduler_jobs" {
   value = {
     data_collection    = google_cloud_scheduler_job.network_data_collection.name
     metrics_collection = google_cloud_scheduler_job.network_metrics_collection.name
+    retention          = google_cloud_scheduler_job.retention_job.name
+    egress_costs       = google_cloud_scheduler_job.egress_costs.name
+    traffic_matrices   = google_cloud_scheduler_job.traffic_matrices.name
+    capacity_forecast  = google_cloud_scheduler_job.capacity_forecast.name
+    fanout_inventory   = google_cloud_scheduler_job.fanout_inventory.name
+    fanout_metrics     = google_cloud_scheduler_job.fanout_metrics.name
   }
 }
\ No newline at end of file